@@ -12,6 +12,7 @@ from models.state_machine_models import (
     SlotKey,
     ProjectSlots,
     StateMachineOutput,
+    StateMachineReply,
     SuggestionBubble,
     RationaleCard,
     SLOT_ORDER,
@@ -24,6 +25,7 @@ from models.state_machine_models import (
     validate_slot_value,
 )
 from prompts.state_machine_prompts import StateMachinePrompts
+from services.llm_client import LLMPriority
 
 logger = logging.getLogger(__name__)
 
@@ -69,17 +71,16 @@ class StateMachineAgent:
         try:
             # 使用LLM提取結構化數據
             prompt = self.prompts.get_extraction_prompt(user_message, current_slots)
-            response = await self.llm_client.generate_response(prompt)
-
-            # 解析JSON回應
-            import json
-
-            try:
-                extracted_data = json.loads(response)
-                return extracted_data
-            except json.JSONDecodeError:
-                logger.warning("LLM回應不是有效JSON，使用備用提取方法")
+            extracted = await self.llm_client.generate_structured(
+                prompt,
+                ProjectSlots,
+                priority=LLMPriority.INTERACTIVE,
+                call_type="state_machine",
+            )
+            if extracted is None:
+                logger.warning("LLM回應未通過槽位驗證，使用備用提取方法")
                 return self._fallback_extraction(user_message)
+            return extracted.dict(exclude_none=True)
 
         except Exception as e:
             logger.error(f"LLM提取失敗，使用備用方法: {e}")
@@ -136,10 +137,15 @@ class StateMachineAgent:
             prompt = self.prompts.get_next_slot_prompt(
                 next_slot, current_slots, user_message
             )
-            response = await self.llm_client.generate_response(prompt)
+            reply = await self.llm_client.generate_structured(
+                prompt,
+                StateMachineReply,
+                priority=LLMPriority.INTERACTIVE,
+                call_type="state_machine",
+            )
 
             # 解析回應
-            parsed_response = self._parse_llm_response(response, next_slot)
+            parsed_response = self._parse_llm_response(reply, next_slot)
 
             # 生成建議泡泡
             suggestions = self._generate_suggestions(next_slot, current_slots)
@@ -162,29 +168,26 @@ class StateMachineAgent:
             logger.error(f"生成下一個槽位回應失敗: {e}")
             return self._generate_fallback_response(next_slot, current_slots)
 
-    def _parse_llm_response(self, response: str, next_slot: SlotKey) -> Dict[str, Any]:
+    def _parse_llm_response(
+        self, reply: Optional[StateMachineReply], next_slot: SlotKey
+    ) -> Dict[str, Any]:
         """解析LLM回應"""
-        try:
-            import json
-
-            parsed = json.loads(response)
-
-            # 確保回應符合合約
-            result = {
-                "message": parsed.get("message", ""),
-                "next_question": parsed.get("next_question", ""),
-                "slot_writes": parsed.get("slot_writes"),
-            }
+        if reply is None:
+            logger.warning("LLM回應未通過合約驗證，使用備用回應")
+            return self._generate_fallback_llm_response(next_slot)
 
-            # 如果是theme槽位，必須包含rationale_cards
-            if next_slot == SlotKey.CAMPAIGN_THEME:
-                result["rationale_cards"] = parsed.get("rationale_cards", [])
+        # 確保回應符合合約
+        result = {
+            "message": reply.message,
+            "next_question": reply.next_question,
+            "slot_writes": reply.slot_writes,
+        }
 
-            return result
+        # 如果是theme槽位，必須包含rationale_cards
+        if next_slot == SlotKey.CAMPAIGN_THEME:
+            result["rationale_cards"] = reply.rationale_cards or []
 
-        except json.JSONDecodeError:
-            logger.warning("LLM回應不是有效JSON，使用備用回應")
-            return self._generate_fallback_llm_response(next_slot)
+        return result
 
     def _generate_fallback_llm_response(self, next_slot: SlotKey) -> Dict[str, Any]:
         """生成備用的LLM回應"""
@@ -5,110 +5,254 @@
 """
 
 
+import asyncio
+import copy
 import logging
-from typing import Any, Dict, List, Optional
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
 from datetime import datetime
 
+from pydantic import BaseModel
+
 from models.unified_models import (
+    FusedTurnPlan,
+    LateResult,
     ProjectData,
-    ChatMessage,
     QuickReply,
     ChatTurnResponse,
-    MessageRole,
-    MessageType,
+)
+from config import (
+    COMPLETENESS_THRESHOLD,
+    INTENT_CLASSIFIER_ENABLED,
+    INTENT_CONFIDENCE_THRESHOLD,
+    INTENT_LOG_PATH,
+    INTENT_MODEL_PATH,
+    LATE_RESULTS_MAX,
+    LLM_SESSION_CONTEXT,
+    PLANNER_MODE,
+    TURN_BUDGET_SECONDS,
 )
 from prompts.unified_prompts import UnifiedPrompts
+from services.conversation_memory import ConversationMemory
+from services.intent_classifier import (
+    IntentClassifier,
+    RoutingLog,
+    project_state_flags,
+)
+from services.llm_client import LLMPriority
+from services.speculative_executor import SpeculativeExecutor
 from tools.unified_tools import ToolExecutor
 
 logger = logging.getLogger(__name__)
 
+# 會改寫專案數據的行動；快速回覆需等這些行動完成後才能產生
+PROJECT_MUTATING_ACTIONS = {"extract_data", "generate_insights", "provide_strategy"}
+
+# 單次規劃模式下仍需執行專用工具的行動（其回覆取代規劃中的 reply_text）
+FUSED_TOOL_ACTIONS = {"generate_insights", "provide_strategy", "evaluate_completeness"}
+
+# 受回合預算約束的行動，超時時改回傳 BUDGET_FALLBACK_MESSAGES 的預設文字
+BUDGETED_ACTIONS = {"generate_insights", "provide_strategy", "evaluate_completeness"}
+
+BUDGET_FALLBACK_MESSAGES = {
+    "generate_insights": "受眾洞察仍在分析中，完成後會自動更新到專案，您可以先繼續補充其他資訊。",
+    "provide_strategy": "內容策略仍在制定中，完成後會自動更新到專案，您可以先繼續補充其他資訊。",
+}
+
+# 預先計算快速回覆時代入的預期用戶訊息（依預測的下一步行動；結果以行動取用，不比對實際訊息）
+SPECULATIVE_MESSAGES = {
+    "generate_insights": "請幫我分析目標受眾",
+    "provide_strategy": "請提供內容策略建議",
+}
+
+
+class TurnSteps:
+    """聊天回合內各步驟的執行與計時"""
+
+    def __init__(self, budget: Optional[float] = None):
+        """初始化計時
+
+        budget: 回合延遲預算（秒），由 within() 執行的步驟共用同一個截止時間。
+        """
+        self.started = time.perf_counter()
+        self.timings: Dict[str, float] = {}
+        self.deadline = self.started + budget if budget and budget > 0 else None
+        self.budget_hits: List[str] = []
+        self.budget_missed: List[str] = []
+        self.pending: List[Dict[str, str]] = []
+
+    def remaining(self) -> Optional[float]:
+        """剩餘預算（秒）；未設定預算時回傳 None"""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.perf_counter())
+
+    async def run(self, name: str, awaitable: Awaitable[Any]) -> Any:
+        """執行步驟並記錄耗時（毫秒）"""
+        started = time.perf_counter()
+        try:
+            return await awaitable
+        finally:
+            self.timings[name] = round((time.perf_counter() - started) * 1000, 2)
+
+    def spawn(self, name: str, awaitable: Awaitable[Any]) -> asyncio.Task:
+        """以背景任務執行步驟，與其他步驟並行"""
+        return asyncio.ensure_future(self.run(name, awaitable))
+
+    async def within(
+        self,
+        name: str,
+        task: asyncio.Task,
+        fallback: Callable[[], Any],
+        on_late: Callable[[asyncio.Task], None],
+    ) -> Any:
+        """在剩餘預算內等待步驟
+
+        超時時回傳 fallback()，步驟不取消而是繼續執行，完成後以 on_late(task) 通知。
+        """
+        remaining = self.remaining()
+        try:
+            if remaining is None:
+                return await task
+            done, _ = await asyncio.wait({task}, timeout=remaining)
+        except asyncio.CancelledError:
+            task.cancel()
+            raise
+
+        if task in done:
+            self.budget_hits.append(name)
+            return task.result()
+
+        self.budget_missed.append(name)
+        task.add_done_callback(on_late)
+        return fallback()
+
+    def summary(self) -> Dict[str, Any]:
+        """步驟耗時與回合總耗時"""
+        return {
+            "timings_ms": dict(self.timings),
+            "total_ms": round((time.perf_counter() - self.started) * 1000, 2),
+            "budget_missed": list(self.budget_missed),
+            "pending": list(self.pending),
+        }
+
 
 class UnifiedPlanningAgent:
     """統一的企劃代理控制器"""
 
-    def __init__(self, llm_client, tool_executor: ToolExecutor):
-        """初始化代理"""
+    def __init__(
+        self,
+        llm_client,
+        tool_executor: ToolExecutor,
+        session_manager=None,
+        planner_mode: Optional[str] = None,
+        intent_classifier: Optional[IntentClassifier] = None,
+        routing_log: Optional[RoutingLog] = None,
+        memory: Optional[ConversationMemory] = None,
+        speculator: Optional[SpeculativeExecutor] = None,
+        turn_budget: Optional[float] = None,
+    ):
+        """初始化代理
+
+        提供 session_manager 時，對話歷史保存在各會話（最近訊息視窗 + 滾動摘要），
+        一般對話並會沿用各會話保存的 Ollama 上下文。
+        planner_mode 為 "fused" 時，路由、提取、回覆與快速回覆以單次結構化呼叫完成；
+        未指定時依 PLANNER_MODE 設定。
+        intent_classifier 未指定時依 INTENT_CLASSIFIER_ENABLED 從 INTENT_MODEL_PATH 載入。
+        speculator 未指定時依 SPECULATION_ENABLED 建立，回覆後預先計算下一步的工具結果。
+        turn_budget 未指定時依 TURN_BUDGET_SECONDS；超出預算的步驟先回傳預設內容，
+        完成後的結果附加到會話的 late_results。
+        """
         self.llm_client = llm_client
         self.tool_executor = tool_executor
-        self.conversation_history: List[ChatMessage] = []
+        self.session_manager = session_manager
+        self.planner_mode = planner_mode or PLANNER_MODE
+        if memory is None and session_manager is not None:
+            memory = ConversationMemory(llm_client, session_manager)
+        self.memory = memory
+        self.speculator = speculator or SpeculativeExecutor(tool_executor, llm_client)
+        if intent_classifier is None and INTENT_CLASSIFIER_ENABLED:
+            intent_classifier = IntentClassifier.load(INTENT_MODEL_PATH)
+        self.intent_classifier = intent_classifier
+        self.routing_log = routing_log or RoutingLog(INTENT_LOG_PATH)
+        self.routing_stats = {"rule": 0, "classifier": 0, "llm": 0}
+        self.turn_budget = TURN_BUDGET_SECONDS if turn_budget is None else turn_budget
+        self.budget_stats = {
+            "hits": 0,
+            "misses": 0,
+            "late_completed": 0,
+            "late_failed": 0,
+        }
+        self._late_tasks = set()
 
     async def process_chat_turn(
         self,
         user_message: str,
         session_id: str,
         project_data: Optional[ProjectData] = None,
+        on_token: Optional[Callable[[str], Awaitable[None]]] = None,
     ) -> ChatTurnResponse:
-        """處理聊天回合"""
+        """處理聊天回合
+
+        步驟相依關係：route → action；quick_replies 只依賴專案數據，
+        因此只有會改寫專案數據的行動才需要等它完成，其餘情況與 action 並行。
+        fused 模式先以單次呼叫規劃整個回合，驗證失敗時退回上述多次呼叫流程。
+        各步驟耗時記錄在回應的 metadata.timings_ms；超出回合預算的步驟列在
+        metadata.pending，完成後可從會話的 late_results 取得。
+
+        on_token: 串流回呼；提供時，回覆文字會在生成時逐段送出。
+        """
+        streamed = False
+        steps = TurnSteps(self.turn_budget)
+        planner = "multi"
+
+        async def forward_token(chunk: str) -> None:
+            nonlocal streamed
+            streamed = True
+            await on_token(chunk)
+
+        async def flush_response(text: str) -> None:
+            # 固定文案的處理器不經過 LLM 串流，先整段送出讓前端提早顯示
+            if on_token and not streamed and text:
+                await on_token(text)
+
         try:
             # 初始化專案數據（如果沒有）
             if project_data is None:
                 project_data = ProjectData()
 
-            # 添加用戶訊息到歷史
-            user_chat_message = ChatMessage(
-                role=MessageRole.USER,
-                content=user_message,
-                message_type=MessageType.TEXT,
-            )
-            self.conversation_history.append(user_chat_message)
-
-            # 分析用戶輸入並決定下一步行動
-            next_action = await self._determine_next_action(user_message, project_data)
-            logger.info(f"決定的下一步行動: {next_action}")
-
-            # 根據行動類型執行相應邏輯
-            if next_action == "extract_data":
-                logger.info("執行數據提取")
-                response = await self._handle_data_extraction(
-                    user_message, project_data
-                )
-            elif next_action == "generate_insights":
-                logger.info("執行洞察生成")
-                response = await self._handle_insight_generation(
-                    user_message, project_data
-                )
-            elif next_action == "provide_strategy":
-                logger.info("執行策略生成")
-                response = await self._handle_strategy_generation(
-                    user_message, project_data
+            plan = None
+            if self.planner_mode == "fused":
+                plan = await steps.run(
+                    "plan", self._plan_fused_turn(user_message, project_data)
                 )
-            elif next_action == "evaluate_completeness":
-                logger.info("執行完整度評估")
-                response = await self._handle_completeness_evaluation(
-                    user_message, project_data
-                )
-            elif next_action == "clarify":
-                logger.info("執行澄清請求")
-                response = await self._handle_clarification(user_message, project_data)
-            elif next_action == "general_conversation":
-                logger.info("執行一般對話")
-                response = await self._handle_general_conversation(
-                    user_message, project_data
+                planner = "fused" if plan is not None else "fused_fallback"
+
+            if plan is not None:
+                next_action, response, quick_replies = await self._apply_fused_plan(
+                    plan,
+                    user_message,
+                    project_data,
+                    steps,
+                    on_response=flush_response,
+                    session_id=session_id,
                 )
             else:
-                logger.info(f"未知行動類型: {next_action}，使用一般對話")
-                response = await self._handle_general_conversation(
-                    user_message, project_data
+                next_action, response, quick_replies = await self._run_multi_call_turn(
+                    user_message,
+                    project_data,
+                    steps,
+                    on_token=forward_token if on_token else None,
+                    on_response=flush_response,
+                    session_id=session_id,
                 )
 
-            # 生成快速回覆選項
-            quick_replies = await self._generate_quick_replies(
-                user_message, project_data
-            )
-
             # 計算專案完整度（使用邏輯計算而非 LLM 評估）
             project_data.completeness_score = self._calculate_completeness_score(
                 project_data
             )
 
-            # 添加AI回應到歷史
-            ai_chat_message = ChatMessage(
-                role=MessageRole.ASSISTANT,
-                content=response,
-                message_type=MessageType.TEXT,
-            )
-            self.conversation_history.append(ai_chat_message)
-
             # 更新專案數據時間戳
             project_data.updated_at = datetime.now()
 
@@ -117,6 +261,13 @@ class UnifiedPlanningAgent:
                 response, project_data, user_message
             )
 
+            # 寫入會話歷史（超出視窗的舊訊息由背景摘要壓縮）
+            if self.memory and session_id:
+                self.memory.record_turn(session_id, user_message, response)
+
+            # 回覆已確定，利用閒置時間預先計算下一步
+            self._schedule_speculation(next_action, project_data)
+
             return ChatTurnResponse(
                 message=response,
                 session_id=session_id,
@@ -124,6 +275,11 @@ class UnifiedPlanningAgent:
                 quick_replies=quick_replies,
                 completeness_score=project_data.completeness_score,
                 is_complete=project_data.completeness_score >= 80.0,
+                metadata={
+                    "action": next_action,
+                    "planner": planner,
+                    **steps.summary(),
+                },
             )
 
         except Exception as e:
@@ -140,8 +296,381 @@ class UnifiedPlanningAgent:
                 ],
                 completeness_score=0.0,
                 is_complete=False,
+                metadata={"planner": planner, **steps.summary()},
             )
 
+    async def _run_multi_call_turn(
+        self,
+        user_message: str,
+        project_data: ProjectData,
+        steps: TurnSteps,
+        on_token: Optional[Callable[[str], Awaitable[None]]] = None,
+        on_response: Optional[Callable[[str], Awaitable[None]]] = None,
+        session_id: Optional[str] = None,
+    ) -> Tuple[str, str, List[QuickReply]]:
+        """多次呼叫流程：路由 → 行動，快速回覆視相依關係並行
+
+        on_response 在行動完成、等待快速回覆之前以回覆文字呼叫。
+        """
+        quick_replies_task: Optional[asyncio.Task] = None
+        try:
+            # 分析用戶輸入並決定下一步行動
+            next_action = await steps.run(
+                "route", self._determine_next_action(user_message, project_data)
+            )
+            logger.info(f"決定的下一步行動: {next_action}")
+
+            # 不改寫專案數據的行動：快速回覆不必等待，與行動並行
+            if next_action not in PROJECT_MUTATING_ACTIONS:
+                quick_replies_task = steps.spawn(
+                    "quick_replies",
+                    self._generate_quick_replies(user_message, project_data, next_action),
+                )
+
+            # 根據行動類型執行相應邏輯
+            def action(project: ProjectData) -> Awaitable[str]:
+                return self._run_action(
+                    next_action,
+                    user_message,
+                    project,
+                    on_token=on_token,
+                    session_id=session_id,
+                )
+
+            if next_action in BUDGETED_ACTIONS:
+                response = await self._run_budgeted_action(
+                    steps, next_action, action, project_data, session_id
+                )
+            else:
+                response = await steps.run("action", action(project_data))
+            if on_response is not None:
+                await on_response(response)
+
+            # 生成快速回覆選項（需要更新後的專案數據時才在此開始）
+            if quick_replies_task is None:
+                quick_replies_task = steps.spawn(
+                    "quick_replies",
+                    self._generate_quick_replies(user_message, project_data, next_action),
+                )
+            task, quick_replies_task = quick_replies_task, None
+            quick_replies = await self._run_budgeted_quick_replies(
+                steps, task, next_action, project_data, session_id
+            )
+
+            return next_action, response, quick_replies
+        finally:
+            if quick_replies_task is not None and not quick_replies_task.done():
+                quick_replies_task.cancel()
+
+    async def _plan_fused_turn(
+        self, user_message: str, project_data: ProjectData
+    ) -> Optional[FusedTurnPlan]:
+        """以單次結構化呼叫規劃整個回合；驗證失敗回傳 None"""
+        try:
+            prompt = UnifiedPrompts.get_system_prompt("fused_turn")
+            context = f"""
+
+專案狀態: {self._get_project_status_summary(project_data)}
+用戶訊息: {user_message}
+"""
+            plan = await self.llm_client.generate_structured(
+                prompt + context,
+                FusedTurnPlan,
+                use_cache=False,
+                priority=LLMPriority.INTERACTIVE,
+                call_type="fused_plan",
+            )
+            if plan is None:
+                logger.warning("單次回合規劃未通過驗證，改用多次呼叫流程")
+            return plan
+
+        except Exception as e:
+            logger.error(f"單次回合規劃失敗: {e}")
+            return None
+
+    async def _apply_fused_plan(
+        self,
+        plan: FusedTurnPlan,
+        user_message: str,
+        project_data: ProjectData,
+        steps: TurnSteps,
+        on_response: Optional[Callable[[str], Awaitable[None]]] = None,
+        session_id: Optional[str] = None,
+    ) -> Tuple[str, str, List[QuickReply]]:
+        """套用單次規劃結果；需要專用工具的行動仍執行對應處理器"""
+        if plan.extracted_fields is not None:
+            self._update_project_data(
+                project_data, plan.extracted_fields.dict(exclude_none=True)
+            )
+
+        response = plan.reply_text
+        if plan.next_action in FUSED_TOOL_ACTIONS:
+            response = await self._run_budgeted_action(
+                steps,
+                plan.next_action,
+                lambda project: self._run_action(plan.next_action, user_message, project),
+                project_data,
+                session_id,
+            )
+        if on_response is not None:
+            await on_response(response)
+
+        quick_replies = [
+            reply.copy(update={"priority": i + 1})
+            for i, reply in enumerate(plan.quick_replies)
+        ]
+        if not quick_replies:
+            quick_replies = await self._run_budgeted_quick_replies(
+                steps,
+                steps.spawn(
+                    "quick_replies",
+                    self._generate_quick_replies(
+                        user_message, project_data, plan.next_action
+                    ),
+                ),
+                plan.next_action,
+                project_data,
+                session_id,
+            )
+
+        return plan.next_action, response, quick_replies
+
+    async def _run_action(
+        self,
+        next_action: str,
+        user_message: str,
+        project_data: ProjectData,
+        on_token: Optional[Callable[[str], Awaitable[None]]] = None,
+        session_id: Optional[str] = None,
+    ) -> str:
+        """依行動類型執行對應的處理器"""
+        if next_action == "extract_data":
+            logger.info("執行數據提取")
+            return await self._handle_data_extraction(user_message, project_data)
+        elif next_action == "generate_insights":
+            logger.info("執行洞察生成")
+            return await self._handle_insight_generation(user_message, project_data)
+        elif next_action == "provide_strategy":
+            logger.info("執行策略生成")
+            return await self._handle_strategy_generation(user_message, project_data)
+        elif next_action == "evaluate_completeness":
+            logger.info("執行完整度評估")
+            return await self._handle_completeness_evaluation(
+                user_message, project_data
+            )
+        elif next_action == "clarify":
+            logger.info("執行澄清請求")
+            return await self._handle_clarification(user_message, project_data)
+        elif next_action == "general_conversation":
+            logger.info("執行一般對話")
+        else:
+            logger.info(f"未知行動類型: {next_action}，使用一般對話")
+        return await self._handle_general_conversation(
+            user_message, project_data, on_token=on_token, session_id=session_id
+        )
+
+    async def _run_budgeted_action(
+        self,
+        steps: TurnSteps,
+        next_action: str,
+        action: Callable[[ProjectData], Awaitable[str]],
+        project_data: ProjectData,
+        session_id: Optional[str],
+    ) -> str:
+        """在回合預算內執行行動；超時先回傳預設文字
+
+        行動在專案數據的副本上執行：如期完成時寫回本回合的專案數據；
+        逾時則本回合資料不再被改動，完成後只將行動改動的欄位合併進會話。
+        """
+        base = project_data.copy(deep=True)
+        work = project_data.copy(deep=True)
+        missed = len(steps.budget_missed)
+        response = await self._run_budgeted(
+            steps,
+            "action",
+            steps.spawn("action", action(work)),
+            lambda: self._budget_fallback_message(next_action, project_data),
+            next_action,
+            work,
+            session_id,
+            base=base,
+        )
+        if len(steps.budget_missed) == missed:
+            for name in ProjectData.model_fields:
+                setattr(project_data, name, getattr(work, name))
+        return response
+
+    async def _run_budgeted_quick_replies(
+        self,
+        steps: TurnSteps,
+        task: asyncio.Task,
+        next_action: str,
+        project_data: ProjectData,
+        session_id: Optional[str],
+    ) -> List[QuickReply]:
+        """在回合預算內等待快速回覆；超時先回傳依缺失欄位產生的預設選項"""
+        return await self._run_budgeted(
+            steps,
+            "quick_replies",
+            task,
+            lambda: self.tool_executor.fallback_quick_replies(project_data),
+            next_action,
+            project_data,
+            session_id,
+        )
+
+    async def _run_budgeted(
+        self,
+        steps: TurnSteps,
+        step: str,
+        task: asyncio.Task,
+        fallback: Callable[[], Any],
+        next_action: str,
+        project_data: ProjectData,
+        session_id: Optional[str],
+        base: Optional[ProjectData] = None,
+    ) -> Any:
+        late_id = uuid.uuid4().hex[:12]
+        created_at = datetime.now()
+
+        def on_late(done: asyncio.Task) -> None:
+            self._attach_late_result(
+                done,
+                late_id,
+                step,
+                next_action,
+                project_data,
+                session_id,
+                created_at,
+                base=base,
+            )
+
+        missed = len(steps.budget_missed)
+        result = await steps.within(step, task, fallback, on_late)
+        if steps.deadline is None:
+            return result
+
+        if len(steps.budget_missed) > missed:
+            self.budget_stats["misses"] += 1
+            self._late_tasks.add(task)
+            steps.pending.append({"id": late_id, "step": step})
+            logger.warning(f"步驟 {step}（{next_action}）超出回合預算，先回傳預設內容")
+        else:
+            self.budget_stats["hits"] += 1
+        return result
+
+    def _attach_late_result(
+        self,
+        task: asyncio.Task,
+        late_id: str,
+        step: str,
+        next_action: str,
+        project_data: ProjectData,
+        session_id: Optional[str],
+        created_at: datetime,
+        base: Optional[ProjectData] = None,
+    ) -> None:
+        """延遲完成的步驟結果附加到會話；改寫專案數據的行動一併保存專案數據
+
+        project_data 為行動專用的副本，base 為行動開始時的內容；
+        只有行動改動的欄位會合併到會話目前的專案數據，不覆寫之後回合的變更。
+        """
+        self._late_tasks.discard(task)
+        late = LateResult(id=late_id, step=step, action=next_action, created_at=created_at)
+        updated_project = None
+        try:
+            result = task.result()
+            if step == "quick_replies":
+                late.quick_replies = result
+            else:
+                late.message = result
+                if next_action in PROJECT_MUTATING_ACTIONS and base is not None:
+                    updated_project = self._merge_late_project(
+                        session_id, base, project_data
+                    )
+            self.budget_stats["late_completed"] += 1
+            logger.info(f"延遲步驟 {step}（{next_action}）已完成")
+        except asyncio.CancelledError:
+            late.status = "failed"
+            self.budget_stats["late_failed"] += 1
+        except Exception as e:
+            late.status = "failed"
+            self.budget_stats["late_failed"] += 1
+            logger.error(f"延遲步驟 {step}（{next_action}）失敗: {e}")
+
+        if self.session_manager is not None and session_id:
+            self.session_manager.add_late_result(
+                session_id,
+                late,
+                project_data=updated_project,
+                max_results=LATE_RESULTS_MAX,
+            )
+
+    def _merge_late_project(
+        self, session_id: Optional[str], base: ProjectData, changed: ProjectData
+    ) -> Optional[ProjectData]:
+        """將延遲行動改動的欄位套用到會話目前專案數據的副本"""
+        if self.session_manager is None or not session_id:
+            return None
+        current = self.session_manager.get_project_data(session_id)
+        if current is None:
+            return None
+        merged = current.copy(deep=True)
+        for name in ProjectData.model_fields:
+            old, new = getattr(base, name), getattr(changed, name)
+            if isinstance(new, BaseModel) and isinstance(old, BaseModel):
+                target = getattr(merged, name)
+                for field in type(new).model_fields:
+                    value = getattr(new, field)
+                    if value != getattr(old, field):
+                        setattr(target, field, copy.deepcopy(value))
+            elif new != old:
+                setattr(merged, name, copy.deepcopy(new))
+        merged.updated_at = datetime.now()
+        return merged
+
+    def _budget_fallback_message(
+        self, next_action: str, project_data: ProjectData
+    ) -> str:
+        """行動超出預算時的預設回覆；完整度評估改用本地計算"""
+        if next_action == "evaluate_completeness":
+            score = self._calculate_completeness_score(project_data)
+            needs = self._identify_clarification_needs(project_data)
+            if needs == "無":
+                return f"依目前資料估算，專案完整度約 {score:.1f}%，詳細評估完成後會附加到會話中。"
+            return f"依目前資料估算，專案完整度約 {score:.1f}%。還需要補充以下資訊：{needs}"
+        return BUDGET_FALLBACK_MESSAGES.get(
+            next_action, "正在處理您的請求，完成後會附加到會話中。"
+        )
+
+    async def drain_late_results(self) -> None:
+        """等待超出預算仍在執行的步驟完成（關閉服務與測試用）"""
+        while self._late_tasks:
+            await asyncio.gather(*list(self._late_tasks), return_exceptions=True)
+
+    def get_budget_stats(self) -> Dict[str, Any]:
+        """回合預算命中與逾時統計"""
+        decided = self.budget_stats["hits"] + self.budget_stats["misses"]
+        return {
+            **self.budget_stats,
+            "budget_seconds": self.turn_budget,
+            "pending": len(self._late_tasks),
+            "miss_rate": (
+                round(self.budget_stats["misses"] / decided, 3) if decided else 0.0
+            ),
+        }
+
+    def get_routing_stats(self) -> Dict[str, Any]:
+        """路由決策來源統計"""
+        decided = sum(self.routing_stats.values())
+        return {
+            **self.routing_stats,
+            "classifier_loaded": self.intent_classifier is not None,
+            "llm_ratio": (
+                round(self.routing_stats["llm"] / decided, 3) if decided else 0.0
+            ),
+        }
+
     async def _determine_next_action(
         self, user_message: str, project_data: ProjectData
     ) -> str:
@@ -155,6 +684,7 @@ class UnifiedPlanningAgent:
 
             if is_greeting:
                 logger.info("檢測到簡單問候語，返回 general_conversation")
+                self.routing_stats["rule"] += 1
                 return "general_conversation"
 
             # 檢查專案數據是否足夠進行分析
@@ -163,8 +693,21 @@ class UnifiedPlanningAgent:
 
             if not has_sufficient_data:
                 logger.info("專案數據不足，返回 extract_data")
+                self.routing_stats["rule"] += 1
                 return "extract_data"
 
+            # 本地分類器信心足夠時直接路由，省下一次 LLM 呼叫
+            state = project_state_flags(project_data)
+            if self.intent_classifier is not None:
+                action, confidence = self.intent_classifier.predict(user_message, state)
+                if action and confidence >= INTENT_CONFIDENCE_THRESHOLD:
+                    logger.info(
+                        f"意圖分類器決定的行動: {action}（信心 {confidence:.2f}）"
+                    )
+                    self.routing_stats["classifier"] += 1
+                    self.routing_log.append(user_message, state, action, "classifier")
+                    return action
+
             # 構建對話流程控制提示詞
             prompt = UnifiedPrompts.get_system_prompt("flow")
 
@@ -178,12 +721,16 @@ class UnifiedPlanningAgent:
 
             full_prompt = prompt + context
 
-            # 調用LLM決定行動
-            response = await self.llm_client.generate_response(full_prompt)
+            # 調用LLM決定行動（阻塞本輪回覆，走互動優先級）
+            response = await self.llm_client.generate_response(
+                full_prompt, priority=LLMPriority.INTERACTIVE, call_type="route"
+            )
 
             # 解析回應決定行動
             action = self._parse_next_action(response)
             logger.info(f"LLM 決定的行動: {action}")
+            self.routing_stats["llm"] += 1
+            self.routing_log.append(user_message, state, action, "llm")
 
             return action
 
@@ -240,13 +787,13 @@ class UnifiedPlanningAgent:
         """處理洞察生成"""
         try:
             # 調用受眾洞察工具
-            result = await self.tool_executor.execute_tool(
-                "generate_audience_insights", project_data=project_data
-            )
+            result = await self._run_tool("generate_audience_insights", project_data)
 
             if result.success and result.data:
                 # 更新受眾洞察
-                project_data.audience_insights = result.data
+                self.apply_tool_result(
+                    "generate_audience_insights", project_data, result.data
+                )
 
                 return (
                     "已為您生成受眾洞察分析！這些資訊將幫助我們制定更精準的內容策略。"
@@ -264,13 +811,13 @@ class UnifiedPlanningAgent:
         """處理策略生成"""
         try:
             # 調用內容策略工具
-            result = await self.tool_executor.execute_tool(
-                "generate_content_strategy", project_data=project_data
-            )
+            result = await self._run_tool("generate_content_strategy", project_data)
 
             if result.success and result.data:
                 # 更新內容策略
-                self._update_content_strategy(project_data, result.data)
+                self.apply_tool_result(
+                    "generate_content_strategy", project_data, result.data
+                )
 
                 return "已為您生成內容策略建議！這些建議基於專案需求和受眾分析。"
             else:
@@ -326,7 +873,11 @@ class UnifiedPlanningAgent:
             return "請告訴我更多關於專案的具體細節。"
 
     async def _handle_general_conversation(
-        self, user_message: str, project_data: ProjectData
+        self,
+        user_message: str,
+        project_data: ProjectData,
+        on_token: Optional[Callable[[str], Awaitable[None]]] = None,
+        session_id: Optional[str] = None,
     ) -> str:
         """處理一般對話"""
         try:
@@ -341,13 +892,30 @@ class UnifiedPlanningAgent:
                     "我會根據您的需求，幫助您完善專案規劃。"
                 )
 
-            # 構建一般對話提示詞
+            context_state = None
+            if LLM_SESSION_CONTEXT and self.session_manager and session_id:
+                context_state = self.session_manager.get_llm_context(session_id)
+            if context_state is not None:
+                return await self._continue_session_conversation(
+                    user_message, project_data, session_id, context_state, on_token
+                )
+
+            # 構建一般對話提示詞（附上本會話的摘要與最近訊息）
+            history = ""
+            if self.memory and session_id:
+                history = self.memory.digest(session_id)
             prompt = UnifiedPrompts.get_conversation_prompt(
-                user_message, project_data.dict(), "general"
+                user_message, project_data.dict(), "general", history=history
             )
 
-            # 調用LLM生成回應
-            response = await self.llm_client.generate_response(prompt)
+            # 調用LLM生成回應（對話回覆需要多樣性，不走回應快取）
+            response = await self.llm_client.generate_response(
+                prompt,
+                on_token=on_token,
+                use_cache=False,
+                priority=LLMPriority.INTERACTIVE,
+                call_type="chat",
+            )
 
             return response
 
@@ -355,16 +923,50 @@ class UnifiedPlanningAgent:
             logger.error(f"處理一般對話失敗: {e}")
             return "我理解您的意思，請繼續描述您的專案需求。"
 
+    async def _continue_session_conversation(
+        self,
+        user_message: str,
+        project_data: ProjectData,
+        session_id: str,
+        context_state,
+        on_token: Optional[Callable[[str], Awaitable[None]]] = None,
+    ) -> str:
+        """沿用會話上下文進行一般對話，只預填本回合的新訊息
+
+        上下文失效需重新預填時，以會話摘要與最近訊息重建對話，而非整段歷史。
+        """
+        history = self.memory.prompt_messages(session_id) if self.memory else []
+        messages = [
+            {"role": "system", "content": UnifiedPrompts.get_system_prompt("general")},
+            *history,
+            {
+                "role": "user",
+                "content": UnifiedPrompts.get_conversation_turn(
+                    user_message, project_data.dict()
+                ),
+            },
+        ]
+        response = await self.llm_client.chat_completion(
+            messages,
+            context_state=context_state,
+            on_token=on_token,
+            priority=LLMPriority.INTERACTIVE,
+            call_type="chat",
+        )
+        self.session_manager.save_llm_context(session_id, context_state)
+        return response
+
     async def _generate_quick_replies(
-        self, user_message: str, project_data: ProjectData
+        self, user_message: str, project_data: ProjectData, action: str = ""
     ) -> List[QuickReply]:
-        """生成快速回覆選項"""
+        """生成快速回覆選項（action 為本回合的行動，用於取用預先計算結果）"""
         try:
             # 調用快速回覆生成工具
-            result = await self.tool_executor.execute_tool(
+            result = await self._run_tool(
                 "generate_quick_replies",
+                project_data,
+                action=action,
                 user_message=user_message,
-                project_data=project_data,
             )
 
             if result.success and result.data:
@@ -385,6 +987,71 @@ class UnifiedPlanningAgent:
                 QuickReply(text="完成", value="complete", priority=3),
             ]
 
+    async def _run_tool(
+        self, tool_name: str, project_data: ProjectData, action: str = "", **kwargs
+    ):
+        """執行工具；有相符的預先計算結果（同工具、同專案數據、同行動）時直接取用"""
+        result = await self.speculator.take(tool_name, project_data, action)
+        if result is not None:
+            logger.info(f"使用預先計算的 {tool_name} 結果")
+            return result
+        return await self.tool_executor.execute_tool(
+            tool_name, project_data=project_data, **kwargs
+        )
+
+    def _schedule_speculation(self, last_action: str, project_data: ProjectData):
+        """預測下一步並於背景預先計算
+
+        完整度達 COMPLETENESS_THRESHOLD 後，用戶幾乎都會接著要受眾洞察、再要內容策略；
+        洞察或策略算好後，再以套用結果後的專案數據預先產生下一回合的快速回覆。
+        """
+        if project_data.completeness_score < COMPLETENESS_THRESHOLD * 100:
+            return
+        if last_action == "provide_strategy":
+            return
+
+        if not project_data.audience_insights.target_demographics:
+            self.speculator.schedule(
+                "generate_audience_insights",
+                project_data,
+                follow_up=self._speculate_quick_replies_after_insights,
+            )
+        else:
+            self.speculator.schedule(
+                "generate_content_strategy",
+                project_data,
+                follow_up=self._speculate_quick_replies_after_strategy,
+            )
+
+    def _speculate_quick_replies_after_insights(self, project_data, result) -> None:
+        self.apply_tool_result("generate_audience_insights", project_data, result.data)
+        self.speculator.schedule(
+            "generate_quick_replies",
+            project_data,
+            action="generate_insights",
+            user_message=SPECULATIVE_MESSAGES["generate_insights"],
+            priority=LLMPriority.BACKGROUND,
+        )
+
+    def _speculate_quick_replies_after_strategy(self, project_data, result) -> None:
+        self.apply_tool_result("generate_content_strategy", project_data, result.data)
+        self.speculator.schedule(
+            "generate_quick_replies",
+            project_data,
+            action="provide_strategy",
+            user_message=SPECULATIVE_MESSAGES["provide_strategy"],
+            priority=LLMPriority.BACKGROUND,
+        )
+
+    def apply_tool_result(
+        self, tool_name: str, project_data: ProjectData, data: Any
+    ) -> None:
+        """將受眾洞察或內容策略工具的結果寫入專案數據"""
+        if tool_name == "generate_audience_insights":
+            project_data.audience_insights = data
+        elif tool_name == "generate_content_strategy":
+            self._update_content_strategy(project_data, data)
+
     def _update_project_data(self, project_data: ProjectData, new_data: Dict[str, Any]):
         """更新專案數據"""
         try:
@@ -50,11 +50,8 @@ async def state_machine_chat(payload: ChatMessage):
             current_slots = ProjectSlots()
             is_new = True
 
-        # 初始化狀態機代理
-        from services.llm_client import LLMClient
-
-        llm_client = LLMClient()
-        state_machine_agent = StateMachineAgent(llm_client)
+        # 初始化狀態機代理（重用共用代理的 LLM 客戶端與其連線池）
+        state_machine_agent = StateMachineAgent(unified_agent.llm_client)
 
         # 處理用戶輸入
         response = await state_machine_agent.process_user_input(
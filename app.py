@@ -29,7 +29,11 @@ from config import (
     PREDEFINED_OPTIONS,
     OPTION_SELECTION_RULES,
     QUICK_REPLY_TEMPLATES,
+    ENTITY_MIN_CONFIDENCE,
 )
+from services import entity_extractor
+from services.entity_extractor import extract_entities
+from services.session_cache import SessionCache
 from utils import (
     retry_on_failure,
     cache_result,
@@ -181,8 +185,10 @@ class AgentOutput(BaseModel):
 # 子模型定義
 from typing import Optional, List
 
-# 重新初始化對話會話存儲
-SESSIONS: Dict[str, ChatSession] = {}
+# 重新初始化對話會話存儲（有上限，閒置或超量時淘汰最久未用的會話）
+# 以下會話只存在記憶體、沒有持久層：只依筆數與位元組上限淘汰，不做閒置淘汰，
+# 避免用戶暫停一段時間後整個會話消失
+SESSIONS: Dict[str, ChatSession] = SessionCache(idle_seconds=0, name="sessions")
 
 
 class ProjectAttributes(BaseModel):
@@ -948,6 +954,17 @@ async def health_check():
         }
 
 
+@app.get("/stats")
+async def get_statistics():
+    """會話快取統計"""
+    return {
+        "session_cache": {
+            cache.name: cache.get_stats()
+            for cache in (SESSIONS, AUDIENCE_COACH_SESSIONS, CHAT_SESSIONS)
+        }
+    }
+
+
 @app.get("/models")
 async def list_models():
     """獲取可用模型列表"""
@@ -1869,18 +1886,7 @@ def _append_unique(lst: List[str], items: List[str]):
 
 def _parse_date_zh(text: str) -> Optional[str]:
     """解析中文日期格式"""
-    import re
-
-    # accept YYYY/MM/DD or YYYY-MM-DD
-    m = re.search(r"(\d{4})[/-](\d{1,2})[/-](\d{1,2})", text)
-    if not m:
-        return None
-    y, mo, d = int(m.group(1)), int(m.group(2)), int(m.group(3))
-    try:
-        dt = datetime(y, mo, d)
-        return dt.strftime("%Y-%m-%d")
-    except Exception:
-        return None
+    return entity_extractor.parse_date(text)
 
 
 def _after(text: str, keys: List[str]) -> Optional[str]:
@@ -1956,52 +1962,28 @@ def parse_and_update_from_answer(pd: Dict[str, Any], answer: str) -> Dict[str, A
 
     pd, cs, ab = _ensure_cs(pd)
 
-    # 預算
-    m = re.search(
-        r"(?:(?:總)?預算|budget)[：:\s]*([0-9][0-9,\.]*)(?:\s*萬)?",
-        answer,
-        flags=re.IGNORECASE,
-    )
-    if m and not cs.get("budget"):
-        val = m.group(1).replace(",", "")
-        try:
-            num = float(val)
-            # 支援「200萬」類型，若後綴出現"萬"則乘以 10000
-            if "萬" in answer[m.start() : m.end()]:
-                num = int(num * 10000)
-            _set_nested(pd, "time_budget.budget", int(num))
-        except Exception:
-            pass
-
-    # 起訖日期
-    m2 = re.search(
-        r"(\d{4}[/-]\d{1,2}[/-]\d{1,2})\s*(?:至|~|-|—)\s*(\d{4}[/-]\d{1,2}[/-]\d{1,2})",
-        answer,
-    )
-    if m2:
-        s = _parse_date_zh(m2.group(1))
-        e = _parse_date_zh(m2.group(2))
-        if s:
-            _set_nested(pd, "time_budget.campaign_start_date", s)
-        if e:
-            _set_nested(pd, "time_budget.campaign_end_date", e)
-    else:
-        # 單獨提供
+    # 預算、起訖日期與交付日期（規則式提取；沒有預算字眼的金額信心不足，不採用）
+    entities = extract_entities(answer).values(ENTITY_MIN_CONFIDENCE)
+    budget = entities.get(entity_extractor.BUDGET)
+    # 預算欄位為整數：區間或「以內」等非單一金額不寫入
+    if budget and budget.isdigit() and not cs.get("budget"):
+        _set_nested(pd, "time_budget.budget", int(budget))
+    for path in (
+        entity_extractor.START_DATE,
+        entity_extractor.END_DATE,
+        entity_extractor.DUE_DATE,
+    ):
+        if entities.get(path):
+            _set_nested(pd, path, entities[path])
+    if not (
+        entities.get(entity_extractor.START_DATE)
+        or entities.get(entity_extractor.DUE_DATE)
+    ):
+        # 單獨提供的日期視為開始日期
         s = _parse_date_zh(answer)
         if s and not _get_nested(pd, "time_budget.campaign_start_date"):
             _set_nested(pd, "time_budget.campaign_start_date", s)
 
-    # 交付日期
-    m3 = re.search(
-        r"(?:交付|截稿|due)[：:\s]*([0-9]{4}[/-]\d{1,2}[/-]\d{1,2})",
-        answer,
-        flags=re.IGNORECASE,
-    )
-    if m3:
-        d = _parse_date_zh(m3.group(1))
-        if d:
-            _set_nested(pd, "time_budget.planning_due_date", d)
-
     # 產業 / 主題
     if any(k in answer for k in ["產業", "industry"]):
         seg = _after(answer, ["產業", "industry"])
@@ -2300,7 +2282,10 @@ class AudienceCoachChatOut(BaseModel):
 # =============================
 
 # 受眾教練會話存儲
-AUDIENCE_COACH_SESSIONS: Dict[str, AudienceCoachState] = {}
+# 僅存在記憶體：不做閒置淘汰（見 SESSIONS）
+AUDIENCE_COACH_SESSIONS: Dict[str, AudienceCoachState] = SessionCache(
+    idle_seconds=0, name="audience_coach_sessions"
+)
 
 
 def get_audience_coach_state(session_id: str) -> AudienceCoachState:
@@ -2919,7 +2904,8 @@ def convert_audience_coach_to_project(session_id: str = Body("default")):
 # =============================
 
 # 對話式會話儲存
-CHAT_SESSIONS: Dict[str, Any] = {}
+# 僅存在記憶體：不做閒置淘汰（見 SESSIONS）
+CHAT_SESSIONS: Dict[str, Any] = SessionCache(idle_seconds=0, name="chat_sessions")
 
 
 class ChatMessage(BaseModel):
@@ -3572,18 +3558,9 @@ def normalize_slot_value(slot: str, value: str) -> str:
     elif slot == "budget.total":
         # 預算正規化
         if "萬" in value:
-            # 提取數字並轉換為整數
-            import re
-
-            match = re.search(r"(\d+)", value)
-            if match:
-                num = int(match.group(1))
-                if "以下" in value:
-                    return f"{num*10000}"
-                elif "以上" in value:
-                    return f"{num*10000}"
-                else:
-                    return f"{num*10000}"
+            amount = entity_extractor.parse_amount(value)
+            if amount is not None:
+                return f"{amount}"
         return value
 
     return value
@@ -4,18 +4,28 @@
 整合企劃專案管理和受眾分析功能
 """
 
+import time
+
+# 冷啟動計時起點（須在其他匯入之前）
+_IMPORT_STARTED = time.perf_counter()
+
+import asyncio
+import json
 import logging
-from fastapi import FastAPI, HTTPException, Header
+from fastapi import FastAPI, HTTPException, Header, Query
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, FileResponse
-from typing import List, Dict, Any, Optional
+from fastapi.responses import JSONResponse, FileResponse, StreamingResponse
+from typing import AsyncIterator, Awaitable, Callable, List, Dict, Any, Optional
 import re
-from datetime import datetime, timedelta
+from datetime import datetime
 from pydantic import BaseModel, Field
 
 from models.unified_models import (
     ChatTurnRequest,
     ChatTurnResponse,
+    Job,
+    JobSubmitRequest,
     ProjectData,
     MessageRole,
 )
@@ -23,7 +33,16 @@ from services.llm_client import LLMClient
 from services.session import manager as session_manager
 from tools.unified_tools import ToolExecutor
 from agents.unified_planning_agent import UnifiedPlanningAgent
-from config import FASTAPI_HOST, FASTAPI_PORT
+from services.conversation_memory import ConversationMemory
+from services.entity_extractor import extract_entities
+from services.job_queue import JobQueue
+from config import (
+    ENTITY_FAST_PATH,
+    ENTITY_MIN_CONFIDENCE,
+    FASTAPI_HOST,
+    FASTAPI_PORT,
+    JOB_PROPOSAL_CONCURRENCY,
+)
 
 # 設定日誌
 logging.basicConfig(level=logging.INFO)
@@ -80,7 +99,11 @@ async def add_basic_cors_headers(request: Request, call_next):
         return Response(status_code=200, headers=headers)
 
     # 一般請求附帶 CORS 標頭
+    # 延遲寫入模式下於請求結束時寫入本次請求變更的會話（durability=turn）；
+    # 串流回應的回合於 _stream_as_sse 結束時寫入
+    session_manager.begin_request()
     response = await call_next(request)
+    await session_manager.end_request()
     response.headers.setdefault("Access-Control-Allow-Origin", "*")
     response.headers.setdefault(
         "Access-Control-Allow-Methods", "GET,POST,PUT,DELETE,OPTIONS"
@@ -100,36 +123,114 @@ app.include_router(api_router, prefix="/api/v2")
 llm_client: LLMClient = None
 tool_executor: ToolExecutor = None
 planning_agent: UnifiedPlanningAgent = None
+conversation_memory: ConversationMemory = None
+job_queue: JobQueue = None
+
+# 冷啟動耗時（模組匯入與各啟動階段，毫秒）
+startup_timings: Dict[str, Any] = {}
+# /api/chat 欄位提取路徑統計：規則式直接完成或呼叫 LLM
+extraction_stats: Dict[str, int] = {"deterministic": 0, "llm": 0}
 
 
 @app.on_event("startup")
 async def startup_event():
-    """應用啟動事件"""
-    global llm_client, tool_executor, planning_agent
+    """應用啟動事件
+
+    只建立物件與連線池；Ollama 可用性由背景探測任務更新，不阻塞啟動。
+    """
+    global llm_client, tool_executor, planning_agent, conversation_memory, job_queue
+    from services.agent import agent as shared_agent
+
+    started = time.perf_counter()
+    stages: Dict[str, float] = {}
+
+    def mark(stage: str, since: float) -> float:
+        now = time.perf_counter()
+        stages[stage] = round((now - since) * 1000, 2)
+        return now
 
     try:
-        # 初始化LLM客戶端
+        # 初始化LLM客戶端（含共用連線池與背景健康探測）
         llm_client = LLMClient()
+        await llm_client.start()
+        await shared_agent.llm_client.start()
         logger.info("LLM客戶端初始化完成")
+        checkpoint = mark("llm_client", started)
 
-        # 會話管理器由單例入口提供（已初始化）
+        # 會話管理器由單例入口提供（已初始化）；延遲寫入模式下啟動背景寫入
+        session_manager.start_flusher()
         logger.info("會話管理器已就緒（單例入口）")
 
         # 初始化工具執行器
         tool_executor = ToolExecutor(llm_client)
         logger.info("工具執行器初始化完成")
-
-        # 初始化企劃代理
-        planning_agent = UnifiedPlanningAgent(llm_client, tool_executor)
+        checkpoint = mark("tool_executor", checkpoint)
+
+        # 初始化企劃代理（對話歷史以會話記憶保存：最近訊息視窗 + 滾動摘要）
+        conversation_memory = ConversationMemory(llm_client, session_manager)
+        planning_agent = UnifiedPlanningAgent(
+            llm_client,
+            tool_executor,
+            session_manager=session_manager,
+            memory=conversation_memory,
+        )
         logger.info("企劃代理初始化完成")
+        checkpoint = mark("planning_agent", checkpoint)
 
-        logger.info("所有服務初始化完成")
+        # 背景工作佇列（長輸出的生成工具不佔用 HTTP 請求）
+        job_queue = JobQueue(session_manager)
+        _register_jobs(job_queue)
+        mark("job_queue", checkpoint)
+
+        startup_timings.update(
+            {
+                "import_ms": round((_IMPORT_FINISHED - _IMPORT_STARTED) * 1000, 2),
+                "startup_ms": round((time.perf_counter() - started) * 1000, 2),
+                "stages_ms": stages,
+            }
+        )
+        logger.info(
+            f"所有服務初始化完成（匯入 {startup_timings['import_ms']}ms，"
+            f"啟動 {startup_timings['startup_ms']}ms）"
+        )
 
     except Exception as e:
         logger.error(f"服務初始化失敗: {e}")
         raise
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """應用關閉事件"""
+    from services.agent import agent as shared_agent
+
+    # 先等待進行中的對話摘要寫回，再關閉連線池
+    if conversation_memory is not None:
+        await conversation_memory.drain()
+    # 預先計算只是猜測，直接取消；超出回合預算的步驟則等待其結果寫回會話
+    if planning_agent is not None:
+        planning_agent.speculator.cancel()
+        await planning_agent.drain_late_results()
+        planning_agent.routing_log.close()
+    # 未完成的背景工作標記為已取消並寫回會話
+    if job_queue is not None:
+        await job_queue.shutdown()
+    # 寫入剩餘的會話變更，再停止儲存層的背景壓縮並釋放資料庫連線
+    await session_manager.shutdown()
+    session_manager.store.close()
+
+    # 釋放 LLM 連線池（本應用實例與共用代理各自持有一個）
+    for client in (llm_client, shared_agent.llm_client):
+        if client is None:
+            continue
+        try:
+            await client.close()
+        except Exception as e:
+            logger.warning(f"關閉LLM連線池失敗: {e}")
+
+    logger.info("所有服務已關閉")
+
+
 @app.get("/")
 async def root():
     """根路徑"""
@@ -149,35 +250,76 @@ async def serve_glass() -> FileResponse:
     return FileResponse("frontend_glass.html", media_type="text/html")
 
 
+def _readiness_snapshot() -> Dict[str, Any]:
+    """由記憶體中的背景探測結果組成就緒快照（不做任何 I/O）"""
+    from datetime import timezone
+
+    llm = (
+        llm_client.status_snapshot()
+        if llm_client
+        else {"ready": False, "status": "not_initialized"}
+    )
+    agent_ready = planning_agent is not None
+    return {
+        "ready": agent_ready and llm["ready"],
+        "ts": datetime.now(timezone.utc).isoformat(),
+        "agent_ready": agent_ready,
+        "llm": llm,
+    }
+
+
+@app.get("/livez")
+async def livez():
+    """存活檢查：程序與事件迴圈可回應即為存活，不觸及任何外部服務"""
+    return {"status": "alive"}
+
+
+@app.get("/readyz")
+async def readyz():
+    """就緒檢查：服務已初始化且背景探測顯示有可用的 Ollama 節點（未就緒回 503）"""
+    snapshot = _readiness_snapshot()
+    return JSONResponse(
+        status_code=200 if snapshot["ready"] else 503, content=snapshot
+    )
+
+
 @app.get("/health")
-async def health_check():
-    """健康檢查（UTC 即時時間戳與簡化欄位）"""
-    try:
-        from datetime import timezone
+async def health_check(deep: bool = False):
+    """健康檢查（UTC 即時時間戳與簡化欄位）
 
-        ts = datetime.now(timezone.utc).isoformat()
+    預設只回傳背景探測的快照；deep=true 時執行限流的深度檢查（含實際生成）
+    並附上完整的會話統計。
+    """
+    try:
+        snapshot = _readiness_snapshot()
         llm_reachable = getattr(llm_client, "healthy", False)
         model_name = getattr(llm_client, "model", None)
 
         # 仍保留詳細資訊於擴展欄位，方便除錯
         details = {}
         try:
-            details["llm_service"] = (
-                await llm_client.health_check()
-                if llm_client
-                else {"status": "not_initialized"}
-            )
+            if not llm_client:
+                details["llm_service"] = {"status": "not_initialized"}
+            elif deep:
+                details["llm_service"] = await llm_client.deep_health_check()
+            else:
+                details["llm_service"] = snapshot["llm"]
         except Exception:
             details["llm_service"] = {"status": "error"}
 
         try:
-            details["session_service"] = session_manager.get_session_statistics()
+            details["session_service"] = (
+                session_manager.get_session_statistics()
+                if deep
+                else {"active_sessions": len(session_manager.active_sessions)}
+            )
         except Exception:
             details["session_service"] = {"status": "error"}
 
         return {
             "status": "ok",
-            "ts": ts,
+            "ts": snapshot["ts"],
+            "ready": snapshot["ready"],
             "llm_reachable": llm_reachable,
             "model": model_name,
             **details,
@@ -201,7 +343,7 @@ async def get_models():
     """獲取可用模型列表"""
     try:
         if llm_client:
-            models = llm_client.get_available_models()
+            models = await llm_client.get_available_models()
             return {"models": models, "current_model": llm_client.model}
         else:
             raise HTTPException(status_code=503, detail="LLM服務未初始化")
@@ -684,84 +826,6 @@ def _build_rationale_for_theme(
     return [{"title": "為何這個主題", "bullets": bullets[:4]}]
 
 
-def _parse_zh_duration(text: str) -> Optional[Dict[str, int]]:
-    mapping = {
-        "一": 1,
-        "二": 2,
-        "三": 3,
-        "四": 4,
-        "五": 5,
-        "六": 6,
-        "七": 7,
-        "八": 8,
-        "九": 9,
-    }
-    m = re.search(r"([一二三四五六七八九]|\d+)(個)?月", text)
-    if m:
-        val = mapping.get(m.group(1)) if m.group(1) in mapping else None
-        if val is None:
-            try:
-                val = int(m.group(1))
-            except Exception:
-                val = None
-        if val:
-            return {"months": val}
-    w = re.search(r"([一二三四五六七八九]|\d+)(個)?週", text)
-    if w:
-        val = mapping.get(w.group(1)) if w.group(1) in mapping else None
-        if val is None:
-            try:
-                val = int(w.group(1))
-            except Exception:
-                val = None
-        if val:
-            return {"weeks": val}
-    return None
-
-
-def _date_from_choice(choice: str) -> Optional[str]:
-    today = datetime.now()
-    c = choice or ""
-    if "下月初" in c:
-        year = today.year + 1 if today.month == 12 else today.year
-        month = 1 if today.month == 12 else today.month + 1
-        start = datetime(year, month, 1)
-        return start.strftime("%Y-%m-%d")
-    if "下週一" in c or "下周一" in c:
-        days_ahead = (7 - today.weekday()) % 7
-        days_ahead = 7 if days_ahead == 0 else days_ahead
-        start = today + timedelta(days=days_ahead)
-        return start.strftime("%Y-%m-%d")
-    m = re.search(r"\d{4}-\d{1,2}-\d{1,2}", c)
-    if m:
-        try:
-            dt = datetime.strptime(m.group(0), "%Y-%m-%d")
-            return dt.strftime("%Y-%m-%d")
-        except Exception:
-            return None
-    return None
-
-
-def _add_duration(start_str: str, hint: Dict[str, int]) -> Optional[str]:
-    try:
-        start = datetime.strptime(start_str, "%Y-%m-%d")
-        if hint.get("months"):
-            months = hint["months"]
-            year = start.year
-            month = start.month + months
-            year += (month - 1) // 12
-            month = ((month - 1) % 12) + 1
-            next_start = datetime(year, month, 1)
-            end = next_start - timedelta(days=1)
-            return end.strftime("%Y-%m-%d")
-        if hint.get("weeks"):
-            end = start + timedelta(weeks=hint["weeks"]) - timedelta(days=1)
-            return end.strftime("%Y-%m-%d")
-    except Exception:
-        return None
-    return None
-
-
 def _build_preview_blocks(slots: Dict[str, Any]) -> List[Dict[str, str]]:
     title_map = {
         "industry": "產業",
@@ -814,24 +878,6 @@ def _build_preview_blocks(slots: Dict[str, Any]) -> List[Dict[str, str]]:
     return blocks
 
 
-def _apply_quick_intent_from_text(project: ProjectData, text: str) -> None:
-    """根據短字串快速寫入常見槽位（解決使用者純文字輸入時無法被工具提取的狀況）。"""
-    if not text:
-        return
-    t = text.strip()
-    # 目標（objective）常見詞
-    objective_labels = {"品牌知名度", "帶動試用", "名單收集", "促銷轉換"}
-    if t in objective_labels:
-        project.project_attributes.objective = t
-        return
-    # 受眾鎖定（簡單匹配）
-    audience_labels = {"家庭親子", "年輕族群", "教育單位", "企業決策者"}
-    if t in audience_labels:
-        # 與 brief 契約一致：audience_lock 單值
-        project.content_strategy.audience_lock = t
-        return
-
-
 def _diff_slot_writes(
     before_slots: Dict[str, Any], after_slots: Dict[str, Any]
 ) -> Dict[str, Any]:
@@ -866,6 +912,85 @@ def _make_next_question(focus_slot: Optional[str]) -> str:
     return mapping.get(focus_slot, "可以再多描述一點專案重點嗎？")
 
 
+TokenCallback = Callable[[str], Awaitable[None]]
+
+
+def _sse_event(event: str, data: Any) -> str:
+    """格式化單一 Server-Sent Event"""
+    payload = json.dumps(jsonable_encoder(data), ensure_ascii=False)
+    return f"event: {event}\ndata: {payload}\n\n"
+
+
+async def _stream_as_sse(
+    run: Callable[[TokenCallback], Awaitable[BaseModel]]
+) -> AsyncIterator[str]:
+    """執行處理流程並將 token 以 SSE 轉送，最後一個事件為完整回應（final）或錯誤（error）"""
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def on_token(chunk: str) -> None:
+        await queue.put(chunk)
+
+    task = asyncio.create_task(run(on_token))
+    task.add_done_callback(lambda _: queue.put_nowait(None))
+    try:
+        while True:
+            chunk = await queue.get()
+            if chunk is None:
+                break
+            yield _sse_event("token", {"text": chunk})
+
+        try:
+            yield _sse_event("final", task.result())
+        except HTTPException as e:
+            yield _sse_event("error", {"status_code": e.status_code, "detail": e.detail})
+        except Exception as e:
+            yield _sse_event("error", {"status_code": 500, "detail": str(e)})
+    finally:
+        # 客戶端中途斷線時取消仍在進行的生成
+        if not task.done():
+            task.cancel()
+        # 回合在串流期間才執行，middleware 結束時尚未產生變更，於此寫入
+        await session_manager.end_request()
+
+
+def _sse_response(events: AsyncIterator[str]) -> StreamingResponse:
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _process_chat_turn(
+    request: ChatTurnRequest, on_token: Optional[TokenCallback] = None
+) -> ChatTurnResponse:
+    """處理聊天回合（一般與串流端點共用）"""
+    # 獲取或創建會話
+    session_data = session_manager.get_session(request.session_id)
+    if not session_data:
+        # 創建新會話
+        session_data = session_manager.create_session()
+        request.session_id = session_data.session_id
+
+    # 獲取現有專案數據
+    project_data = session_data.project_data
+
+    # 處理聊天回合
+    response = await planning_agent.process_chat_turn(
+        user_message=request.message,
+        session_id=request.session_id,
+        project_data=project_data,
+        on_token=on_token,
+    )
+
+    # 更新會話
+    session_manager.update_session(
+        request.session_id, project_data=response.project_data
+    )
+
+    return response
+
+
 @app.post("/chat/turn", response_model=ChatTurnResponse)
 async def chat_turn(request: ChatTurnRequest):
     """統一的聊天回合端點"""
@@ -873,79 +998,75 @@ async def chat_turn(request: ChatTurnRequest):
         if not planning_agent:
             raise HTTPException(status_code=503, detail="企劃代理未初始化")
 
-        # 獲取或創建會話
-        session_data = session_manager.get_session(request.session_id)
-        if not session_data:
-            # 創建新會話
-            session_data = session_manager.create_session()
-            request.session_id = session_data.session_id
-
-        # 獲取現有專案數據
-        project_data = session_data.project_data
-
-        # 處理聊天回合
-        response = await planning_agent.process_chat_turn(
-            user_message=request.message,
-            session_id=request.session_id,
-            project_data=project_data,
-        )
-
-        # 更新會話
-        session_manager.update_session(
-            request.session_id, project_data=response.project_data
-        )
-
-        return response
+        return await _process_chat_turn(request)
 
     except Exception as e:
         logger.error(f"處理聊天回合失敗: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.post("/api/chat", response_model=ChatAPIResponse)
-async def chat_api(
-    request: ChatAPIRequest,
-    session_id: Optional[str] = None,
-    x_session_id: Optional[str] = Header(None),
-):
-    """Brief v1.1 合約的對話端點包裝器。"""
-    try:
-        if not tool_executor:
-            raise HTTPException(status_code=503, detail="工具執行器未初始化")
+@app.post("/chat/turn/stream")
+async def chat_turn_stream(request: ChatTurnRequest):
+    """聊天回合的 SSE 串流版本：逐段送出 token，最後送出完整 ChatTurnResponse"""
+    if not planning_agent:
+        raise HTTPException(status_code=503, detail="企劃代理未初始化")
 
-        # 1) 準備初始專案資料（由 slots 映射）
-        project = ProjectData()
+    return _sse_response(
+        _stream_as_sse(lambda on_token: _process_chat_turn(request, on_token))
+    )
+
+
+def _append_session_message(sid: str, role: MessageRole, content: str) -> None:
+    """寫入會話訊息；會話記憶已啟動時由其負責視窗與摘要"""
+    if conversation_memory is not None:
+        conversation_memory.append(sid, role, content)
+    else:
+        session_manager.add_chat_message(sid, role, content)
+
+
+async def _process_chat_api(
+    request: ChatAPIRequest,
+    sid: Optional[str],
+    on_token: Optional[TokenCallback] = None,
+) -> ChatAPIResponse:
+    """Brief v1.1 對話處理（一般與串流端點共用）"""
+    # 1) 準備初始專案資料（由 slots 映射）
+    project = ProjectData()
+    before_slots = _brief_slots_from_project(project)
+    if request.slots:
+        _update_project_from_brief_slots(project, request.slots)
         before_slots = _brief_slots_from_project(project)
-        if request.slots:
-            _update_project_from_brief_slots(project, request.slots)
-            before_slots = _brief_slots_from_project(project)
-
-        # 2) 取最後一則 user 訊息
-        user_msg = ""
-        for m in reversed(request.messages or []):
-            if (m.role or "").lower() == "user":
-                user_msg = m.content or ""
-                break
 
-        # 2.1) 嘗試綁定會話（支援 query 參數或 X-Session-Id 標頭）
-        sid = x_session_id or session_id
-        if sid:
-            # 確保會話存在
-            sess = session_manager.get_session(sid)
-            if not sess:
-                # 若不存在則創建（不指定 user_id）
-                new_sess = session_manager.create_session()
-                sid = new_sess.session_id
-            # 寫入用戶訊息
-            if user_msg.strip():
-                session_manager.add_chat_message(sid, MessageRole.USER, user_msg)
-
-        # 3) 透過工具嘗試從 user 輸入提取結構化資料並更新 ProjectData；若沒有命中則套用 quick intent
+    # 2) 取最後一則 user 訊息
+    user_msg = ""
+    for m in reversed(request.messages or []):
+        if (m.role or "").lower() == "user":
+            user_msg = m.content or ""
+            break
+
+    # 2.1) 嘗試綁定會話（支援 query 參數或 X-Session-Id 標頭）
+    if sid:
+        # 確保會話存在
+        sess = session_manager.get_session(sid)
+        if not sess:
+            # 若不存在則創建（不指定 user_id）
+            new_sess = session_manager.create_session()
+            sid = new_sess.session_id
+        # 寫入用戶訊息
         if user_msg.strip():
+            _append_session_message(sid, MessageRole.USER, user_msg)
+
+    # 3) 先以規則式提取；提及的欄位都能確定解析時略過 LLM，否則透過工具提取並以規則結果補空缺
+    if user_msg.strip():
+        entities = extract_entities(user_msg)
+        if ENTITY_FAST_PATH and entities.is_deterministic(ENTITY_MIN_CONFIDENCE):
+            entities.apply_to(project, ENTITY_MIN_CONFIDENCE)
+            extraction_stats["deterministic"] += 1
+        else:
             result = await tool_executor.execute_tool(
-                "extract_project_data", user_message=user_msg
+                "extract_project_data", user_message=user_msg, on_token=on_token
             )
-            extracted_any = False
+            extraction_stats["llm"] += 1
             if result.success and isinstance(result.data, dict):
                 # 以 UnifiedAgent 的更新邏輯一致地寫回
                 for section, section_data in result.data.items():
@@ -954,114 +1075,128 @@ async def chat_api(
                         for key, value in section_data.items():
                             if hasattr(section_obj, key) and value is not None:
                                 setattr(section_obj, key, value)
-                                extracted_any = True
-            if not extracted_any:
-                _apply_quick_intent_from_text(project, user_msg)
-
-        # 4) 生成回傳所需的 brief slots
-        after_slots = _brief_slots_from_project(project)
-
-        # 5) 僅以 slots 為準計算完成度與缺失欄位（固定順序）
-        completion = _compute_weighted_completion(after_slots)
-        missing_brief: List[str] = [
-            key for key in SLOT_ORDER if not _is_filled_slot(key, after_slots)
-        ]
+            # LLM 未填的欄位以規則結果補上
+            for path, value in entities.values(ENTITY_MIN_CONFIDENCE).items():
+                section_name, field = path.split(".")
+                if getattr(getattr(project, section_name), field) in (None, "", []):
+                    setattr(getattr(project, section_name), field, value)
+
+    # 4) 生成回傳所需的 brief slots
+    after_slots = _brief_slots_from_project(project)
+
+    # 5) 僅以 slots 為準計算完成度與缺失欄位（固定順序）
+    completion = _compute_weighted_completion(after_slots)
+    missing_brief: List[str] = [
+        key for key in SLOT_ORDER if not _is_filled_slot(key, after_slots)
+    ]
 
-        # 依情境微調優先詢問的槽位（例如動物園先問受眾）
-        def _select_focus_slot(
-            missing: List[str], slots: Dict[str, Any], last_text: str
-        ) -> Optional[str]:
-            if not missing:
-                return None
-            ind = slots.get("industry") or ""
-            theme = slots.get("campaign_theme") or ""
-            text = last_text or ""
-            zoo_hit = any(
-                k in (ind + theme + text) for k in ["動物", "動物園", "zoo", "長頸鹿"]
+    # 依情境微調優先詢問的槽位（例如動物園先問受眾）
+    def _select_focus_slot(
+        missing: List[str], slots: Dict[str, Any], last_text: str
+    ) -> Optional[str]:
+        if not missing:
+            return None
+        ind = slots.get("industry") or ""
+        theme = slots.get("campaign_theme") or ""
+        text = last_text or ""
+        zoo_hit = any(
+            k in (ind + theme + text) for k in ["動物", "動物園", "zoo", "長頸鹿"]
+        )
+        if zoo_hit and "audience_targeting" in missing:
+            return "audience_targeting"
+        return missing[0]
+
+    focus_slot = _select_focus_slot(missing_brief, after_slots, user_msg)
+
+    # 建議泡泡（3-5則）與下一題
+    msg_text = ""
+    if focus_slot == "objective":
+        # 目標 chips（簡易通用）
+        labels = ["品牌知名度", "帶動試用", "名單收集", "促銷轉換"]
+        suggestions = _make_chips("objective", labels)
+        next_q = _clamp_text("請問這次企劃的主要目標是什麼？")
+        msg_text = next_q
+    elif focus_slot == "audience_targeting":
+        suggestions = _get_audience_chips(after_slots.get("industry"))
+        next_q = _clamp_text(
+            _get_opening_text(
+                after_slots.get("industry"), after_slots.get("campaign_theme")
             )
-            if zoo_hit and "audience_targeting" in missing:
-                return "audience_targeting"
-            return missing[0]
-
-        focus_slot = _select_focus_slot(missing_brief, after_slots, user_msg)
-
-        # 建議泡泡（3-5則）與下一題
-        msg_text = ""
-        if focus_slot == "objective":
-            # 目標 chips（簡易通用）
-            labels = ["品牌知名度", "帶動試用", "名單收集", "促銷轉換"]
-            suggestions = _make_chips("objective", labels)
-            next_q = _clamp_text("請問這次企劃的主要目標是什麼？")
-            msg_text = next_q
-        elif focus_slot == "audience_targeting":
-            suggestions = _get_audience_chips(after_slots.get("industry"))
-            next_q = _clamp_text(
-                _get_opening_text(
-                    after_slots.get("industry"), after_slots.get("campaign_theme")
-                )
+        )
+        msg_text = next_q
+    else:
+        raw_sugs = (
+            _default_suggestions_for_slot(focus_slot, after_slots)
+            if focus_slot
+            else []
+        )
+        suggestions = [
+            SuggestionItem(
+                label=s,
+                slot=focus_slot or "industry",
+                value=s,
+                send_as_user=s,
             )
-            msg_text = next_q
-        else:
-            raw_sugs = (
-                _default_suggestions_for_slot(focus_slot, after_slots)
-                if focus_slot
-                else []
+            for s in raw_sugs[:5]
+        ] or [
+            SuggestionItem(
+                label="提供更多資訊",
+                slot=focus_slot or "industry",
+                value="提供更多資訊",
+                send_as_user="提供更多資訊",
             )
-            suggestions = [
-                SuggestionItem(
-                    label=s,
-                    slot=focus_slot or "industry",
-                    value=s,
-                    send_as_user=s,
-                )
-                for s in raw_sugs[:5]
-            ] or [
-                SuggestionItem(
-                    label="提供更多資訊",
-                    slot=focus_slot or "industry",
-                    value="提供更多資訊",
-                    send_as_user="提供更多資訊",
-                )
-            ]
-            next_q = _clamp_text(_make_next_question(focus_slot))
-            msg_text = next_q
-
-        # 下一個問題（已於上方決定並做 100 字裁切）
+        ]
+        next_q = _clamp_text(_make_next_question(focus_slot))
+        msg_text = next_q
 
-        # slot_writes 僅輸出有變更者
-        slot_writes = _diff_slot_writes(before_slots, after_slots)
+    # 下一個問題（已於上方決定並做 100 字裁切）
 
-        # 預覽區塊
-        preview_blocks = _build_preview_blocks(after_slots)
+    # slot_writes 僅輸出有變更者
+    slot_writes = _diff_slot_writes(before_slots, after_slots)
 
-        # 若本輪寫入了 campaign_theme，補理由卡
-        rationale_cards: List[Dict[str, Any]] = []
-        if slot_writes.get("campaign_theme"):
-            rationale_cards = _build_rationale_for_theme(
-                after_slots.get("industry"),
-                (after_slots.get("audience_targeting") or [None])[0],
-                slot_writes.get("campaign_theme"),
-            )
+    # 預覽區塊
+    preview_blocks = _build_preview_blocks(after_slots)
 
-        resp = ChatAPIResponse(
-            next_question=next_q,
-            message=msg_text,
-            suggestions=suggestions,
-            slot_writes=slot_writes,
-            rationale_cards=rationale_cards,
-            preview_blocks=preview_blocks,
-            completion=completion,
+    # 若本輪寫入了 campaign_theme，補理由卡
+    rationale_cards: List[Dict[str, Any]] = []
+    if slot_writes.get("campaign_theme"):
+        rationale_cards = _build_rationale_for_theme(
+            after_slots.get("industry"),
+            (after_slots.get("audience_targeting") or [None])[0],
+            slot_writes.get("campaign_theme"),
         )
 
-        # 9) 如果綁定到會話，寫回助手訊息，確保之後切回 /chat/turn 能延續
-        if sid:
-            assistant_text = msg_text or next_q or ""
-            if assistant_text:
-                session_manager.add_chat_message(
-                    sid, MessageRole.ASSISTANT, assistant_text
-                )
+    resp = ChatAPIResponse(
+        next_question=next_q,
+        message=msg_text,
+        suggestions=suggestions,
+        slot_writes=slot_writes,
+        rationale_cards=rationale_cards,
+        preview_blocks=preview_blocks,
+        completion=completion,
+    )
+
+    # 9) 如果綁定到會話，寫回助手訊息，確保之後切回 /chat/turn 能延續
+    if sid:
+        assistant_text = msg_text or next_q or ""
+        if assistant_text:
+            _append_session_message(sid, MessageRole.ASSISTANT, assistant_text)
+
+    return resp
+
+
+@app.post("/api/chat", response_model=ChatAPIResponse)
+async def chat_api(
+    request: ChatAPIRequest,
+    session_id: Optional[str] = None,
+    x_session_id: Optional[str] = Header(None),
+):
+    """Brief v1.1 合約的對話端點包裝器。"""
+    try:
+        if not tool_executor:
+            raise HTTPException(status_code=503, detail="工具執行器未初始化")
 
-        return resp
+        return await _process_chat_api(request, x_session_id or session_id)
     except HTTPException:
         raise
     except Exception as e:
@@ -1069,6 +1204,22 @@ async def chat_api(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/api/chat/stream")
+async def chat_api_stream(
+    request: ChatAPIRequest,
+    session_id: Optional[str] = None,
+    x_session_id: Optional[str] = Header(None),
+):
+    """/api/chat 的 SSE 串流版本：轉送提取過程的 token，最後送出完整 ChatAPIResponse。"""
+    if not tool_executor:
+        raise HTTPException(status_code=503, detail="工具執行器未初始化")
+
+    sid = x_session_id or session_id
+    return _sse_response(
+        _stream_as_sse(lambda on_token: _process_chat_api(request, sid, on_token))
+    )
+
+
 class ReportRequest(BaseModel):
     slots: Dict[str, Any]
     preview: Optional[List[Dict[str, Any]]] = None
@@ -1164,15 +1315,143 @@ async def report_api(request: ReportRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _job_project(job: Job) -> ProjectData:
+    project = session_manager.get_project_data(job.session_id)
+    if project is None:
+        raise ValueError(f"會話不存在: {job.session_id}")
+    return project
+
+
+def _tool_job(tool_name: str) -> Callable[[Job], Awaitable[Any]]:
+    """以工具結果更新會話專案數據的背景工作"""
+
+    async def run(job: Job) -> Any:
+        result = await tool_executor.execute_tool(
+            tool_name, project_data=_job_project(job)
+        )
+        if not result.success:
+            raise RuntimeError(result.message)
+
+        # 生成期間專案數據可能已被更新，重新取得後再寫入
+        project = _job_project(job)
+        planning_agent.apply_tool_result(tool_name, project, result.data)
+        project.updated_at = datetime.now()
+        session_manager.update_project_data(job.session_id, project)
+        return jsonable_encoder(result.data)
+
+    return run
+
+
+async def _run_proposal_job(job: Job) -> Dict[str, Any]:
+    """生成完整提案；LLM 失敗時改用模板"""
+    project = _job_project(job)
+    result = await tool_executor.execute_tool("render_proposal", project_data=project)
+    if result.success:
+        return {"markdown": result.data, "fallback": False}
+    logger.warning(f"提案生成失敗，改用模板: {result.message}")
+    return {
+        "markdown": _generate_full_markdown(_brief_slots_from_project(project)),
+        "fallback": True,
+    }
+
+
+def _register_jobs(queue: JobQueue) -> None:
+    """註冊背景工作類型"""
+    queue.register("audience_insights", _tool_job("generate_audience_insights"))
+    queue.register("content_strategy", _tool_job("generate_content_strategy"))
+    queue.register("proposal", _run_proposal_job, concurrency=JOB_PROPOSAL_CONCURRENCY)
+
+
+@app.post("/jobs", response_model=Job, status_code=202)
+async def submit_job(request: JobSubmitRequest):
+    """提交背景工作，立即回傳工作狀態；以 GET /jobs/{job_id} 輪詢結果"""
+    try:
+        if not job_queue:
+            raise HTTPException(status_code=503, detail="工作佇列未初始化")
+
+        if not session_manager.get_session(request.session_id):
+            raise HTTPException(status_code=404, detail="會話不存在")
+
+        return job_queue.submit(request.job_type, request.session_id, request.params)
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"提交背景工作失敗: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/jobs/{job_id}", response_model=Job)
+async def get_job(job_id: str):
+    """查詢背景工作狀態與結果"""
+    if not job_queue:
+        raise HTTPException(status_code=503, detail="工作佇列未初始化")
+
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="工作不存在")
+    return job
+
+
+@app.post("/jobs/{job_id}/cancel", response_model=Job)
+async def cancel_job(job_id: str):
+    """取消排隊中或執行中的背景工作"""
+    if not job_queue:
+        raise HTTPException(status_code=503, detail="工作佇列未初始化")
+
+    job = await job_queue.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="工作不存在")
+    return job
+
+
+@app.get("/chat/sessions/{session_id}/jobs")
+async def list_session_jobs(session_id: str):
+    """列出會話的背景工作（含服務重啟前已結束的工作）"""
+    try:
+        if not session_manager:
+            raise HTTPException(status_code=503, detail="會話管理器未初始化")
+
+        if not session_manager.get_session(session_id):
+            raise HTTPException(status_code=404, detail="會話不存在")
+
+        return {"session_id": session_id, "jobs": session_manager.get_jobs(session_id)}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"獲取背景工作失敗: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.get("/chat/sessions")
-async def list_sessions(user_id: str = None):
-    """列出會話"""
+async def list_sessions(
+    user_id: str = None,
+    status: str = None,
+    updated_after: datetime = None,
+    updated_before: datetime = None,
+    cursor: str = None,
+    limit: int = Query(50, ge=1, le=200),
+):
+    """列出會話（依更新時間由新到舊，以 next_cursor 取下一頁）"""
     try:
         if not session_manager:
             raise HTTPException(status_code=503, detail="會話管理器未初始化")
 
-        sessions = session_manager.list_sessions(user_id)
-        return {"sessions": sessions, "total": len(sessions)}
+        try:
+            sessions, next_cursor = session_manager.list_sessions_page(
+                user_id=user_id,
+                status=status,
+                updated_after=updated_after,
+                updated_before=updated_before,
+                cursor=cursor,
+                limit=limit,
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return {"sessions": sessions, "total": len(sessions), "next_cursor": next_cursor}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"列出會話失敗: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -1289,16 +1568,39 @@ async def get_chat_history(session_id: str):
             raise HTTPException(status_code=503, detail="會話管理器未初始化")
 
         chat_history = session_manager.get_chat_history(session_id)
+        session = session_manager.get_session(session_id)
+        summarized = session.summarized_messages if session else 0
         return {
             "session_id": session_id,
             "chat_history": chat_history,
-            "total_messages": len(chat_history),
+            # 較舊的訊息已壓縮進摘要，chat_history 只保留最近的視窗
+            "conversation_summary": session.conversation_summary if session else None,
+            "total_messages": len(chat_history) + summarized,
         }
     except Exception as e:
         logger.error(f"獲取聊天歷史失敗: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/chat/sessions/{session_id}/late-results")
+async def get_late_results(session_id: str, consume: bool = False):
+    """獲取超出回合預算後才完成的步驟結果（對應回應 metadata.pending）"""
+    try:
+        if not session_manager:
+            raise HTTPException(status_code=503, detail="會話管理器未初始化")
+
+        if not session_manager.get_session(session_id):
+            raise HTTPException(status_code=404, detail="會話不存在")
+
+        late_results = session_manager.get_late_results(session_id, consume=consume)
+        return {"session_id": session_id, "late_results": late_results}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"獲取延遲結果失敗: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.post("/chat/sessions/{session_id}/reset")
 async def reset_session(session_id: str):
     """重置會話"""
@@ -1311,13 +1613,8 @@ async def reset_session(session_id: str):
         if not session_data:
             raise HTTPException(status_code=404, detail="會話不存在")
 
-        # 重置專案數據和聊天歷史
-        session_data.project_data = ProjectData()
-        session_data.chat_history = []
-        session_data.status = "active"
-
-        # 更新會話
-        success = session_manager.update_session(session_id, session_data)
+        # 重置專案數據、聊天歷史與對話摘要
+        success = session_manager.reset_session(session_id)
         if not success:
             raise HTTPException(status_code=500, detail="重置會話失敗")
 
@@ -1337,6 +1634,28 @@ async def get_statistics():
             raise HTTPException(status_code=503, detail="會話管理器未初始化")
 
         stats = session_manager.get_session_statistics()
+        stats["session_writes"] = session_manager.get_write_stats()
+        stats["session_cache"] = session_manager.get_cache_stats()
+        if llm_client:
+            stats["llm_cache"] = llm_client.get_cache_stats()
+            stats["llm_coalescing"] = llm_client.get_coalescing_stats()
+            stats["llm_scheduler"] = llm_client.get_scheduler_stats()
+            stats["llm_backends"] = llm_client.get_backend_stats()
+            stats["llm_latency"] = llm_client.get_latency_stats()
+            stats["llm_context"] = llm_client.get_context_stats()
+            stats["llm_structured"] = llm_client.get_structured_stats()
+        if planning_agent:
+            stats["routing"] = planning_agent.get_routing_stats()
+            stats["speculation"] = planning_agent.speculator.get_stats()
+            stats["turn_budget"] = planning_agent.get_budget_stats()
+        if tool_executor and tool_executor.memo:
+            stats["tool_memo"] = tool_executor.memo.get_stats()
+        if job_queue:
+            stats["jobs"] = job_queue.get_stats()
+        if conversation_memory:
+            stats["conversation_memory"] = conversation_memory.get_stats()
+        stats["extraction"] = extraction_stats
+        stats["startup"] = startup_timings
         return stats
     except Exception as e:
         logger.error(f"獲取統計資訊失敗: {e}")
@@ -1528,6 +1847,10 @@ def identify_missing_fields(project_data: ProjectData) -> List[str]:
     return missing
 
 
+# 模組匯入完成（供冷啟動計時）
+_IMPORT_FINISHED = time.perf_counter()
+
+
 if __name__ == "__main__":
     import uvicorn
 
@@ -12,6 +12,133 @@ OLLAMA_PORT = int(os.getenv("OLLAMA_PORT", "11434"))
 OLLAMA_DEFAULT_MODEL = os.getenv("OLLAMA_DEFAULT_MODEL", "gemma3:27b")
 OLLAMA_TIMEOUT = int(os.getenv("OLLAMA_TIMEOUT", "30"))
 
+# 多節點 Ollama（逗號分隔 host:port；留空則使用 OLLAMA_HOST:OLLAMA_PORT 單一節點）
+OLLAMA_BACKENDS = os.getenv("OLLAMA_BACKENDS", "")
+OLLAMA_HEALTH_INTERVAL = float(os.getenv("OLLAMA_HEALTH_INTERVAL", "15"))
+OLLAMA_FAILURE_THRESHOLD = int(os.getenv("OLLAMA_FAILURE_THRESHOLD", "2"))
+
+# 深度健康檢查（實際生成）的最短間隔；間隔內重複呼叫回傳上次結果
+HEALTH_DEEP_CHECK_MIN_INTERVAL = float(
+    os.getenv("HEALTH_DEEP_CHECK_MIN_INTERVAL", "60")
+)
+
+# Ollama 連線池設定（長駐 keep-alive 連線，由 LLMClient 在應用啟動/關閉時管理）
+OLLAMA_POOL_LIMIT = int(os.getenv("OLLAMA_POOL_LIMIT", "32"))
+OLLAMA_POOL_LIMIT_PER_HOST = int(os.getenv("OLLAMA_POOL_LIMIT_PER_HOST", "8"))
+OLLAMA_DNS_CACHE_TTL = int(os.getenv("OLLAMA_DNS_CACHE_TTL", "300"))
+OLLAMA_KEEPALIVE_TIMEOUT = float(os.getenv("OLLAMA_KEEPALIVE_TIMEOUT", "60"))
+
+# LLM 回應快取設定（記憶體 LRU + SQLite 持久層；DB 路徑留空則僅用記憶體；
+# SQLite 層超過 LLM_CACHE_MAX_DISK_ENTRIES 筆時刪除最早寫入者，0 表示不限制）
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "512"))
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "3600"))
+LLM_CACHE_DB_PATH = os.getenv("LLM_CACHE_DB_PATH", "cache/llm_cache.sqlite3")
+LLM_CACHE_MAX_DISK_ENTRIES = int(os.getenv("LLM_CACHE_MAX_DISK_ENTRIES", "50000"))
+
+# 工具結果記憶化：受眾洞察與內容策略依其實際讀取的欄位指紋跨會話共用結果；
+# 調整提示詞或輸出格式時遞增 TOOL_MEMO_VERSION 使舊結果失效（DB 路徑為空時只用記憶體）
+TOOL_MEMO_ENABLED = os.getenv("TOOL_MEMO_ENABLED", "true").lower() == "true"
+TOOL_MEMO_MAX_ENTRIES = int(os.getenv("TOOL_MEMO_MAX_ENTRIES", "256"))
+TOOL_MEMO_TTL = float(os.getenv("TOOL_MEMO_TTL", "86400"))
+TOOL_MEMO_DB_PATH = os.getenv("TOOL_MEMO_DB_PATH", "")
+TOOL_MEMO_MAX_DISK_ENTRIES = int(os.getenv("TOOL_MEMO_MAX_DISK_ENTRIES", "10000"))
+TOOL_MEMO_VERSION = os.getenv("TOOL_MEMO_VERSION", "1")
+
+# LLM 排程設定（每個節點的同時生成上限與低優先級請求的老化秒數）
+LLM_MAX_CONCURRENT = int(os.getenv("LLM_MAX_CONCURRENT", "2"))
+LLM_PRIORITY_AGING_SECONDS = float(os.getenv("LLM_PRIORITY_AGING_SECONDS", "10"))
+
+# 自適應逾時（依各呼叫類型的滾動 p99 推導）與對沖請求（超過 p95 時改送第二節點）
+LLM_ADAPTIVE_TIMEOUT = os.getenv("LLM_ADAPTIVE_TIMEOUT", "true").lower() == "true"
+LLM_LATENCY_WINDOW = int(os.getenv("LLM_LATENCY_WINDOW", "200"))
+LLM_LATENCY_MIN_SAMPLES = int(os.getenv("LLM_LATENCY_MIN_SAMPLES", "20"))
+LLM_TIMEOUT_MULTIPLIER = float(os.getenv("LLM_TIMEOUT_MULTIPLIER", "3.0"))
+LLM_TIMEOUT_MIN = float(os.getenv("LLM_TIMEOUT_MIN", "5"))
+LLM_TIMEOUT_MAX = float(os.getenv("LLM_TIMEOUT_MAX", "120"))
+LLM_HEDGING = os.getenv("LLM_HEDGING", "false").lower() == "true"
+LLM_HEDGE_MAX_RATIO = float(os.getenv("LLM_HEDGE_MAX_RATIO", "0.1"))
+
+# 回合規劃模式：multi（路由、提取、快速回覆各自呼叫）或 fused（單次結構化呼叫）
+PLANNER_MODE = os.getenv("PLANNER_MODE", "multi").lower()
+
+# 會話上下文沿用：保存 Ollama 回傳的 context，後續回合只需預填新訊息
+LLM_SESSION_CONTEXT = os.getenv("LLM_SESSION_CONTEXT", "true").lower() == "true"
+LLM_SESSION_CONTEXT_MAX_TOKENS = int(
+    os.getenv("LLM_SESSION_CONTEXT_MAX_TOKENS", "6000")
+)
+
+# 會話儲存後端：json（每會話一個 JSON 檔）、sqlite（WAL，多個 worker 可共用）
+# 或 jsonl（快照 + 追加式紀錄；紀錄累積 SESSION_LOG_COMPACT_RECORDS 筆後，
+# 由每 SESSION_LOG_COMPACT_INTERVAL 秒執行的背景壓縮折疊成新快照，0 表示寫入時立即壓縮）
+SESSION_STORE_BACKEND = os.getenv("SESSION_STORE_BACKEND", "json").lower()
+# 共用會話管理器的資料目錄（json / jsonl 後端的會話檔與索引、sqlite 的預設資料庫位置）
+SESSIONS_DIR = os.getenv("SESSIONS_DIR", "sessions")
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", "")
+SESSION_LOG_COMPACT_RECORDS = int(os.getenv("SESSION_LOG_COMPACT_RECORDS", "200"))
+SESSION_LOG_COMPACT_INTERVAL = float(os.getenv("SESSION_LOG_COMPACT_INTERVAL", "30"))
+
+# 會話延遲寫入：變更只標記為待寫入，由背景每 SESSION_FLUSH_INTERVAL 秒合併寫入一次；
+# SESSION_DURABILITY=turn 時每個請求結束即寫入並 fsync，batch 時只依間隔寫入（一批一次 fsync）
+SESSION_WRITE_BEHIND = os.getenv("SESSION_WRITE_BEHIND", "false").lower() == "true"
+SESSION_FLUSH_INTERVAL = float(os.getenv("SESSION_FLUSH_INTERVAL", "1.0"))
+SESSION_DURABILITY = os.getenv("SESSION_DURABILITY", "turn").lower()
+
+# 記憶體中的會話快取上限：筆數、近似位元組數與閒置秒數（0 表示不限制該項）；
+# 超出時淘汰最久未用的會話（有延遲寫入的變更會先寫入）
+SESSION_CACHE_MAX_ENTRIES = int(os.getenv("SESSION_CACHE_MAX_ENTRIES", "1000"))
+SESSION_CACHE_MAX_BYTES = int(os.getenv("SESSION_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+SESSION_CACHE_IDLE_SECONDS = float(os.getenv("SESSION_CACHE_IDLE_SECONDS", "1800"))
+# 查無此會話的結果保留秒數與筆數，重複查詢未知會話ID時不必再讀取儲存層
+SESSION_NEGATIVE_CACHE_TTL = float(os.getenv("SESSION_NEGATIVE_CACHE_TTL", "30"))
+SESSION_NEGATIVE_CACHE_MAX = int(os.getenv("SESSION_NEGATIVE_CACHE_MAX", "10000"))
+# 記憶體中的會話向儲存層確認版本的最短間隔秒數（偵測其他行程的更新；0 表示每次讀取都確認）
+SESSION_VERSION_CHECK_INTERVAL = float(os.getenv("SESSION_VERSION_CHECK_INTERVAL", "1.0"))
+
+# 會話記憶：保留最近訊息視窗，超出的舊訊息累積到一批後以背景摘要壓縮；
+# 摘要持續失敗時以硬上限直接丟棄最舊訊息
+CONVERSATION_WINDOW_MESSAGES = int(os.getenv("CONVERSATION_WINDOW_MESSAGES", "12"))
+CONVERSATION_SUMMARY_BATCH = int(os.getenv("CONVERSATION_SUMMARY_BATCH", "4"))
+CONVERSATION_SUMMARY_MAX_CHARS = int(os.getenv("CONVERSATION_SUMMARY_MAX_CHARS", "600"))
+CONVERSATION_HISTORY_HARD_LIMIT = int(
+    os.getenv("CONVERSATION_HISTORY_HARD_LIMIT", "60")
+)
+
+# 預測性預先計算：回覆送出後以背景優先級預跑下一步最可能的工具，結果依專案數據指紋保存；
+# 只在 LLM 排程器無排隊且有空閒名額時啟動，同時進行數受 SPECULATION_MAX_INFLIGHT 限制
+SPECULATION_ENABLED = os.getenv("SPECULATION_ENABLED", "true").lower() == "true"
+SPECULATION_MAX_INFLIGHT = int(os.getenv("SPECULATION_MAX_INFLIGHT", "1"))
+SPECULATION_MAX_ENTRIES = int(os.getenv("SPECULATION_MAX_ENTRIES", "128"))
+SPECULATION_TTL = float(os.getenv("SPECULATION_TTL", "600"))
+
+# 回合延遲預算：受預算約束的步驟（洞察、策略、完整度評估、快速回覆）超時即回傳預設內容，
+# 原步驟在背景繼續執行，完成後結果附加到會話（0 表示不限制）
+TURN_BUDGET_SECONDS = float(os.getenv("TURN_BUDGET_SECONDS", "8"))
+LATE_RESULTS_MAX = int(os.getenv("LATE_RESULTS_MAX", "20"))
+
+# 背景工作佇列：長輸出的生成工具（受眾洞察、內容策略、完整提案）在請求外執行；
+# 各工作類型各自限制同時執行數，完成的工作保存在會話中（每會話最多 JOB_HISTORY_PER_SESSION 筆）
+JOB_DEFAULT_CONCURRENCY = int(os.getenv("JOB_DEFAULT_CONCURRENCY", "2"))
+JOB_PROPOSAL_CONCURRENCY = int(os.getenv("JOB_PROPOSAL_CONCURRENCY", "1"))
+JOB_MAX_FINISHED = int(os.getenv("JOB_MAX_FINISHED", "200"))
+JOB_HISTORY_PER_SESSION = int(os.getenv("JOB_HISTORY_PER_SESSION", "20"))
+
+# 本地意圖分類器：信心達門檻時直接路由，不足時交給 LLM 並記錄決策供重新訓練
+INTENT_CLASSIFIER_ENABLED = (
+    os.getenv("INTENT_CLASSIFIER_ENABLED", "true").lower() == "true"
+)
+INTENT_MODEL_PATH = os.getenv("INTENT_MODEL_PATH", "cache/intent_classifier.json")
+INTENT_LOG_PATH = os.getenv("INTENT_LOG_PATH", "cache/intent_routing.jsonl")
+INTENT_CONFIDENCE_THRESHOLD = float(os.getenv("INTENT_CONFIDENCE_THRESHOLD", "0.8"))
+# 路由紀錄：超過大小上限時輪替；用戶原文預設不記錄，重新訓練分類器前需開啟
+INTENT_LOG_MAX_BYTES = int(os.getenv("INTENT_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+INTENT_LOG_BACKUPS = int(os.getenv("INTENT_LOG_BACKUPS", "3"))
+INTENT_LOG_MESSAGES = os.getenv("INTENT_LOG_MESSAGES", "false").lower() == "true"
+
+# 規則式實體提取：訊息中提及的欄位都能以規則解析（且信心達門檻）時，/api/chat 不呼叫 LLM
+ENTITY_FAST_PATH = os.getenv("ENTITY_FAST_PATH", "true").lower() == "true"
+ENTITY_MIN_CONFIDENCE = float(os.getenv("ENTITY_MIN_CONFIDENCE", "0.85"))
+
 # FastAPI 設定
 FASTAPI_HOST = os.getenv("FASTAPI_HOST", "0.0.0.0")
 FASTAPI_PORT = int(os.getenv("FASTAPI_PORT", "8000"))
@@ -74,6 +74,17 @@ class StateMachineOutput(BaseModel):
     completion: float = Field(0.0, ge=0.0, le=1.0, description="完成度")
 
 
+class StateMachineReply(BaseModel):
+    """狀態機輸出中由 LLM 生成的部分（建議泡泡與完成度由伺服端計算）"""
+
+    message: str = Field(..., max_length=100, description="兩句洞察＋問句，≤100字")
+    next_question: str = Field(..., description="問句式")
+    slot_writes: Optional[Dict[str, Any]] = Field(None, description="同步直寫（可選）")
+    rationale_cards: Optional[List[RationaleCard]] = Field(
+        None, description="理由卡片（僅在theme時必回）"
+    )
+
+
 class ProjectSlots(BaseModel):
     """專案槽位集合"""
 
@@ -5,7 +5,7 @@
 """
 
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Literal, Optional
 from pydantic import BaseModel, Field
 from enum import Enum
 
@@ -97,6 +97,34 @@ class ProjectData(BaseModel):
     status: str = Field("draft", description="狀態")
 
 
+class ProjectDataExtraction(BaseModel):
+    """從用戶訊息提取的專案數據（LLM 結構化輸出用，僅含可提取的區段）"""
+
+    project_attributes: Optional[ProjectAttributes] = None
+    time_budget: Optional[TimeBudget] = None
+    content_strategy: Optional[ContentStrategy] = None
+    technical_needs: Optional[TechnicalNeeds] = None
+
+
+class CompletenessEvaluation(BaseModel):
+    """專案完整度評估（LLM 結構化輸出用）"""
+
+    completeness_score: float = Field(..., ge=0.0, le=100.0, description="完整度分數")
+    missing_fields: List[str] = Field(default_factory=list, description="缺失欄位")
+    next_action: str = Field(..., description="建議的下一步行動")
+    is_ready: bool = Field(False, description="是否可進入下一階段")
+
+
+class ContentStrategySuggestion(BaseModel):
+    """內容策略建議（LLM 結構化輸出用）"""
+
+    planning_types: List[str] = Field(default_factory=list, description="企劃類型")
+    media_formats: List[str] = Field(default_factory=list, description="媒體形式")
+    content_themes: List[str] = Field(default_factory=list, description="內容主題")
+    timing_suggestions: List[str] = Field(default_factory=list, description="傳播時機")
+    evaluation_metrics: List[str] = Field(default_factory=list, description="評估指標")
+
+
 class ChatMessage(BaseModel):
     """聊天訊息"""
 
@@ -116,6 +144,28 @@ class QuickReply(BaseModel):
     priority: int = Field(1, description="優先級")
 
 
+class FusedTurnPlan(BaseModel):
+    """單次呼叫的回合規劃（LLM 結構化輸出用）"""
+
+    next_action: Literal[
+        "extract_data",
+        "generate_insights",
+        "provide_strategy",
+        "evaluate_completeness",
+        "clarify",
+        "general_conversation",
+    ]
+    extracted_fields: Optional[ProjectDataExtraction] = None
+    reply_text: str = Field(..., min_length=1, description="給用戶的回覆")
+    quick_replies: List[QuickReply] = Field(default_factory=list, max_length=5)
+
+
+class QuickReplyOptions(BaseModel):
+    """快速回覆選項列表（LLM 結構化輸出用）"""
+
+    options: List[QuickReply] = Field(..., min_length=1, max_length=5)
+
+
 class ChatTurnRequest(BaseModel):
     """聊天回合請求"""
 
@@ -137,6 +187,76 @@ class ChatTurnResponse(BaseModel):
     next_action: Optional[str] = Field(None, description="建議的下一步動作")
     is_complete: bool = Field(False, description="專案是否完整")
     completeness_score: float = Field(0.0, description="完整度分數")
+    metadata: Optional[Dict[str, Any]] = Field(
+        None, description="回合元數據（行動與各步驟耗時）"
+    )
+
+
+class ConversationSummary(BaseModel):
+    """較舊對話回合的滾動摘要"""
+
+    summary: str = Field(..., min_length=1, description="對話摘要")
+
+
+class LLMContextState(BaseModel):
+    """會話的 Ollama 對話上下文（/api/generate 回傳的 context token 陣列）
+
+    模型或系統提示詞改變、或對話中最後一則助手訊息不是此上下文產生的回覆時失效，
+    避免沿用不相容或缺漏其他路徑訊息的上下文。
+    """
+
+    model: Optional[str] = Field(None, description="產生上下文的模型")
+    system_hash: Optional[str] = Field(None, description="系統提示詞指紋")
+    context: List[int] = Field(default_factory=list, description="context token")
+    turns: int = Field(0, description="沿用上下文的回合數")
+    reply_hash: Optional[str] = Field(None, description="此上下文產生的回覆指紋")
+    reply_chars: int = Field(0, description="產生的回覆長度（去除首尾空白）")
+
+
+class LateResult(BaseModel):
+    """超出回合預算、於回覆送出後才完成的步驟結果"""
+
+    id: str = Field(..., description="結果ID（對應回應 metadata.pending）")
+    step: str = Field(..., description="步驟名稱，例如 action 或 quick_replies")
+    action: Optional[str] = Field(None, description="步驟所屬的行動")
+    status: str = Field("completed", description="completed 或 failed")
+    message: Optional[str] = Field(None, description="延遲產生的回覆文字")
+    quick_replies: Optional[List[QuickReply]] = Field(None, description="延遲產生的快速回覆")
+    created_at: datetime = Field(default_factory=datetime.now, description="步驟開始時間")
+    completed_at: datetime = Field(default_factory=datetime.now, description="完成時間")
+
+
+class JobStatus(str, Enum):
+    """背景工作狀態"""
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+class Job(BaseModel):
+    """背景工作（長輸出的生成工具在請求外執行）"""
+
+    id: str = Field(..., description="工作ID")
+    job_type: str = Field(..., description="工作類型，例如 proposal")
+    session_id: str = Field(..., description="所屬會話ID")
+    status: JobStatus = Field(JobStatus.QUEUED, description="工作狀態")
+    params: Dict[str, Any] = Field(default_factory=dict, description="工作參數")
+    result: Optional[Any] = Field(None, description="工作結果")
+    error: Optional[str] = Field(None, description="失敗原因")
+    created_at: datetime = Field(default_factory=datetime.now)
+    started_at: Optional[datetime] = Field(None, description="開始執行時間")
+    finished_at: Optional[datetime] = Field(None, description="結束時間")
+
+
+class JobSubmitRequest(BaseModel):
+    """提交背景工作請求"""
+
+    job_type: str = Field(..., description="工作類型")
+    session_id: str = Field(..., description="會話ID")
+    params: Dict[str, Any] = Field(default_factory=dict, description="工作參數")
 
 
 class SessionData(BaseModel):
@@ -149,6 +269,15 @@ class SessionData(BaseModel):
     created_at: datetime = Field(default_factory=datetime.now)
     updated_at: datetime = Field(default_factory=datetime.now)
     status: str = Field("active", description="會話狀態")
+    llm_context: Optional[LLMContextState] = Field(None, description="LLM對話上下文")
+    conversation_summary: Optional[str] = Field(
+        None, description="較舊對話的滾動摘要（chat_history 只保留最近訊息）"
+    )
+    summarized_messages: int = Field(0, description="已壓縮進摘要的訊息數")
+    late_results: List[LateResult] = Field(
+        default_factory=list, description="超出回合預算後才完成的步驟結果"
+    )
+    jobs: List[Job] = Field(default_factory=list, description="最近的背景工作")
 
 
 class AgentOutput(BaseModel):
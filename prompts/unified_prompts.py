@@ -4,7 +4,7 @@
 整合所有系統提示詞和對話模板
 """
 
-from typing import Dict, Any
+from typing import Any, Dict, Optional
 
 
 class UnifiedPrompts:
@@ -89,6 +89,30 @@ class UnifiedPrompts:
 
 請提供結構化的評估結果。"""
 
+    # 單次回合規劃提示詞（路由＋提取＋回覆＋快速回覆）
+    FUSED_TURN_PROMPT = """請一次完成本回合的規劃，並以JSON回傳：
+- next_action：下一步行動，限於 extract_data、generate_insights、provide_strategy、
+  evaluate_completeness、clarify、general_conversation
+- extracted_fields：從用戶訊息中提取的專案欄位（結構同專案數據，無法確定的欄位設為null）
+- reply_text：給用戶的回覆，具體且不少於50字，並針對最重要的缺漏提問
+- quick_replies：3-5個快速回覆，每個含 text（顯示文字）與 value（實際值），
+  內容要能直接填入缺漏欄位或推進下一步
+
+只回傳JSON格式，不要包含其他文字。"""
+
+    # 完整提案生成提示詞
+    PROPOSAL_GENERATION_PROMPT = """你是一個專業的企劃專案提案生成助手。基於完整的企劃專案資料，生成格式化的企劃提案文本。
+
+請根據提供的企劃專案資料，生成包含以下內容的提案：
+1. 專案概覽（活動名稱、產業、緊急程度）
+2. 時程與預算規劃
+3. 內容與策略說明
+4. 受眾洞察
+5. 提案內容（市場分析、競品分析、策略提案等）
+6. 後續步驟
+
+只返回 Markdown 格式的提案文本，不要其他內容。"""
+
     # 對話流程控制提示詞
     CONVERSATION_FLOW_PROMPT = """基於當前專案狀態和用戶輸入，請決定下一步對話策略。
 
@@ -122,30 +146,68 @@ class UnifiedPrompts:
             "strategy": cls.CONTENT_STRATEGY_PROMPT,
             "quick_reply": cls.QUICK_REPLY_GENERATION_PROMPT,
             "completeness": cls.COMPLETENESS_EVALUATION_PROMPT,
+            "proposal": cls.PROPOSAL_GENERATION_PROMPT,
             "flow": cls.CONVERSATION_FLOW_PROMPT,
+            "fused_turn": cls.FUSED_TURN_PROMPT,
             "error": cls.ERROR_HANDLING_PROMPT,
         }
         return prompts.get(context, cls.SYSTEM_ROLE)
 
     @classmethod
     def get_conversation_prompt(
-        cls, user_message: str, project_data: Dict[str, Any], context: str = "general"
+        cls,
+        user_message: str,
+        project_data: Dict[str, Any],
+        context: str = "general",
+        history: str = "",
     ) -> str:
-        """生成完整的對話提示詞"""
+        """生成完整的對話提示詞（history 為對話摘要與最近訊息）"""
         system_prompt = cls.get_system_prompt(context)
+        history_section = f"\n對話紀錄：\n{history}\n" if history else ""
 
         prompt = f"""
 {system_prompt}
 
 當前專案狀態：
 {cls._format_project_data(project_data)}
-
+{history_section}
 用戶訊息：{user_message}
 
 請根據以上資訊提供回應。
 """
         return prompt.strip()
 
+    @classmethod
+    def get_conversation_turn(
+        cls, user_message: str, project_data: Dict[str, Any]
+    ) -> str:
+        """生成單一對話回合的訊息（不含系統提示詞，供會話上下文模式使用）"""
+        return f"""
+當前專案狀態：
+{cls._format_project_data(project_data)}
+
+用戶訊息：{user_message}
+""".strip()
+
+    @classmethod
+    def get_history_summary_prompt(
+        cls, previous_summary: Optional[str], transcript: str, max_chars: int
+    ) -> str:
+        """生成對話摘要提示詞：將既有摘要與較舊的對話合併為新摘要"""
+        return f"""
+你是企劃需求助手的記錄員。請將「既有摘要」與「較舊對話」合併成一段新的摘要，
+保留已確認的專案資訊、客戶偏好、尚未解決的問題與已給出的建議，省略寒暄。
+摘要需為繁體中文，不超過 {max_chars} 字。
+
+既有摘要：
+{previous_summary or "（無）"}
+
+較舊對話：
+{transcript}
+
+請以 JSON 回傳：{{"summary": "..."}}
+""".strip()
+
     @classmethod
     def _format_project_data(cls, project_data: Dict[str, Any]) -> str:
         """格式化專案數據用於提示詞"""
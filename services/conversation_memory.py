@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+會話對話記憶
+每個會話的聊天歷史只保留最近的訊息視窗；超出視窗的舊訊息累積到一批後，
+由背景任務以 LLM 合併進滾動摘要，讓提示詞長度與記憶體用量不隨會話長度成長。
+"""
+
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional
+
+from config import (
+    CONVERSATION_HISTORY_HARD_LIMIT,
+    CONVERSATION_SUMMARY_BATCH,
+    CONVERSATION_SUMMARY_MAX_CHARS,
+    CONVERSATION_WINDOW_MESSAGES,
+)
+from models.unified_models import ChatMessage, ConversationSummary, MessageRole
+from prompts.unified_prompts import UnifiedPrompts
+from services.llm_client import LLMPriority
+
+logger = logging.getLogger(__name__)
+
+_ROLE_LABELS = {MessageRole.USER: "用戶", MessageRole.ASSISTANT: "助手"}
+
+
+def format_transcript(messages: List[ChatMessage]) -> str:
+    """將訊息列表格式化為「用戶: …」「助手: …」逐行文字"""
+    return "\n".join(
+        f"{_ROLE_LABELS.get(m.role, m.role)}: {m.content}"
+        for m in messages
+        if m.role in _ROLE_LABELS
+    )
+
+
+class ConversationMemory:
+    """會話記憶：最近訊息視窗 + 非同步滾動摘要"""
+
+    def __init__(
+        self,
+        llm_client,
+        session_manager,
+        window: int = CONVERSATION_WINDOW_MESSAGES,
+        batch: int = CONVERSATION_SUMMARY_BATCH,
+        summary_max_chars: int = CONVERSATION_SUMMARY_MAX_CHARS,
+        hard_limit: int = CONVERSATION_HISTORY_HARD_LIMIT,
+    ):
+        """初始化會話記憶"""
+        self.llm_client = llm_client
+        self.session_manager = session_manager
+        self.window = window
+        self.batch = max(1, batch)
+        self.summary_max_chars = summary_max_chars
+        self.hard_limit = max(hard_limit, window + self.batch)
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self.stats = {"summaries": 0, "summary_failures": 0, "dropped": 0}
+
+    def append(self, session_id: str, role: MessageRole, content: str) -> bool:
+        """寫入一則訊息，必要時排程背景摘要"""
+        if not self.session_manager.add_chat_message(session_id, role, content):
+            return False
+        self._maybe_compact(session_id)
+        return True
+
+    def record_turn(
+        self, session_id: str, user_message: str, assistant_message: str
+    ) -> bool:
+        """寫入一個完整回合（用戶訊息與助手回覆，單次寫入）"""
+        if not self.session_manager.add_chat_messages(
+            session_id,
+            [(MessageRole.USER, user_message), (MessageRole.ASSISTANT, assistant_message)],
+        ):
+            return False
+        self._maybe_compact(session_id)
+        return True
+
+    def _maybe_compact(self, session_id: str) -> None:
+        history = self.session_manager.get_chat_history(session_id)
+        overflow = len(history) - self.window
+        if overflow < self.batch:
+            return
+
+        task = self._tasks.get(session_id)
+        if task is not None and not task.done():
+            return
+
+        if len(history) > self.hard_limit:
+            # 摘要持續失敗時的保底：直接丟棄最舊的訊息
+            drop = len(history) - self.hard_limit
+            self.session_manager.compact_chat_history(session_id, None, drop)
+            self.stats["dropped"] += drop
+            logger.warning(f"會話 {session_id} 摘要落後，丟棄最舊 {drop} 則訊息")
+
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # 同步呼叫端沒有事件迴圈，留待下一次寫入時再摘要
+            return
+        self._tasks[session_id] = loop.create_task(self._summarize(session_id))
+
+    async def _summarize(self, session_id: str) -> None:
+        """將視窗外的舊訊息合併進滾動摘要"""
+        try:
+            session = self.session_manager.get_session(session_id)
+            if not session:
+                return
+            older = session.chat_history[: -self.window]
+            if not older:
+                return
+
+            prompt = UnifiedPrompts.get_history_summary_prompt(
+                session.conversation_summary,
+                format_transcript(older),
+                self.summary_max_chars,
+            )
+            result = await self.llm_client.generate_structured(
+                prompt,
+                ConversationSummary,
+                temperature=0.2,
+                use_cache=False,
+                priority=LLMPriority.BACKGROUND,
+                call_type="summary",
+            )
+            if result is None:
+                self.stats["summary_failures"] += 1
+                logger.warning(f"會話 {session_id} 對話摘要失敗，保留原始訊息")
+                return
+
+            # 摘要期間只會在尾端新增訊息，依數量從頭移除即可
+            summary = result.summary.strip()[: self.summary_max_chars]
+            self.session_manager.compact_chat_history(session_id, summary, len(older))
+            self.stats["summaries"] += 1
+            logger.info(f"會話 {session_id} 已將 {len(older)} 則訊息壓縮進摘要")
+
+        except Exception as e:
+            self.stats["summary_failures"] += 1
+            logger.error(f"壓縮會話記憶失敗: {e}")
+        finally:
+            self._tasks.pop(session_id, None)
+
+    def digest(self, session_id: str) -> str:
+        """提示詞用的對話紀錄：摘要加上最近訊息"""
+        session = self.session_manager.get_session(session_id)
+        if not session:
+            return ""
+        parts = []
+        if session.conversation_summary:
+            parts.append(f"先前對話摘要：{session.conversation_summary}")
+        recent = format_transcript(session.chat_history[-self.window :])
+        if recent:
+            parts.append(recent)
+        return "\n".join(parts)
+
+    def prompt_messages(self, session_id: str) -> List[Dict[str, str]]:
+        """chat_completion 用的訊息：摘要（作為開頭的用戶訊息）與最近訊息"""
+        session = self.session_manager.get_session(session_id)
+        if not session:
+            return []
+        messages = []
+        if session.conversation_summary:
+            messages.append(
+                {
+                    "role": "user",
+                    "content": f"先前對話摘要：{session.conversation_summary}",
+                }
+            )
+        for m in session.chat_history[-self.window :]:
+            if m.role in _ROLE_LABELS:
+                messages.append({"role": m.role.value, "content": m.content})
+        return messages
+
+    async def drain(self) -> None:
+        """等待進行中的摘要任務完成（關閉服務與測試用）"""
+        tasks = [t for t in self._tasks.values() if not t.done()]
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """會話記憶統計"""
+        return {
+            **self.stats,
+            "pending": sum(1 for t in self._tasks.values() if not t.done()),
+            "window": self.window,
+            "hard_limit": self.hard_limit,
+        }
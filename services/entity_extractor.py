@@ -0,0 +1,718 @@
+#!/usr/bin/env python3
+"""
+規則式企劃實體提取
+以預先編譯的正規表示式與 Aho-Corasick 詞典（由 PREDEFINED_OPTIONS 建立）解析
+預算、日期區間、期長、產業、投放形式與企劃類型，並處理中文數字。
+每個欄位附帶信心分數；訊息中提及的欄位都能確定解析時，呼叫端可略過 LLM 提取。
+
+試跑與吞吐量測試：
+    python -m services.entity_extractor "預算200萬，2024/11/01至2025/03/31投放Meta廣告"
+    python -m services.entity_extractor --benchmark 20000
+"""
+
+import argparse
+import calendar
+import json
+import re
+import time
+from datetime import date, timedelta
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from config import PLANNING_TYPES, PREDEFINED_OPTIONS
+
+INDUSTRY = "project_attributes.industry"
+OBJECTIVE = "project_attributes.objective"
+BUDGET = "time_budget.budget"
+START_DATE = "time_budget.campaign_start_date"
+END_DATE = "time_budget.campaign_end_date"
+DUE_DATE = "time_budget.planning_due_date"
+MEDIA_FORMATS = "content_strategy.media_formats"
+PLANNING_TYPES_PATH = "content_strategy.planning_types"
+AUDIENCE_LOCK = "content_strategy.audience_lock"
+
+LIST_PATHS = {MEDIA_FORMATS, PLANNING_TYPES_PATH}
+
+# 快速回覆泡泡的固定選項：整句完全相同時直接寫入
+OBJECTIVE_LABELS = {"品牌知名度", "帶動試用", "名單收集", "促銷轉換"}
+AUDIENCE_LABELS = {"家庭親子", "年輕族群", "教育單位", "企業決策者"}
+
+INDUSTRY_ALIASES = {
+    "食品": "食品飲料",
+    "飲料": "食品飲料",
+    "餐飲": "食品飲料",
+    "服飾": "服飾配件",
+    "家電": "3C家電",
+    "3c": "3C家電",
+    "金融": "金融保險",
+    "保險": "金融保險",
+    "銀行": "金融保險",
+    "美妝": "美妝保養",
+    "保養品": "美妝保養",
+    "健身": "運動健身",
+    "汽車": "汽車產業",
+    "建案": "房地產",
+    "旅遊": "旅遊觀光",
+    "觀光": "旅遊觀光",
+    "動物園": "旅遊觀光",
+    "飯店": "旅遊觀光",
+    "教育": "教育培訓",
+    "補習班": "教育培訓",
+    "醫療": "醫療健康",
+    "寵物": "寵物用品",
+    "母嬰": "母嬰用品",
+    "家居": "家居用品",
+    "家具": "家居用品",
+    "遊戲": "遊戲產業",
+    "電商": "電商平台",
+}
+
+MEDIA_ALIASES = {
+    "meta": "Meta廣告",
+    "fb": "Meta廣告",
+    "facebook": "Meta廣告",
+    "臉書": "Meta廣告",
+    "ig": "Meta廣告",
+    "instagram": "Meta廣告",
+    "youtube": "YouTube廣告",
+    "yt": "YouTube廣告",
+    "google": "Google廣告",
+    "谷歌": "Google廣告",
+    "line": "Line廣告",
+    "tiktok": "TikTok廣告",
+    "抖音": "TikTok廣告",
+    "sem": "搜尋引擎廣告",
+    "關鍵字廣告": "搜尋引擎廣告",
+    "ott": "OTT/OTV",
+    "kol": "KOL合作",
+    "網紅": "網紅行銷",
+    "電視": "電視廣告",
+    "廣播": "廣播廣告",
+    "戶外": "戶外廣告",
+    "edm": "電子郵件",
+    "簡訊": "簡訊行銷",
+    "社群": "社群媒體",
+}
+
+CANONICAL_CONFIDENCE = 0.95
+ALIAS_CONFIDENCE = 0.85
+
+_ZH_DIGITS = {
+    "零": 0,
+    "〇": 0,
+    "一": 1,
+    "壹": 1,
+    "二": 2,
+    "兩": 2,
+    "貳": 2,
+    "三": 3,
+    "參": 3,
+    "四": 4,
+    "五": 5,
+    "六": 6,
+    "七": 7,
+    "八": 8,
+    "九": 9,
+}
+_ZH_UNITS = {"十": 10, "拾": 10, "百": 100, "佰": 100, "千": 1000, "仟": 1000}
+_ZH_SECTION_UNITS = {"萬": 10_000, "万": 10_000, "億": 100_000_000, "亿": 100_000_000}
+_SUFFIX_UNITS = {"k": 1000, "m": 1_000_000}
+
+_NUMBER_TOKEN_RE = re.compile(r"\d+(?:\.\d+)?|\D")
+
+# 金額數字：阿拉伯數字、中文數字與單位交錯組成的整段（例如「一億兩千萬」「2百萬」「1萬2000」）
+_NUMERAL_CHARS = "零〇一二兩三四五六七八九十百千萬万億亿"
+_NUMERAL = r"(?:[0-9][0-9,]*(?:\.[0-9]+)?|[" + _NUMERAL_CHARS + r"])"
+_AMOUNT = (
+    r"(" + _NUMERAL + r"(?:" + _NUMERAL + r"|\s[" + _NUMERAL_CHARS + r"])*)"
+    r"\s*([kKmM](?![a-zA-Z]))?"
+)
+_NUMERAL_TAIL_RE = re.compile(r"\s*[0-9" + _NUMERAL_CHARS + r"]")
+_RANGE_SEP = r"\s*(?:至|到|~|～|-|—|–)\s*"
+_DATE = r"(\d{4})\s*[/.\-年]\s*(\d{1,2})\s*[/.\-月]\s*(\d{1,2})\s*[日號]?"
+_MONTH_DAY = r"(\d{1,2})\s*[/.\-月]\s*(\d{1,2})\s*[日號]?"
+
+BUDGET_RE = re.compile(
+    r"(?:總預算|預算|經費|budget)(?:\s|[：:]|約|大約|大概|為|是|有|抓|共)*"
+    + _AMOUNT
+    + r"(?:"
+    + _RANGE_SEP
+    + _AMOUNT
+    + r")?\s*(?:元|塊|NTD|TWD)?\s*(左右|以內|以下|以上|上下)?",
+    re.IGNORECASE,
+)
+BARE_AMOUNT_RE = re.compile(
+    r"(" + _NUMERAL + r"(?:" + _NUMERAL + r")*?\s*[萬万億亿])\s*(?:元|塊)?"
+)
+AMOUNT_RE = re.compile(_AMOUNT + r"(?:" + _RANGE_SEP + _AMOUNT + r")?")
+BUDGET_CUE_RE = re.compile(r"預算|經費|budget", re.IGNORECASE)
+
+DATE_RANGE_RE = re.compile(_DATE + _RANGE_SEP + r"(?:" + _DATE + r"|" + _MONTH_DAY + r")")
+MONTH_RANGE_RE = re.compile(
+    r"(\d{4})\s*[/.\-年]\s*(\d{1,2})\s*月?"
+    + _RANGE_SEP
+    + r"(?:(\d{4})\s*[/.\-年]\s*)?(\d{1,2})\s*月"
+)
+DATE_RE = re.compile(_DATE)
+RELATIVE_DATE_RE = re.compile(r"下個?月初|下[週周]一")
+DURATION_RE = re.compile(
+    r"(?<![\d.])(\d{1,2}|[一二兩三四五六七八九十]{1,3}|半)\s*(個)?\s*(月|週|周|星期|禮拜|天|年|季)"
+)
+
+_DUE_CUE_RE = re.compile(r"交付|截稿|提案|交件|due|deadline", re.IGNORECASE)
+_START_CUE_RE = re.compile(r"開始|起跑|開跑|上線|起")
+_END_CUE_RE = re.compile(r"結束|為止|截止")
+
+# 提及但規則無法解析的欄位線索（出現時交給 LLM）
+UNRESOLVED_CUE_RE = re.compile(
+    r"主題|受眾|族群|客群|目標|素材|需求|要求|技術|風險|競品|標語|訴求|kpi",
+    re.IGNORECASE,
+)
+
+# 否定線索：出現時整句交給 LLM，且同一子句中否定詞之後的值不寫入
+NEGATION_RE = re.compile(r"不要|不做|不用|除了|別|不")
+_CLAUSE_BREAK_RE = re.compile(r"[，,。；;！!？?\n]")
+
+# 計算剩餘內容時忽略的虛詞、欄位關鍵字與標點
+_FILLER_RE = re.compile(
+    r"[\W_]+|總預算|預算|經費|活動期間|期間|檔期|走期|時間|為期|投放|使用|採用|主要|預計"
+    r"|大概|大約|左右|我們|產業|行業|媒體|形式|管道|平台|廣告|總共|規劃|安排|進行|活動"
+    r"|企劃|類型|以及|還有|另外|然後|打算|希望|想要|開始|開跑|起跑|上線|結束|交付|提案|日期"
+    r"|[約從到至我想要會的是在做用和跟與及為有共元了吧喔呢嗎啊]"
+)
+
+
+class ExtractedSlot(NamedTuple):
+    """單一欄位的提取結果"""
+
+    path: str
+    value: Any
+    confidence: float
+    source: str
+
+
+class AhoCorasick:
+    """Aho-Corasick 多模式字串比對（一次掃描找出所有詞典詞）"""
+
+    def __init__(self):
+        """初始化自動機"""
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[Tuple[int, Any]]] = [[]]
+
+    def add(self, term: str, payload: Any) -> None:
+        """加入詞條"""
+        node = 0
+        for ch in term:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+                self._goto[node][ch] = nxt
+            node = nxt
+        self._out[node].append((len(term), payload))
+
+    def build(self) -> "AhoCorasick":
+        """建立失敗連結"""
+        queue = list(self._goto[0].values())
+        for node in queue:
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                fallback = self._fail[node]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(ch, 0)
+                self._fail[child] = target if target != child else 0
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+        return self
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, int, Any]]:
+        """逐一產生 (起點, 終點, payload)"""
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for length, payload in out[node]:
+                yield i - length + 1, i + 1, payload
+
+
+def _build_dictionary() -> AhoCorasick:
+    """由預定義選項與別名建立詞典"""
+    automaton = AhoCorasick()
+    entries = [
+        (INDUSTRY, [i for i in PREDEFINED_OPTIONS["industries"] if i != "其他產業"]),
+        (MEDIA_FORMATS, PREDEFINED_OPTIONS["media_formats"]),
+        (PLANNING_TYPES_PATH, PLANNING_TYPES),
+    ]
+    for path, terms in entries:
+        for term in terms:
+            automaton.add(term.lower(), (path, term, CANONICAL_CONFIDENCE))
+    for path, aliases in ((INDUSTRY, INDUSTRY_ALIASES), (MEDIA_FORMATS, MEDIA_ALIASES)):
+        for alias, canonical in aliases.items():
+            automaton.add(alias.lower(), (path, canonical, ALIAS_CONFIDENCE))
+    return automaton.build()
+
+
+_DICTIONARY = _build_dictionary()
+
+
+def parse_zh_number(text: str) -> Optional[float]:
+    """解析中文或阿拉伯數字（例如「兩百」「一千五百」「3千5百」「1.5」）"""
+    if not text:
+        return None
+    total = 0.0
+    section = 0.0
+    number: Optional[float] = None
+    for token in _NUMBER_TOKEN_RE.findall(text.replace(",", "")):
+        if token[0].isdigit():
+            number = float(token)
+        elif token in _ZH_DIGITS:
+            number = _ZH_DIGITS[token]
+        elif token in _ZH_UNITS:
+            section += (1 if number is None else number) * _ZH_UNITS[token]
+            number = None
+        elif token in _ZH_SECTION_UNITS:
+            section += number or 0
+            total += (section or 1) * _ZH_SECTION_UNITS[token]
+            section, number = 0.0, None
+        else:
+            return None
+    return total + section + (number or 0)
+
+
+def parse_amount_number(text: str) -> Optional[float]:
+    """解析金額數字整段；有無法確定的部分時回傳 None
+
+    「2萬3」「一千五」這類省略單位的口語、或兩個數字相連（「二三」）都視為無法確定，
+    避免只取其中一部分寫入錯誤的金額。
+    """
+    tokens = _NUMBER_TOKEN_RE.findall(re.sub(r"[\s,]", "", text or ""))
+    previous = None  # 前一個記號的種類："number"、"zero" 或單位字
+    for token in tokens:
+        if token in ("零", "〇"):
+            previous = "zero"
+        elif token[0].isdigit() or token in _ZH_DIGITS:
+            if previous == "number":
+                return None
+            previous = "number"
+        elif token in _ZH_UNITS or token in _ZH_SECTION_UNITS:
+            previous = token
+        else:
+            return None
+    if len(tokens) >= 2 and previous == "number" and len(tokens[-1]) == 1:
+        # 大單位後懸空的一位數（「2萬3」「一千五」）；「十二」「一百零五」不受影響
+        if tokens[-2] not in ("十", "拾", "零", "〇"):
+            return None
+    return parse_zh_number(text)
+
+
+def _amount_unit(number: str) -> Optional[str]:
+    """金額數字最後的大單位（區間下限省略單位時沿用上限的單位）"""
+    return number[-1] if number and number[-1] in "千萬万億亿" else None
+
+
+def _amount(
+    number: Optional[str], suffix: Optional[str], inherit: Optional[str] = None
+) -> Optional[int]:
+    number = (number or "").strip()
+    if inherit and not any(ch in "百千萬万億亿" for ch in number):
+        number += inherit
+    value = parse_amount_number(number)
+    if value is None:
+        return None
+    return int(round(value * _SUFFIX_UNITS.get((suffix or "").lower(), 1)))
+
+
+def _range_amounts(m: "re.Match") -> Tuple[Optional[int], Optional[int]]:
+    """金額或金額區間（區間下限沿用上限的單位與 k/m 後綴）"""
+    if not m.group(3):
+        return _amount(m.group(1), m.group(2)), None
+    low = _amount(m.group(1), m.group(2) or m.group(4), _amount_unit(m.group(3)))
+    return low, _amount(m.group(3), m.group(4))
+
+
+def parse_amount(text: str) -> Optional[int]:
+    """解析金額（例如「200萬」「兩百萬」「1.5億」）為整數元；區間取下限"""
+    m = AMOUNT_RE.search(text or "")
+    return _range_amounts(m)[0] if m else None
+
+
+def _iso(year: int, month: int, day: int) -> Optional[str]:
+    try:
+        return date(year, month, day).isoformat()
+    except ValueError:
+        return None
+
+
+def parse_date(text: str) -> Optional[str]:
+    """解析 YYYY/MM/DD、YYYY-MM-DD、YYYY年M月D日 為 YYYY-MM-DD"""
+    m = DATE_RE.search(text or "")
+    return _iso(int(m.group(1)), int(m.group(2)), int(m.group(3))) if m else None
+
+
+def parse_duration(text: str) -> Optional[Dict[str, int]]:
+    """解析期長（例如「三個月」「2週」「半年」）為 {"months": n} 或 {"days": n}"""
+    m = DURATION_RE.search(text or "")
+    return _duration(m) if m else None
+
+
+def _duration(m: "re.Match") -> Optional[Dict[str, int]]:
+    raw, counter, unit = m.group(1), m.group(2), m.group(3)
+    if unit == "月" and not counter:
+        # 「3月」是月份不是期長
+        return None
+    amount = 0.5 if raw == "半" else parse_zh_number(raw)
+    if not amount:
+        return None
+    if unit == "年":
+        return {"months": int(amount * 12)}
+    if unit == "季":
+        return {"months": int(amount * 3)}
+    if unit == "月":
+        return {"months": int(amount)} if amount >= 1 else {"days": 15}
+    if unit in ("週", "周", "星期", "禮拜"):
+        return {"days": int(amount * 7)}
+    return {"days": int(amount)}
+
+
+def add_duration(start: str, duration: Dict[str, int]) -> Optional[str]:
+    """由開始日期與期長推算結束日期（含首日）"""
+    try:
+        begin = date.fromisoformat(start)
+    except (TypeError, ValueError):
+        return None
+    if duration.get("months"):
+        month_index = begin.month - 1 + duration["months"]
+        year, month = begin.year + month_index // 12, month_index % 12 + 1
+        day = min(begin.day, calendar.monthrange(year, month)[1])
+        return (date(year, month, day) - timedelta(days=1)).isoformat()
+    if duration.get("days"):
+        return (begin + timedelta(days=duration["days"] - 1)).isoformat()
+    return None
+
+
+def resolve_relative_date(text: str, today: Optional[date] = None) -> Optional[str]:
+    """解析「下月初」「下週一」等相對日期"""
+    today = today or date.today()
+    if re.search(r"下個?月初", text or ""):
+        year = today.year + 1 if today.month == 12 else today.year
+        month = 1 if today.month == 12 else today.month + 1
+        return date(year, month, 1).isoformat()
+    if re.search(r"下[週周]一", text or ""):
+        return (today + timedelta(days=7 - today.weekday())).isoformat()
+    return None
+
+
+def _month_end(year: int, month: int) -> Optional[str]:
+    if not 1 <= month <= 12:
+        return None
+    return date(year, month, calendar.monthrange(year, month)[1]).isoformat()
+
+
+class ExtractionResult:
+    """一則訊息的提取結果"""
+
+    def __init__(
+        self,
+        slots: Dict[str, ExtractedSlot],
+        unresolved: List[str],
+        residual: str,
+    ):
+        """初始化結果"""
+        self.slots = slots
+        self.unresolved = unresolved
+        self.residual = residual
+
+    def values(self, min_confidence: float = 0.0) -> Dict[str, Any]:
+        """信心達門檻的欄位值（以 ProjectData 路徑為鍵）"""
+        return {
+            path: slot.value
+            for path, slot in self.slots.items()
+            if slot.confidence >= min_confidence
+        }
+
+    def is_deterministic(self, min_confidence: float) -> bool:
+        """訊息提及的欄位是否都已確定解析（可略過 LLM）
+
+        去除已解析片段與虛詞後不得有任何剩餘內容。
+        """
+        return (
+            bool(self.slots)
+            and not self.unresolved
+            and not self.residual
+            and all(slot.confidence >= min_confidence for slot in self.slots.values())
+        )
+
+    def apply_to(self, project, min_confidence: float = 0.0) -> List[str]:
+        """寫入 ProjectData，回傳實際變更的欄位路徑"""
+        written = []
+        for path, value in self.values(min_confidence).items():
+            section_name, field = path.split(".")
+            section = getattr(project, section_name)
+            current = getattr(section, field)
+            if path in LIST_PATHS:
+                merged = list(current or [])
+                merged += [v for v in value if v not in merged]
+                value = merged
+            if value != current:
+                setattr(section, field, value)
+                written.append(path)
+        return written
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "slots": {path: slot._asdict() for path, slot in self.slots.items()},
+            "unresolved": self.unresolved,
+            "residual": self.residual,
+        }
+
+
+class _Collector:
+    """累積提取結果並記錄已使用的字元範圍"""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.slots: Dict[str, ExtractedSlot] = {}
+        self.unresolved: List[str] = []
+        self.spans: List[Tuple[int, int]] = []
+
+    def overlaps(self, start: int, end: int) -> bool:
+        return any(start < e and s < end for s, e in self.spans)
+
+    def claim(self, start: int, end: int) -> None:
+        self.spans.append((start, end))
+
+    def negated(self, start: int) -> bool:
+        """同一子句中、值之前是否有否定詞（「不要Meta廣告」）"""
+        clause_start = 0
+        for m in _CLAUSE_BREAK_RE.finditer(self.text, 0, start):
+            clause_start = m.end()
+        return bool(NEGATION_RE.search(self.text, clause_start, start))
+
+    def put(self, path: str, value: Any, confidence: float, start: int, end: int):
+        if self.negated(start):
+            return
+        source = self.text[start:end]
+        existing = self.slots.get(path)
+        if path in LIST_PATHS:
+            values = list(existing.value) if existing else []
+            if value not in values:
+                values.append(value)
+            confidence = min(confidence, existing.confidence) if existing else confidence
+            self.slots[path] = ExtractedSlot(path, values, confidence, source)
+        elif existing is None or confidence > existing.confidence:
+            self.slots[path] = ExtractedSlot(path, value, confidence, source)
+
+    def residual(self) -> str:
+        chars = list(self.text)
+        for start, end in self.spans:
+            chars[start:end] = [" "] * (end - start)
+        return _FILLER_RE.sub("", "".join(chars))
+
+
+def _date_role(text: str, start: int, end: int) -> Optional[str]:
+    """依日期前後文判斷欄位"""
+    before, after = text[max(0, start - 8) : start], text[end : end + 4]
+    if _DUE_CUE_RE.search(before) or _DUE_CUE_RE.search(after):
+        return DUE_DATE
+    if _END_CUE_RE.search(after) or _END_CUE_RE.search(before[-3:]):
+        return END_DATE
+    if _START_CUE_RE.search(after) or _START_CUE_RE.search(before[-3:]):
+        return START_DATE
+    return None
+
+
+def _extract_budget(c: _Collector) -> None:
+    for m in BUDGET_RE.finditer(c.text):
+        low, high = _range_amounts(m)
+        if not low or (m.group(3) and not high) or _NUMERAL_TAIL_RE.match(c.text, m.end()):
+            # 金額有未能解析的部分：不寫入片段值，交給 LLM
+            c.claim(m.start(), m.end())
+            c.unresolved.append(BUDGET)
+            continue
+        qualifier = m.group(5) or ""
+        if high:
+            value = f"{low}-{high}"
+        elif qualifier in ("以內", "以下", "以上"):
+            value = f"{low}{qualifier}"
+        else:
+            value = str(low)
+        c.put(BUDGET, value, 0.95, m.start(), m.end())
+        c.claim(m.start(), m.end())
+    if BUDGET not in c.slots and BUDGET not in c.unresolved:
+        for m in BARE_AMOUNT_RE.finditer(c.text):
+            if c.overlaps(m.start(), m.end()):
+                continue
+            low = _amount(m.group(1), None)
+            if low and not _NUMERAL_TAIL_RE.match(c.text, m.end()):
+                c.put(BUDGET, str(low), 0.7, m.start(), m.end())
+                c.claim(m.start(), m.end())
+                break
+    if (
+        BUDGET not in c.slots
+        and BUDGET not in c.unresolved
+        and BUDGET_CUE_RE.search(c.text)
+    ):
+        c.unresolved.append(BUDGET)
+
+
+def _extract_dates(c: _Collector, today: Optional[date]) -> None:
+    text = c.text
+    for m in DATE_RANGE_RE.finditer(text):
+        start = _iso(int(m.group(1)), int(m.group(2)), int(m.group(3)))
+        if m.group(4):
+            end, confidence = _iso(int(m.group(4)), int(m.group(5)), int(m.group(6))), 0.95
+        else:
+            end, confidence = _iso(int(m.group(1)), int(m.group(7)), int(m.group(8))), 0.9
+        if start and end and end >= start:
+            c.put(START_DATE, start, confidence, m.start(), m.end())
+            c.put(END_DATE, end, confidence, m.start(), m.end())
+            c.claim(m.start(), m.end())
+
+    for m in MONTH_RANGE_RE.finditer(text):
+        if c.overlaps(m.start(), m.end()):
+            continue
+        year, month = int(m.group(1)), int(m.group(2))
+        end_year = int(m.group(3)) if m.group(3) else year
+        start = _iso(year, month, 1)
+        end = _month_end(end_year, int(m.group(4)))
+        if start and end and end >= start:
+            c.put(START_DATE, start, 0.85, m.start(), m.end())
+            c.put(END_DATE, end, 0.85, m.start(), m.end())
+            c.claim(m.start(), m.end())
+
+    for m in DATE_RE.finditer(text):
+        if c.overlaps(m.start(), m.end()):
+            continue
+        value = _iso(int(m.group(1)), int(m.group(2)), int(m.group(3)))
+        role = _date_role(text, m.start(), m.end())
+        c.claim(m.start(), m.end())
+        if value and role:
+            c.put(role, value, 0.9, m.start(), m.end())
+        else:
+            c.unresolved.append("date")
+
+    for m in RELATIVE_DATE_RE.finditer(text):
+        value = resolve_relative_date(m.group(0), today)
+        role = _date_role(text, m.start(), m.end()) or START_DATE
+        c.put(role, value, 0.85, m.start(), m.end())
+        c.claim(m.start(), m.end())
+
+    for m in DURATION_RE.finditer(text):
+        if c.overlaps(m.start(), m.end()):
+            continue
+        duration = _duration(m)
+        if not duration:
+            continue
+        c.claim(m.start(), m.end())
+        start_slot = c.slots.get(START_DATE)
+        if start_slot and END_DATE not in c.slots:
+            end = add_duration(start_slot.value, duration)
+            c.put(END_DATE, end, min(start_slot.confidence, 0.9), m.start(), m.end())
+        elif END_DATE not in c.slots:
+            # 只有期長沒有開始日期時無法確定活動期間
+            c.unresolved.append("duration")
+
+
+def _is_ascii_word(ch: str) -> bool:
+    return ch.isascii() and ch.isalnum()
+
+
+def _extract_dictionary_terms(c: _Collector) -> None:
+    lowered = c.text.lower()
+    matches = sorted(
+        _DICTIONARY.iter_matches(lowered), key=lambda m: (m[0], m[0] - m[1])
+    )
+    last_end = 0
+    for start, end, (path, canonical, confidence) in matches:
+        # 最左最長、不重疊
+        if start < last_end or c.overlaps(start, end):
+            continue
+        # 英文別名需是完整單字（避免 online 命中 line）
+        if _is_ascii_word(lowered[start]) and start and _is_ascii_word(lowered[start - 1]):
+            continue
+        if (
+            _is_ascii_word(lowered[end - 1])
+            and end < len(lowered)
+            and _is_ascii_word(lowered[end])
+        ):
+            continue
+        c.put(path, canonical, confidence, start, end)
+        c.claim(start, end)
+        last_end = end
+
+
+def extract_entities(text: str, today: Optional[date] = None) -> ExtractionResult:
+    """從訊息提取企劃欄位"""
+    text = (text or "").strip()
+    c = _Collector(text)
+    if not text:
+        return ExtractionResult({}, [], "")
+
+    # 快速回覆泡泡的固定選項
+    if text in OBJECTIVE_LABELS:
+        c.put(OBJECTIVE, text, 1.0, 0, len(text))
+        return ExtractionResult(c.slots, [], "")
+    if text in AUDIENCE_LABELS:
+        c.put(AUDIENCE_LOCK, text, 1.0, 0, len(text))
+        return ExtractionResult(c.slots, [], "")
+
+    _extract_dates(c, today)
+    _extract_budget(c)
+    _extract_dictionary_terms(c)
+    c.unresolved.extend(
+        f"mention:{m.group(0)}" for m in UNRESOLVED_CUE_RE.finditer(text)
+    )
+    if NEGATION_RE.search(text):
+        c.unresolved.append("negation")
+    return ExtractionResult(c.slots, c.unresolved, c.residual())
+
+
+BENCHMARK_MESSAGES = [
+    "預算200萬，活動期間2024/11/01至2025/03/31，投放Meta廣告和YouTube廣告",
+    "總預算約兩百五十萬左右",
+    "2024年11月1日開始，為期三個月",
+    "我們是食品飲料產業，想做KOL合作與社群媒體",
+    "提案交付 2024-10-15，預算100-300萬",
+    "想推廣新款熱水器，主打家庭親子族群",
+    "品牌知名度",
+    "下月初開跑，走期兩週，經費50萬以內",
+]
+
+
+def run_benchmark(iterations: int) -> Dict[str, float]:
+    """以範例訊息測量吞吐量"""
+    started = time.perf_counter()
+    for i in range(iterations):
+        extract_entities(BENCHMARK_MESSAGES[i % len(BENCHMARK_MESSAGES)])
+    elapsed = time.perf_counter() - started
+    return {
+        "messages": iterations,
+        "seconds": round(elapsed, 3),
+        "messages_per_second": round(iterations / elapsed, 1),
+        "us_per_message": round(elapsed / iterations * 1_000_000, 1),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """命令列入口：提取單句或執行吞吐量測試"""
+    parser = argparse.ArgumentParser(description="規則式企劃實體提取")
+    parser.add_argument("text", nargs="?", help="要提取的訊息")
+    parser.add_argument("--benchmark", type=int, metavar="N", help="執行 N 次吞吐量測試")
+    args = parser.parse_args(argv)
+
+    if args.benchmark:
+        print(json.dumps(run_benchmark(args.benchmark), ensure_ascii=False))
+        return 0
+    if not args.text:
+        parser.print_help()
+        return 1
+    print(json.dumps(extract_entities(args.text).to_dict(), ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,407 @@
+#!/usr/bin/env python3
+"""
+本地意圖分類器
+以字元 n-gram 與專案狀態特徵訓練多項式樸素貝氏，取代路由用的 LLM 呼叫；
+信心不足時交回 LLM 決定。
+
+樸素貝氏假設特徵獨立，n-gram 彼此高度相關，直接 softmax 的機率會過度自信；
+信心以隨特徵數增長的溫度校正（溫度可在重新訓練時以驗證資料調整）。
+
+重新訓練：
+    python -m services.intent_classifier --log cache/intent_routing.jsonl \
+        --out cache/intent_classifier.json
+"""
+
+import argparse
+import json
+import logging
+import math
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from config import INTENT_LOG_BACKUPS, INTENT_LOG_MAX_BYTES, INTENT_LOG_MESSAGES
+
+logger = logging.getLogger(__name__)
+
+INTENT_LABELS = [
+    "extract_data",
+    "generate_insights",
+    "provide_strategy",
+    "evaluate_completeness",
+    "clarify",
+    "general_conversation",
+]
+
+# 預設的每特徵溫度：softmax 溫度 = 特徵數 × 此值（至少為 1）
+DEFAULT_TEMPERATURE = 0.25
+_TEMPERATURE_GRID = (0.05, 0.1, 0.15, 0.25, 0.35, 0.5, 0.75, 1.0)
+
+
+def project_state_flags(project_data) -> Dict[str, bool]:
+    """將專案數據摘要為分類用的布林狀態"""
+    attrs = project_data.project_attributes
+    budget = project_data.time_budget
+    strategy = project_data.content_strategy
+    insights = project_data.audience_insights
+    return {
+        "industry": bool(attrs.industry),
+        "campaign": bool(attrs.campaign),
+        "budget": bool(budget.budget),
+        "period": bool(budget.campaign_start_date or budget.campaign_end_date),
+        "audience": bool(strategy.audience_lock),
+        "media": bool(strategy.media_formats),
+        "plan_type": bool(strategy.planning_types),
+        "insights": bool(insights.target_demographics),
+    }
+
+
+def extract_features(
+    message: str, state: Optional[Dict[str, bool]] = None, max_n: int = 3
+) -> Counter:
+    """字元 1..max_n-gram 加上專案狀態旗標"""
+    text = "".join((message or "").lower().split())
+    features: Counter = Counter()
+    for n in range(1, max_n + 1):
+        for i in range(len(text) - n + 1):
+            features[text[i : i + n]] += 1
+    for key, value in (state or {}).items():
+        features[f"state:{key}={int(bool(value))}"] += 1
+    return features
+
+
+class IntentClassifier:
+    """多項式樸素貝氏意圖分類器（純 Python，單次預測為微秒級）"""
+
+    def __init__(
+        self, alpha: float = 0.5, max_n: int = 3, temperature: float = DEFAULT_TEMPERATURE
+    ):
+        """初始化分類器"""
+        self.alpha = alpha
+        self.max_n = max_n
+        self.temperature = temperature
+        self.labels: List[str] = []
+        self.log_priors: Dict[str, float] = {}
+        self.log_likelihoods: Dict[str, Dict[str, float]] = {}
+        self.log_unseen: Dict[str, float] = {}
+        self.trained_examples = 0
+
+    @property
+    def is_trained(self) -> bool:
+        return bool(self.labels)
+
+    def fit(self, examples: Iterable[Tuple[str, Dict[str, bool], str]]) -> None:
+        """以 (訊息, 專案狀態, 行動) 訓練"""
+        class_counts: Counter = Counter()
+        feature_counts: Dict[str, Counter] = {}
+        vocabulary = set()
+        for message, state, label in examples:
+            features = extract_features(message, state, self.max_n)
+            class_counts[label] += 1
+            feature_counts.setdefault(label, Counter()).update(features)
+            vocabulary.update(features)
+
+        total = sum(class_counts.values())
+        if not total:
+            raise ValueError("沒有可用的訓練資料")
+
+        vocab_size = len(vocabulary)
+        self.labels = sorted(class_counts)
+        self.log_priors = {
+            label: math.log(count / total) for label, count in class_counts.items()
+        }
+        self.log_likelihoods = {}
+        self.log_unseen = {}
+        for label in self.labels:
+            counts = feature_counts[label]
+            denominator = sum(counts.values()) + self.alpha * vocab_size
+            self.log_likelihoods[label] = {
+                feature: math.log((count + self.alpha) / denominator)
+                for feature, count in counts.items()
+            }
+            self.log_unseen[label] = math.log(self.alpha / denominator)
+        self.trained_examples = total
+
+    def _posteriors(
+        self, message: str, state: Optional[Dict[str, bool]], temperature: float
+    ) -> Dict[str, float]:
+        """各行動經溫度校正後的後驗機率"""
+        features = extract_features(message, state, self.max_n)
+        scores = {}
+        for label in self.labels:
+            likelihoods = self.log_likelihoods[label]
+            unseen = self.log_unseen[label]
+            score = self.log_priors[label]
+            for feature, count in features.items():
+                score += count * likelihoods.get(feature, unseen)
+            scores[label] = score
+
+        scale = max(1.0, sum(features.values()) * temperature)
+        top = max(scores.values())
+        weights = {label: math.exp((score - top) / scale) for label, score in scores.items()}
+        normalizer = sum(weights.values())
+        return {label: weight / normalizer for label, weight in weights.items()}
+
+    def predict(
+        self, message: str, state: Optional[Dict[str, bool]] = None
+    ) -> Tuple[Optional[str], float]:
+        """回傳 (行動, 信心)；未訓練時回傳 (None, 0.0)"""
+        if not self.is_trained:
+            return None, 0.0
+
+        posteriors = self._posteriors(message, state, self.temperature)
+        best = max(posteriors, key=posteriors.get)
+        return best, posteriors[best]
+
+    def calibrate(self, examples: Iterable[Tuple[str, Dict[str, bool], str]]) -> float:
+        """以驗證資料選擇負對數似然最小的溫度並套用，回傳選定的溫度"""
+        examples = [e for e in examples if e[2] in self.labels]
+        if not examples:
+            return self.temperature
+
+        def loss(temperature: float) -> float:
+            total = 0.0
+            for message, state, label in examples:
+                probability = self._posteriors(message, state, temperature)[label]
+                total -= math.log(max(probability, 1e-12))
+            return total
+
+        self.temperature = min(_TEMPERATURE_GRID, key=loss)
+        return self.temperature
+
+    def save(self, path: str) -> None:
+        """保存模型為 JSON"""
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        payload = {
+            "alpha": self.alpha,
+            "max_n": self.max_n,
+            "temperature": self.temperature,
+            "labels": self.labels,
+            "log_priors": self.log_priors,
+            "log_likelihoods": self.log_likelihoods,
+            "log_unseen": self.log_unseen,
+            "trained_examples": self.trained_examples,
+        }
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["IntentClassifier"]:
+        """載入模型；檔案不存在或格式錯誤時回傳 None"""
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                payload = json.load(f)
+            classifier = cls(
+                alpha=payload["alpha"],
+                max_n=payload["max_n"],
+                temperature=payload.get("temperature", DEFAULT_TEMPERATURE),
+            )
+            classifier.labels = payload["labels"]
+            classifier.log_priors = payload["log_priors"]
+            classifier.log_likelihoods = payload["log_likelihoods"]
+            classifier.log_unseen = payload["log_unseen"]
+            classifier.trained_examples = payload.get("trained_examples", 0)
+            return classifier
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.error(f"載入意圖分類器失敗: {e}")
+            return None
+
+
+def routing_log_files(path: str) -> List[str]:
+    """路由紀錄檔與其輪替備份（由舊到新）"""
+    base = Path(path)
+    backups = [p for p in base.parent.glob(f"{base.name}.*") if p.suffix[1:].isdigit()]
+    files = sorted(backups, key=lambda p: int(p.suffix[1:]), reverse=True)
+    if base.exists():
+        files.append(base)
+    return [str(p) for p in files]
+
+
+class RoutingLog:
+    """路由決策紀錄（JSONL），作為分類器的訓練資料
+
+    寫入由背景執行緒進行，不阻塞事件迴圈；檔案超過 max_bytes 時輪替，保留 backups 份。
+    用戶原文只在 log_messages 開啟時記錄（重新訓練需要原文）。
+    """
+
+    def __init__(
+        self,
+        path: Optional[str],
+        max_bytes: int = INTENT_LOG_MAX_BYTES,
+        backups: int = INTENT_LOG_BACKUPS,
+        log_messages: bool = INTENT_LOG_MESSAGES,
+    ):
+        """初始化紀錄檔"""
+        self.path = Path(path) if path else None
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.log_messages = log_messages
+        self._lock = threading.Lock()
+        self._queue: "queue.Queue[Optional[str]]" = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+
+    def append(
+        self, message: str, state: Dict[str, bool], action: str, source: str
+    ) -> None:
+        """追加一筆決策（放入佇列後立即返回）"""
+        if self.path is None:
+            return
+        record = {
+            "ts": time.time(),
+            "state": state,
+            "action": action,
+            "source": source,
+        }
+        if self.log_messages:
+            record["message"] = message
+        with self._lock:
+            if self._writer is None:
+                self._writer = threading.Thread(
+                    target=self._write_loop, name="intent-routing-log", daemon=True
+                )
+                self._writer.start()
+        self._queue.put(json.dumps(record, ensure_ascii=False))
+
+    def _write_loop(self) -> None:
+        while True:
+            line = self._queue.get()
+            lines = []
+            stop = line is None
+            if not stop:
+                lines.append(line)
+            # 一次寫入佇列中累積的所有紀錄
+            while not stop:
+                try:
+                    line = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if line is None:
+                    stop = True
+                else:
+                    lines.append(line)
+            try:
+                if lines:
+                    self._write(lines)
+            except Exception as e:
+                logger.warning(f"寫入路由紀錄失敗: {e}")
+            finally:
+                for _ in range(len(lines) + int(stop)):
+                    self._queue.task_done()
+            if stop:
+                return
+
+    def _write(self, lines: List[str]) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+            size = f.tell()
+        if self.max_bytes and size > self.max_bytes:
+            self._rotate()
+
+    def _rotate(self) -> None:
+        """path → path.1 → … → path.{backups}，最舊的一份刪除"""
+        if self.backups <= 0:
+            os.remove(self.path)
+            return
+        oldest = self.path.with_name(f"{self.path.name}.{self.backups}")
+        if oldest.exists():
+            os.remove(oldest)
+        for i in range(self.backups - 1, 0, -1):
+            source = self.path.with_name(f"{self.path.name}.{i}")
+            if source.exists():
+                os.replace(source, self.path.with_name(f"{self.path.name}.{i + 1}"))
+        os.replace(self.path, self.path.with_name(f"{self.path.name}.1"))
+
+    def flush(self) -> None:
+        """等待佇列中的紀錄寫入完成"""
+        if self._writer is not None:
+            self._queue.join()
+
+    def close(self) -> None:
+        """寫入剩餘紀錄並停止背景執行緒（關閉服務時使用）"""
+        with self._lock:
+            writer, self._writer = self._writer, None
+        if writer is not None:
+            self._queue.put(None)
+            writer.join(timeout=5)
+
+
+def load_training_examples(
+    paths: Iterable[str], sources: Optional[Iterable[str]] = ("llm",)
+) -> List[Tuple[str, Dict[str, bool], str]]:
+    """從路由紀錄讀取訓練資料；預設只採用 LLM 做出的決策，避免分類器自我強化"""
+    allowed = set(sources) if sources else None
+    examples = []
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if allowed is not None and record.get("source") not in allowed:
+                    continue
+                if record.get("action") not in INTENT_LABELS:
+                    continue
+                # 未記錄原文（INTENT_LOG_MESSAGES 關閉）的紀錄無法用於訓練
+                if "message" not in record:
+                    continue
+                examples.append(
+                    (record["message"], record.get("state") or {}, record["action"])
+                )
+    return examples
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """重新訓練意圖分類器的命令列入口"""
+    from config import INTENT_LOG_PATH, INTENT_MODEL_PATH
+
+    parser = argparse.ArgumentParser(description="從路由紀錄重新訓練意圖分類器")
+    parser.add_argument(
+        "--log",
+        nargs="+",
+        default=routing_log_files(INTENT_LOG_PATH),
+        help="路由紀錄 JSONL 檔（預設含輪替備份）",
+    )
+    parser.add_argument("--out", default=INTENT_MODEL_PATH, help="模型輸出路徑")
+    parser.add_argument("--alpha", type=float, default=0.5, help="平滑係數")
+    parser.add_argument(
+        "--holdout", type=float, default=0.2, help="保留作驗證的比例（0 表示不驗證）"
+    )
+    args = parser.parse_args(argv)
+
+    examples = load_training_examples(args.log)
+    if not examples:
+        print("沒有可用的訓練資料")
+        return 1
+
+    split = int(len(examples) * (1 - args.holdout)) if args.holdout > 0 else len(examples)
+    train, holdout = examples[:split], examples[split:]
+    classifier = IntentClassifier(alpha=args.alpha)
+    classifier.fit(train)
+    if holdout:
+        correct = sum(
+            classifier.predict(message, state)[0] == label
+            for message, state, label in holdout
+        )
+        print(f"驗證準確率: {correct / len(holdout):.3f}（{len(holdout)} 筆）")
+        temperature = classifier.calibrate(holdout)
+        print(f"信心校正溫度: {temperature}")
+        classifier.fit(examples)
+
+    classifier.save(args.out)
+    print(f"已訓練 {classifier.trained_examples} 筆，模型保存至 {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
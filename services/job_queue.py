@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+背景工作佇列
+長輸出的生成工具（受眾洞察、內容策略、完整提案）改以背景工作執行：
+提交後立即回傳工作ID，由用戶端輪詢結果，不必讓 HTTP 請求等待整段生成。
+
+各工作類型以各自的信號量限制同時執行數；工作狀態變更時寫回所屬會話，
+服務重啟後仍可從會話查到先前的結果。
+"""
+
+import asyncio
+import logging
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from config import (
+    JOB_DEFAULT_CONCURRENCY,
+    JOB_HISTORY_PER_SESSION,
+    JOB_MAX_FINISHED,
+)
+from models.unified_models import Job, JobStatus
+
+logger = logging.getLogger(__name__)
+
+JobHandler = Callable[[Job], Awaitable[Any]]
+
+_FINISHED = {JobStatus.COMPLETED, JobStatus.FAILED, JobStatus.CANCELLED}
+
+
+class JobQueue:
+    """行程內的非同步背景工作佇列"""
+
+    def __init__(
+        self,
+        session_manager=None,
+        default_concurrency: int = JOB_DEFAULT_CONCURRENCY,
+        max_finished: int = JOB_MAX_FINISHED,
+        history_per_session: int = JOB_HISTORY_PER_SESSION,
+    ):
+        """初始化工作佇列
+
+        session_manager: 提供時，工作狀態變更會寫回所屬會話。
+        """
+        self.session_manager = session_manager
+        self.default_concurrency = max(1, default_concurrency)
+        self.max_finished = max_finished
+        self.history_per_session = history_per_session
+        self._handlers: Dict[str, JobHandler] = {}
+        self._limits: Dict[str, asyncio.Semaphore] = {}
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self.stats: Dict[str, Dict[str, int]] = {}
+
+    def register(
+        self, job_type: str, handler: JobHandler, concurrency: Optional[int] = None
+    ) -> None:
+        """註冊工作類型；handler 以 Job 呼叫，回傳值作為工作結果"""
+        self._handlers[job_type] = handler
+        self._limits[job_type] = asyncio.Semaphore(
+            max(1, concurrency or self.default_concurrency)
+        )
+        self.stats.setdefault(
+            job_type,
+            {"submitted": 0, "completed": 0, "failed": 0, "cancelled": 0},
+        )
+
+    @property
+    def job_types(self) -> List[str]:
+        return sorted(self._handlers)
+
+    def submit(
+        self, job_type: str, session_id: str, params: Optional[Dict[str, Any]] = None
+    ) -> Job:
+        """提交工作並立即回傳；未註冊的類型拋出 ValueError"""
+        handler = self._handlers.get(job_type)
+        if handler is None:
+            raise ValueError(
+                f"未知的工作類型: {job_type}（可用: {', '.join(self.job_types)}）"
+            )
+
+        job = Job(
+            id=uuid.uuid4().hex,
+            job_type=job_type,
+            session_id=session_id,
+            params=params or {},
+        )
+        self._jobs[job.id] = job
+        self._persist(job)
+        self._tasks[job.id] = asyncio.ensure_future(self._run(job, handler))
+        self.stats[job_type]["submitted"] += 1
+        logger.info(f"提交背景工作 {job_type}（{job.id}）")
+        return job
+
+    async def _run(self, job: Job, handler: JobHandler) -> None:
+        try:
+            async with self._limits[job.job_type]:
+                job.status = JobStatus.RUNNING
+                job.started_at = datetime.now()
+                self._persist(job)
+                job.result = await handler(job)
+            job.status = JobStatus.COMPLETED
+        except asyncio.CancelledError:
+            job.status = JobStatus.CANCELLED
+        except Exception as e:
+            job.status = JobStatus.FAILED
+            job.error = str(e)
+            logger.error(f"背景工作 {job.job_type}（{job.id}）失敗: {e}")
+        finally:
+            job.finished_at = datetime.now()
+            self._tasks.pop(job.id, None)
+            self.stats[job.job_type][job.status.value] += 1
+            self._persist(job)
+            self._prune()
+
+    def _persist(self, job: Job) -> None:
+        if self.session_manager is None:
+            return
+        self.session_manager.save_job(
+            job.session_id, job, max_jobs=self.history_per_session
+        )
+
+    def _prune(self) -> None:
+        """記憶體只保留最近 max_finished 筆已結束的工作（完整紀錄在會話中）"""
+        finished = [job_id for job_id, job in self._jobs.items() if job.status in _FINISHED]
+        for job_id in finished[: max(0, len(finished) - self.max_finished)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """查詢工作"""
+        return self._jobs.get(job_id)
+
+    async def cancel(self, job_id: str) -> Optional[Job]:
+        """取消排隊中或執行中的工作並等待狀態寫回；已結束的工作原樣回傳"""
+        job = self._jobs.get(job_id)
+        task = self._tasks.get(job_id)
+        if job is not None and task is not None:
+            task.cancel()
+            await asyncio.wait({task})
+            logger.info(f"取消背景工作 {job.job_type}（{job_id}）")
+        return job
+
+    async def drain(self) -> None:
+        """等待所有工作結束（測試用）"""
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks.values()), return_exceptions=True)
+
+    async def shutdown(self) -> None:
+        """取消未完成的工作並等待狀態寫回（關閉服務時使用）"""
+        for task in list(self._tasks.values()):
+            task.cancel()
+        await self.drain()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """各工作類型的數量統計"""
+        by_type = {}
+        for job_type, counts in self.stats.items():
+            active = [
+                job
+                for job_id, job in self._jobs.items()
+                if job.job_type == job_type and job_id in self._tasks
+            ]
+            by_type[job_type] = {
+                **counts,
+                "queued": sum(1 for job in active if job.status == JobStatus.QUEUED),
+                "running": sum(1 for job in active if job.status == JobStatus.RUNNING),
+            }
+        return {"types": by_type, "tracked": len(self._jobs)}
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+LLM呼叫延遲追蹤
+依呼叫類型維護滾動百分位數，推導自適應逾時與對沖（hedge）延遲
+
+逾時的呼叫以當時套用的逾時秒數計入樣本（實際耗時至少如此），延遲整體變慢時
+推導出的逾時會跟著放寬；連續逾時達 max_consecutive_timeouts 次則改用 max_timeout，
+直到再有呼叫成功。
+"""
+
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """取已排序數列的百分位數（最近秩法）；空數列回傳 0"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(q * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+class LatencyTracker:
+    """各呼叫類型的滾動延遲統計"""
+
+    def __init__(
+        self,
+        default_timeout: float,
+        window: int = 200,
+        min_samples: int = 20,
+        multiplier: float = 3.0,
+        min_timeout: float = 5.0,
+        max_timeout: float = 120.0,
+        max_consecutive_timeouts: int = 3,
+    ):
+        """初始化追蹤器
+
+        樣本數不足 min_samples 時，逾時沿用 default_timeout 且不做對沖。
+        """
+        self.default_timeout = default_timeout
+        self.window = window
+        self.min_samples = min_samples
+        self.multiplier = multiplier
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.max_consecutive_timeouts = max_consecutive_timeouts
+        self._samples: Dict[str, Deque[float]] = {}
+        self._timeouts: Dict[str, int] = {}
+        self._consecutive_timeouts: Dict[str, int] = {}
+
+    def _append(self, call_type: str, seconds: float) -> None:
+        samples = self._samples.get(call_type)
+        if samples is None:
+            samples = self._samples[call_type] = deque(maxlen=self.window)
+        samples.append(seconds)
+
+    def record(self, call_type: str, seconds: float) -> None:
+        """記錄一次成功呼叫的耗時"""
+        self._append(call_type, seconds)
+        self._consecutive_timeouts[call_type] = 0
+
+    def record_timeout(self, call_type: str, timeout: Optional[float] = None) -> None:
+        """記錄一次逾時；timeout 為當時套用的逾時秒數，計入樣本"""
+        self._timeouts[call_type] = self._timeouts.get(call_type, 0) + 1
+        self._consecutive_timeouts[call_type] = (
+            self._consecutive_timeouts.get(call_type, 0) + 1
+        )
+        if timeout is not None:
+            self._append(call_type, timeout)
+
+    def quantile(self, call_type: str, q: float) -> Optional[float]:
+        """取得指定百分位數；樣本不足回傳 None"""
+        samples = self._samples.get(call_type)
+        if not samples or len(samples) < self.min_samples:
+            return None
+        return percentile(sorted(samples), q)
+
+    def timeout_for(self, call_type: str) -> float:
+        """以 p99 × multiplier 推導逾時，並限制在 [min_timeout, max_timeout]"""
+        if (
+            self.max_consecutive_timeouts
+            and self._consecutive_timeouts.get(call_type, 0)
+            >= self.max_consecutive_timeouts
+        ):
+            return self.max_timeout
+        p99 = self.quantile(call_type, 0.99)
+        if p99 is None:
+            return self.default_timeout
+        return max(self.min_timeout, min(self.max_timeout, p99 * self.multiplier))
+
+    def hedge_delay(self, call_type: str) -> Optional[float]:
+        """對沖延遲：超過該類型 p95 仍未完成才送出備援請求"""
+        return self.quantile(call_type, 0.95)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """獲取各呼叫類型的延遲統計"""
+        stats = {}
+        for call_type, samples in self._samples.items():
+            ordered = sorted(samples)
+            stats[call_type] = {
+                "samples": len(ordered),
+                "p50_ms": round(percentile(ordered, 0.50) * 1000, 1),
+                "p95_ms": round(percentile(ordered, 0.95) * 1000, 1),
+                "p99_ms": round(percentile(ordered, 0.99) * 1000, 1),
+                "timeouts": self._timeouts.get(call_type, 0),
+                "timeout_s": round(self.timeout_for(call_type), 2),
+            }
+        for call_type, count in self._timeouts.items():
+            if call_type not in stats:
+                stats[call_type] = {"samples": 0, "timeouts": count}
+        return stats
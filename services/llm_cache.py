@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+LLM回應快取
+記憶體 LRU（含 TTL）＋ SQLite 持久層，可跨重啟與多個 uvicorn worker 共用
+
+事件迴圈內請使用 get_async / set_async：記憶體層直接處理，SQLite 讀寫交給執行緒，
+其他 worker 持有寫入鎖時不會阻塞事件迴圈。
+SQLite 層定期清除過期項目，超過 max_disk_entries 時再刪除最早寫入的項目。
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def make_cache_key(
+    model: str,
+    prompt: str,
+    system: Optional[str],
+    temperature: float,
+    num_predict: int,
+    response_format: Any = None,
+) -> str:
+    """以 (model, prompt, system, temperature, num_predict[, format]) 產生穩定的快取鍵"""
+    parts = [model, prompt, system or "", float(temperature), int(num_predict)]
+    if response_format is not None:
+        parts.append(response_format)
+    raw = json.dumps(
+        parts,
+        ensure_ascii=False,
+        separators=(",", ":"),
+        sort_keys=True,
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """兩層式LLM回應快取"""
+
+    def __init__(
+        self,
+        max_entries: int = 512,
+        ttl: float = 3600.0,
+        db_path: Optional[str] = None,
+        max_disk_entries: int = 0,
+    ):
+        """初始化快取
+
+        db_path 為空時僅使用記憶體層；max_disk_entries 為 0 時不限制 SQLite 層筆數。
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.db_path = db_path
+        self.max_disk_entries = max_disk_entries
+
+        self._memory: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # SQLite 連線跨執行緒共用，另以獨立的鎖序列化，避免記憶體層等待磁碟 I/O
+        self._db_lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._sets_since_purge = 0
+
+        self.stats: Dict[str, int] = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "sets": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "disk_evictions": 0,
+            "disk_errors": 0,
+        }
+
+        if db_path:
+            self._open_db(db_path)
+
+    def _open_db(self, db_path: str) -> None:
+        """開啟 SQLite 持久層（WAL 模式，允許多程序同時讀寫）"""
+        try:
+            Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(
+                db_path, timeout=5.0, check_same_thread=False, isolation_level=None
+            )
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    response TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    created_at REAL NOT NULL DEFAULT 0
+                )
+                """
+            )
+            # 舊版資料表沒有 created_at：補上欄位（既有項目視為最早寫入）
+            columns = {
+                row[1] for row in self._db.execute("PRAGMA table_info(llm_cache)")
+            }
+            if "created_at" not in columns:
+                self._db.execute(
+                    "ALTER TABLE llm_cache ADD COLUMN created_at REAL NOT NULL DEFAULT 0"
+                )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS idx_llm_cache_expires ON llm_cache(expires_at)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS idx_llm_cache_created ON llm_cache(created_at)"
+            )
+            logger.info(f"LLM快取持久層已開啟: {db_path}")
+        except Exception as e:
+            logger.error(f"開啟LLM快取持久層失敗，僅使用記憶體快取: {e}")
+            self._db = None
+
+    def _get_memory(self, key: str, now: float) -> Optional[str]:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            response, expires_at = entry
+            if expires_at > now:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return response
+            del self._memory[key]
+            self.stats["expirations"] += 1
+            return None
+
+    def _get_disk(self, key: str, now: float) -> Optional[str]:
+        """查詢 SQLite 並回填記憶體；未命中時計入 misses"""
+        row = None
+        if self._db is not None:
+            try:
+                with self._db_lock:
+                    row = self._db.execute(
+                        "SELECT response, expires_at FROM llm_cache WHERE key = ?",
+                        (key,),
+                    ).fetchone()
+            except sqlite3.Error as e:
+                logger.warning(f"讀取LLM快取持久層失敗: {e}")
+                with self._lock:
+                    self.stats["disk_errors"] += 1
+        with self._lock:
+            if row is not None and row[1] > now:
+                self._store_memory(key, row[0], row[1])
+                self.stats["disk_hits"] += 1
+                return row[0]
+            self.stats["misses"] += 1
+            return None
+
+    def get(self, key: str) -> Optional[str]:
+        """讀取快取；記憶體未命中時查詢 SQLite 並回填記憶體"""
+        now = time.time()
+        response = self._get_memory(key, now)
+        if response is not None:
+            return response
+        return self._get_disk(key, now)
+
+    async def get_async(self, key: str) -> Optional[str]:
+        """同 get，但 SQLite 查詢在執行緒中進行"""
+        now = time.time()
+        response = self._get_memory(key, now)
+        if response is not None:
+            return response
+        if self._db is None:
+            # 沒有持久層時不涉及 I/O，只記錄未命中
+            return self._get_disk(key, now)
+        return await asyncio.to_thread(self._get_disk, key, now)
+
+    def _set_memory(self, key: str, response: str) -> float:
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._store_memory(key, response, expires_at)
+            self.stats["sets"] += 1
+        return expires_at
+
+    def _set_disk(self, key: str, response: str, expires_at: float) -> None:
+        if self._db is None:
+            return
+        try:
+            with self._db_lock:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO llm_cache "
+                    "(key, response, expires_at, created_at) VALUES (?, ?, ?, ?)",
+                    (key, response, expires_at, time.time()),
+                )
+                self._sets_since_purge += 1
+                if self._sets_since_purge >= 100:
+                    self._purge_expired_locked()
+        except sqlite3.Error as e:
+            logger.warning(f"寫入LLM快取持久層失敗: {e}")
+            with self._lock:
+                self.stats["disk_errors"] += 1
+
+    def set(self, key: str, response: str) -> None:
+        """寫入快取（記憶體與 SQLite）"""
+        expires_at = self._set_memory(key, response)
+        self._set_disk(key, response, expires_at)
+
+    async def set_async(self, key: str, response: str) -> None:
+        """同 set，但 SQLite 寫入在執行緒中進行"""
+        expires_at = self._set_memory(key, response)
+        if self._db is not None:
+            await asyncio.to_thread(self._set_disk, key, response, expires_at)
+
+    def _store_memory(self, key: str, response: str, expires_at: float) -> None:
+        self._memory[key] = (response, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def _purge_expired_locked(self) -> None:
+        """刪除過期項目並刪除超出 max_disk_entries 的最舊項目（呼叫端須持有 _db_lock）"""
+        self._sets_since_purge = 0
+        self._db.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (time.time(),))
+        if self.max_disk_entries:
+            cursor = self._db.execute(
+                "DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache "
+                "ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_disk_entries,),
+            )
+            if cursor.rowcount > 0:
+                with self._lock:
+                    self.stats["disk_evictions"] += cursor.rowcount
+
+    def clear(self) -> None:
+        """清除所有快取"""
+        with self._lock:
+            self._memory.clear()
+        with self._db_lock:
+            if self._db is not None:
+                try:
+                    self._db.execute("DELETE FROM llm_cache")
+                except sqlite3.Error as e:
+                    logger.warning(f"清除LLM快取持久層失敗: {e}")
+
+    def close(self) -> None:
+        """關閉 SQLite 連線"""
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """獲取快取統計"""
+        with self._lock:
+            hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+            lookups = hits + self.stats["misses"]
+            return {
+                **self.stats,
+                "hits": hits,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "max_entries": self.max_entries,
+                "max_disk_entries": self.max_disk_entries,
+                "ttl": self.ttl,
+                "persistent": self._db is not None,
+            }
@@ -4,49 +4,464 @@
 整合Ollama服務，提供統一的AI模型調用介面
 """
 
+import hashlib
 import json
 import logging
 import asyncio
-from typing import Any, Dict, List
+import itertools
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from enum import Enum
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Deque,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+    Type,
+)
 import aiohttp
-import requests
 
-from config import OLLAMA_HOST, OLLAMA_PORT, OLLAMA_DEFAULT_MODEL, OLLAMA_TIMEOUT
+from config import (
+    OLLAMA_HOST,
+    OLLAMA_PORT,
+    OLLAMA_DEFAULT_MODEL,
+    OLLAMA_TIMEOUT,
+    OLLAMA_BACKENDS,
+    OLLAMA_HEALTH_INTERVAL,
+    OLLAMA_FAILURE_THRESHOLD,
+    HEALTH_DEEP_CHECK_MIN_INTERVAL,
+    OLLAMA_POOL_LIMIT,
+    OLLAMA_POOL_LIMIT_PER_HOST,
+    OLLAMA_DNS_CACHE_TTL,
+    OLLAMA_KEEPALIVE_TIMEOUT,
+    LLM_CACHE_ENABLED,
+    LLM_CACHE_MAX_ENTRIES,
+    LLM_CACHE_TTL,
+    LLM_CACHE_DB_PATH,
+    LLM_CACHE_MAX_DISK_ENTRIES,
+    LLM_MAX_CONCURRENT,
+    LLM_PRIORITY_AGING_SECONDS,
+    LLM_ADAPTIVE_TIMEOUT,
+    LLM_LATENCY_WINDOW,
+    LLM_LATENCY_MIN_SAMPLES,
+    LLM_TIMEOUT_MULTIPLIER,
+    LLM_TIMEOUT_MIN,
+    LLM_TIMEOUT_MAX,
+    LLM_HEDGING,
+    LLM_HEDGE_MAX_RATIO,
+    LLM_SESSION_CONTEXT_MAX_TOKENS,
+)
+from services.llm_cache import LLMResponseCache, make_cache_key
+from services.single_flight import SingleFlight
+from services.ollama_pool import OllamaBackend, OllamaBackendPool, parse_backend_urls
+from services.latency_tracker import LatencyTracker, percentile
+from models.unified_models import LLMContextState
+from pydantic import BaseModel, ValidationError
 
 logger = logging.getLogger(__name__)
 
 
+class LLMRequestError(Exception):
+    """Ollama 回應非 200 或串流中回報錯誤"""
+
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+
+
+class LLMPriority(str, Enum):
+    """生成請求優先級"""
+
+    INTERACTIVE = "interactive"  # 阻塞使用者回覆的呼叫
+    NORMAL = "normal"
+    BACKGROUND = "background"  # 可延後的長篇生成
+
+
+_PRIORITY_RANK = {
+    LLMPriority.INTERACTIVE: 0,
+    LLMPriority.NORMAL: 1,
+    LLMPriority.BACKGROUND: 2,
+}
+
+
+@lru_cache(maxsize=None)
+def _json_schema_text(schema: Type[BaseModel]) -> str:
+    return json.dumps(schema.model_json_schema(), ensure_ascii=False)
+
+
+def json_schema_for(schema: Type[BaseModel]) -> Dict[str, Any]:
+    """取得 pydantic 模型的 JSON Schema（供 Ollama format 參數使用）"""
+    return json.loads(_json_schema_text(schema))
+
+
+def parse_structured(schema: Type[BaseModel], text: str) -> Optional[BaseModel]:
+    """將 LLM 輸出驗證為 schema 物件；失敗回傳 None
+
+    受 format 約束的輸出應為純 JSON；舊版 Ollama 忽略 format 時，
+    退而截取第一個 JSON 物件再驗證。
+    """
+    if not text:
+        return None
+    try:
+        return schema.model_validate_json(text)
+    except ValidationError:
+        pass
+    start, end = text.find("{"), text.rfind("}") + 1
+    if start < 0 or end <= start:
+        return None
+    try:
+        return schema.model_validate_json(text[start:end])
+    except ValidationError:
+        return None
+
+
+class LLMScheduler:
+    """Ollama 前的准入排程器
+
+    - 同時進行的生成數量受 max_concurrent 限制
+    - 各優先級內 FIFO；跨優先級以「等級 - 等待秒數 / aging_seconds」選出下一個，
+      避免低優先級請求被長期餓死
+    """
+
+    def __init__(self, max_concurrent: int = 2, aging_seconds: float = 10.0):
+        """初始化排程器"""
+        self.max_concurrent = max(1, max_concurrent)
+        self.aging_seconds = aging_seconds
+        self.in_flight = 0
+        self._seq = itertools.count()
+        self._queues: Dict[LLMPriority, Deque[Tuple[int, float, asyncio.Future]]] = {
+            p: deque() for p in LLMPriority
+        }
+        self._wait_times: Dict[LLMPriority, Deque[float]] = {
+            p: deque(maxlen=200) for p in LLMPriority
+        }
+        self._admitted: Dict[LLMPriority, int] = {p: 0 for p in LLMPriority}
+
+    @asynccontextmanager
+    async def slot(self, priority: LLMPriority = LLMPriority.NORMAL):
+        """取得一個生成名額，離開時釋放"""
+        await self._acquire(LLMPriority(priority))
+        try:
+            yield
+        finally:
+            self._release()
+
+    async def _acquire(self, priority: LLMPriority) -> None:
+        enqueued_at = time.monotonic()
+        if self.in_flight < self.max_concurrent and not self.queue_depth():
+            self._admit(priority, enqueued_at)
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (next(self._seq), enqueued_at, future)
+        self._queues[priority].append(entry)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # 已被授予名額但呼叫者離開，交還名額
+                self._release()
+            else:
+                self._queues[priority].remove(entry)
+            raise
+        self._admit(priority, enqueued_at, counted=True)
+
+    def _admit(
+        self, priority: LLMPriority, enqueued_at: float, counted: bool = False
+    ) -> None:
+        if not counted:
+            self.in_flight += 1
+        self._admitted[priority] += 1
+        self._wait_times[priority].append(time.monotonic() - enqueued_at)
+
+    def _release(self) -> None:
+        self.in_flight -= 1
+        self._grant_next()
+
+    def _grant_next(self) -> None:
+        while self.in_flight < self.max_concurrent:
+            chosen = self._pick_next()
+            if chosen is None:
+                return
+            _, _, future = self._queues[chosen].popleft()
+            if future.done():
+                continue
+            # 先佔用名額，等待者醒來後不再重複計數
+            self.in_flight += 1
+            future.set_result(None)
+
+    def _pick_next(self) -> Optional[LLMPriority]:
+        now = time.monotonic()
+        best: Optional[LLMPriority] = None
+        best_key: Optional[Tuple[float, int]] = None
+        for priority, queue in self._queues.items():
+            if not queue:
+                continue
+            seq, enqueued_at, _ = queue[0]
+            waited = now - enqueued_at
+            effective = _PRIORITY_RANK[priority] - (
+                waited / self.aging_seconds if self.aging_seconds > 0 else 0.0
+            )
+            key = (effective, seq)
+            if best_key is None or key < best_key:
+                best, best_key = priority, key
+        return best
+
+    def queue_depth(self, priority: Optional[LLMPriority] = None) -> int:
+        """排隊中的請求數"""
+        if priority is not None:
+            return len(self._queues[LLMPriority(priority)])
+        return sum(len(q) for q in self._queues.values())
+
+    def get_stats(self) -> Dict[str, Any]:
+        """獲取排程統計（佇列深度與等待時間）"""
+        classes = {}
+        for priority in LLMPriority:
+            waits = sorted(self._wait_times[priority])
+            classes[priority.value] = {
+                "queue_depth": len(self._queues[priority]),
+                "admitted": self._admitted[priority],
+                "wait_avg_ms": (
+                    round(sum(waits) / len(waits) * 1000, 1) if waits else 0.0
+                ),
+                "wait_p95_ms": round(percentile(waits, 0.95) * 1000, 1),
+                "wait_max_ms": round(waits[-1] * 1000, 1) if waits else 0.0,
+            }
+        return {
+            "max_concurrent": self.max_concurrent,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth(),
+            "aging_seconds": self.aging_seconds,
+            "classes": classes,
+        }
+
+
 class LLMClient:
     """統一的LLM客戶端"""
 
-    def __init__(self, host: str = None, port: int = None, model: str = None):
-        """初始化LLM客戶端"""
+    def __init__(
+        self,
+        host: str = None,
+        port: int = None,
+        model: str = None,
+        cache: Optional[LLMResponseCache] = None,
+        backends: Optional[List[str]] = None,
+    ):
+        """初始化LLM客戶端
+
+        cache: 自訂回應快取；未提供時依 config 建立預設快取（LLM_CACHE_ENABLED）。
+        backends: Ollama 節點 URL 清單；未提供時使用 OLLAMA_BACKENDS，
+            若明確指定 host/port 則只使用該節點。
+        """
         self.host = host or OLLAMA_HOST
         self.port = port or OLLAMA_PORT
         self.model = model or OLLAMA_DEFAULT_MODEL
-        self.base_url = f"http://{self.host}:{self.port}"
         self.timeout = OLLAMA_TIMEOUT
 
-        # 健康狀態
-        self.healthy = False
+        # 後端池（第一個節點作為模型清單等管理查詢的主節點）
+        if backends is None:
+            spec = "" if (host or port) else OLLAMA_BACKENDS
+            backends = parse_backend_urls(spec, self.host, self.port)
+        self.pool = OllamaBackendPool(
+            backends,
+            failure_threshold=OLLAMA_FAILURE_THRESHOLD,
+            probe_interval=OLLAMA_HEALTH_INTERVAL,
+        )
+        self.base_url = self.pool.primary.base_url
+
+        # 回應快取
+        if cache is None and LLM_CACHE_ENABLED:
+            cache = LLMResponseCache(
+                max_entries=LLM_CACHE_MAX_ENTRIES,
+                ttl=LLM_CACHE_TTL,
+                db_path=LLM_CACHE_DB_PATH or None,
+                max_disk_entries=LLM_CACHE_MAX_DISK_ENTRIES,
+            )
+        self.cache = cache
+
+        # 相同請求指紋的並行呼叫合併為一次生成
+        self._single_flight = SingleFlight()
+
+        # 各呼叫類型的延遲追蹤（自適應逾時與對沖）
+        self.latency = LatencyTracker(
+            default_timeout=self.timeout,
+            window=LLM_LATENCY_WINDOW,
+            min_samples=LLM_LATENCY_MIN_SAMPLES,
+            multiplier=LLM_TIMEOUT_MULTIPLIER,
+            min_timeout=LLM_TIMEOUT_MIN,
+            max_timeout=LLM_TIMEOUT_MAX,
+        )
+        self.adaptive_timeout = LLM_ADAPTIVE_TIMEOUT
+        self.hedging = LLM_HEDGING
+        self.hedge_max_ratio = LLM_HEDGE_MAX_RATIO
+        self.hedge_stats: Dict[str, int] = {
+            "dispatched": 0,
+            "hedged": 0,
+            "hedge_wins": 0,
+        }
+
+        # 結構化輸出統計（依 schema 名稱）
+        self.structured_stats: Dict[str, Dict[str, int]] = {}
+
+        # 會話上下文沿用統計
+        self.context_max_tokens = LLM_SESSION_CONTEXT_MAX_TOKENS
+        self.context_stats: Dict[str, int] = {
+            "reused": 0,
+            "full_prefill": 0,
+            "invalidated": 0,
+            "prompt_eval_tokens": 0,
+        }
+
+        # 生成准入排程（各 LLMClient 實例各自計數，名額隨節點數擴充）
+        self.scheduler = LLMScheduler(
+            LLM_MAX_CONCURRENT * len(self.pool.backends), LLM_PRIORITY_AGING_SECONDS
+        )
+
+        # 共用連線池（於 start() 建立，close() 釋放；未啟動時首次呼叫會延遲建立）
+        self.pool_limit = OLLAMA_POOL_LIMIT
+        self.pool_limit_per_host = OLLAMA_POOL_LIMIT_PER_HOST
+        self.dns_cache_ttl = OLLAMA_DNS_CACHE_TTL
+        self.keepalive_timeout = OLLAMA_KEEPALIVE_TIMEOUT
+        self._http_session: Optional[aiohttp.ClientSession] = None
+        self._http_loop: Optional[asyncio.AbstractEventLoop] = None
 
-        # 檢查服務可用性
-        self.healthy = self._check_service_availability()
+        # 深度健康檢查（實際生成）限流
+        self.deep_check_min_interval = HEALTH_DEEP_CHECK_MIN_INTERVAL
+        self._deep_check_result: Optional[Dict[str, Any]] = None
+        self._deep_check_at: Optional[float] = None
+        self._deep_check_lock: Optional[asyncio.Lock] = None
 
-    def _check_service_availability(self) -> bool:
-        """檢查Ollama服務可用性"""
+        # 建構時不做任何網路 I/O；可用性由 start() 啟動的背景探測更新
+
+    @property
+    def healthy(self) -> bool:
+        """是否有已探測且健康的節點（尚未完成首次探測時為 False）"""
+        return any(b.healthy and b.last_probe_at is not None for b in self.pool.backends)
+
+    async def start(self) -> None:
+        """建立共用的 HTTP 連線池並啟動節點健康探測（應用啟動時呼叫）"""
+        await self._get_http_session()
+        self.pool.start_probing(self._get_http_session)
+        logger.info(
+            f"Ollama連線池已建立: limit={self.pool_limit}, "
+            f"per_host={self.pool_limit_per_host}, dns_ttl={self.dns_cache_ttl}s, "
+            f"backends={len(self.pool.backends)}"
+        )
+
+    async def close(self) -> None:
+        """停止健康探測並關閉共用的 HTTP 連線池（應用關閉時呼叫）"""
+        await self.pool.stop_probing()
+        session = self._http_session
+        self._http_session = None
+        self._http_loop = None
+        if session is not None and not session.closed:
+            await session.close()
+            logger.info("Ollama連線池已關閉")
+
+    async def _get_http_session(self) -> aiohttp.ClientSession:
+        """取得共用的 HTTP 連線池，必要時（未啟動、已關閉或換了事件迴圈）重新建立"""
+        loop = asyncio.get_running_loop()
+        session = self._http_session
+        if session is not None and not session.closed and self._http_loop is loop:
+            return session
+        stale_loop = self._http_loop
+
+        connector = aiohttp.TCPConnector(
+            limit=self.pool_limit,
+            limit_per_host=self.pool_limit_per_host,
+            ttl_dns_cache=self.dns_cache_ttl,
+            use_dns_cache=True,
+            keepalive_timeout=self.keepalive_timeout,
+        )
+        self._http_session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+        )
+        self._http_loop = loop
+        # 先換上新的連線池再關閉舊的，並行的呼叫不會各自建立一份
+        if session is not None and not session.closed:
+            await self._close_stale_session(session, stale_loop)
+        return self._http_session
+
+    @staticmethod
+    async def _close_stale_session(
+        session: aiohttp.ClientSession, loop: Optional[asyncio.AbstractEventLoop]
+    ) -> None:
+        """關閉屬於其他事件迴圈的舊連線池，避免遺留未關閉的連線"""
+        try:
+            if loop is not None and loop.is_running():
+                # 舊迴圈仍在其他執行緒運作：交由該迴圈關閉
+                asyncio.run_coroutine_threadsafe(session.close(), loop)
+            else:
+                # 舊迴圈已停止，沒有待完成的關閉工作，可在目前迴圈收尾
+                await session.close()
+        except Exception as e:
+            logger.warning(f"關閉舊的Ollama連線池失敗: {e}")
+
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """獲取連線池狀態"""
+        session = self._http_session
+        connector = session.connector if session is not None else None
+        return {
+            "open": session is not None and not session.closed,
+            "limit": self.pool_limit,
+            "limit_per_host": self.pool_limit_per_host,
+            "dns_cache_ttl": self.dns_cache_ttl,
+            "keepalive_timeout": self.keepalive_timeout,
+            "idle_connections": (
+                sum(len(conns) for conns in getattr(connector, "_conns", {}).values())
+                if connector is not None
+                else 0
+            ),
+        }
+
+    async def check_service_availability(self) -> bool:
+        """立即探測所有節點，回傳是否有可用節點"""
         try:
-            response = requests.get(f"{self.base_url}/api/tags", timeout=5)
-            if response.status_code == 200:
+            results = await self.pool.probe_all(await self._get_http_session())
+            if any(results.values()):
                 logger.info("Ollama服務連接正常")
                 return True
-            else:
-                logger.warning(f"Ollama服務回應異常: {response.status_code}")
-                return False
+            logger.warning("沒有可用的Ollama節點")
+            return False
         except Exception as e:
             logger.error(f"無法連接到Ollama服務: {e}")
             return False
 
+    def _build_generate_request(
+        self,
+        prompt: str,
+        model: str = None,
+        temperature: float = 0.7,
+        max_tokens: int = 2000,
+        system_prompt: str = None,
+        response_format: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """構建 /api/generate 請求數據"""
+        request_data = {
+            "model": model or self.model,
+            "prompt": prompt,
+            "stream": False,
+            "options": {"temperature": temperature, "num_predict": max_tokens},
+        }
+
+        # 如果有系統提示詞，添加到選項中
+        if system_prompt:
+            request_data["system"] = system_prompt
+
+        # 以 JSON Schema 約束輸出格式
+        if response_format is not None:
+            request_data["format"] = response_format
+
+        return request_data
+
     async def generate_response(
         self,
         prompt: str,
@@ -54,53 +469,412 @@ class LLMClient:
         temperature: float = 0.7,
         max_tokens: int = 2000,
         system_prompt: str = None,
+        on_token: Optional[Callable[[str], Awaitable[None]]] = None,
+        use_cache: bool = True,
+        priority: LLMPriority = LLMPriority.NORMAL,
+        call_type: str = "generate",
+        raise_on_error: bool = False,
     ) -> str:
-        """生成AI回應"""
-        try:
-            # 構建請求數據
-            request_data = {
-                "model": model or self.model,
-                "prompt": prompt,
-                "stream": False,
-                "options": {"temperature": temperature, "num_predict": max_tokens},
-            }
+        """生成AI回應
 
-            # 如果有系統提示詞，添加到選項中
-            if system_prompt:
-                request_data["system"] = system_prompt
-
-            # 發送請求
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    f"{self.base_url}/api/generate",
-                    json=request_data,
-                    timeout=aiohttp.ClientTimeout(total=self.timeout),
-                ) as response:
-                    if response.status == 200:
-                        result = await response.json()
-                        return result.get("response", "")
-                    else:
-                        error_msg = f"LLM請求失敗: {response.status}"
-                        logger.error(error_msg)
-                        return f"抱歉，AI服務暫時無法回應。錯誤：{error_msg}"
+        若提供 on_token，改以串流方式生成，每個片段到達時即回呼，最後仍回傳完整文字。
+        use_cache=False 可略過回應快取（例如需要多樣性的高溫創意生成）。
+        priority 決定在排程器中的准入順序；合併的請求沿用首個呼叫者的優先級。
+        call_type 用於分類延遲統計，據以推導該類呼叫的逾時與對沖時機。
+        raise_on_error=True 時失敗直接拋出例外，而非回傳道歉文字（背景工作需據以改用備案）。
+        """
+        try:
+            return await self._generate_text(
+                prompt,
+                model,
+                temperature,
+                max_tokens,
+                system_prompt,
+                on_token=on_token,
+                use_cache=use_cache,
+                priority=priority,
+                call_type=call_type,
+            )
 
         except asyncio.TimeoutError:
             error_msg = "LLM請求超時"
             logger.error(error_msg)
+            if raise_on_error:
+                raise
             return f"抱歉，AI回應超時，請稍後再試。"
+        except LLMRequestError as e:
+            error_msg = str(e)
+            logger.error(error_msg)
+            if raise_on_error:
+                raise
+            return f"抱歉，AI服務暫時無法回應。錯誤：{error_msg}"
         except Exception as e:
             error_msg = f"LLM請求異常: {str(e)}"
             logger.error(error_msg)
+            if raise_on_error:
+                raise
             return f"抱歉，AI服務出現異常：{str(e)}"
 
+    async def generate_structured(
+        self,
+        prompt: str,
+        schema: Type[BaseModel],
+        model: str = None,
+        temperature: float = 0.3,
+        max_tokens: int = 2000,
+        on_token: Optional[Callable[[str], Awaitable[None]]] = None,
+        use_cache: bool = True,
+        priority: LLMPriority = LLMPriority.NORMAL,
+        call_type: str = "structured",
+    ) -> Optional[BaseModel]:
+        """以 schema 的 JSON Schema 約束 Ollama 輸出（format 參數），回傳驗證後的物件
+
+        請求失敗或輸出無法通過驗證時回傳 None，由呼叫端使用預設值；
+        只有通過驗證的輸出才會寫入回應快取。
+        """
+        stats = self.structured_stats.setdefault(
+            schema.__name__, {"requests": 0, "parsed": 0, "parse_failures": 0, "errors": 0}
+        )
+        stats["requests"] += 1
+
+        try:
+            text = await self._generate_text(
+                prompt,
+                model,
+                temperature,
+                max_tokens,
+                on_token=on_token,
+                use_cache=use_cache,
+                priority=priority,
+                call_type=call_type,
+                response_format=json_schema_for(schema),
+                cache_if=lambda t: parse_structured(schema, t) is not None,
+            )
+        except Exception as e:
+            stats["errors"] += 1
+            logger.error(f"結構化生成失敗（{schema.__name__}）: {e}")
+            return None
+
+        parsed = parse_structured(schema, text)
+        if parsed is None:
+            stats["parse_failures"] += 1
+            logger.warning(f"結構化輸出未通過驗證（{schema.__name__}）: {text[:80]!r}")
+        else:
+            stats["parsed"] += 1
+        return parsed
+
+    async def _generate_text(
+        self,
+        prompt: str,
+        model: str = None,
+        temperature: float = 0.7,
+        max_tokens: int = 2000,
+        system_prompt: str = None,
+        on_token: Optional[Callable[[str], Awaitable[None]]] = None,
+        use_cache: bool = True,
+        priority: LLMPriority = LLMPriority.NORMAL,
+        call_type: str = "generate",
+        response_format: Optional[Dict[str, Any]] = None,
+        cache_if: Optional[Callable[[str], bool]] = None,
+    ) -> str:
+        """查詢快取、合併並送出生成請求；失敗時拋出例外"""
+        # 構建請求數據
+        request_data = self._build_generate_request(
+            prompt, model, temperature, max_tokens, system_prompt, response_format
+        )
+
+        fingerprint = make_cache_key(
+            request_data["model"],
+            prompt,
+            system_prompt,
+            temperature,
+            max_tokens,
+            response_format,
+        )
+
+        # 查詢快取
+        if use_cache and self.cache is not None:
+            cached = await self.cache.get_async(fingerprint)
+            if cached is not None:
+                if on_token is not None:
+                    await on_token(cached)
+                return cached
+
+        if on_token is not None:
+            # 串流呼叫各自需要自己的 token 流，不做合併
+            result = await self._dispatch_generate(
+                request_data, on_token, priority, call_type
+            )
+        else:
+            # 相同指紋的並行呼叫共用同一個進行中的生成
+            result = await self._single_flight.run(
+                fingerprint,
+                lambda: self._dispatch_generate(
+                    request_data, priority=priority, call_type=call_type
+                ),
+            )
+        text = result.get("response", "")
+
+        if (
+            use_cache
+            and self.cache is not None
+            and text
+            and (cache_if is None or cache_if(text))
+        ):
+            await self.cache.set_async(fingerprint, text)
+
+        return text
+
+    async def _dispatch_generate(
+        self,
+        request_data: Dict[str, Any],
+        on_token: Optional[Callable[[str], Awaitable[None]]] = None,
+        priority: LLMPriority = LLMPriority.NORMAL,
+        call_type: str = "generate",
+    ) -> Dict[str, Any]:
+        """實際送出生成請求，回傳 Ollama 的完整結果；失敗時拋出例外由呼叫端處理"""
+        if on_token is not None:
+            chunks: List[str] = []
+            final: Dict[str, Any] = {}
+            async for chunk in self._stream_request(request_data, priority, final):
+                chunks.append(chunk)
+                await on_token(chunk)
+            return {**final, "response": "".join(chunks)}
+
+        async with self.scheduler.slot(priority):
+            self.hedge_stats["dispatched"] += 1
+            timeout = self._timeout_for(call_type)
+            tried: set = set()
+            primary = asyncio.ensure_future(
+                self._post_with_failover(request_data, timeout, call_type, tried)
+            )
+            try:
+                hedge_delay = self._hedge_delay_for(call_type)
+                if hedge_delay is None:
+                    return await primary
+
+                done, _ = await asyncio.wait({primary}, timeout=hedge_delay)
+                if done:
+                    return primary.result()
+
+                backend = self.pool.pick_alternative(request_data["model"], tried)
+                if backend is None:
+                    return await primary
+                return await self._race_hedge(
+                    primary, backend, request_data, timeout, call_type
+                )
+            finally:
+                if not primary.done():
+                    primary.cancel()
+
+    def _timeout_for(self, call_type: str) -> float:
+        """此呼叫類型目前的逾時秒數"""
+        if not self.adaptive_timeout:
+            return self.timeout
+        return self.latency.timeout_for(call_type)
+
+    def _hedge_delay_for(self, call_type: str) -> Optional[float]:
+        """回傳對沖延遲；未啟用、節點不足或超出對沖額度時回傳 None"""
+        if not self.hedging or len(self.pool.healthy_backends()) < 2:
+            return None
+        budget = self.hedge_max_ratio * self.hedge_stats["dispatched"]
+        if self.hedge_stats["hedged"] >= budget:
+            return None
+        return self.latency.hedge_delay(call_type)
+
+    async def _race_hedge(
+        self,
+        primary: asyncio.Future,
+        backend: OllamaBackend,
+        request_data: Dict[str, Any],
+        timeout: float,
+        call_type: str,
+    ) -> Dict[str, Any]:
+        """主請求超過 p95 仍未完成時，對另一節點送出相同請求，取先成功者"""
+        self.hedge_stats["hedged"] += 1
+        logger.info(f"LLM請求超過p95，對沖至節點: {backend.base_url}")
+        hedge = asyncio.ensure_future(
+            self._post_on_backend(backend, request_data, timeout, call_type)
+        )
+        pending = {primary, hedge}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self.hedge_stats["hedge_wins"] += 1
+                        return task.result()
+                if not pending:
+                    # 兩者皆失敗：以主請求的錯誤為準
+                    return primary.result()
+        finally:
+            for task in (primary, hedge):
+                if not task.done():
+                    task.cancel()
+
+    async def _post_with_failover(
+        self,
+        request_data: Dict[str, Any],
+        timeout: float,
+        call_type: str,
+        tried: set,
+    ) -> Dict[str, Any]:
+        """送出非串流請求；連線層失敗時改送其他節點（tried 記錄已嘗試的節點）"""
+        while True:
+            backend = self.pool.pick(request_data["model"], tried)
+            tried.add(backend.base_url)
+            try:
+                return await self._post_on_backend(
+                    backend, request_data, timeout, call_type
+                )
+            except aiohttp.ClientConnectionError:
+                # 連線層失敗（請求未被處理）可安全改送其他節點
+                if len(tried) >= len(self.pool.backends):
+                    raise
+                logger.warning(f"Ollama節點連線失敗，改送其他節點: {backend.base_url}")
+
+    async def _post_on_backend(
+        self,
+        backend: OllamaBackend,
+        request_data: Dict[str, Any],
+        timeout: float,
+        call_type: str,
+    ) -> Dict[str, Any]:
+        """對指定節點送出請求並記錄延遲"""
+        started = time.monotonic()
+        try:
+            async with self._use_backend(backend):
+                result = await self._post_generate(backend, request_data, timeout)
+        except asyncio.TimeoutError:
+            self.latency.record_timeout(call_type, timeout)
+            raise
+        self.latency.record(call_type, time.monotonic() - started)
+        return result
+
+    async def _post_generate(
+        self, backend: OllamaBackend, request_data: Dict[str, Any], timeout: float
+    ) -> Dict[str, Any]:
+        """對指定節點送出非串流生成請求（重用共用連線池）"""
+        session = await self._get_http_session()
+        async with session.post(
+            f"{backend.base_url}/api/generate",
+            json=request_data,
+            timeout=aiohttp.ClientTimeout(total=timeout),
+        ) as response:
+            if response.status != 200:
+                raise LLMRequestError(
+                    f"LLM請求失敗: {response.status}", status=response.status
+                )
+            return await response.json()
+
+    @asynccontextmanager
+    async def _use_backend(self, backend: OllamaBackend):
+        """記錄節點的負載與成敗"""
+        backend.in_flight += 1
+        backend.total_requests += 1
+        try:
+            yield backend
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self.pool.mark_failure(backend, str(e) or type(e).__name__)
+            raise
+        except LLMRequestError as e:
+            # 4xx（例如模型不存在）是請求問題，不影響節點健康
+            if e.status is None or e.status >= 500:
+                self.pool.mark_failure(backend, str(e))
+            raise
+        else:
+            self.pool.mark_success(backend)
+        finally:
+            backend.in_flight -= 1
+
+    async def stream_response(
+        self,
+        prompt: str,
+        model: str = None,
+        temperature: float = 0.7,
+        max_tokens: int = 2000,
+        system_prompt: str = None,
+        priority: LLMPriority = LLMPriority.INTERACTIVE,
+    ) -> AsyncIterator[str]:
+        """串流生成AI回應，逐一產出 Ollama 回傳的文字片段
+
+        連線或狀態碼錯誤會直接拋出，由呼叫端決定如何回退。
+        """
+        request_data = self._build_generate_request(
+            prompt, model, temperature, max_tokens, system_prompt
+        )
+        async for chunk in self._stream_request(request_data, priority):
+            yield chunk
+
+    async def _stream_request(
+        self,
+        request_data: Dict[str, Any],
+        priority: LLMPriority = LLMPriority.INTERACTIVE,
+        final: Optional[Dict[str, Any]] = None,
+    ) -> AsyncIterator[str]:
+        """以串流模式送出生成請求
+
+        提供 final 時，結束片段（done=true，含 context 與計時欄位）會寫入其中。
+        """
+        request_data = {**request_data, "stream": True}
+
+        async with self.scheduler.slot(priority):
+            backend = self.pool.pick(request_data["model"])
+            async with self._use_backend(backend):
+                async for chunk in self._stream_post(backend, request_data, final):
+                    yield chunk
+
+    async def _stream_post(
+        self,
+        backend: OllamaBackend,
+        request_data: Dict[str, Any],
+        final: Optional[Dict[str, Any]] = None,
+    ) -> AsyncIterator[str]:
+        """送出串流 POST 並解析 NDJSON 片段"""
+        session = await self._get_http_session()
+        async with session.post(
+            f"{backend.base_url}/api/generate",
+            json=request_data,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+        ) as response:
+            if response.status != 200:
+                raise LLMRequestError(
+                    f"LLM串流請求失敗: {response.status}", status=response.status
+                )
+
+            # Ollama 以 NDJSON 逐行回傳 {"response": "...", "done": false}
+            async for line in response.content:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    chunk = json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f"無法解析串流片段: {line[:80]!r}")
+                    continue
+                if chunk.get("error"):
+                    raise LLMRequestError(f"LLM串流錯誤: {chunk['error']}")
+                text = chunk.get("response", "")
+                if text:
+                    yield text
+                if chunk.get("done"):
+                    if final is not None:
+                        final.update(chunk)
+                    break
+
     async def generate_structured_response(
         self,
         prompt: str,
         expected_format: str = "JSON",
         model: str = None,
         temperature: float = 0.3,
+        priority: LLMPriority = LLMPriority.NORMAL,
+        call_type: str = "structured",
     ) -> Dict[str, Any]:
-        """生成結構化回應"""
+        """生成結構化回應（經由 generate_response，同樣享有快取與並行合併）"""
         try:
             # 添加格式要求到提示詞
             formatted_prompt = f"""
@@ -111,7 +885,11 @@ class LLMClient:
 
             # 生成回應
             response = await self.generate_response(
-                formatted_prompt, model=model, temperature=temperature
+                formatted_prompt,
+                model=model,
+                temperature=temperature,
+                priority=priority,
+                call_type=call_type,
             )
 
             # 嘗試解析結構化回應
@@ -156,32 +934,120 @@ class LLMClient:
         messages: List[Dict[str, str]],
         model: str = None,
         temperature: float = 0.7,
+        context_state: Optional[LLMContextState] = None,
+        on_token: Optional[Callable[[str], Awaitable[None]]] = None,
+        priority: LLMPriority = LLMPriority.NORMAL,
+        call_type: str = "chat",
     ) -> str:
-        """聊天完成"""
+        """聊天完成
+
+        提供 context_state 時進入會話模式：沿用上一回合 Ollama 回傳的 context，
+        只送出最後一則助手回覆之後的新訊息，省去重新預填整段對話；
+        模型或系統提示詞改變、或上下文超過上限時重新完整預填。
+        context_state 會就地更新，由呼叫端負責保存。
+        """
         try:
-            # 構建聊天提示詞
-            chat_prompt = ""
-            for message in messages:
-                role = message.get("role", "user")
-                content = message.get("content", "")
-                if role == "system":
-                    chat_prompt += f"系統: {content}\n\n"
-                elif role == "user":
-                    chat_prompt += f"用戶: {content}\n\n"
-                elif role == "assistant":
-                    chat_prompt += f"助手: {content}\n\n"
+            if context_state is None:
+                # 構建聊天提示詞
+                chat_prompt = self._format_chat_messages(messages)
 
-            # 生成回應
-            response = await self.generate_response(
-                chat_prompt, model=model, temperature=temperature
+                # 生成回應
+                return await self.generate_response(
+                    chat_prompt,
+                    model=model,
+                    temperature=temperature,
+                    on_token=on_token,
+                    priority=priority,
+                    call_type=call_type,
+                )
+
+            model = model or self.model
+            system_prompt = "\n\n".join(
+                m.get("content", "") for m in messages if m.get("role") == "system"
             )
+            system_hash = hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()[:16]
+            dialogue = [m for m in messages if m.get("role") != "system"]
 
-            return response
+            last_assistant = max(
+                (i for i, m in enumerate(dialogue) if m.get("role") == "assistant"),
+                default=-1,
+            )
+            reuse = bool(context_state.context) and (
+                context_state.model == model
+                and context_state.system_hash == system_hash
+                and len(context_state.context) <= self.context_max_tokens
+                and last_assistant >= 0
+                and self._produced_reply(
+                    context_state, dialogue[last_assistant].get("content", "")
+                )
+            )
+            if reuse:
+                # 上下文已涵蓋先前的對話，只需預填新訊息
+                dialogue = dialogue[last_assistant + 1 :]
+                self.context_stats["reused"] += 1
+            else:
+                if context_state.context:
+                    logger.info(
+                        "會話上下文失效（模型、系統提示詞、長度變更或對話含其他來源的回覆），重新預填"
+                    )
+                    self.context_stats["invalidated"] += 1
+                self.context_stats["full_prefill"] += 1
+
+            request_data = self._build_generate_request(
+                self._format_chat_messages(dialogue),
+                model,
+                temperature,
+                system_prompt=system_prompt or None,
+            )
+            if reuse:
+                request_data["context"] = context_state.context
+
+            result = await self._dispatch_generate(
+                request_data, on_token, priority, call_type
+            )
+            self.context_stats["prompt_eval_tokens"] += result.get(
+                "prompt_eval_count", 0
+            )
+
+            context_state.model = model
+            context_state.system_hash = system_hash
+            context_state.context = result.get("context") or []
+            context_state.turns = context_state.turns + 1 if reuse else 1
+            reply = result.get("response", "")
+            context_state.reply_chars = len(reply.strip())
+            context_state.reply_hash = self._reply_hash(reply.strip())
+
+            return reply
 
         except Exception as e:
             logger.error(f"聊天完成失敗: {e}")
             return f"抱歉，聊天服務出現異常：{str(e)}"
 
+    @staticmethod
+    def _reply_hash(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+    def _produced_reply(self, context_state: LLMContextState, content: str) -> bool:
+        """歷史中的助手訊息是否為此上下文產生的回覆（允許呼叫端在後面補充內容）"""
+        if not context_state.reply_hash:
+            return False
+        prefix = content.strip()[: context_state.reply_chars]
+        return self._reply_hash(prefix) == context_state.reply_hash
+
+    def _format_chat_messages(self, messages: List[Dict[str, str]]) -> str:
+        """將訊息列表攤平成單一提示詞"""
+        chat_prompt = ""
+        for message in messages:
+            role = message.get("role", "user")
+            content = message.get("content", "")
+            if role == "system":
+                chat_prompt += f"系統: {content}\n\n"
+            elif role == "user":
+                chat_prompt += f"用戶: {content}\n\n"
+            elif role == "assistant":
+                chat_prompt += f"助手: {content}\n\n"
+        return chat_prompt
+
     async def extract_entities(
         self, text: str, entity_types: List[str], model: str = None
     ) -> Dict[str, Any]:
@@ -269,51 +1135,149 @@ class LLMClient:
             logger.error(f"文本摘要失敗: {e}")
             return f"摘要生成失敗：{str(e)}"
 
-    def get_available_models(self) -> List[Dict[str, Any]]:
+    def get_latency_stats(self) -> Dict[str, Any]:
+        """獲取各呼叫類型的延遲、逾時與對沖統計"""
+        return {
+            "adaptive_timeout": self.adaptive_timeout,
+            "hedging": self.hedging,
+            **self.hedge_stats,
+            "call_types": self.latency.get_stats(),
+        }
+
+    def get_structured_stats(self) -> Dict[str, Dict[str, int]]:
+        """獲取各 schema 的結構化輸出解析統計"""
+        return {name: dict(stats) for name, stats in self.structured_stats.items()}
+
+    def get_context_stats(self) -> Dict[str, Any]:
+        """獲取會話上下文沿用統計"""
+        return {**self.context_stats, "max_tokens": self.context_max_tokens}
+
+    def get_backend_stats(self) -> Dict[str, Any]:
+        """獲取 Ollama 節點池狀態"""
+        return self.pool.get_stats()
+
+    def get_scheduler_stats(self) -> Dict[str, Any]:
+        """獲取排程器統計"""
+        return self.scheduler.get_stats()
+
+    def get_coalescing_stats(self) -> Dict[str, int]:
+        """獲取並行請求合併統計"""
+        return self._single_flight.get_stats()
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """獲取回應快取統計"""
+        if self.cache is None:
+            return {"enabled": False}
+        return {"enabled": True, **self.cache.get_stats()}
+
+    async def get_available_models(self) -> List[Dict[str, Any]]:
         """獲取可用模型列表"""
         try:
-            response = requests.get(f"{self.base_url}/api/tags", timeout=5)
-            if response.status_code == 200:
-                data = response.json()
-                return data.get("models", [])
-            else:
-                logger.warning(f"獲取模型列表失敗: {response.status_code}")
+            session = await self._get_http_session()
+            async with session.get(
+                f"{self.base_url}/api/tags", timeout=aiohttp.ClientTimeout(total=5)
+            ) as response:
+                if response.status == 200:
+                    data = await response.json()
+                    return data.get("models", [])
+                logger.warning(f"獲取模型列表失敗: {response.status}")
                 return []
         except Exception as e:
             logger.error(f"獲取模型列表異常: {e}")
             return []
 
-    def get_model_info(self, model_name: str = None) -> Dict[str, Any]:
+    async def get_model_info(self, model_name: str = None) -> Dict[str, Any]:
         """獲取模型資訊"""
         try:
             model = model_name or self.model
-            response = requests.get(
-                f"{self.base_url}/api/show", json={"name": model}, timeout=5
-            )
-            if response.status_code == 200:
-                return response.json()
-            else:
-                logger.warning(f"獲取模型資訊失敗: {response.status_code}")
+            session = await self._get_http_session()
+            async with session.post(
+                f"{self.base_url}/api/show",
+                json={"name": model},
+                timeout=aiohttp.ClientTimeout(total=5),
+            ) as response:
+                if response.status == 200:
+                    return await response.json()
+                logger.warning(f"獲取模型資訊失敗: {response.status}")
                 return {}
         except Exception as e:
             logger.error(f"獲取模型資訊異常: {e}")
             return {}
 
+    def status_snapshot(self) -> Dict[str, Any]:
+        """由背景探測結果組成的狀態快照（不做任何 I/O，可供高頻輪詢）"""
+        now = time.time()
+        probed = [b for b in self.pool.backends if b.last_probe_at is not None]
+        healthy = [b for b in probed if b.healthy]
+        last_probe_at = max((b.last_probe_at for b in probed), default=None)
+        # 探測結果過舊（背景探測停擺）視同未就緒
+        stale = (
+            last_probe_at is None
+            or now - last_probe_at > 3 * self.pool.probe_interval + 5
+        )
+        model_available = any(b.has_model(self.model) for b in healthy)
+        return {
+            "ready": bool(healthy) and model_available and not stale,
+            "model": self.model,
+            "model_available": model_available,
+            "healthy_backends": len(healthy),
+            "total_backends": len(self.pool.backends),
+            "last_probe_age_s": (
+                round(now - last_probe_at, 1) if last_probe_at is not None else None
+            ),
+            "stale": stale,
+        }
+
+    async def deep_health_check(self, force: bool = False) -> Dict[str, Any]:
+        """限流的深度健康檢查（含實際生成）
+
+        間隔 deep_check_min_interval 內重複呼叫直接回傳上次結果；
+        並行呼叫共用同一次檢查。
+        """
+        if self._deep_check_lock is None:
+            self._deep_check_lock = asyncio.Lock()
+        async with self._deep_check_lock:
+            now = time.monotonic()
+            if (
+                not force
+                and self._deep_check_result is not None
+                and now - self._deep_check_at < self.deep_check_min_interval
+            ):
+                return {
+                    **self._deep_check_result,
+                    "cached": True,
+                    "age_s": round(now - self._deep_check_at, 1),
+                }
+
+            result = await self.health_check()
+            self._deep_check_result = result
+            self._deep_check_at = time.monotonic()
+            return {**result, "cached": False, "age_s": 0.0}
+
     async def health_check(self) -> Dict[str, Any]:
-        """健康檢查"""
+        """健康檢查（會實際生成；高頻輪詢請改用 status_snapshot）"""
         try:
             # 檢查服務連接
-            service_ok = self._check_service_availability()
+            service_ok = await self.check_service_availability()
 
             # 檢查模型可用性
-            models = self.get_available_models()
+            models = await self.get_available_models()
             model_ok = len(models) > 0
 
-            # 測試簡單生成
-            test_response = await self.generate_response(
-                "測試", temperature=0.1, max_tokens=10
-            )
-            generation_ok = len(test_response) > 0
+            # 測試簡單生成（失敗會拋出，不以道歉文字當作成功）
+            try:
+                test_response = await self._generate_text(
+                    "測試",
+                    temperature=0.1,
+                    max_tokens=10,
+                    use_cache=False,
+                    priority=LLMPriority.BACKGROUND,
+                    call_type="health",
+                )
+                generation_ok = len(test_response) > 0
+            except Exception as e:
+                logger.warning(f"健康檢查生成失敗: {e}")
+                generation_ok = False
 
             return {
                 "service_status": "healthy" if service_ok else "unhealthy",
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+多節點 Ollama 後端池
+背景探測各節點健康與已載入模型，將請求導向負載最低且具備模型的健康節點
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+
+def parse_backend_urls(spec: str, default_host: str, default_port: int) -> List[str]:
+    """解析 "host:port,host2:port2" 形式的後端清單；為空時使用預設單一節點"""
+    urls = []
+    for item in (spec or "").split(","):
+        item = item.strip().rstrip("/")
+        if not item:
+            continue
+        if not item.startswith(("http://", "https://")):
+            item = f"http://{item}"
+        urls.append(item)
+    return urls or [f"http://{default_host}:{default_port}"]
+
+
+class OllamaBackend:
+    """單一 Ollama 節點的狀態"""
+
+    def __init__(self, base_url: str):
+        """初始化節點"""
+        self.base_url = base_url
+        self.healthy = True
+        self.in_flight = 0
+        self.available_models: Optional[Set[str]] = None  # /api/tags；None 表示尚未得知
+        self.loaded_models: Set[str] = set()  # /api/ps 已常駐記憶體的模型
+        self.consecutive_failures = 0
+        self.total_requests = 0
+        self.total_failures = 0
+        self.last_probe_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    def has_model(self, model: str) -> bool:
+        return self.available_models is None or model in self.available_models
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "base_url": self.base_url,
+            "healthy": self.healthy,
+            "in_flight": self.in_flight,
+            "available_models": (
+                sorted(self.available_models)
+                if self.available_models is not None
+                else None
+            ),
+            "loaded_models": sorted(self.loaded_models),
+            "consecutive_failures": self.consecutive_failures,
+            "total_requests": self.total_requests,
+            "total_failures": self.total_failures,
+            "last_probe_at": self.last_probe_at,
+            "last_error": self.last_error,
+        }
+
+
+class OllamaBackendPool:
+    """Ollama 後端池
+
+    - 路由：健康 → 具備模型（優先已載入）→ 進行中請求最少 → 清單順序
+    - 被動偵測：連續失敗達門檻即移出輪替
+    - 主動偵測：背景定期探測 /api/tags 與 /api/ps，恢復的節點重新加入
+    """
+
+    def __init__(
+        self,
+        base_urls: List[str],
+        failure_threshold: int = 2,
+        probe_interval: float = 15.0,
+        probe_timeout: float = 3.0,
+    ):
+        """初始化後端池"""
+        if not base_urls:
+            raise ValueError("至少需要一個 Ollama 後端")
+        self.backends = [OllamaBackend(url) for url in base_urls]
+        self.failure_threshold = max(1, failure_threshold)
+        self.probe_interval = probe_interval
+        self.probe_timeout = probe_timeout
+        self._probe_task: Optional[asyncio.Task] = None
+
+    @property
+    def primary(self) -> OllamaBackend:
+        return self.backends[0]
+
+    def healthy_backends(self) -> List[OllamaBackend]:
+        return [b for b in self.backends if b.healthy]
+
+    def pick(self, model: str, exclude: Optional[Set[str]] = None) -> OllamaBackend:
+        """選出處理此模型請求的節點"""
+        exclude = exclude or set()
+        candidates = [b for b in self.backends if b.base_url not in exclude]
+        if not candidates:
+            candidates = list(self.backends)
+
+        healthy = [b for b in candidates if b.healthy]
+        with_model = [b for b in healthy if b.has_model(model)]
+        pool = with_model or healthy
+        if not pool:
+            # 全部節點都不健康時仍需嘗試，挑最少連續失敗者
+            return min(candidates, key=lambda b: (b.consecutive_failures, b.in_flight))
+
+        order = {id(b): i for i, b in enumerate(self.backends)}
+        return min(
+            pool,
+            key=lambda b: (
+                model not in b.loaded_models,
+                b.in_flight,
+                order[id(b)],
+            ),
+        )
+
+    def pick_alternative(
+        self, model: str, exclude: Set[str]
+    ) -> Optional[OllamaBackend]:
+        """選出不在 exclude 中、健康且具備模型的節點（供對沖請求使用）；沒有則回傳 None"""
+        candidates = [
+            b
+            for b in self.backends
+            if b.healthy and b.base_url not in exclude and b.has_model(model)
+        ]
+        if not candidates:
+            return None
+        return self.pick(model, exclude)
+
+    def mark_success(self, backend: OllamaBackend) -> None:
+        backend.consecutive_failures = 0
+        if not backend.healthy:
+            logger.info(f"Ollama節點恢復: {backend.base_url}")
+        backend.healthy = True
+
+    def mark_failure(self, backend: OllamaBackend, error: str) -> None:
+        backend.consecutive_failures += 1
+        backend.total_failures += 1
+        backend.last_error = error
+        if backend.healthy and backend.consecutive_failures >= self.failure_threshold:
+            backend.healthy = False
+            logger.warning(f"Ollama節點移出輪替: {backend.base_url}（{error}）")
+
+    async def probe(
+        self, backend: OllamaBackend, session: aiohttp.ClientSession
+    ) -> bool:
+        """探測單一節點：/api/tags 判斷存活與可用模型，/api/ps 取得已載入模型"""
+        timeout = aiohttp.ClientTimeout(total=self.probe_timeout)
+        backend.last_probe_at = time.time()
+        try:
+            async with session.get(
+                f"{backend.base_url}/api/tags", timeout=timeout
+            ) as response:
+                if response.status != 200:
+                    raise RuntimeError(f"/api/tags 回應 {response.status}")
+                data = await response.json()
+            backend.available_models = {
+                m.get("name") for m in data.get("models", []) if m.get("name")
+            }
+
+            try:
+                async with session.get(
+                    f"{backend.base_url}/api/ps", timeout=timeout
+                ) as response:
+                    if response.status == 200:
+                        data = await response.json()
+                        backend.loaded_models = {
+                            m.get("name") for m in data.get("models", []) if m.get("name")
+                        }
+            except Exception:
+                # 舊版 Ollama 沒有 /api/ps，不影響健康判定
+                pass
+
+            backend.last_error = None
+            self.mark_success(backend)
+            return True
+        except Exception as e:
+            # 主動探測失敗直接移出輪替
+            backend.consecutive_failures = max(
+                backend.consecutive_failures + 1, self.failure_threshold
+            )
+            backend.last_error = str(e) or type(e).__name__
+            if backend.healthy:
+                logger.warning(
+                    f"Ollama節點探測失敗，移出輪替: {backend.base_url}（{backend.last_error}）"
+                )
+            backend.healthy = False
+            return False
+
+    async def probe_all(self, session: aiohttp.ClientSession) -> Dict[str, bool]:
+        """並行探測所有節點"""
+        results = await asyncio.gather(
+            *[self.probe(b, session) for b in self.backends]
+        )
+        return {b.base_url: ok for b, ok in zip(self.backends, results)}
+
+    def start_probing(
+        self, get_session: Callable[[], Awaitable[aiohttp.ClientSession]]
+    ) -> None:
+        """啟動背景健康探測"""
+        if self._probe_task is not None and not self._probe_task.done():
+            return
+        self._probe_task = asyncio.create_task(self._probe_loop(get_session))
+
+    async def stop_probing(self) -> None:
+        """停止背景健康探測"""
+        task = self._probe_task
+        self._probe_task = None
+        if task is not None and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def _probe_loop(
+        self, get_session: Callable[[], Awaitable[aiohttp.ClientSession]]
+    ) -> None:
+        while True:
+            try:
+                await self.probe_all(await get_session())
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ollama節點探測循環失敗: {e}")
+            await asyncio.sleep(self.probe_interval)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """獲取後端池狀態"""
+        return {
+            "total": len(self.backends),
+            "healthy": len(self.healthy_backends()),
+            "probe_interval": self.probe_interval,
+            "backends": [b.to_dict() for b in self.backends],
+        }
@@ -4,10 +4,11 @@
 所有模組請從這裡取得唯一的會話管理器實例
 """
 
+from config import SESSIONS_DIR
 from services.unified_session_manager import UnifiedSessionManager
 
 # 唯一來源（檔案型持久化管理器）
-manager = UnifiedSessionManager()
+manager = UnifiedSessionManager(sessions_dir=SESSIONS_DIR)
 
 
 
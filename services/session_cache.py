@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+有上限的會話快取
+取代各處只增不減的會話 dict：依最近使用順序（LRU）保留會話，
+超過筆數或近似位元組上限時淘汰最久未用者，閒置過久的會話也會被淘汰。
+
+淘汰前會呼叫 on_evict（例如先寫入延遲寫入中的變更）；回傳 False 時保留該會話。
+位元組數以序列化後的 JSON 長度估算並維護累計值，會話就地修改後以 refresh 重新估算該筆。
+"""
+
+import json
+import logging
+import time
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from pydantic import BaseModel
+
+from config import (
+    SESSION_CACHE_IDLE_SECONDS,
+    SESSION_CACHE_MAX_BYTES,
+    SESSION_CACHE_MAX_ENTRIES,
+)
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+def approx_size(value: Any) -> int:
+    """以 UTF-8 JSON 長度估算物件佔用的位元組數"""
+    try:
+        if isinstance(value, BaseModel):
+            text = value.json()
+        else:
+            text = json.dumps(value, ensure_ascii=False, default=str)
+        return len(text.encode("utf-8"))
+    except Exception:
+        return 0
+
+
+class SessionCache(MutableMapping):
+    """LRU + 閒置淘汰的會話快取（可直接當作 dict 使用）"""
+
+    def __init__(
+        self,
+        max_entries: int = SESSION_CACHE_MAX_ENTRIES,
+        max_bytes: int = SESSION_CACHE_MAX_BYTES,
+        idle_seconds: float = SESSION_CACHE_IDLE_SECONDS,
+        on_evict: Optional[Callable[[str, Any], bool]] = None,
+        sizeof: Callable[[Any], int] = approx_size,
+        clock: Callable[[], float] = time.monotonic,
+        name: str = "sessions",
+    ):
+        """初始化會話快取
+
+        max_entries / max_bytes / idle_seconds 為 0 時不限制該項。
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.idle_seconds = idle_seconds
+        self.on_evict = on_evict
+        self.sizeof = sizeof
+        self.clock = clock
+        self.name = name
+        self._data: "OrderedDict[str, Any]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._total_bytes = 0
+        self._last_access: Dict[str, float] = {}
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "evicted_entries": 0,
+            "evicted_bytes": 0,
+            "evicted_idle": 0,
+            "evict_blocked": 0,
+        }
+
+    # ---- dict 介面 ----
+
+    def __getitem__(self, key: str) -> Any:
+        value = self._data.get(key, _MISSING)
+        if value is not _MISSING and self._is_idle(key) and self._evict(key, "idle"):
+            value = _MISSING
+        if value is _MISSING:
+            self.stats["misses"] += 1
+            raise KeyError(key)
+        self.stats["hits"] += 1
+        self._touch(key)
+        return value
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        self._data[key] = value
+        self._resize(key)
+        self._touch(key)
+        self._enforce(protect=key)
+
+    def __delitem__(self, key: str) -> None:
+        del self._data[key]
+        self._forget(key)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._data
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._data))
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    # 檢視與移除不計入命中統計、也不更新使用順序
+    def keys(self):
+        return self._data.keys()
+
+    def values(self):
+        return self._data.values()
+
+    def items(self):
+        return self._data.items()
+
+    def pop(self, key: str, default: Any = _MISSING) -> Any:
+        if key not in self._data:
+            if default is _MISSING:
+                raise KeyError(key)
+            return default
+        value = self._data.pop(key)
+        self._forget(key)
+        return value
+
+    def peek(self, key: str, default: Any = None) -> Any:
+        """讀取但不更新使用順序與統計"""
+        return self._data.get(key, default)
+
+    # ---- 淘汰 ----
+
+    def refresh(self, key: str) -> None:
+        """會話就地修改後呼叫：更新使用時間、重新估算大小並檢查上限"""
+        if key in self._data:
+            self._resize(key)
+            self._touch(key)
+            self._enforce(protect=key)
+
+    def _resize(self, key: str) -> None:
+        size = self.sizeof(self._data[key]) if self.max_bytes else 0
+        self._total_bytes += size - self._sizes.get(key, 0)
+        self._sizes[key] = size
+
+    def _touch(self, key: str) -> None:
+        self._data.move_to_end(key)
+        self._last_access[key] = self.clock()
+
+    def _forget(self, key: str) -> None:
+        self._total_bytes -= self._sizes.pop(key, 0)
+        self._last_access.pop(key, None)
+
+    def _is_idle(self, key: str) -> bool:
+        if not self.idle_seconds:
+            return False
+        return self.clock() - self._last_access.get(key, 0) > self.idle_seconds
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total_bytes
+
+    def _evict(self, key: str, reason: str) -> bool:
+        value = self._data.get(key)
+        if self.on_evict is not None:
+            try:
+                if self.on_evict(key, value) is False:
+                    self.stats["evict_blocked"] += 1
+                    return False
+            except Exception as e:
+                logger.error(f"淘汰會話前處理失敗: {e}")
+                self.stats["evict_blocked"] += 1
+                return False
+        self._data.pop(key, None)
+        self._forget(key)
+        self.stats[f"evicted_{reason}"] += 1
+        return True
+
+    def evict_idle(self) -> int:
+        """淘汰閒置超過 idle_seconds 的會話，回傳淘汰數"""
+        if not self.idle_seconds:
+            return 0
+        evicted = 0
+        # 使用順序由舊到新排列，遇到未閒置者即可停止
+        for key in list(self._data):
+            if not self._is_idle(key):
+                break
+            if self._evict(key, "idle"):
+                evicted += 1
+        return evicted
+
+    def _enforce(self, protect: Optional[str] = None) -> None:
+        """依閒置時間、筆數與位元組上限淘汰最久未用的會話"""
+        self.evict_idle()
+        for reason, over in (
+            ("entries", lambda: self.max_entries and len(self._data) > self.max_entries),
+            ("bytes", lambda: self.max_bytes and self.total_bytes > self.max_bytes),
+        ):
+            for key in list(self._data):
+                if not over():
+                    break
+                if key != protect:
+                    self._evict(key, reason)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """快取統計"""
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "name": self.name,
+            "entries": len(self._data),
+            "bytes": self.total_bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "idle_seconds": self.idle_seconds,
+            "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else 0.0,
+        }
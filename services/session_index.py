@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+會話中繼資料索引
+檔案型儲存後端列出會話時不必逐一解析會話檔：每次寫入時增量更新一筆精簡資料
+（session_id、user_id、建立/更新時間、狀態、訊息數、專案摘要），
+依（updated_at, session_id）排序保存在記憶體，並以追加式 JSONL 持久化。
+
+列表以游標分頁：游標編碼上一頁最後一筆的（updated_at, session_id），
+下一頁從該位置往前取，成本與頁面大小成正比。
+
+多個 worker 共用同一個索引檔：查詢前比對檔案的 inode、大小與修改時間，
+有其他行程追加時只讀取新增的行，檔案被重寫時整份重新載入。
+索引只由儲存後端的寫入維護；手動放入的會話檔須刪除索引檔以觸發重建。
+"""
+
+import base64
+import bisect
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 紀錄行數超過 max(此值, 索引筆數 × 2) 時重寫索引檔
+_COMPACT_MIN_RECORDS = 1000
+
+
+def iso_time(value: Any) -> Optional[str]:
+    """日期條件轉為與索引相同格式的 ISO 字串（本地時間、無時區）"""
+    if value is None or isinstance(value, str):
+        return value
+    if value.tzinfo is not None:
+        value = value.astimezone().replace(tzinfo=None)
+    return value.isoformat()
+
+
+def encode_cursor(row: Dict[str, Any]) -> str:
+    """以一筆會話資訊產生下一頁游標"""
+    raw = json.dumps([row["updated_at"], row["session_id"]], ensure_ascii=False)
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """解析游標；格式不正確時拋出 ValueError"""
+    try:
+        updated_at, session_id = json.loads(
+            base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+        )
+        return str(updated_at), str(session_id)
+    except Exception:
+        raise ValueError("無效的分頁游標")
+
+
+def matches(
+    row: Dict[str, Any],
+    user_id: Optional[str] = None,
+    status: Optional[str] = None,
+    updated_after: Optional[str] = None,
+    updated_before: Optional[str] = None,
+) -> bool:
+    """會話資訊是否符合篩選條件（updated_after 含、updated_before 不含）"""
+    if user_id is not None and row["user_id"] != user_id:
+        return False
+    if status is not None and row["status"] != status:
+        return False
+    if updated_after is not None and row["updated_at"] < updated_after:
+        return False
+    if updated_before is not None and row["updated_at"] >= updated_before:
+        return False
+    return True
+
+
+class SessionIndex:
+    """會話中繼資料索引（記憶體排序 + 追加式 JSONL 持久化）"""
+
+    def __init__(
+        self,
+        path: str,
+        rebuild: Optional[Callable[[], Iterable[Dict[str, Any]]]] = None,
+    ):
+        """載入索引
+
+        索引檔不存在時以 rebuild 回傳的會話資訊重建（例如掃描既有會話檔）。
+        """
+        self.path = Path(path)
+        self._lock = threading.RLock()
+        self._rows: Dict[str, Dict[str, Any]] = {}
+        # 依 (updated_at, session_id) 遞增排序
+        self._order: List[Tuple[str, str]] = []
+        self._records = 0
+        # 已讀到的檔案位置與當時的檔案狀態（inode, 大小, 修改時間）
+        self._offset = 0
+        self._stat: Optional[Tuple[int, int, int]] = None
+
+        if self.path.exists():
+            self._load()
+            if self._over_limit():
+                self._rewrite()
+        elif rebuild is not None:
+            for row in rebuild():
+                self._set(row)
+            self._rewrite()
+            logger.info(f"已重建會話索引（{len(self._rows)} 筆）")
+
+    # ---- 持久化 ----
+
+    @staticmethod
+    def _file_stat(path: Path) -> Optional[Tuple[int, int, int]]:
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_size, st.st_mtime_ns
+
+    def _over_limit(self) -> bool:
+        return self._records > max(_COMPACT_MIN_RECORDS, len(self._rows) * 2)
+
+    def _load(self) -> None:
+        """整份重新載入索引檔"""
+        self._rows.clear()
+        self._order.clear()
+        self._records = 0
+        self._offset = 0
+        self._read_from_offset()
+
+    def _read_from_offset(self) -> None:
+        """讀取 _offset 之後的完整行（其他行程寫到一半的末行留待下次）"""
+        with open(self.path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            f.seek(self._offset)
+            data = f.read()
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                logger.warning("略過損壞的會話索引紀錄")
+                continue
+            if "row" in record:
+                self._set(record["row"])
+            else:
+                self._unset(record["del"])
+            self._records += 1
+        self._offset += end
+        self._stat = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+    def _refresh(self) -> None:
+        """索引檔被其他行程追加或重寫時同步記憶體內容"""
+        stat = self._file_stat(self.path)
+        if stat is None or stat == self._stat:
+            return
+        try:
+            if self._stat is None or stat[0] != self._stat[0] or stat[1] < self._offset:
+                self._load()
+            else:
+                self._read_from_offset()
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.error(f"重新載入會話索引失敗: {e}")
+
+    def _append(self, record: Dict[str, Any]) -> None:
+        # 不直接推進讀取位置：由 _refresh 依檔案順序讀回自己與其他行程追加的紀錄
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+        self._refresh()
+        if self._over_limit():
+            self._rewrite()
+
+    def _rewrite(self) -> None:
+        """以目前內容重寫索引檔"""
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for row in self._rows.values():
+                f.write(
+                    json.dumps({"row": row}, ensure_ascii=False, separators=(",", ":"))
+                    + "\n"
+                )
+            self._offset = f.tell()
+        os.replace(tmp_path, self.path)
+        self._records = len(self._rows)
+        self._stat = self._file_stat(self.path)
+
+    # ---- 增量更新 ----
+
+    def _set(self, row: Dict[str, Any]) -> None:
+        self._unset(row["session_id"])
+        self._rows[row["session_id"]] = row
+        bisect.insort(self._order, (row["updated_at"], row["session_id"]))
+
+    def _unset(self, session_id: str) -> None:
+        old = self._rows.pop(session_id, None)
+        if old is not None:
+            key = (old["updated_at"], session_id)
+            i = bisect.bisect_left(self._order, key)
+            if i < len(self._order) and self._order[i] == key:
+                del self._order[i]
+
+    def put(self, row: Dict[str, Any]) -> None:
+        """新增或更新一筆會話資訊（內容未變時不寫入）"""
+        try:
+            with self._lock:
+                self._refresh()
+                if self._rows.get(row["session_id"]) == row:
+                    return
+                self._set(row)
+                self._append({"row": row})
+        except Exception as e:
+            logger.error(f"更新會話索引失敗: {e}")
+
+    def remove(self, session_id: str) -> None:
+        """移除一筆會話資訊"""
+        try:
+            with self._lock:
+                self._refresh()
+                if session_id not in self._rows:
+                    return
+                self._unset(session_id)
+                self._append({"del": session_id})
+        except Exception as e:
+            logger.error(f"更新會話索引失敗: {e}")
+
+    # ---- 查詢 ----
+
+    def __contains__(self, session_id: object) -> bool:
+        with self._lock:
+            self._refresh()
+            return session_id in self._rows
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._refresh()
+            return len(self._rows)
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self._refresh()
+            return self._rows.get(session_id)
+
+    def query(
+        self,
+        user_id: Optional[str] = None,
+        status: Optional[str] = None,
+        updated_after: Optional[str] = None,
+        updated_before: Optional[str] = None,
+        cursor: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """依更新時間由新到舊取一頁會話資訊，回傳（資料, 下一頁游標）"""
+        with self._lock:
+            self._refresh()
+            # 起點：游標位置或 updated_before 之前，兩者取較早者
+            end = len(self._order)
+            if cursor is not None:
+                end = bisect.bisect_left(self._order, decode_cursor(cursor))
+            if updated_before is not None:
+                end = min(end, bisect.bisect_left(self._order, (updated_before, "")))
+
+            page: List[Dict[str, Any]] = []
+            for i in range(end - 1, -1, -1):
+                updated_at, session_id = self._order[i]
+                if updated_after is not None and updated_at < updated_after:
+                    break
+                row = self._rows[session_id]
+                if not matches(row, user_id, status):
+                    continue
+                if limit is not None and len(page) == limit:
+                    return page, encode_cursor(page[-1])
+                page.append(dict(row))
+            return page, None
+
+    def older_than(self, cutoff: str) -> List[str]:
+        """updated_at 早於 cutoff 的會話ID"""
+        with self._lock:
+            self._refresh()
+            end = bisect.bisect_left(self._order, (cutoff, ""))
+            return [session_id for _, session_id in self._order[:end]]
@@ -0,0 +1,1134 @@
+#!/usr/bin/env python3
+"""
+會話儲存後端
+UnifiedSessionManager 透過 SessionStore 介面讀寫會話：
+
+- JsonFileSessionStore：每個會話一個 JSON 檔（原有格式），任何變更都整檔重寫。
+- SQLiteSessionStore：會話、訊息、專案快照分表保存（WAL 模式）；新增訊息只插入一列，
+  多個 uvicorn worker 可共用同一個資料庫，並以版本號判斷記憶體中的會話是否過期。
+- JsonlLogSessionStore：快照 + 追加式 JSONL 紀錄，每則訊息與專案數據差異各追加一行，
+  由背景壓縮折疊成新快照。
+
+轉換舊格式檔案：
+    python -m services.session_store --sessions-dir sessions --to jsonl
+
+寫入方法回傳寫入後的版本號，失敗時回傳 None；不追蹤版本的後端固定回傳 0。
+"""
+
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import threading
+import typing
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+from models.unified_models import ChatMessage, ProjectData, SessionData
+from services.session_index import (
+    SessionIndex,
+    decode_cursor,
+    encode_cursor,
+    iso_time,
+    matches,
+)
+
+logger = logging.getLogger(__name__)
+
+# 會話列上直接保存的欄位；其餘欄位（摘要、LLM 上下文、背景工作等）序列化到 state
+_ROW_FIELDS = {
+    "session_id",
+    "user_id",
+    "status",
+    "created_at",
+    "updated_at",
+    "project_data",
+    "chat_history",
+}
+
+
+def project_summary(project_data: ProjectData) -> str:
+    """專案摘要（列出會話用）"""
+    summary = []
+    if project_data.project_attributes.industry:
+        summary.append(f"產業: {project_data.project_attributes.industry}")
+    if project_data.project_attributes.campaign:
+        summary.append(f"主題: {project_data.project_attributes.campaign}")
+    if project_data.time_budget.budget:
+        summary.append(f"預算: {project_data.time_budget.budget}")
+    return " | ".join(summary) if summary else "專案尚未開始"
+
+
+def session_listing(session_data: SessionData, message_count: int) -> Dict[str, Any]:
+    """list_sessions 回傳的單筆會話資訊"""
+    return {
+        "session_id": session_data.session_id,
+        "user_id": session_data.user_id,
+        "created_at": session_data.created_at.isoformat(),
+        "updated_at": session_data.updated_at.isoformat(),
+        "status": session_data.status,
+        "project_summary": project_summary(session_data.project_data),
+        "message_count": message_count,
+    }
+
+
+class SessionStore:
+    """會話儲存介面
+
+    save 保存會話本身與專案數據；聊天訊息由 append_messages / drop_messages /
+    replace_messages 維護，讓支援逐列寫入的後端不必重寫整段歷史。
+    """
+
+    # 寫入後是否 fsync（由 set_fsync 切換）
+    fsync = False
+
+    def set_fsync(self, enabled: bool) -> None:
+        """切換寫入後是否確保資料落盤"""
+        self.fsync = enabled
+
+    def load(self, session_id: str) -> Optional[SessionData]:
+        """載入會話；不存在時回傳 None"""
+        raise NotImplementedError
+
+    def save(self, session_data: SessionData) -> Optional[int]:
+        """保存會話（不含聊天訊息）"""
+        raise NotImplementedError
+
+    def append_messages(
+        self, session_data: SessionData, messages: List[ChatMessage]
+    ) -> Optional[int]:
+        """追加訊息（session_data.chat_history 已包含這些訊息）"""
+        raise NotImplementedError
+
+    def save_with_messages(
+        self, session_data: SessionData, messages: List[ChatMessage]
+    ) -> Optional[int]:
+        """保存會話並追加訊息（延遲寫入合併多次變更時使用）"""
+        if self.save(session_data) is None:
+            return None
+        return self.append_messages(session_data, messages)
+
+    def drop_messages(self, session_data: SessionData, count: int) -> Optional[int]:
+        """移除最舊的 count 則訊息並保存會話（session_data 已是移除後的狀態）"""
+        raise NotImplementedError
+
+    def replace_messages(self, session_data: SessionData) -> Optional[int]:
+        """以 session_data.chat_history 取代已保存的全部訊息並保存會話"""
+        raise NotImplementedError
+
+    def delete(self, session_id: str) -> bool:
+        """刪除會話"""
+        raise NotImplementedError
+
+    def list_sessions(self, user_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """列出會話（依更新時間由新到舊）"""
+        raise NotImplementedError
+
+    def list_page(
+        self,
+        user_id: Optional[str] = None,
+        status: Optional[str] = None,
+        updated_after: Optional[str] = None,
+        updated_before: Optional[str] = None,
+        cursor: Optional[str] = None,
+        limit: int = 50,
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """依更新時間由新到舊分頁列出會話，回傳（資料, 下一頁游標）
+
+        日期條件為 ISO 字串；游標無效時拋出 ValueError。
+        """
+        start = decode_cursor(cursor) if cursor else None
+        rows = sorted(
+            (
+                row
+                for row in self.list_sessions(user_id)
+                if matches(row, user_id, status, updated_after, updated_before)
+                and (start is None or (row["updated_at"], row["session_id"]) < start)
+            ),
+            key=lambda row: (row["updated_at"], row["session_id"]),
+            reverse=True,
+        )
+        if len(rows) > limit:
+            return rows[:limit], encode_cursor(rows[limit - 1])
+        return rows, None
+
+    def delete_older_than(self, cutoff: datetime) -> List[str]:
+        """刪除 updated_at 早於 cutoff 的會話，回傳被刪除的會話ID"""
+        raise NotImplementedError
+
+    def count(self) -> int:
+        """會話總數"""
+        raise NotImplementedError
+
+    def version(self, session_id: str) -> Optional[int]:
+        """會話目前的版本號（不存在時為 None）；不追蹤版本的後端固定回傳 0"""
+        return 0
+
+    def close(self) -> None:
+        """釋放資源"""
+
+
+def _sync(f) -> None:
+    """將已寫入的檔案內容 fsync 到磁碟"""
+    f.flush()
+    os.fsync(f.fileno())
+
+
+def load_session_file(session_file: Path) -> Optional[SessionData]:
+    """讀取舊格式（每會話一個 JSON 檔）的會話"""
+    try:
+        if not session_file.exists():
+            return None
+
+        with open(session_file, "r", encoding="utf-8") as f:
+            session_dict = json.load(f)
+
+        # 轉換時間戳
+        session_dict["created_at"] = datetime.fromisoformat(session_dict["created_at"])
+        session_dict["updated_at"] = datetime.fromisoformat(session_dict["updated_at"])
+
+        # 處理聊天歷史的時間戳
+        for msg in session_dict["chat_history"]:
+            msg["timestamp"] = datetime.fromisoformat(msg["timestamp"])
+
+        return SessionData(**session_dict)
+
+    except Exception as e:
+        logger.error(f"從檔案載入會話失敗: {e}")
+        return None
+
+
+class JsonFileSessionStore(SessionStore):
+    """每個會話一個 JSON 檔的儲存後端（列表由 _index.jsonl 中繼資料索引提供）"""
+
+    def __init__(self, sessions_dir: str = "sessions"):
+        """初始化檔案儲存"""
+        self.sessions_dir = Path(sessions_dir)
+        self.sessions_dir.mkdir(parents=True, exist_ok=True)
+        self.index = SessionIndex(
+            str(self.sessions_dir / "_index.jsonl"), rebuild=self._scan
+        )
+
+    def _scan(self):
+        """逐一解析會話檔（僅在索引不存在時使用）"""
+        for session_file in self.sessions_dir.glob("*.json"):
+            session_data = self.load(session_file.stem)
+            if session_data:
+                yield session_listing(session_data, len(session_data.chat_history))
+
+    def _path(self, session_id: str) -> Path:
+        return self.sessions_dir / f"{session_id}.json"
+
+    def load(self, session_id: str) -> Optional[SessionData]:
+        return load_session_file(self._path(session_id))
+
+    def save(self, session_data: SessionData) -> Optional[int]:
+        try:
+            # 轉換為可序列化的格式
+            session_dict = session_data.model_dump()
+            session_dict["created_at"] = session_data.created_at.isoformat()
+            session_dict["updated_at"] = session_data.updated_at.isoformat()
+
+            # 處理聊天歷史的時間戳
+            for msg in session_dict["chat_history"]:
+                msg["timestamp"] = msg["timestamp"].isoformat()
+
+            with open(self._path(session_data.session_id), "w", encoding="utf-8") as f:
+                # 專案數據內的時間戳同樣以 ISO 格式保存
+                json.dump(
+                    session_dict,
+                    f,
+                    ensure_ascii=False,
+                    indent=2,
+                    default=lambda o: o.isoformat() if isinstance(o, datetime) else str(o),
+                )
+                if self.fsync:
+                    _sync(f)
+
+            self.index.put(
+                session_listing(session_data, len(session_data.chat_history))
+            )
+            return 0
+
+        except Exception as e:
+            logger.error(f"保存會話到檔案失敗: {e}")
+            return None
+
+    # 檔案格式無法局部更新，訊息變更一律整檔重寫
+    def append_messages(
+        self, session_data: SessionData, messages: List[ChatMessage]
+    ) -> Optional[int]:
+        return self.save(session_data)
+
+    def save_with_messages(
+        self, session_data: SessionData, messages: List[ChatMessage]
+    ) -> Optional[int]:
+        return self.save(session_data)
+
+    def drop_messages(self, session_data: SessionData, count: int) -> Optional[int]:
+        return self.save(session_data)
+
+    def replace_messages(self, session_data: SessionData) -> Optional[int]:
+        return self.save(session_data)
+
+    def delete(self, session_id: str) -> bool:
+        session_file = self._path(session_id)
+        if session_file.exists():
+            session_file.unlink()
+        self.index.remove(session_id)
+        return True
+
+    def list_sessions(self, user_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        return self.index.query(user_id=user_id)[0]
+
+    def list_page(
+        self,
+        user_id: Optional[str] = None,
+        status: Optional[str] = None,
+        updated_after: Optional[str] = None,
+        updated_before: Optional[str] = None,
+        cursor: Optional[str] = None,
+        limit: int = 50,
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        return self.index.query(
+            user_id, status, updated_after, updated_before, cursor, limit
+        )
+
+    def delete_older_than(self, cutoff: datetime) -> List[str]:
+        if cutoff.tzinfo is None:
+            cutoff = cutoff.replace(tzinfo=timezone.utc)
+
+        deleted = []
+        for session_file in self.sessions_dir.glob("*.json"):
+            try:
+                with open(session_file, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+
+                updated_str = data.get("updated_at") or data.get("created_at")
+                try:
+                    updated_dt = datetime.fromisoformat(updated_str) if updated_str else None
+                except Exception:
+                    updated_dt = None
+
+                if updated_dt is None:
+                    # 後備：使用檔案修改時間
+                    updated_dt = datetime.fromtimestamp(
+                        session_file.stat().st_mtime, tz=timezone.utc
+                    )
+
+                # 補上時區（假設為 UTC）
+                if updated_dt.tzinfo is None:
+                    updated_dt = updated_dt.replace(tzinfo=timezone.utc)
+
+                if updated_dt < cutoff:
+                    session_file.unlink()
+                    self.index.remove(session_file.stem)
+                    deleted.append(session_file.stem)
+                    logger.info(f"清理舊會話檔案: {session_file}")
+
+            except Exception as e:
+                logger.warning(f"檢查會話檔案失敗: {session_file}, 錯誤: {e}")
+                continue
+
+        return deleted
+
+    def count(self) -> int:
+        return len(self.index)
+
+
+class SQLiteSessionStore(SessionStore):
+    """SQLite（WAL）會話儲存後端"""
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS sessions (
+        session_id TEXT PRIMARY KEY,
+        user_id TEXT,
+        status TEXT NOT NULL,
+        created_at TEXT NOT NULL,
+        updated_at TEXT NOT NULL,
+        state TEXT NOT NULL,
+        project_summary TEXT,
+        message_count INTEGER NOT NULL DEFAULT 0,
+        version INTEGER NOT NULL DEFAULT 0
+    );
+    CREATE INDEX IF NOT EXISTS idx_sessions_user_id ON sessions (user_id);
+    CREATE INDEX IF NOT EXISTS idx_sessions_updated_at ON sessions (updated_at);
+    CREATE INDEX IF NOT EXISTS idx_sessions_page ON sessions (updated_at, session_id);
+    CREATE INDEX IF NOT EXISTS idx_sessions_user_page
+        ON sessions (user_id, updated_at, session_id);
+    CREATE TABLE IF NOT EXISTS messages (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        session_id TEXT NOT NULL,
+        role TEXT NOT NULL,
+        content TEXT NOT NULL,
+        message_type TEXT NOT NULL,
+        timestamp TEXT NOT NULL,
+        metadata TEXT
+    );
+    CREATE INDEX IF NOT EXISTS idx_messages_session ON messages (session_id, id);
+    CREATE TABLE IF NOT EXISTS project_snapshots (
+        session_id TEXT PRIMARY KEY,
+        data TEXT NOT NULL,
+        updated_at TEXT NOT NULL
+    );
+    """
+
+    def __init__(self, db_path: str, busy_timeout: float = 5.0):
+        """初始化 SQLite 儲存
+
+        busy_timeout: 其他行程持有寫入鎖時的等待秒數。
+        """
+        self.db_path = db_path
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        # isolation_level=None：交易由 _transaction 明確控制
+        self._db = sqlite3.connect(
+            db_path,
+            timeout=busy_timeout,
+            check_same_thread=False,
+            isolation_level=None,
+        )
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(self.SCHEMA)
+
+    def set_fsync(self, enabled: bool) -> None:
+        """WAL 模式下 synchronous=FULL 才會在每次提交時 fsync"""
+        super().set_fsync(enabled)
+        with self._lock:
+            self._db.execute(f"PRAGMA synchronous={'FULL' if enabled else 'NORMAL'}")
+
+    def _write(self, session_id: str, statements) -> Optional[int]:
+        """在單一交易內執行寫入並遞增版本號，回傳新版本"""
+        with self._lock:
+            try:
+                self._db.execute("BEGIN IMMEDIATE")
+                for sql, params in statements:
+                    if params and isinstance(params, list):
+                        self._db.executemany(sql, params)
+                    else:
+                        self._db.execute(sql, params or ())
+                self._db.execute(
+                    "UPDATE sessions SET version = version + 1 WHERE session_id = ?",
+                    (session_id,),
+                )
+                row = self._db.execute(
+                    "SELECT version FROM sessions WHERE session_id = ?", (session_id,)
+                ).fetchone()
+                self._db.execute("COMMIT")
+                return row["version"] if row else None
+            except sqlite3.Error as e:
+                self._db.execute("ROLLBACK")
+                logger.error(f"寫入會話資料庫失敗: {e}")
+                return None
+
+    @staticmethod
+    def _state_json(session_data: SessionData) -> str:
+        return session_data.model_dump_json(exclude=_ROW_FIELDS)
+
+    def _session_statements(self, session_data: SessionData) -> List:
+        now = session_data.updated_at.isoformat()
+        return [
+            (
+                "INSERT INTO sessions (session_id, user_id, status, created_at, "
+                "updated_at, state, project_summary) VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(session_id) DO UPDATE SET user_id = excluded.user_id, "
+                "status = excluded.status, updated_at = excluded.updated_at, "
+                "state = excluded.state, project_summary = excluded.project_summary",
+                (
+                    session_data.session_id,
+                    session_data.user_id,
+                    session_data.status,
+                    session_data.created_at.isoformat(),
+                    now,
+                    self._state_json(session_data),
+                    project_summary(session_data.project_data),
+                ),
+            ),
+            (
+                "INSERT INTO project_snapshots (session_id, data, updated_at) "
+                "VALUES (?, ?, ?) ON CONFLICT(session_id) DO UPDATE SET "
+                "data = excluded.data, updated_at = excluded.updated_at",
+                (
+                    session_data.session_id,
+                    session_data.project_data.model_dump_json(),
+                    now,
+                ),
+            ),
+        ]
+
+    @staticmethod
+    def _message_rows(session_id: str, messages: List[ChatMessage]) -> List[tuple]:
+        return [
+            (
+                session_id,
+                m.role.value,
+                m.content,
+                m.message_type.value,
+                m.timestamp.isoformat(),
+                json.dumps(m.metadata, ensure_ascii=False, default=str)
+                if m.metadata is not None
+                else None,
+            )
+            for m in messages
+        ]
+
+    _INSERT_MESSAGE = (
+        "INSERT INTO messages (session_id, role, content, message_type, timestamp, "
+        "metadata) VALUES (?, ?, ?, ?, ?, ?)"
+    )
+
+    def load(self, session_id: str) -> Optional[SessionData]:
+        try:
+            with self._lock:
+                row = self._db.execute(
+                    "SELECT s.*, p.data AS project FROM sessions s "
+                    "LEFT JOIN project_snapshots p ON p.session_id = s.session_id "
+                    "WHERE s.session_id = ?",
+                    (session_id,),
+                ).fetchone()
+                if row is None:
+                    return None
+                messages = self._db.execute(
+                    "SELECT role, content, message_type, timestamp, metadata "
+                    "FROM messages WHERE session_id = ? ORDER BY id",
+                    (session_id,),
+                ).fetchall()
+
+            session_dict = json.loads(row["state"])
+            session_dict.update(
+                session_id=row["session_id"],
+                user_id=row["user_id"],
+                status=row["status"],
+                created_at=row["created_at"],
+                updated_at=row["updated_at"],
+                project_data=json.loads(row["project"]) if row["project"] else {},
+                chat_history=[
+                    {
+                        "role": m["role"],
+                        "content": m["content"],
+                        "message_type": m["message_type"],
+                        "timestamp": m["timestamp"],
+                        "metadata": json.loads(m["metadata"]) if m["metadata"] else None,
+                    }
+                    for m in messages
+                ],
+            )
+            return SessionData.model_validate(session_dict)
+
+        except Exception as e:
+            logger.error(f"從資料庫載入會話失敗: {e}")
+            return None
+
+    def save(self, session_data: SessionData) -> Optional[int]:
+        return self._write(
+            session_data.session_id, self._session_statements(session_data)
+        )
+
+    def _append_statements(
+        self, session_data: SessionData, messages: List[ChatMessage]
+    ) -> List:
+        session_id = session_data.session_id
+        return [
+            (
+                "UPDATE sessions SET updated_at = ?, "
+                "message_count = message_count + ? WHERE session_id = ?",
+                (session_data.updated_at.isoformat(), len(messages), session_id),
+            ),
+            (self._INSERT_MESSAGE, self._message_rows(session_id, messages)),
+        ]
+
+    def append_messages(
+        self, session_data: SessionData, messages: List[ChatMessage]
+    ) -> Optional[int]:
+        return self._write(
+            session_data.session_id, self._append_statements(session_data, messages)
+        )
+
+    def save_with_messages(
+        self, session_data: SessionData, messages: List[ChatMessage]
+    ) -> Optional[int]:
+        return self._write(
+            session_data.session_id,
+            self._session_statements(session_data)
+            + self._append_statements(session_data, messages),
+        )
+
+    def drop_messages(self, session_data: SessionData, count: int) -> Optional[int]:
+        session_id = session_data.session_id
+        return self._write(
+            session_id,
+            self._session_statements(session_data)
+            + [
+                (
+                    "DELETE FROM messages WHERE id IN (SELECT id FROM messages "
+                    "WHERE session_id = ? ORDER BY id LIMIT ?)",
+                    (session_id, count),
+                ),
+                (
+                    "UPDATE sessions SET message_count = (SELECT COUNT(*) FROM "
+                    "messages WHERE session_id = ?) WHERE session_id = ?",
+                    (session_id, session_id),
+                ),
+            ],
+        )
+
+    def replace_messages(self, session_data: SessionData) -> Optional[int]:
+        session_id = session_data.session_id
+        statements = self._session_statements(session_data) + [
+            ("DELETE FROM messages WHERE session_id = ?", (session_id,)),
+            (
+                "UPDATE sessions SET message_count = ? WHERE session_id = ?",
+                (len(session_data.chat_history), session_id),
+            ),
+        ]
+        if session_data.chat_history:
+            statements.append(
+                (
+                    self._INSERT_MESSAGE,
+                    self._message_rows(session_id, session_data.chat_history),
+                )
+            )
+        return self._write(session_id, statements)
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            try:
+                self._db.execute("BEGIN IMMEDIATE")
+                for table in ("messages", "project_snapshots", "sessions"):
+                    self._db.execute(
+                        f"DELETE FROM {table} WHERE session_id = ?", (session_id,)
+                    )
+                self._db.execute("COMMIT")
+                return True
+            except sqlite3.Error as e:
+                self._db.execute("ROLLBACK")
+                logger.error(f"刪除會話失敗: {e}")
+                return False
+
+    def list_sessions(self, user_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        sql = (
+            "SELECT session_id, user_id, created_at, updated_at, status, "
+            "project_summary, message_count FROM sessions"
+        )
+        params: tuple = ()
+        if user_id is not None:
+            sql += " WHERE user_id = ?"
+            params = (user_id,)
+        sql += " ORDER BY updated_at DESC"
+        with self._lock:
+            rows = self._db.execute(sql, params).fetchall()
+        return [dict(row) for row in rows]
+
+    def list_page(
+        self,
+        user_id: Optional[str] = None,
+        status: Optional[str] = None,
+        updated_after: Optional[str] = None,
+        updated_before: Optional[str] = None,
+        cursor: Optional[str] = None,
+        limit: int = 50,
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        # 以 (updated_at, session_id) 作為鍵集分頁，沿索引只讀取一頁
+        where, params = [], []
+        for column, op, value in (
+            ("user_id", "=", user_id),
+            ("status", "=", status),
+            ("updated_at", ">=", updated_after),
+            ("updated_at", "<", updated_before),
+        ):
+            if value is not None:
+                where.append(f"{column} {op} ?")
+                params.append(value)
+        if cursor:
+            where.append("(updated_at, session_id) < (?, ?)")
+            params.extend(decode_cursor(cursor))
+        sql = (
+            "SELECT session_id, user_id, created_at, updated_at, status, "
+            "project_summary, message_count FROM sessions"
+        )
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY updated_at DESC, session_id DESC LIMIT ?"
+        params.append(limit + 1)
+        with self._lock:
+            rows = [dict(row) for row in self._db.execute(sql, params).fetchall()]
+        if len(rows) > limit:
+            return rows[:limit], encode_cursor(rows[limit - 1])
+        return rows, None
+
+    def delete_older_than(self, cutoff: datetime) -> List[str]:
+        # updated_at 以本地時間 ISO 字串保存，可直接比較字串
+        if cutoff.tzinfo is not None:
+            cutoff = cutoff.astimezone().replace(tzinfo=None)
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT session_id FROM sessions WHERE updated_at < ?",
+                (cutoff.isoformat(),),
+            ).fetchall()
+        deleted = [row["session_id"] for row in rows]
+        for session_id in deleted:
+            self.delete(session_id)
+        return deleted
+
+    def count(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def version(self, session_id: str) -> Optional[int]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT version FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        return row["version"] if row else None
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+def _json_safe(model, **kwargs) -> Dict[str, Any]:
+    return json.loads(model.model_dump_json(**kwargs))
+
+
+def _sub_model(model: Optional[type], field: str) -> Optional[type]:
+    """欄位型別為 pydantic 模型（含 Optional[模型]）時回傳該模型"""
+    info = getattr(model, "model_fields", {}).get(field)
+    if info is None:
+        return None
+    for candidate in (info.annotation, *typing.get_args(info.annotation)):
+        if isinstance(candidate, type) and issubclass(candidate, BaseModel):
+            return candidate
+    return None
+
+
+def _diff(old: Dict[str, Any], new: Dict[str, Any], model: type) -> Dict[str, Any]:
+    """兩個模型 dict 的差異
+
+    只遞迴進入子模型；Dict[str, Any] 等自由格式欄位整個取代，
+    避免已刪除的鍵在重播時被合併回來。
+    """
+    delta = {}
+    for key, value in new.items():
+        previous = old.get(key)
+        sub_model = _sub_model(model, key)
+        if sub_model and isinstance(value, dict) and isinstance(previous, dict):
+            nested = _diff(previous, value, sub_model)
+            if nested:
+                delta[key] = nested
+        elif value != previous or key not in old:
+            delta[key] = value
+    return delta
+
+
+def _merge(target: Dict[str, Any], delta: Dict[str, Any], model: type) -> None:
+    for key, value in delta.items():
+        sub_model = _sub_model(model, key)
+        if sub_model and isinstance(value, dict) and isinstance(target.get(key), dict):
+            _merge(target[key], value, sub_model)
+        else:
+            target[key] = value
+
+
+class JsonlLogSessionStore(SessionStore):
+    """快照 + 追加式 JSONL 紀錄的檔案儲存後端
+
+    每個會話在 log_dir 下有兩個檔案：
+    - {id}.snapshot.json：某個序號時的完整會話
+    - {id}.log.jsonl：之後的變更（新增/移除訊息、專案數據與會話狀態的差異），每筆一行
+
+    載入時以快照為基礎依序套用序號較新的紀錄；紀錄數超過 compact_records 時，
+    由背景執行緒（compact_interval <= 0 時於寫入當下）將紀錄折疊成新的快照。
+    初始化時會把 sessions_dir 下舊格式的 {id}.json 轉為快照，原檔改名為 .json.migrated。
+    """
+
+    def __init__(
+        self,
+        sessions_dir: str = "sessions",
+        compact_records: int = 200,
+        compact_interval: float = 30.0,
+        migrate: bool = True,
+    ):
+        """初始化紀錄儲存"""
+        self.sessions_dir = Path(sessions_dir)
+        self.log_dir = self.sessions_dir / "log"
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+        self.compact_records = max(1, compact_records)
+        self._lock = threading.RLock()
+        # 各會話最後寫入的狀態（計算差異用）：project、state、seq、records
+        self._tails: Dict[str, Dict[str, Any]] = {}
+        self._pending_compaction: set = set()
+        self.stats = {"records": 0, "snapshots": 0, "compactions": 0, "migrated": 0}
+        self.index = SessionIndex(str(self.log_dir / "_index.jsonl"), rebuild=self._scan)
+
+        if migrate:
+            migrate_json_sessions(str(self.sessions_dir), self)
+
+        self._stop = threading.Event()
+        self._compactor: Optional[threading.Thread] = None
+        if compact_interval > 0:
+            self._compactor = threading.Thread(
+                target=self._compact_loop,
+                args=(compact_interval,),
+                name="session-log-compactor",
+                daemon=True,
+            )
+            self._compactor.start()
+
+    def _scan(self):
+        """逐一重建會話（僅在索引不存在時使用）"""
+        for session_id in self._session_ids():
+            session_data = self.load(session_id)
+            if session_data:
+                yield session_listing(session_data, len(session_data.chat_history))
+
+    def _snapshot_path(self, session_id: str) -> Path:
+        return self.log_dir / f"{session_id}.snapshot.json"
+
+    def _log_path(self, session_id: str) -> Path:
+        return self.log_dir / f"{session_id}.log.jsonl"
+
+    @staticmethod
+    def _split(session_data: SessionData) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        project = _json_safe(session_data.project_data)
+        state = _json_safe(session_data, exclude={"project_data", "chat_history"})
+        return project, state
+
+    # ---- 讀取 ----
+
+    def _rebuild(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """讀取快照並套用之後的紀錄，回傳會話 dict（含 _seq 與 _records）"""
+        snapshot_path = self._snapshot_path(session_id)
+        if not snapshot_path.exists():
+            return None
+        with open(snapshot_path, "r", encoding="utf-8") as f:
+            doc = json.load(f)
+        seq = doc.pop("_seq", 0)
+        records = 0
+
+        log_path = self._log_path(session_id)
+        if log_path.exists():
+            self._truncate_torn_tail(log_path)
+            with open(log_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        logger.warning(f"略過損壞的會話紀錄: {session_id}")
+                        continue
+                    if record["seq"] <= seq:
+                        continue
+                    self._apply(doc, record)
+                    seq = record["seq"]
+                    records += 1
+
+        doc["_seq"] = seq
+        doc["_records"] = records
+        return doc
+
+    @staticmethod
+    def _truncate_torn_tail(log_path: Path) -> None:
+        """截掉寫入中斷留下的不完整末行，避免下次追加黏在殘行後而一併遺失"""
+        with open(log_path, "rb+") as f:
+            size = f.seek(0, os.SEEK_END)
+            if size == 0:
+                return
+            f.seek(size - 1)
+            if f.read(1) == b"\n":
+                return
+            f.seek(0)
+            keep = f.read().rfind(b"\n") + 1
+            f.truncate(keep)
+        logger.warning(f"已截斷會話紀錄的不完整末行: {log_path.name}")
+
+    @staticmethod
+    def _apply(doc: Dict[str, Any], record: Dict[str, Any]) -> None:
+        op = record["op"]
+        if op == "append":
+            doc["chat_history"].extend(record["messages"])
+        elif op == "drop":
+            del doc["chat_history"][: record["count"]]
+        elif op == "replace":
+            doc["chat_history"] = record["messages"]
+        elif op == "project":
+            _merge(doc["project_data"], record["delta"], ProjectData)
+        elif op == "state":
+            doc.update(record["delta"])
+
+    def load(self, session_id: str) -> Optional[SessionData]:
+        try:
+            with self._lock:
+                doc = self._rebuild(session_id)
+                if doc is None:
+                    return None
+                seq, records = doc.pop("_seq"), doc.pop("_records")
+                session_data = SessionData.model_validate(doc)
+                project, state = self._split(session_data)
+                self._tails[session_id] = {
+                    "project": project,
+                    "state": state,
+                    "seq": seq,
+                    "records": records,
+                }
+                return session_data
+
+        except Exception as e:
+            logger.error(f"從紀錄載入會話失敗: {e}")
+            return None
+
+    # ---- 寫入 ----
+
+    def _write_snapshot(self, session_data: SessionData, seq: int) -> None:
+        doc = _json_safe(session_data)
+        doc["_seq"] = seq
+        snapshot_path = self._snapshot_path(session_data.session_id)
+        tmp_path = snapshot_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(doc, f, ensure_ascii=False, separators=(",", ":"))
+            if self.fsync:
+                _sync(f)
+        os.replace(tmp_path, snapshot_path)
+        self.stats["snapshots"] += 1
+
+    def _write(
+        self, session_data: SessionData, ops: List[Dict[str, Any]]
+    ) -> Optional[int]:
+        """寫入專案與狀態差異及 ops（單次追加）；尚無快照時直接寫完整快照
+
+        與 JSON 檔後端相同，不追蹤跨行程版本，固定回傳 0。
+        """
+        session_id = session_data.session_id
+        try:
+            with self._lock:
+                tail = self._tails.get(session_id)
+                if tail is None and self._snapshot_path(session_id).exists():
+                    self.load(session_id)
+                    tail = self._tails.get(session_id)
+
+                project, state = self._split(session_data)
+                if tail is None:
+                    self._write_snapshot(session_data, 0)
+                    self._tails[session_id] = {
+                        "project": project,
+                        "state": state,
+                        "seq": 0,
+                        "records": 0,
+                    }
+                    self.index.put(
+                        session_listing(session_data, len(session_data.chat_history))
+                    )
+                    return 0
+
+                records = list(ops)
+                project_delta = _diff(tail["project"], project, ProjectData)
+                if project_delta:
+                    records.append({"op": "project", "delta": project_delta})
+                state_delta = _diff(tail["state"], state, SessionData)
+                if state_delta:
+                    # 狀態欄位整個取代（late_results、jobs 等列表不做逐項差異）
+                    records.append(
+                        {"op": "state", "delta": {k: state[k] for k in state_delta}}
+                    )
+                if not records:
+                    return 0
+
+                lines = []
+                for record in records:
+                    tail["seq"] += 1
+                    lines.append(
+                        json.dumps(
+                            {"seq": tail["seq"], **record},
+                            ensure_ascii=False,
+                            separators=(",", ":"),
+                        )
+                    )
+                with open(self._log_path(session_id), "a", encoding="utf-8") as f:
+                    f.write("\n".join(lines) + "\n")
+                    if self.fsync:
+                        _sync(f)
+
+                self.index.put(
+                    session_listing(session_data, len(session_data.chat_history))
+                )
+                tail["project"], tail["state"] = project, state
+                tail["records"] += len(records)
+                self.stats["records"] += len(records)
+                if tail["records"] >= self.compact_records:
+                    if self._compactor is None:
+                        self._compact_locked(session_id)
+                    else:
+                        self._pending_compaction.add(session_id)
+                return 0
+
+        except Exception as e:
+            logger.error(f"寫入會話紀錄失敗: {e}")
+            # 紀錄檔可能留下殘行：丟棄尾端狀態，下次寫入時重新載入並截斷
+            with self._lock:
+                self._tails.pop(session_data.session_id, None)
+            return None
+
+    @staticmethod
+    def _messages(messages: List[ChatMessage]) -> List[Dict[str, Any]]:
+        return [_json_safe(m) for m in messages]
+
+    def save(self, session_data: SessionData) -> Optional[int]:
+        return self._write(session_data, [])
+
+    def append_messages(
+        self, session_data: SessionData, messages: List[ChatMessage]
+    ) -> Optional[int]:
+        return self._write(
+            session_data, [{"op": "append", "messages": self._messages(messages)}]
+        )
+
+    def save_with_messages(
+        self, session_data: SessionData, messages: List[ChatMessage]
+    ) -> Optional[int]:
+        # 追加紀錄本身已包含專案與狀態差異
+        return self.append_messages(session_data, messages)
+
+    def drop_messages(self, session_data: SessionData, count: int) -> Optional[int]:
+        return self._write(session_data, [{"op": "drop", "count": count}])
+
+    def replace_messages(self, session_data: SessionData) -> Optional[int]:
+        return self._write(
+            session_data,
+            [{"op": "replace", "messages": self._messages(session_data.chat_history)}],
+        )
+
+    # ---- 壓縮 ----
+
+    def compact(self, session_id: str) -> bool:
+        """將紀錄折疊進新的快照"""
+        try:
+            with self._lock:
+                return self._compact_locked(session_id)
+        except Exception as e:
+            logger.error(f"壓縮會話紀錄失敗: {e}")
+            return False
+
+    def _compact_locked(self, session_id: str) -> bool:
+        self._pending_compaction.discard(session_id)
+        doc = self._rebuild(session_id)
+        if doc is None:
+            return False
+        seq = doc.pop("_seq")
+        doc.pop("_records")
+        # 先寫入帶序號的快照再清空紀錄；中途中斷時，載入會略過序號不大於快照的紀錄
+        self._write_snapshot(SessionData.model_validate(doc), seq)
+        open(self._log_path(session_id), "w").close()
+        if session_id in self._tails:
+            self._tails[session_id]["records"] = 0
+        self.stats["compactions"] += 1
+        return True
+
+    def _compact_loop(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            with self._lock:
+                pending = list(self._pending_compaction)
+            for session_id in pending:
+                self.compact(session_id)
+
+    # ---- 其他 ----
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            self._tails.pop(session_id, None)
+            self._pending_compaction.discard(session_id)
+            for path in (self._snapshot_path(session_id), self._log_path(session_id)):
+                if path.exists():
+                    path.unlink()
+            self.index.remove(session_id)
+        return True
+
+    def _session_ids(self) -> List[str]:
+        return [p.name[: -len(".snapshot.json")] for p in self.log_dir.glob("*.snapshot.json")]
+
+    def list_sessions(self, user_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        return self.index.query(user_id=user_id)[0]
+
+    def list_page(
+        self,
+        user_id: Optional[str] = None,
+        status: Optional[str] = None,
+        updated_after: Optional[str] = None,
+        updated_before: Optional[str] = None,
+        cursor: Optional[str] = None,
+        limit: int = 50,
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        return self.index.query(
+            user_id, status, updated_after, updated_before, cursor, limit
+        )
+
+    def delete_older_than(self, cutoff: datetime) -> List[str]:
+        deleted = self.index.older_than(iso_time(cutoff))
+        for session_id in deleted:
+            self.delete(session_id)
+        return deleted
+
+    def count(self) -> int:
+        return len(self.index)
+
+    def close(self) -> None:
+        """停止背景壓縮並折疊尚待壓縮的紀錄"""
+        self._stop.set()
+        if self._compactor is not None:
+            self._compactor.join(timeout=5)
+            self._compactor = None
+        for session_id in list(self._pending_compaction):
+            self.compact(session_id)
+
+
+def migrate_json_sessions(sessions_dir: str, store: SessionStore) -> int:
+    """將舊格式的 {id}.json 會話寫入 store，原檔改名為 .json.migrated；回傳轉換數"""
+    migrated = 0
+    for session_file in sorted(Path(sessions_dir).glob("*.json")):
+        session_data = load_session_file(session_file)
+        if session_data is None:
+            continue
+        if store.save(session_data) is None:
+            logger.warning(f"轉換會話失敗，保留原檔: {session_file}")
+            continue
+        if session_data.chat_history and isinstance(store, SQLiteSessionStore):
+            store.replace_messages(session_data)
+        session_file.rename(session_file.with_name(session_file.name + ".migrated"))
+        migrated += 1
+    if migrated:
+        if hasattr(store, "stats"):
+            store.stats["migrated"] = store.stats.get("migrated", 0) + migrated
+        logger.info(f"已轉換 {migrated} 個舊格式會話檔案")
+    return migrated
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """將舊格式會話檔案轉換到新儲存後端的命令列入口"""
+    parser = argparse.ArgumentParser(description="轉換 sessions/*.json 到新的會話儲存後端")
+    parser.add_argument("--sessions-dir", default="sessions", help="會話目錄")
+    parser.add_argument(
+        "--to", choices=["jsonl", "sqlite"], default="jsonl", help="目標儲存後端"
+    )
+    parser.add_argument("--db", default=None, help="SQLite 路徑（預設為會話目錄下）")
+    args = parser.parse_args(argv)
+
+    if args.to == "sqlite":
+        store = SQLiteSessionStore(
+            args.db or str(Path(args.sessions_dir) / "sessions.sqlite3")
+        )
+        migrated = migrate_json_sessions(args.sessions_dir, store)
+    else:
+        store = JsonlLogSessionStore(args.sessions_dir, compact_interval=0, migrate=False)
+        migrated = migrate_json_sessions(args.sessions_dir, store)
+    store.close()
+    print(f"已轉換 {migrated} 個會話")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
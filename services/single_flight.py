@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+同鍵請求合併（single-flight）
+相同指紋的並行呼叫共用同一個進行中的任務，只實際執行一次
+"""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+logger = logging.getLogger(__name__)
+
+
+class _Flight:
+    """進行中的共用任務與其等待者數量"""
+
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """同鍵並行呼叫合併器
+
+    - 第一個呼叫者建立共用任務，其餘呼叫者等待同一結果（含例外）
+    - 單一等待者被取消不會影響其他人；最後一個等待者離開時才取消共用任務
+    """
+
+    def __init__(self):
+        """初始化合併器"""
+        self._flights: Dict[Hashable, _Flight] = {}
+        self.stats: Dict[str, int] = {
+            "leaders": 0,
+            "coalesced": 0,
+            "abandoned": 0,
+        }
+
+    async def run(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """以 key 合併執行 factory()"""
+        flight = self._flights.get(key)
+        if flight is None or flight.task.done():
+            task = asyncio.ensure_future(factory())
+            flight = _Flight(task)
+            self._flights[key] = flight
+            task.add_done_callback(lambda _t, f=flight: self._forget(key, f))
+            self.stats["leaders"] += 1
+        else:
+            self.stats["coalesced"] += 1
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            if flight.waiters == 1 and not flight.task.done():
+                # 沒有人再需要這個結果了
+                flight.task.cancel()
+                self.stats["abandoned"] += 1
+            raise
+        finally:
+            flight.waiters -= 1
+
+    def _forget(self, key: Hashable, flight: _Flight) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        # 避免所有等待者都已離開時出現 "exception was never retrieved"
+        if not flight.task.cancelled() and flight.task.exception() is not None:
+            logger.debug(f"合併任務失敗: {flight.task.exception()}")
+
+    def in_flight(self) -> int:
+        """目前進行中的共用任務數"""
+        return len(self._flights)
+
+    def get_stats(self) -> Dict[str, int]:
+        """獲取合併統計"""
+        return {**self.stats, "in_flight": self.in_flight()}
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+預測性預先計算
+回覆送出後，於背景預先執行下一步最可能用到的工具（受眾洞察、內容策略、快速回覆），
+結果以「工具名稱 + 專案數據指紋 + 預測行動」保存；下一回合請求相同工具、
+專案數據未變且（依行動而定的工具，如快速回覆）行動與預測相同時直接取用。
+用戶訊息不納入鍵：預先計算時無從得知實際訊息，納入後幾乎不會命中。
+
+為避免搶占互動請求：只在 LLM 排程器沒有排隊、且仍有空閒名額時才啟動，
+同時進行的預先計算數受 max_inflight 限制，並以 BACKGROUND 優先級送出。
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from config import (
+    SPECULATION_ENABLED,
+    SPECULATION_MAX_ENTRIES,
+    SPECULATION_MAX_INFLIGHT,
+    SPECULATION_TTL,
+)
+from models.unified_models import ProjectData, ToolResult
+
+logger = logging.getLogger(__name__)
+
+# 不影響工具輸出的中繼欄位
+_VOLATILE_FIELDS = {"created_at", "updated_at", "completeness_score", "status"}
+
+# （工具名稱, 專案數據指紋, 預測行動）
+SpeculationKey = Tuple[str, str, str]
+
+
+def project_fingerprint(project_data: ProjectData) -> str:
+    """專案數據指紋（忽略時間戳與完整度等中繼欄位）"""
+    payload = json.dumps(
+        project_data.dict(exclude=_VOLATILE_FIELDS),
+        sort_keys=True,
+        ensure_ascii=False,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:24]
+
+
+def speculation_key(
+    tool_name: str, project_data: ProjectData, action: str = ""
+) -> SpeculationKey:
+    """預先計算結果的鍵；依行動產生結果的工具（如快速回覆）須帶入預測的行動"""
+    return tool_name, project_fingerprint(project_data), action
+
+
+class SpeculativeExecutor:
+    """預先計算工具結果並依專案數據指紋提供"""
+
+    def __init__(
+        self,
+        tool_executor,
+        llm_client=None,
+        enabled: bool = SPECULATION_ENABLED,
+        max_inflight: int = SPECULATION_MAX_INFLIGHT,
+        max_entries: int = SPECULATION_MAX_ENTRIES,
+        ttl: float = SPECULATION_TTL,
+    ):
+        """初始化預先計算器
+
+        llm_client: 提供時依其排程器狀態決定是否啟動（有排隊或名額已滿則略過）。
+        """
+        self.tool_executor = tool_executor
+        self.llm_client = llm_client
+        self.enabled = enabled
+        self.max_inflight = max(0, max_inflight)
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._results: "OrderedDict[SpeculationKey, Tuple[float, ToolResult]]" = (
+            OrderedDict()
+        )
+        self._inflight: Dict[SpeculationKey, asyncio.Task] = {}
+        self.stats = {
+            "scheduled": 0,
+            "hits": 0,
+            "joined": 0,
+            "misses": 0,
+            "skipped_busy": 0,
+            "failures": 0,
+            "expired": 0,
+            "evicted": 0,
+        }
+
+    def _llm_busy(self) -> bool:
+        scheduler = getattr(self.llm_client, "scheduler", None)
+        if scheduler is None:
+            return False
+        return (
+            scheduler.queue_depth() > 0
+            or scheduler.in_flight >= scheduler.max_concurrent
+        )
+
+    def schedule(
+        self,
+        tool_name: str,
+        project_data: ProjectData,
+        follow_up: Optional[Callable[[ProjectData, ToolResult], None]] = None,
+        action: str = "",
+        **kwargs: Any,
+    ) -> bool:
+        """排程預先計算；已有結果、進行中或資源不足時略過
+
+        follow_up 在成功後以（專案數據副本, 結果）呼叫，可據以排程下一步。
+        action 為結果所對應的預測行動，取用時須相同才會命中。
+        """
+        if not self.enabled:
+            return False
+
+        key = speculation_key(tool_name, project_data, action)
+        if key in self._results or key in self._inflight:
+            return False
+        if len(self._inflight) >= self.max_inflight or self._llm_busy():
+            self.stats["skipped_busy"] += 1
+            return False
+
+        snapshot = project_data.copy(deep=True)
+        self._inflight[key] = asyncio.ensure_future(
+            self._run(key, tool_name, snapshot, follow_up, kwargs)
+        )
+        self.stats["scheduled"] += 1
+        logger.info(f"預先計算 {tool_name}（{key[1][:8]}）")
+        return True
+
+    async def _run(
+        self,
+        key: SpeculationKey,
+        tool_name: str,
+        project_data: ProjectData,
+        follow_up: Optional[Callable[[ProjectData, ToolResult], None]],
+        kwargs: Dict[str, Any],
+    ) -> Optional[ToolResult]:
+        result = None
+        try:
+            result = await self.tool_executor.execute_tool(
+                tool_name, project_data=project_data, **kwargs
+            )
+            if not result.success:
+                self.stats["failures"] += 1
+                return None
+            self._store(key, result)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.stats["failures"] += 1
+            logger.error(f"預先計算 {tool_name} 失敗: {e}")
+            return None
+        finally:
+            self._inflight.pop(key, None)
+
+        if follow_up is not None:
+            try:
+                follow_up(project_data, result)
+            except Exception as e:
+                logger.error(f"排程後續預先計算失敗: {e}")
+        return result
+
+    def _store(self, key: SpeculationKey, result: ToolResult) -> None:
+        self._results[key] = (time.monotonic(), result)
+        self._results.move_to_end(key)
+        while len(self._results) > self.max_entries:
+            self._results.popitem(last=False)
+            self.stats["evicted"] += 1
+
+    async def take(
+        self,
+        tool_name: str,
+        project_data: ProjectData,
+        action: str = "",
+    ) -> Optional[ToolResult]:
+        """取用預先計算結果；仍在進行中則等待其完成，沒有則回傳 None
+
+        action 須與排程時相同才會命中（不依行動而定的工具兩邊都省略）。
+        """
+        if not self.enabled:
+            return None
+
+        key = speculation_key(tool_name, project_data, action)
+        entry = self._results.pop(key, None)
+        if entry is not None:
+            stored_at, result = entry
+            if time.monotonic() - stored_at <= self.ttl:
+                self.stats["hits"] += 1
+                return result
+            self.stats["expired"] += 1
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.stats["joined"] += 1
+            try:
+                # shield：等待者被取消時不中斷預先計算本身
+                await asyncio.shield(task)
+            except asyncio.CancelledError:
+                if not task.cancelled():
+                    raise
+                return None
+            entry = self._results.pop(key, None)
+            return entry[1] if entry else None
+
+        self.stats["misses"] += 1
+        return None
+
+    async def drain(self) -> None:
+        """等待進行中的預先計算（測試與關閉服務用）"""
+        while self._inflight:
+            await asyncio.gather(*list(self._inflight.values()), return_exceptions=True)
+
+    def cancel(self) -> None:
+        """取消所有進行中的預先計算（關閉服務時使用）"""
+        for task in list(self._inflight.values()):
+            task.cancel()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """預先計算統計"""
+        served = self.stats["hits"] + self.stats["joined"]
+        lookups = served + self.stats["misses"] + self.stats["expired"]
+        return {
+            **self.stats,
+            "enabled": self.enabled,
+            "inflight": len(self._inflight),
+            "stored": len(self._results),
+            "hit_rate": round(served / lookups, 3) if lookups else 0.0,
+        }
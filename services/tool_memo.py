@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+工具結果記憶化
+受眾洞察與內容策略只讀取專案數據中的少數欄位；將這些欄位正規化後產生指紋，
+解析後的 ToolResult 依（工具、提示詞版本、模型、指紋）跨會話共用。
+
+儲存沿用 LLMResponseCache（記憶體 LRU + TTL，可選 SQLite 持久層）；
+事件迴圈內使用 get_async / set_async，SQLite 讀寫不阻塞迴圈。
+提示詞文字或 TOOL_MEMO_VERSION 變更時鍵值隨之改變，舊結果自然失效。
+"""
+
+import hashlib
+import json
+import logging
+from typing import Any, Dict, Iterable, Optional, Type
+
+from pydantic import BaseModel
+
+from config import (
+    TOOL_MEMO_DB_PATH,
+    TOOL_MEMO_MAX_DISK_ENTRIES,
+    TOOL_MEMO_MAX_ENTRIES,
+    TOOL_MEMO_TTL,
+    TOOL_MEMO_VERSION,
+)
+from models.unified_models import ProjectData, ToolResult
+from services.llm_cache import LLMResponseCache
+
+logger = logging.getLogger(__name__)
+
+
+def canonical_value(value: Any) -> Any:
+    """正規化欄位值：字串去除多餘空白並轉小寫，列表去重排序，空值一律為 None"""
+    if isinstance(value, str):
+        value = " ".join(value.split()).casefold()
+        return value or None
+    if isinstance(value, (list, tuple, set)):
+        items = {json.dumps(canonical_value(v), ensure_ascii=False) for v in value}
+        items.discard("null")
+        return [json.loads(v) for v in sorted(items)] or None
+    if isinstance(value, dict):
+        items = {k: canonical_value(v) for k, v in value.items()}
+        return {k: v for k, v in sorted(items.items()) if v is not None} or None
+    return value
+
+
+def canonical_inputs(project_data: ProjectData, fields: Iterable[str]) -> Dict[str, Any]:
+    """取出工具讀取的欄位（以 "區塊.欄位" 表示）並正規化"""
+    inputs = {}
+    for path in fields:
+        value: Any = project_data
+        for part in path.split("."):
+            value = getattr(value, part, None)
+        inputs[path] = canonical_value(value)
+    return inputs
+
+
+class ToolResultMemo:
+    """跨會話的工具結果記憶化快取"""
+
+    def __init__(
+        self,
+        max_entries: int = TOOL_MEMO_MAX_ENTRIES,
+        ttl: float = TOOL_MEMO_TTL,
+        db_path: Optional[str] = TOOL_MEMO_DB_PATH or None,
+        version: str = TOOL_MEMO_VERSION,
+        max_disk_entries: int = TOOL_MEMO_MAX_DISK_ENTRIES,
+    ):
+        """初始化記憶化快取
+
+        db_path 為空時僅使用記憶體層（同一行程內跨會話共用）。
+        """
+        self.version = version
+        self.cache = LLMResponseCache(
+            max_entries=max_entries,
+            ttl=ttl,
+            db_path=db_path,
+            max_disk_entries=max_disk_entries,
+        )
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "decode_errors": 0}
+
+    def key(
+        self, tool_name: str, inputs: Dict[str, Any], prompt: str, model: str = ""
+    ) -> str:
+        """記憶化鍵：工具、版本、提示詞雜湊、模型與正規化後的輸入欄位"""
+        prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:16]
+        raw = json.dumps(
+            [tool_name, self.version, prompt_hash, model, inputs],
+            ensure_ascii=False,
+            sort_keys=True,
+            separators=(",", ":"),
+        )
+        return "tool:" + hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(
+        self, key: str, data_model: Optional[Type[BaseModel]] = None
+    ) -> Optional[ToolResult]:
+        """讀取記憶化結果；data_model 用於還原 data 的型別"""
+        return self._decode(self.cache.get(key), data_model)
+
+    async def get_async(
+        self, key: str, data_model: Optional[Type[BaseModel]] = None
+    ) -> Optional[ToolResult]:
+        """同 get，SQLite 查詢在執行緒中進行"""
+        return self._decode(await self.cache.get_async(key), data_model)
+
+    def _decode(
+        self, raw: Optional[str], data_model: Optional[Type[BaseModel]]
+    ) -> Optional[ToolResult]:
+        if raw is None:
+            self.stats["misses"] += 1
+            return None
+        try:
+            result = ToolResult.model_validate_json(raw)
+            if data_model is not None and result.data is not None:
+                result.data = data_model.model_validate(result.data)
+        except Exception as e:
+            self.stats["decode_errors"] += 1
+            logger.warning(f"記憶化結果解析失敗，重新生成: {e}")
+            return None
+
+        self.stats["hits"] += 1
+        result.metadata = {**(result.metadata or {}), "memoized": True}
+        return result
+
+    def set(self, key: str, result: ToolResult) -> None:
+        """保存成功的工具結果"""
+        if not result.success:
+            return
+        try:
+            self.cache.set(key, result.model_dump_json())
+            self.stats["stores"] += 1
+        except Exception as e:
+            logger.warning(f"保存記憶化結果失敗: {e}")
+
+    async def set_async(self, key: str, result: ToolResult) -> None:
+        """同 set，SQLite 寫入在執行緒中進行"""
+        if not result.success:
+            return
+        try:
+            await self.cache.set_async(key, result.model_dump_json())
+            self.stats["stores"] += 1
+        except Exception as e:
+            logger.warning(f"保存記憶化結果失敗: {e}")
+
+    def clear(self) -> None:
+        """清除所有記憶化結果"""
+        self.cache.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """記憶化統計"""
+        lookups = self.stats["hits"] + self.stats["misses"]
+        cache = self.cache.get_stats()
+        return {
+            **self.stats,
+            "version": self.version,
+            "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else 0.0,
+            "entries": cache["memory_entries"],
+            "max_entries": cache["max_entries"],
+            "ttl": cache["ttl"],
+            "persistent": cache["persistent"],
+        }
@@ -4,26 +4,124 @@
 整合企劃專案和受眾分析的會話管理
 """
 
-import json
+import asyncio
 import logging
+import time
 import uuid
-from datetime import datetime
-from typing import Any, Dict, List, Optional
+from collections import OrderedDict
+from contextvars import ContextVar
+from datetime import datetime, timedelta
 from pathlib import Path
-
-from models.unified_models import SessionData, ProjectData, ChatMessage, MessageRole
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from models.unified_models import (
+    SessionData,
+    ProjectData,
+    ChatMessage,
+    MessageRole,
+    Job,
+    LLMContextState,
+    LateResult,
+)
+from services.session_cache import SessionCache
+from services.session_index import iso_time
+from services.session_store import (
+    JsonFileSessionStore,
+    JsonlLogSessionStore,
+    SessionStore,
+    SQLiteSessionStore,
+    project_summary,
+)
 
 logger = logging.getLogger(__name__)
 
+# 目前請求變更過的會話ID（由 begin_request 建立，end_request 只寫入這些會話）
+_request_sessions: ContextVar[Optional[Set[str]]] = ContextVar(
+    "request_sessions", default=None
+)
+
 
 class UnifiedSessionManager:
     """統一的會話管理器"""
 
-    def __init__(self, sessions_dir: str = "sessions"):
-        """初始化會話管理器"""
+    def __init__(
+        self,
+        sessions_dir: str = "sessions",
+        store: Optional[SessionStore] = None,
+        backend: Optional[str] = None,
+        write_behind: Optional[bool] = None,
+        durability: Optional[str] = None,
+        flush_interval: Optional[float] = None,
+    ):
+        """初始化會話管理器
+
+        store 未指定時依 backend（預設 SESSION_STORE_BACKEND）建立：
+        "json" 為每會話一個 JSON 檔；"sqlite" 使用 SESSION_DB_PATH
+        （未設定時為 sessions_dir 下的 sessions.sqlite3）；"jsonl" 為快照 + 追加式紀錄，
+        並自動轉換 sessions_dir 下的舊 JSON 檔。
+
+        write_behind 啟用時變更只標記為待寫入，由 flush / 背景寫入合併保存；
+        durability 為 "turn"（每個請求結束即寫入）或 "batch"（依 flush_interval 寫入）。
+        """
+        from config import (
+            SESSION_DB_PATH,
+            SESSION_DURABILITY,
+            SESSION_FLUSH_INTERVAL,
+            SESSION_LOG_COMPACT_INTERVAL,
+            SESSION_LOG_COMPACT_RECORDS,
+            SESSION_NEGATIVE_CACHE_MAX,
+            SESSION_NEGATIVE_CACHE_TTL,
+            SESSION_STORE_BACKEND,
+            SESSION_VERSION_CHECK_INTERVAL,
+            SESSION_WRITE_BEHIND,
+        )
+
         self.sessions_dir = Path(sessions_dir)
         self.sessions_dir.mkdir(exist_ok=True)
-        self.active_sessions: Dict[str, SessionData] = {}
+        if store is None:
+            backend = (backend or SESSION_STORE_BACKEND).lower()
+            if backend == "sqlite":
+                db_path = SESSION_DB_PATH or str(self.sessions_dir / "sessions.sqlite3")
+                store = SQLiteSessionStore(db_path)
+            elif backend == "jsonl":
+                store = JsonlLogSessionStore(
+                    str(self.sessions_dir),
+                    compact_records=SESSION_LOG_COMPACT_RECORDS,
+                    compact_interval=SESSION_LOG_COMPACT_INTERVAL,
+                )
+            else:
+                store = JsonFileSessionStore(str(self.sessions_dir))
+        self.store = store
+        # 有上限的會話快取；淘汰前先寫入該會話尚未寫入的變更
+        self.active_sessions = SessionCache(
+            on_evict=self._flush_before_evict, name="unified_sessions"
+        )
+        # 查無此會話的ID與到期時間（負向快取）
+        self._missing: "OrderedDict[str, float]" = OrderedDict()
+        self.negative_ttl = SESSION_NEGATIVE_CACHE_TTL
+        self.negative_max = SESSION_NEGATIVE_CACHE_MAX
+        self.negative_hits = 0
+        # 記憶體中各會話對應的儲存版本；與儲存層不同時表示其他行程已更新，需重新載入
+        self._versions: Dict[str, Optional[int]] = {}
+        # 各會話上次確認儲存版本的時間；間隔內直接沿用記憶體中的會話，不查詢儲存層
+        self.version_check_interval = SESSION_VERSION_CHECK_INTERVAL
+        self._version_checked: Dict[str, float] = {}
+
+        # 延遲寫入：各會話待寫入的儲存操作（方法名稱與參數），flush 時合併成單次寫入
+        self.write_behind = SESSION_WRITE_BEHIND if write_behind is None else write_behind
+        self.durability = (durability or SESSION_DURABILITY).lower()
+        self.flush_interval = (
+            SESSION_FLUSH_INTERVAL if flush_interval is None else flush_interval
+        )
+        self._pending: Dict[str, List[Tuple[str, tuple]]] = {}
+        # 正在背景寫入中的會話；寫入完成前儲存層版本尚未更新，不可據此重新載入
+        self._flushing: Set[str] = set()
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._flusher: Optional[asyncio.Task] = None
+        self.write_stats = {"deferred": 0, "flushes": 0, "writes": 0, "failed": 0}
+        if self.write_behind:
+            # 延遲寫入後每次實際寫入都確保落盤，兩種模式只差在寫入頻率
+            self.store.set_fsync(True)
 
     def create_session(self, user_id: Optional[str] = None) -> SessionData:
         """創建新會話"""
@@ -40,11 +138,10 @@ class UnifiedSessionManager:
                 status="active",
             )
 
-            # 保存到記憶體
+            # 保存到記憶體與儲存層
+            self._missing.pop(session_id, None)
             self.active_sessions[session_id] = session_data
-
-            # 保存到檔案
-            self._save_session_to_file(session_data)
+            self._persist(session_data)
 
             logger.info(f"創建新會話: {session_id}")
             return session_data
@@ -56,22 +153,65 @@ class UnifiedSessionManager:
     def get_session(self, session_id: str) -> Optional[SessionData]:
         """獲取會話"""
         try:
-            # 先從記憶體中查找
-            if session_id in self.active_sessions:
-                return self.active_sessions[session_id]
-
-            # 從檔案中載入
-            session_data = self._load_session_from_file(session_id)
+            # 先從記憶體中查找（有待寫入或寫入中的變更、剛確認過版本或版本相同時才沿用）
+            cached = self.active_sessions.get(session_id)
+            if cached is None and self._known_missing(session_id):
+                return None
+            if cached is not None and (
+                session_id in self._pending
+                or session_id in self._flushing
+                or self._recently_checked(session_id)
+            ):
+                return cached
+            version = self.store.version(session_id)
+            self._version_checked[session_id] = time.monotonic()
+            if cached is not None and version == self._versions.get(session_id):
+                return cached
+
+            # 從儲存層載入
+            session_data = self.store.load(session_id)
             if session_data:
                 self.active_sessions[session_id] = session_data
+                self._versions[session_id] = version
                 return session_data
 
+            self.active_sessions.pop(session_id, None)
+            self._remember_missing(session_id)
             return None
 
         except Exception as e:
             logger.error(f"獲取會話失敗: {e}")
             return None
 
+    def _recently_checked(self, session_id: str) -> bool:
+        checked = self._version_checked.get(session_id)
+        return (
+            checked is not None
+            and time.monotonic() - checked < self.version_check_interval
+        )
+
+    def _forget_version(self, session_id: str) -> None:
+        self._versions.pop(session_id, None)
+        self._version_checked.pop(session_id, None)
+
+    def _known_missing(self, session_id: str) -> bool:
+        expires = self._missing.get(session_id)
+        if expires is None:
+            return False
+        if expires < time.monotonic():
+            del self._missing[session_id]
+            return False
+        self.negative_hits += 1
+        return True
+
+    def _remember_missing(self, session_id: str) -> None:
+        if self.negative_ttl <= 0:
+            return
+        self._missing[session_id] = time.monotonic() + self.negative_ttl
+        self._missing.move_to_end(session_id)
+        while len(self._missing) > self.negative_max:
+            self._missing.popitem(last=False)
+
     def update_session(
         self,
         session_id: str,
@@ -89,21 +229,22 @@ class UnifiedSessionManager:
             if project_data:
                 session_data.project_data = project_data
 
-            # 添加聊天訊息
-            if chat_message:
-                session_data.chat_history.append(chat_message)
-
             # 更新時間戳
             session_data.updated_at = datetime.now()
 
-            # 保存到記憶體
-            self.active_sessions[session_id] = session_data
-
-            # 保存到檔案
-            self._save_session_to_file(session_data)
+            # 添加聊天訊息（SQLite 後端只插入新訊息，不重寫歷史）
+            if chat_message:
+                session_data.chat_history.append(chat_message)
+                if project_data:
+                    self._persist(session_data)
+                saved = self._persist_with(
+                    session_data, self.store.append_messages, [chat_message]
+                )
+            else:
+                saved = self._persist(session_data)
 
             logger.info(f"更新會話: {session_id}")
-            return True
+            return saved
 
         except Exception as e:
             logger.error(f"更新會話失敗: {e}")
@@ -133,6 +274,31 @@ class UnifiedSessionManager:
             logger.error(f"添加聊天訊息失敗: {e}")
             return False
 
+    def add_chat_messages(
+        self, session_id: str, messages: List[Tuple[MessageRole, str]]
+    ) -> bool:
+        """以單次寫入添加多則聊天訊息（例如一個完整回合）"""
+        try:
+            session_data = self.get_session(session_id)
+            if not session_data:
+                logger.warning(f"會話不存在: {session_id}")
+                return False
+
+            now = datetime.now()
+            chat_messages = [
+                ChatMessage(role=role, content=content, timestamp=now)
+                for role, content in messages
+            ]
+            session_data.chat_history.extend(chat_messages)
+            session_data.updated_at = now
+            return self._persist_with(
+                session_data, self.store.append_messages, chat_messages
+            )
+
+        except Exception as e:
+            logger.error(f"添加聊天訊息失敗: {e}")
+            return False
+
     def get_chat_history(self, session_id: str) -> List[ChatMessage]:
         """獲取聊天歷史"""
         try:
@@ -166,55 +332,173 @@ class UnifiedSessionManager:
             logger.error(f"更新專案數據失敗: {e}")
             return False
 
+    def get_llm_context(self, session_id: str) -> Optional[LLMContextState]:
+        """獲取會話的LLM對話上下文；尚未建立時回傳空狀態"""
+        try:
+            session_data = self.get_session(session_id)
+            if not session_data:
+                return None
+            return session_data.llm_context or LLMContextState()
+
+        except Exception as e:
+            logger.error(f"獲取LLM上下文失敗: {e}")
+            return None
+
+    def save_llm_context(self, session_id: str, state: LLMContextState) -> bool:
+        """保存會話的LLM對話上下文"""
+        try:
+            session_data = self.get_session(session_id)
+            if not session_data:
+                logger.warning(f"會話不存在: {session_id}")
+                return False
+
+            session_data.llm_context = state
+            return self._persist(session_data)
+
+        except Exception as e:
+            logger.error(f"保存LLM上下文失敗: {e}")
+            return False
+
+    def compact_chat_history(
+        self, session_id: str, summary: Optional[str], drop_count: int
+    ) -> bool:
+        """移除最舊的 drop_count 則訊息；提供 summary 時一併更新滾動摘要"""
+        try:
+            session_data = self.get_session(session_id)
+            if not session_data:
+                logger.warning(f"會話不存在: {session_id}")
+                return False
+
+            del session_data.chat_history[:drop_count]
+            session_data.summarized_messages += drop_count
+            if summary is not None:
+                session_data.conversation_summary = summary
+            return self._persist_with(
+                session_data, self.store.drop_messages, drop_count
+            )
+
+        except Exception as e:
+            logger.error(f"壓縮聊天歷史失敗: {e}")
+            return False
+
+    def add_late_result(
+        self,
+        session_id: str,
+        late_result: LateResult,
+        project_data: Optional[ProjectData] = None,
+        max_results: int = 20,
+    ) -> bool:
+        """附加延遲完成的步驟結果；提供 project_data 時一併更新專案數據"""
+        try:
+            session_data = self.get_session(session_id)
+            if not session_data:
+                logger.warning(f"會話不存在: {session_id}")
+                return False
+
+            session_data.late_results.append(late_result)
+            del session_data.late_results[:-max_results]
+            if project_data is not None:
+                session_data.project_data = project_data
+            session_data.updated_at = datetime.now()
+            return self._persist(session_data)
+
+        except Exception as e:
+            logger.error(f"附加延遲結果失敗: {e}")
+            return False
+
+    def get_late_results(
+        self, session_id: str, consume: bool = False
+    ) -> List[LateResult]:
+        """取得延遲完成的步驟結果；consume 時取出後清空"""
+        try:
+            session_data = self.get_session(session_id)
+            if not session_data:
+                return []
+
+            results = list(session_data.late_results)
+            if consume and results:
+                session_data.late_results = []
+                self._persist(session_data)
+            return results
+
+        except Exception as e:
+            logger.error(f"獲取延遲結果失敗: {e}")
+            return []
+
+    def save_job(self, session_id: str, job: Job, max_jobs: int = 20) -> bool:
+        """保存背景工作狀態（同ID覆寫，只保留最近 max_jobs 筆）"""
+        try:
+            session_data = self.get_session(session_id)
+            if not session_data:
+                logger.warning(f"會話不存在: {session_id}")
+                return False
+
+            jobs = [j for j in session_data.jobs if j.id != job.id]
+            jobs.append(job.copy(deep=True))
+            session_data.jobs = jobs[-max_jobs:]
+            return self._persist(session_data)
+
+        except Exception as e:
+            logger.error(f"保存背景工作失敗: {e}")
+            return False
+
+    def get_jobs(self, session_id: str) -> List[Job]:
+        """獲取會話的背景工作"""
+        try:
+            session_data = self.get_session(session_id)
+            return list(session_data.jobs) if session_data else []
+
+        except Exception as e:
+            logger.error(f"獲取背景工作失敗: {e}")
+            return []
+
     def list_sessions(self, user_id: Optional[str] = None) -> List[Dict[str, Any]]:
         """列出會話"""
         try:
-            sessions = []
-
-            # 掃描會話目錄
-            for session_file in self.sessions_dir.glob("*.json"):
-                try:
-                    session_data = self._load_session_from_file(session_file.stem)
-                    if session_data:
-                        # 如果指定了用戶ID，只返回該用戶的會話
-                        if user_id is None or session_data.user_id == user_id:
-                            sessions.append(
-                                {
-                                    "session_id": session_data.session_id,
-                                    "user_id": session_data.user_id,
-                                    "created_at": session_data.created_at.isoformat(),
-                                    "updated_at": session_data.updated_at.isoformat(),
-                                    "status": session_data.status,
-                                    "project_summary": self._get_project_summary(
-                                        session_data.project_data
-                                    ),
-                                    "message_count": len(session_data.chat_history),
-                                }
-                            )
-                except Exception as e:
-                    logger.warning(f"載入會話檔案失敗: {session_file}, 錯誤: {e}")
-                    continue
-
-            # 按更新時間排序
-            sessions.sort(key=lambda x: x["updated_at"], reverse=True)
-
-            return sessions
+            return self.store.list_sessions(user_id)
 
         except Exception as e:
             logger.error(f"列出會話失敗: {e}")
             return []
 
+    def list_sessions_page(
+        self,
+        user_id: Optional[str] = None,
+        status: Optional[str] = None,
+        updated_after: Optional[datetime] = None,
+        updated_before: Optional[datetime] = None,
+        cursor: Optional[str] = None,
+        limit: int = 50,
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """依更新時間由新到舊分頁列出會話，回傳（資料, 下一頁游標）
+
+        游標無效時拋出 ValueError。
+        """
+        try:
+            return self.store.list_page(
+                user_id=user_id,
+                status=status,
+                updated_after=iso_time(updated_after),
+                updated_before=iso_time(updated_before),
+                cursor=cursor,
+                limit=limit,
+            )
+
+        except ValueError:
+            raise
+        except Exception as e:
+            logger.error(f"列出會話失敗: {e}")
+            return [], None
+
     def delete_session(self, session_id: str) -> bool:
         """刪除會話"""
         try:
             # 從記憶體中移除
-            if session_id in self.active_sessions:
-                del self.active_sessions[session_id]
+            self.active_sessions.pop(session_id, None)
+            self._forget_version(session_id)
+            self._pending.pop(session_id, None)
 
-            # 刪除檔案
-            session_file = self.sessions_dir / f"{session_id}.json"
-            if session_file.exists():
-                session_file.unlink()
+            self.store.delete(session_id)
 
             logger.info(f"刪除會話: {session_id}")
             return True
@@ -223,6 +507,26 @@ class UnifiedSessionManager:
             logger.error(f"刪除會話失敗: {e}")
             return False
 
+    def reset_session(self, session_id: str) -> bool:
+        """重置會話：清空專案數據、聊天歷史與對話摘要"""
+        try:
+            session_data = self.get_session(session_id)
+            if not session_data:
+                return False
+
+            session_data.project_data = ProjectData()
+            session_data.chat_history = []
+            session_data.conversation_summary = None
+            session_data.summarized_messages = 0
+            session_data.llm_context = None
+            session_data.status = "active"
+            session_data.updated_at = datetime.now()
+            return self._persist_with(session_data, self.store.replace_messages)
+
+        except Exception as e:
+            logger.error(f"重置會話失敗: {e}")
+            return False
+
     def close_session(self, session_id: str) -> bool:
         """關閉會話"""
         try:
@@ -236,71 +540,209 @@ class UnifiedSessionManager:
             logger.error(f"關閉會話失敗: {e}")
             return False
 
-    def _save_session_to_file(self, session_data: SessionData) -> bool:
-        """保存會話到檔案"""
-        try:
-            session_file = self.sessions_dir / f"{session_data.session_id}.json"
-
-            # 轉換為可序列化的格式
-            session_dict = session_data.dict()
-            session_dict["created_at"] = session_data.created_at.isoformat()
-            session_dict["updated_at"] = session_data.updated_at.isoformat()
-
-            # 處理聊天歷史的時間戳
-            for msg in session_dict["chat_history"]:
-                msg["timestamp"] = msg["timestamp"].isoformat()
+    def _persist(self, session_data: SessionData) -> bool:
+        """保存會話（不含訊息變更）"""
+        return self._persist_with(session_data, self.store.save)
 
-            with open(session_file, "w", encoding="utf-8") as f:
-                json.dump(session_dict, f, ensure_ascii=False, indent=2)
+    def _persist_with(self, session_data: SessionData, write, *args) -> bool:
+        """以指定的儲存層寫入方法保存，並記錄寫入後的版本
 
+        延遲寫入模式下只記錄待寫入的操作，由 flush 實際寫入。
+        """
+        self.active_sessions.refresh(session_data.session_id)
+        if self.write_behind:
+            self._pending.setdefault(session_data.session_id, []).append(
+                (write.__name__, args)
+            )
+            touched = _request_sessions.get()
+            if touched is not None:
+                touched.add(session_data.session_id)
+            self.write_stats["deferred"] += 1
             return True
 
-        except Exception as e:
-            logger.error(f"保存會話到檔案失敗: {e}")
+        version = write(session_data, *args)
+        if version is None:
             return False
+        self._versions[session_data.session_id] = version
+        self._version_checked[session_data.session_id] = time.monotonic()
+        return True
 
-    def _load_session_from_file(self, session_id: str) -> Optional[SessionData]:
-        """從檔案載入會話"""
-        try:
-            session_file = self.sessions_dir / f"{session_id}.json"
-
-            if not session_file.exists():
-                return None
-
-            with open(session_file, "r", encoding="utf-8") as f:
-                session_dict = json.load(f)
-
-            # 轉換時間戳
-            session_dict["created_at"] = datetime.fromisoformat(
-                session_dict["created_at"]
-            )
-            session_dict["updated_at"] = datetime.fromisoformat(
-                session_dict["updated_at"]
-            )
+    # ---- 延遲寫入 ----
 
-            # 處理聊天歷史的時間戳
-            for msg in session_dict["chat_history"]:
-                msg["timestamp"] = datetime.fromisoformat(msg["timestamp"])
+    @staticmethod
+    def _coalesce(ops: List[Tuple[str, tuple]]) -> Tuple[str, tuple]:
+        """將一個會話的待寫入操作合併為單次儲存層寫入
 
-            return SessionData(**session_dict)
+        含移除或取代訊息時改為整段取代（同時保存會話）；只新增訊息時合併為一次追加，
+        其間有 save 則以 save_with_messages 在同一次寫入中保存會話。
+        """
+        names = {name for name, _ in ops}
+        if names & {"drop_messages", "replace_messages"}:
+            return "replace_messages", ()
+        messages = [m for name, args in ops if name == "append_messages" for m in args[0]]
+        if not messages:
+            return "save", ()
+        if "save" in names:
+            return "save_with_messages", (messages,)
+        return "append_messages", (messages,)
+
+    def _take_pending(
+        self, session_ids: Optional[Iterable[str]] = None
+    ) -> List[Tuple[SessionData, str, tuple]]:
+        """取出待寫入的會話（session_ids 未指定時取出全部）
+
+        會話以深拷貝交給寫入端，避免與後續變更互相干擾。
+        """
+        if session_ids is None:
+            pending, self._pending = self._pending, {}
+        else:
+            pending = {
+                session_id: self._pending.pop(session_id)
+                for session_id in session_ids
+                if session_id in self._pending
+            }
+        batch = []
+        for session_id, ops in pending.items():
+            session_data = self.active_sessions.peek(session_id)
+            if session_data is None:
+                continue
+            name, args = self._coalesce(ops)
+            batch.append((session_data.copy(deep=True), name, args))
+            self._flushing.add(session_id)
+        return batch
+
+    def _write_batch(
+        self, batch: List[Tuple[SessionData, str, tuple]]
+    ) -> List[Tuple[str, Optional[int]]]:
+        results = []
+        for session_data, name, args in batch:
+            try:
+                version = getattr(self.store, name)(session_data, *args)
+            except Exception as e:
+                logger.error(f"寫入會話失敗: {e}")
+                version = None
+            results.append((session_data.session_id, version))
+        return results
+
+    def _apply_results(self, results: List[Tuple[str, Optional[int]]]) -> None:
+        for session_id, version in results:
+            if version is None:
+                # 寫入失敗：下次以整段取代重試
+                self.write_stats["failed"] += 1
+                self._pending.setdefault(session_id, []).append(("replace_messages", ()))
+                continue
+            self.write_stats["writes"] += 1
+            self._versions[session_id] = version
+            self._version_checked[session_id] = time.monotonic()
+        if results:
+            self.write_stats["flushes"] += 1
+
+    def _done_flushing(self, batch: List[Tuple[SessionData, str, tuple]]) -> None:
+        for session_data, _, _ in batch:
+            self._flushing.discard(session_data.session_id)
+
+    def _flush_before_evict(self, session_id: str, session_data: SessionData) -> bool:
+        """會話被淘汰前同步寫入其待寫入的變更；寫入失敗時保留會話"""
+        ops = self._pending.pop(session_id, None)
+        if ops:
+            name, args = self._coalesce(ops)
+            results = self._write_batch([(session_data, name, args)])
+            if results[0][1] is None:
+                self.write_stats["failed"] += 1
+                self._pending[session_id] = ops
+                return False
+            self.write_stats["writes"] += 1
+        self._forget_version(session_id)
+        return True
 
-        except Exception as e:
-            logger.error(f"從檔案載入會話失敗: {e}")
-            return None
+    def flush(self) -> int:
+        """同步寫入所有待寫入的會話，回傳寫入成功數"""
+        batch = self._take_pending()
+        try:
+            results = self._write_batch(batch)
+            self._apply_results(results)
+        finally:
+            self._done_flushing(batch)
+        return sum(1 for _, version in results if version is not None)
+
+    async def flush_async(self, session_ids: Optional[Iterable[str]] = None) -> int:
+        """在背景執行緒寫入待寫入的會話（session_ids 未指定時寫入全部），不阻塞事件迴圈"""
+        if not self._pending:
+            return 0
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            batch = self._take_pending(session_ids)
+            try:
+                results = await asyncio.to_thread(self._write_batch, batch)
+                self._apply_results(results)
+            finally:
+                self._done_flushing(batch)
+        return sum(1 for _, version in results if version is not None)
+
+    def begin_request(self) -> None:
+        """請求開始時呼叫：記錄本次請求變更的會話，供 end_request 只寫入這些會話"""
+        if self.write_behind:
+            _request_sessions.set(set())
+
+    async def end_request(self) -> None:
+        """回合處理完畢時呼叫：durability 為 turn 時立即寫入本次請求變更的會話
+
+        串流回應的回合在回應主體產生時才執行，須在串流結束時再呼叫一次；
+        未呼叫 begin_request 時不寫入（留給背景定時寫入）。
+        """
+        if not (self.write_behind and self.durability == "turn"):
+            return
+        touched = _request_sessions.get()
+        if not touched:
+            return
+        session_ids = set(touched)
+        touched.clear()
+        await self.flush_async(session_ids)
+
+    def start_flusher(self) -> None:
+        """啟動背景定時寫入（需在事件迴圈內呼叫）"""
+        if self.write_behind and self._flusher is None:
+            self._flusher = asyncio.ensure_future(self._flush_loop())
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush_async()
+            except Exception as e:
+                logger.error(f"背景寫入會話失敗: {e}")
+
+    async def shutdown(self) -> None:
+        """停止背景寫入並寫入剩餘變更（關閉服務時使用）"""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            await asyncio.gather(self._flusher, return_exceptions=True)
+            self._flusher = None
+        await self.flush_async()
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """會話快取統計（含負向快取）"""
+        return {
+            **self.active_sessions.get_stats(),
+            "negative_hits": self.negative_hits,
+            "negative_entries": len(self._missing),
+        }
+
+    def get_write_stats(self) -> Dict[str, Any]:
+        """延遲寫入統計"""
+        return {
+            **self.write_stats,
+            "write_behind": self.write_behind,
+            "durability": self.durability,
+            "flush_interval": self.flush_interval,
+            "dirty_sessions": len(self._pending),
+        }
 
     def _get_project_summary(self, project_data: ProjectData) -> str:
         """獲取專案摘要"""
         try:
-            summary = []
-
-            if project_data.project_attributes.industry:
-                summary.append(f"產業: {project_data.project_attributes.industry}")
-            if project_data.project_attributes.campaign:
-                summary.append(f"主題: {project_data.project_attributes.campaign}")
-            if project_data.time_budget.budget:
-                summary.append(f"預算: {project_data.time_budget.budget}")
-
-            return " | ".join(summary) if summary else "專案尚未開始"
+            return project_summary(project_data)
 
         except Exception as e:
             logger.error(f"獲取專案摘要失敗: {e}")
@@ -310,54 +752,20 @@ class UnifiedSessionManager:
         """清理舊會話，依據 updated_at 與 days 參數判斷。
 
         - days <= 0: 不清理，直接返回 0
-        - 其餘：刪除 updated_at 早於 (現在 - days) 的會話檔案
+        - 其餘：刪除 updated_at 早於 (現在 - days) 的會話
         """
         try:
-            from datetime import timezone, timedelta
-
             if days <= 0:
                 return 0
 
-            cleanup_count = 0
-            cutoff = datetime.now(timezone.utc) - timedelta(days=days)
-
-            for session_file in self.sessions_dir.glob("*.json"):
-                try:
-                    with open(session_file, "r", encoding="utf-8") as f:
-                        data = json.load(f)
-
-                    updated_str = data.get("updated_at") or data.get("created_at")
-                    if updated_str:
-                        try:
-                            updated_dt = datetime.fromisoformat(updated_str)
-                        except Exception:
-                            updated_dt = None
-                    else:
-                        updated_dt = None
-
-                    if updated_dt is None:
-                        # 後備：使用檔案修改時間
-                        updated_dt = datetime.fromtimestamp(
-                            session_file.stat().st_mtime, tz=timezone.utc
-                        )
-
-                    # 補上時區（假設為 UTC）
-                    if updated_dt.tzinfo is None:
-                        from datetime import timezone as _tz
-
-                        updated_dt = updated_dt.replace(tzinfo=_tz.utc)
-
-                    if updated_dt < cutoff:
-                        session_file.unlink()
-                        cleanup_count += 1
-                        logger.info(f"清理舊會話檔案: {session_file}")
-
-                except Exception as e:
-                    logger.warning(f"檢查會話檔案失敗: {session_file}, 錯誤: {e}")
-                    continue
+            deleted = self.store.delete_older_than(datetime.now() - timedelta(days=days))
+            for session_id in deleted:
+                self.active_sessions.pop(session_id, None)
+                self._forget_version(session_id)
+                self._pending.pop(session_id, None)
 
-            logger.info(f"清理完成，共刪除 {cleanup_count} 個舊會話檔案")
-            return cleanup_count
+            logger.info(f"清理完成，共刪除 {len(deleted)} 個舊會話")
+            return len(deleted)
 
         except Exception as e:
             logger.error(f"清理舊會話失敗: {e}")
@@ -366,7 +774,7 @@ class UnifiedSessionManager:
     def get_session_statistics(self) -> Dict[str, Any]:
         """獲取會話統計資訊"""
         try:
-            total_sessions = len(list(self.sessions_dir.glob("*.json")))
+            total_sessions = self.store.count()
             active_sessions = len(self.active_sessions)
 
             # 統計專案類型
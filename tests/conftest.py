@@ -0,0 +1,112 @@
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import threading
+
+import pytest
+from aiohttp import web
+
+# Ensure the application modules can be imported when tests run from the tests directory
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+# The shared session manager is created at import time; keep its files out of the repo
+os.environ.setdefault("SESSIONS_DIR", tempfile.mkdtemp(prefix="brieforg-sessions-"))
+
+
+class OllamaStub:
+    """Minimal Ollama-compatible HTTP server running on a background thread."""
+
+    def __init__(self):
+        self.requests = []
+        self.peers = set()
+        self.reply = "stub reply"
+        self.delay = 0.0
+        self.models = [{"name": "gemma3:27b"}]
+        self.loaded = []
+        self.healthy = True
+        self.host = "127.0.0.1"
+        self.port = None
+        self._loop = asyncio.new_event_loop()
+        self._runner = None
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+
+    async def _generate(self, request):
+        if not self.healthy:
+            return web.json_response({"error": "unavailable"}, status=503)
+        body = await request.json()
+        self.requests.append(body)
+        self.peers.add(request.transport.get_extra_info("peername"))
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        # Fake token ids: the returned context extends whatever context was sent
+        done = {
+            "done": True,
+            "context": body.get("context", []) + [len(body["prompt"]), len(self.reply)],
+            "prompt_eval_count": len(body["prompt"]),
+        }
+        if body.get("stream"):
+            response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+            await response.prepare(request)
+            for piece in self.reply.split(" "):
+                line = json.dumps({"response": piece + " ", "done": False})
+                await response.write(line.encode() + b"\n")
+            await response.write(json.dumps({"response": "", **done}).encode() + b"\n")
+            await response.write_eof()
+            return response
+        return web.json_response({"response": self.reply, **done})
+
+    async def _tags(self, request):
+        if not self.healthy:
+            return web.json_response({"error": "unavailable"}, status=503)
+        return web.json_response({"models": self.models})
+
+    async def _ps(self, request):
+        return web.json_response({"models": [{"name": m} for m in self.loaded]})
+
+    async def _start(self):
+        app = web.Application()
+        app.router.add_post("/api/generate", self._generate)
+        app.router.add_get("/api/tags", self._tags)
+        app.router.add_get("/api/ps", self._ps)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, 0)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    def start(self):
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._start(), self._loop).result(5)
+        return self
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}"
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result(5)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(5)
+
+
+@pytest.fixture
+def ollama_stub():
+    stub = OllamaStub().start()
+    yield stub
+    stub.stop()
+
+
+@pytest.fixture
+def ollama_stubs():
+    """Factory fixture: ``ollama_stubs(n)`` starts n independent stub servers."""
+    started = []
+
+    def factory(count):
+        stubs = [OllamaStub().start() for _ in range(count)]
+        started.extend(stubs)
+        return stubs
+
+    yield factory
+    for stub in started:
+        stub.stop()
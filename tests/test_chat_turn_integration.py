@@ -1,3 +1,4 @@
+import asyncio
 import os
 import sys
 import pytest
@@ -5,12 +6,24 @@ from fastapi.testclient import TestClient
 
 # Ensure the application module can be imported when tests run from the tests directory
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import app_refactored_unified
 from app_refactored_unified import app
+from models.unified_models import MessageRole
+from services.unified_session_manager import UnifiedSessionManager
 
 
 client = TestClient(app)
 
 
+@pytest.fixture(autouse=True)
+def isolated_sessions(tmp_path, monkeypatch):
+    """Serve every request from a session store under tmp_path"""
+    manager = UnifiedSessionManager(sessions_dir=str(tmp_path / "sessions"))
+    monkeypatch.setattr(app_refactored_unified, "session_manager", manager)
+    monkeypatch.setattr("api.routes.session_manager", manager)
+    return manager
+
+
 @pytest.mark.parametrize(
     "industry,brand",
     [
@@ -24,3 +37,39 @@ def test_chat_turn_responds(industry, brand):
     response = client.post("/chat/turn", json=payload)
     # planning_agent may not be initialised in tests; accept server errors as well
     assert response.status_code in (200, 500, 503)
+
+
+def test_livez_and_readyz_answer_without_touching_ollama():
+    assert client.get("/livez").json() == {"status": "alive"}
+    # services are not started here, so the readiness probe must report 503
+    response = client.get("/readyz")
+    assert response.status_code == 503
+    assert response.json()["ready"] is False
+
+
+def test_streamed_turn_is_flushed_when_the_stream_ends(tmp_path, monkeypatch):
+    manager = UnifiedSessionManager(
+        sessions_dir=str(tmp_path), backend="json", write_behind=True, durability="turn"
+    )
+    session_id = manager.create_session().session_id
+    manager.flush()
+    monkeypatch.setattr(app_refactored_unified, "session_manager", manager)
+
+    async def turn(on_token):
+        await on_token("你好")
+        manager.add_chat_message(session_id, MessageRole.ASSISTANT, "你好")
+        return {"message": "你好"}
+
+    async def run():
+        # middleware 在回應主體產生前就已結束
+        manager.begin_request()
+        await manager.end_request()
+        return [
+            event async for event in app_refactored_unified._stream_as_sse(turn)
+        ]
+
+    events = asyncio.run(run())
+
+    assert events[-1].startswith("event: final")
+    reloaded = UnifiedSessionManager(sessions_dir=str(tmp_path), backend="json")
+    assert [m.content for m in reloaded.get_session(session_id).chat_history] == ["你好"]
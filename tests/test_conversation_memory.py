@@ -0,0 +1,107 @@
+import asyncio
+import json
+
+from agents.unified_planning_agent import UnifiedPlanningAgent
+from services.conversation_memory import ConversationMemory
+from services.intent_classifier import IntentClassifier, RoutingLog
+from services.llm_cache import LLMResponseCache
+from services.llm_client import LLMClient
+from services.unified_session_manager import UnifiedSessionManager
+from tools.unified_tools import ToolExecutor
+
+
+def _client(ollama_stub):
+    return LLMClient(
+        host=ollama_stub.host, port=ollama_stub.port, cache=LLMResponseCache()
+    )
+
+
+def test_history_stays_bounded_with_rolling_summary(ollama_stub, tmp_path):
+    ollama_stub.reply = json.dumps(
+        {"summary": "客戶為家電品牌，預算200萬"}, ensure_ascii=False
+    )
+    manager = UnifiedSessionManager(sessions_dir=str(tmp_path))
+    session_id = manager.create_session().session_id
+    client = _client(ollama_stub)
+    memory = ConversationMemory(client, manager, window=4, batch=2)
+
+    async def run():
+        try:
+            for i in range(10):
+                memory.record_turn(session_id, f"第{i}輪問題", f"第{i}輪回覆")
+                await memory.drain()
+        finally:
+            await client.close()
+
+    asyncio.run(run())
+
+    session = UnifiedSessionManager(sessions_dir=str(tmp_path)).get_session(session_id)
+    assert [m.content for m in session.chat_history] == [
+        "第8輪問題",
+        "第8輪回覆",
+        "第9輪問題",
+        "第9輪回覆",
+    ]
+    assert session.conversation_summary == "客戶為家電品牌，預算200萬"
+    assert session.summarized_messages == 16
+    assert memory.get_stats()["summaries"] == len(ollama_stub.requests)
+    # the previous summary is folded into the next one
+    assert "客戶為家電品牌" in ollama_stub.requests[-1]["prompt"]
+
+    digest = memory.digest(session_id)
+    assert digest.startswith("先前對話摘要：客戶為家電品牌")
+    assert digest.endswith("助手: 第9輪回覆")
+
+
+def test_hard_limit_drops_oldest_when_summaries_fail(ollama_stub, tmp_path):
+    ollama_stub.reply = "not json"
+    manager = UnifiedSessionManager(sessions_dir=str(tmp_path))
+    session_id = manager.create_session().session_id
+    client = _client(ollama_stub)
+    memory = ConversationMemory(client, manager, window=4, batch=2, hard_limit=8)
+
+    async def run():
+        try:
+            for i in range(10):
+                memory.record_turn(session_id, f"問題{i}", f"回覆{i}")
+                await memory.drain()
+        finally:
+            await client.close()
+
+    asyncio.run(run())
+
+    assert len(manager.get_chat_history(session_id)) <= 9
+    stats = memory.get_stats()
+    assert stats["summary_failures"] > 0
+    assert stats["dropped"] > 0
+    assert manager.get_session(session_id).conversation_summary is None
+
+
+def test_agent_keeps_history_per_session(ollama_stub, tmp_path):
+    manager = UnifiedSessionManager(sessions_dir=str(tmp_path))
+    first = manager.create_session().session_id
+    second = manager.create_session().session_id
+    client = _client(ollama_stub)
+    agent = UnifiedPlanningAgent(
+        client,
+        ToolExecutor(client),
+        session_manager=manager,
+        intent_classifier=IntentClassifier(),
+        routing_log=RoutingLog(None),
+    )
+
+    async def run():
+        try:
+            await agent.process_chat_turn("你好", first)
+            await agent.process_chat_turn("嗨", second)
+        finally:
+            await client.close()
+
+    asyncio.run(run())
+
+    assert not hasattr(agent, "conversation_history")
+    first_history = manager.get_chat_history(first)
+    second_history = manager.get_chat_history(second)
+    assert [m.content for m in first_history][0] == "你好"
+    assert [m.content for m in second_history][0] == "嗨"
+    assert len(first_history) == len(second_history) == 2
@@ -0,0 +1,149 @@
+import asyncio
+from datetime import date
+
+import app_refactored_unified as service
+from services.entity_extractor import (
+    AhoCorasick,
+    BUDGET,
+    DUE_DATE,
+    END_DATE,
+    INDUSTRY,
+    MEDIA_FORMATS,
+    START_DATE,
+    extract_entities,
+    parse_zh_number,
+    run_benchmark,
+)
+from services.llm_cache import LLMResponseCache
+from services.llm_client import LLMClient
+from tools.unified_tools import ToolExecutor
+
+
+def test_chinese_numerals():
+    assert parse_zh_number("兩百") == 200
+    assert parse_zh_number("一千五百") == 1500
+    assert parse_zh_number("十二") == 12
+    assert parse_zh_number("3千5百") == 3500
+    assert parse_zh_number("一億五千萬") == 150_000_000
+    assert parse_zh_number("多少") is None
+
+
+def test_compound_budget_amounts():
+    assert extract_entities("預算一億兩千萬").values() == {BUDGET: "120000000"}
+    assert extract_entities("預算2百萬").values() == {BUDGET: "2000000"}
+    assert extract_entities("預算50万").values() == {BUDGET: "500000"}
+    assert extract_entities("預算1萬2000").values() == {BUDGET: "12000"}
+    assert extract_entities("預算100-300萬").values() == {BUDGET: "1000000-3000000"}
+    # 省略單位的口語無法確定金額，不寫入片段值
+    for text in ("預算2萬3", "預算一千五"):
+        result = extract_entities(text)
+        assert result.values() == {}
+        assert result.unresolved == [BUDGET]
+
+
+def test_aho_corasick_finds_overlapping_terms():
+    automaton = AhoCorasick()
+    for term in ("he", "she", "his", "hers"):
+        automaton.add(term, term)
+    automaton.build()
+    found = {(s, e, p) for s, e, p in automaton.iter_matches("ushers")}
+    assert found == {(1, 4, "she"), (2, 4, "he"), (2, 6, "hers")}
+
+
+def test_extracts_budget_period_and_media_deterministically():
+    result = extract_entities(
+        "預算200萬，活動期間2024/11/01至2025/03/31，投放Meta廣告和FB"
+    )
+    assert result.values() == {
+        BUDGET: "2000000",
+        START_DATE: "2024-11-01",
+        END_DATE: "2025-03-31",
+        MEDIA_FORMATS: ["Meta廣告"],
+    }
+    assert result.is_deterministic(0.85)
+
+
+def test_duration_and_relative_dates():
+    values = extract_entities("2024年11月1日開始，為期三個月").values()
+    assert values == {START_DATE: "2024-11-01", END_DATE: "2025-01-31"}
+
+    values = extract_entities("下月初開跑，走期兩週", today=date(2024, 12, 20)).values()
+    assert values == {START_DATE: "2025-01-01", END_DATE: "2025-01-14"}
+
+    # a duration without a start date cannot fix the campaign period
+    assert extract_entities("大概三個月").unresolved == ["duration"]
+
+
+def test_due_dates_ranges_and_aliases():
+    values = extract_entities("提案交付 2024-10-15，總預算約兩百萬到三百萬").values()
+    assert values == {DUE_DATE: "2024-10-15", BUDGET: "2000000-3000000"}
+    assert extract_entities("我們做餐飲").values() == {INDUSTRY: "食品飲料"}
+    # ASCII aliases only match whole words
+    assert MEDIA_FORMATS not in extract_entities("online 課程").slots
+
+
+def test_unresolvable_mentions_defer_to_llm():
+    result = extract_entities("想推廣新款熱水器，主打家庭親子族群，預算200萬")
+    assert result.values() == {BUDGET: "2000000"}
+    assert not result.is_deterministic(0.85)
+    assert not extract_entities("預算還沒確定").is_deterministic(0.85)
+
+
+def test_negation_and_leftover_content_defer_to_llm():
+    result = extract_entities("我不要Meta廣告")
+    assert result.values() == {}
+    assert not result.is_deterministic(0.85)
+
+    result = extract_entities("不做電視廣告, 預算200萬")
+    assert result.values() == {BUDGET: "2000000"}
+    assert "negation" in result.unresolved
+    assert not result.is_deterministic(0.85)
+
+    # 剩餘內容必須全是虛詞，短句也不例外
+    result = extract_entities("預算200萬，台北舉辦")
+    assert result.residual == "台北舉辦"
+    assert not result.is_deterministic(0.85)
+    assert extract_entities("預算兩千萬").is_deterministic(0.85)
+
+
+def test_benchmark_reports_throughput():
+    stats = run_benchmark(200)
+    assert stats["messages"] == 200
+    assert stats["messages_per_second"] > 0
+
+
+def test_api_chat_skips_llm_when_fully_resolved(ollama_stub, monkeypatch):
+    client = LLMClient(
+        host=ollama_stub.host, port=ollama_stub.port, cache=LLMResponseCache()
+    )
+    monkeypatch.setattr(service, "tool_executor", ToolExecutor(client))
+    request = service.ChatAPIRequest(
+        messages=[{"role": "user", "content": "預算200萬，投放YouTube廣告"}]
+    )
+
+    async def run():
+        try:
+            return await service._process_chat_api(request, None)
+        finally:
+            await client.close()
+
+    response = asyncio.run(run())
+
+    assert response.slot_writes == {
+        "total_budget": "2000000",
+        "media_formats": ["YouTube廣告"],
+    }
+    assert ollama_stub.requests == []
+
+
+def test_audience_coach_only_takes_plain_budget_with_cue():
+    from app import parse_and_update_from_answer
+
+    for sentence in ("活動預計吸引10萬名遊客", "我們粉絲有3萬人"):
+        pd = parse_and_update_from_answer({}, sentence)
+        assert "budget" not in pd.get("time_budget", {})
+
+    pd = parse_and_update_from_answer({}, "預算50萬")
+    assert pd["time_budget"]["budget"] == 500000
+    pd = parse_and_update_from_answer({}, "預算50萬以內")
+    assert "budget" not in pd.get("time_budget", {})
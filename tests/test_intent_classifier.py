@@ -0,0 +1,132 @@
+import asyncio
+import json
+
+from agents.unified_planning_agent import UnifiedPlanningAgent
+from models.unified_models import ProjectData
+from services.intent_classifier import (
+    IntentClassifier,
+    RoutingLog,
+    load_training_examples,
+    main,
+    routing_log_files,
+)
+from services.llm_cache import LLMResponseCache
+from services.llm_client import LLMClient
+from tools.unified_tools import ToolExecutor
+
+STATE = {"industry": True, "campaign": True, "budget": False}
+
+EXAMPLES = [
+    ("幫我分析目標受眾", STATE, "generate_insights"),
+    ("受眾輪廓是什麼樣子", STATE, "generate_insights"),
+    ("分析一下受眾洞察", STATE, "generate_insights"),
+    ("給我內容策略建議", STATE, "provide_strategy"),
+    ("媒體投放策略怎麼規劃", STATE, "provide_strategy"),
+    ("建議一下策略方向", STATE, "provide_strategy"),
+    ("專案還缺什麼資料", STATE, "evaluate_completeness"),
+    ("完整度評估一下", STATE, "evaluate_completeness"),
+    ("目前資料完整嗎", STATE, "evaluate_completeness"),
+]
+
+
+def test_classifier_predicts_and_roundtrips(tmp_path):
+    classifier = IntentClassifier()
+    classifier.fit(EXAMPLES)
+
+    label, confidence = classifier.predict("請分析受眾", STATE)
+    assert label == "generate_insights"
+    assert 0.5 < confidence <= 1.0
+    assert classifier.predict("策略建議", STATE)[0] == "provide_strategy"
+
+    path = tmp_path / "model.json"
+    classifier.save(str(path))
+    restored = IntentClassifier.load(str(path))
+    assert restored.predict("請分析受眾", STATE) == (label, confidence)
+    assert IntentClassifier.load(str(tmp_path / "missing.json")) is None
+    assert IntentClassifier().predict("任何訊息") == (None, 0.0)
+
+
+def test_ambiguous_message_is_not_confident(tmp_path):
+    classifier = IntentClassifier()
+    classifier.fit(EXAMPLES)
+
+    # mixes insight and strategy n-grams: must defer to the LLM
+    assert classifier.predict("分析受眾還是給策略", STATE)[1] < 0.8
+    assert classifier.predict("嗯", STATE)[1] < 0.8
+    assert classifier.predict("幫我分析目標受眾", STATE)[1] >= 0.8
+
+    classifier.calibrate(EXAMPLES)
+    path = tmp_path / "model.json"
+    classifier.save(str(path))
+    assert IntentClassifier.load(str(path)).temperature == classifier.temperature
+
+
+def test_routing_log_gates_messages_and_rotates(tmp_path):
+    path = tmp_path / "routing.jsonl"
+    log = RoutingLog(str(path), max_bytes=300, backups=2, log_messages=False)
+    for i in range(10):
+        log.append(f"訊息{i}", STATE, "clarify", "llm")
+        log.flush()
+    log.close()
+
+    files = routing_log_files(str(path))
+    assert (tmp_path / "routing.jsonl.2").exists()
+    assert not (tmp_path / "routing.jsonl.3").exists()
+    assert len(files) <= 3
+    records = [
+        json.loads(line)
+        for name in files
+        for line in open(name, encoding="utf-8").read().splitlines()
+    ]
+    assert records and all("message" not in r for r in records)
+    assert load_training_examples(files) == []
+
+
+def test_retrain_cli_uses_only_llm_decisions(tmp_path):
+    log = RoutingLog(str(tmp_path / "routing.jsonl"), log_messages=True)
+    for message, state, action in EXAMPLES:
+        log.append(message, state, action, "llm")
+    log.append("分析受眾", STATE, "provide_strategy", "classifier")
+    log.flush()
+
+    assert len(load_training_examples([str(log.path)])) == len(EXAMPLES)
+
+    out = tmp_path / "model.json"
+    assert main(["--log", str(log.path), "--out", str(out), "--holdout", "0"]) == 0
+    assert IntentClassifier.load(str(out)).trained_examples == len(EXAMPLES)
+
+
+def test_confident_classifier_skips_llm_route_call(ollama_stub, tmp_path):
+    classifier = IntentClassifier()
+    classifier.fit(EXAMPLES)
+    client = LLMClient(
+        host=ollama_stub.host, port=ollama_stub.port, cache=LLMResponseCache()
+    )
+    log = RoutingLog(str(tmp_path / "routing.jsonl"))
+    agent = UnifiedPlanningAgent(
+        client, ToolExecutor(client), intent_classifier=classifier, routing_log=log
+    )
+    project = ProjectData()
+    project.project_attributes.industry = "家電"
+    project.project_attributes.campaign = "新品上市"
+
+    async def run():
+        try:
+            confident = await agent._determine_next_action("幫我分析目標受眾", project)
+            ambiguous = await agent._determine_next_action("分析受眾還是給策略", project)
+            return confident, ambiguous
+        finally:
+            await client.close()
+
+    confident, _ = asyncio.run(run())
+    log.flush()
+
+    assert confident == "generate_insights"
+    # only the ambiguous message reaches Ollama
+    assert len(ollama_stub.requests) == 1
+    assert agent.routing_stats["classifier"] == 1
+    assert agent.routing_stats["llm"] == 1
+    sources = [
+        json.loads(line)["source"] for line in log.path.read_text().splitlines()
+    ]
+    assert sources == ["classifier", "llm"]
@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+
+from models.unified_models import JobStatus
+from services.job_queue import JobQueue
+from services.unified_session_manager import UnifiedSessionManager
+
+
+def test_jobs_respect_per_type_concurrency_and_persist_to_session(tmp_path):
+    manager = UnifiedSessionManager(sessions_dir=str(tmp_path))
+    session_id = manager.create_session().session_id
+    queue = JobQueue(manager)
+    running = {"now": 0, "peak": 0}
+
+    async def slow(job):
+        running["now"] += 1
+        running["peak"] = max(running["peak"], running["now"])
+        await asyncio.sleep(0.05)
+        running["now"] -= 1
+        return {"n": job.params["n"]}
+
+    async def run():
+        queue.register("proposal", slow, concurrency=1)
+        jobs = [queue.submit("proposal", session_id, {"n": i}) for i in range(3)]
+        await asyncio.sleep(0.01)
+        queued = queue.get_stats()["types"]["proposal"]["queued"]
+        await queue.drain()
+        return jobs, queued
+
+    jobs, queued = asyncio.run(run())
+
+    assert running["peak"] == 1
+    assert queued == 2
+    assert [queue.get(j.id).result for j in jobs] == [{"n": 0}, {"n": 1}, {"n": 2}]
+
+    stored = UnifiedSessionManager(sessions_dir=str(tmp_path)).get_jobs(session_id)
+    assert [j.status for j in stored] == [JobStatus.COMPLETED] * 3
+    assert stored[0].result == {"n": 0}
+
+
+def test_cancel_and_failure_are_recorded(tmp_path):
+    manager = UnifiedSessionManager(sessions_dir=str(tmp_path))
+    session_id = manager.create_session().session_id
+    queue = JobQueue(manager)
+
+    async def hang(job):
+        await asyncio.sleep(10)
+
+    async def boom(job):
+        raise RuntimeError("生成失敗")
+
+    async def run():
+        queue.register("content_strategy", hang)
+        queue.register("audience_insights", boom)
+        hung = queue.submit("content_strategy", session_id)
+        failed = queue.submit("audience_insights", session_id)
+        await asyncio.sleep(0.01)
+        cancelled = await queue.cancel(hung.id)
+        await queue.drain()
+        return cancelled, failed
+
+    cancelled, failed = asyncio.run(run())
+
+    assert cancelled.status == JobStatus.CANCELLED
+    assert failed.status == JobStatus.FAILED
+    assert failed.error == "生成失敗"
+    stats = queue.get_stats()["types"]
+    assert stats["content_strategy"]["cancelled"] == 1
+    assert stats["audience_insights"]["failed"] == 1
+
+    with pytest.raises(ValueError):
+        queue.submit("unknown", session_id)
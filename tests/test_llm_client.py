@@ -0,0 +1,512 @@
+import asyncio
+import itertools
+import sqlite3
+
+from services.llm_cache import LLMResponseCache, make_cache_key
+from services.llm_client import LLMClient
+
+
+def test_generate_response_reuses_pooled_connection(ollama_stub):
+    client = LLMClient(
+        host=ollama_stub.host, port=ollama_stub.port, cache=LLMResponseCache()
+    )
+
+    async def run():
+        await client.start()
+        try:
+            first = await client.generate_response("你好")
+            second = await client.generate_response("再一次")
+            stats = client.get_pool_stats()
+        finally:
+            await client.close()
+        return first, second, stats
+
+    first, second, stats = asyncio.run(run())
+
+    assert first == second == "stub reply"
+    assert len(ollama_stub.requests) == 2
+    # keep-alive: both generations travelled over the same TCP connection
+    assert len(ollama_stub.peers) == 1
+    assert stats["open"] is True
+    assert client.get_pool_stats()["open"] is False
+
+
+def test_http_session_from_a_previous_loop_is_closed(ollama_stub):
+    client = LLMClient(
+        host=ollama_stub.host, port=ollama_stub.port, cache=LLMResponseCache()
+    )
+
+    async def generate(prompt):
+        await client.generate_response(prompt, use_cache=False)
+        return client._http_session
+
+    old_session = asyncio.run(generate("第一個迴圈"))
+    old_connector = old_session.connector
+
+    async def run():
+        try:
+            return await generate("第二個迴圈")
+        finally:
+            await client.close()
+
+    new_session = asyncio.run(run())
+
+    assert new_session is not old_session
+    assert old_session.closed
+    assert old_connector.closed
+
+
+def test_stream_response_yields_chunks_and_forwards_tokens(ollama_stub):
+    ollama_stub.reply = "one two three"
+    client = LLMClient(
+        host=ollama_stub.host, port=ollama_stub.port, cache=LLMResponseCache()
+    )
+    forwarded = []
+
+    async def on_token(chunk):
+        forwarded.append(chunk)
+
+    async def run():
+        try:
+            chunks = [c async for c in client.stream_response("hi")]
+            full = await client.generate_response("hi", on_token=on_token)
+        finally:
+            await client.close()
+        return chunks, full
+
+    chunks, full = asyncio.run(run())
+
+    assert chunks == ["one ", "two ", "three "]
+    assert forwarded == chunks
+    assert full == "one two three "
+    assert all(body["stream"] is True for body in ollama_stub.requests)
+
+
+def test_generate_response_served_from_cache_until_bypassed(ollama_stub):
+    client = LLMClient(
+        host=ollama_stub.host, port=ollama_stub.port, cache=LLMResponseCache()
+    )
+
+    async def run():
+        try:
+            await client.generate_response("專案尚未開始")
+            await client.generate_response("專案尚未開始")
+            await client.generate_response("專案尚未開始", use_cache=False)
+        finally:
+            await client.close()
+
+    asyncio.run(run())
+
+    assert len(ollama_stub.requests) == 2
+    stats = client.get_cache_stats()
+    assert stats["memory_hits"] == 1
+    assert stats["misses"] == 1
+
+
+def test_cache_lru_eviction_and_ttl():
+    cache = LLMResponseCache(max_entries=2, ttl=60)
+    cache.set("a", "A")
+    cache.set("b", "B")
+    cache.get("a")
+    cache.set("c", "C")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "A"
+    assert cache.get_stats()["evictions"] == 1
+
+    expired = LLMResponseCache(ttl=-1)
+    expired.set("k", "v")
+    assert expired.get("k") is None
+
+
+def test_cache_sqlite_tier_survives_restart(tmp_path):
+    db_path = str(tmp_path / "llm_cache.sqlite3")
+    key = make_cache_key("gemma3:27b", "prompt", None, 0.7, 2000)
+
+    first = LLMResponseCache(db_path=db_path)
+    first.set(key, "persisted")
+    first.close()
+
+    second = LLMResponseCache(db_path=db_path)
+    assert second.get(key) == "persisted"
+    assert second.get_stats()["disk_hits"] == 1
+    second.close()
+
+
+
+def test_cache_sqlite_tier_drops_oldest_rows_beyond_cap(tmp_path, monkeypatch):
+    db_path = tmp_path / "llm_cache.sqlite3"
+    legacy = sqlite3.connect(db_path)
+    legacy.execute(
+        "CREATE TABLE llm_cache (key TEXT PRIMARY KEY, response TEXT NOT NULL, "
+        "expires_at REAL NOT NULL)"
+    )
+    legacy.execute("INSERT INTO llm_cache VALUES ('legacy', 'old', 1e12)")
+    legacy.commit()
+    legacy.close()
+
+    clock = itertools.count(1_000_000)
+    monkeypatch.setattr("services.llm_cache.time.time", lambda: next(clock))
+    cache = LLMResponseCache(db_path=str(db_path), max_disk_entries=10)
+    for i in range(100):  # the 100th write triggers the periodic purge
+        cache.set(f"k{i}", str(i))
+
+    rows = cache._db.execute("SELECT key FROM llm_cache ORDER BY created_at").fetchall()
+    assert [key for (key,) in rows] == [f"k{i}" for i in range(90, 100)]
+    assert cache.get_stats()["disk_evictions"] == 91
+    cache.close()
+
+def test_cache_sqlite_access_does_not_block_event_loop(tmp_path):
+    db_path = str(tmp_path / "llm_cache.sqlite3")
+    cache = LLMResponseCache(db_path=db_path)
+
+    async def run():
+        await cache.set_async("k", "v")
+        cache._memory.clear()
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticking = asyncio.create_task(ticker())
+        # simulate a slow SQLite read: the loop keeps running meanwhile
+        cache._db_lock.acquire()
+        lookup = asyncio.create_task(cache.get_async("k"))
+        await asyncio.sleep(0.2)
+        cache._db_lock.release()
+        value = await lookup
+        ticking.cancel()
+        return value, ticks
+
+    value, ticks = asyncio.run(run())
+
+    assert value == "v"
+    assert ticks >= 5
+    assert cache.get_stats()["disk_hits"] == 1
+    cache.close()
+
+
+def test_identical_concurrent_requests_share_one_generation(ollama_stub):
+    ollama_stub.delay = 0.2
+    client = LLMClient(
+        host=ollama_stub.host, port=ollama_stub.port, cache=LLMResponseCache()
+    )
+
+    async def run():
+        try:
+            return await asyncio.gather(
+                *[client.generate_response("同一個提示", use_cache=False) for _ in range(5)]
+            )
+        finally:
+            await client.close()
+
+    results = asyncio.run(run())
+
+    assert results == ["stub reply"] * 5
+    assert len(ollama_stub.requests) == 1
+    assert client.get_coalescing_stats()["coalesced"] == 4
+
+
+def test_single_flight_cancelling_one_waiter_keeps_shared_task():
+    from services.single_flight import SingleFlight
+
+    flight = SingleFlight()
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def run():
+        first = asyncio.ensure_future(flight.run("k", work))
+        second = asyncio.ensure_future(flight.run("k", work))
+        await asyncio.sleep(0)
+        first.cancel()
+        result = await second
+        lone = asyncio.ensure_future(flight.run("other", work))
+        await asyncio.sleep(0)
+        lone.cancel()
+        await asyncio.sleep(0.01)
+        return first, result
+
+    first, result = asyncio.run(run())
+
+    assert first.cancelled()
+    assert result == "done"
+    assert len(calls) == 2
+    assert flight.get_stats()["abandoned"] == 1
+    assert flight.in_flight() == 0
+
+
+def test_scheduler_admits_interactive_before_background():
+    from services.llm_client import LLMPriority, LLMScheduler
+
+    scheduler = LLMScheduler(max_concurrent=1, aging_seconds=60)
+    order = []
+
+    async def job(name, priority):
+        async with scheduler.slot(priority):
+            order.append(name)
+            await asyncio.sleep(0.01)
+
+    async def run():
+        blocker = asyncio.ensure_future(job("first", LLMPriority.NORMAL))
+        await asyncio.sleep(0)
+        waiters = [
+            asyncio.ensure_future(job("bg1", LLMPriority.BACKGROUND)),
+            asyncio.ensure_future(job("bg2", LLMPriority.BACKGROUND)),
+            asyncio.ensure_future(job("ui", LLMPriority.INTERACTIVE)),
+        ]
+        await asyncio.sleep(0)
+        depth = scheduler.queue_depth()
+        await asyncio.gather(blocker, *waiters)
+        return depth
+
+    depth = asyncio.run(run())
+
+    assert depth == 3
+    assert order == ["first", "ui", "bg1", "bg2"]
+    stats = scheduler.get_stats()
+    assert stats["in_flight"] == 0
+    assert stats["classes"]["background"]["admitted"] == 2
+
+
+def test_scheduler_aging_promotes_long_waiting_background():
+    from services.llm_client import LLMPriority, LLMScheduler
+
+    scheduler = LLMScheduler(max_concurrent=1, aging_seconds=0.01)
+    order = []
+
+    async def job(name, priority):
+        async with scheduler.slot(priority):
+            order.append(name)
+            await asyncio.sleep(0.05)
+
+    async def run():
+        blocker = asyncio.ensure_future(job("first", LLMPriority.NORMAL))
+        await asyncio.sleep(0)
+        bg = asyncio.ensure_future(job("bg", LLMPriority.BACKGROUND))
+        await asyncio.sleep(0.04)
+        ui = asyncio.ensure_future(job("ui", LLMPriority.INTERACTIVE))
+        await asyncio.gather(blocker, bg, ui)
+
+    asyncio.run(run())
+
+    assert order == ["first", "bg", "ui"]
+
+
+def test_latency_tracker_derives_timeout_from_p99():
+    from services.latency_tracker import LatencyTracker
+
+    tracker = LatencyTracker(
+        default_timeout=60, min_samples=10, multiplier=3.0, min_timeout=1, max_timeout=30
+    )
+    assert tracker.timeout_for("route") == 60
+    assert tracker.hedge_delay("route") is None
+
+    for _ in range(99):
+        tracker.record("route", 0.5)
+    tracker.record("route", 2.0)
+    assert tracker.timeout_for("route") == 1.5
+    assert tracker.hedge_delay("route") == 0.5
+
+    for _ in range(10):
+        tracker.record("insights", 20.0)
+    assert tracker.timeout_for("insights") == 30
+
+
+def test_latency_tracker_timeout_recovers_when_backend_slows_down():
+    from services.latency_tracker import LatencyTracker
+
+    tracker = LatencyTracker(
+        default_timeout=60, min_samples=10, multiplier=3.0, min_timeout=1, max_timeout=30
+    )
+    for _ in range(100):
+        tracker.record("route", 0.5)
+    assert tracker.timeout_for("route") == 1.5
+
+    # the backend now needs 5s: calls time out until the timeout widens
+    attempts = []
+    for _ in range(10):
+        timeout = tracker.timeout_for("route")
+        attempts.append(timeout)
+        if 5.0 > timeout:
+            tracker.record_timeout("route", timeout)
+        else:
+            tracker.record("route", 5.0)
+            break
+
+    assert attempts[-1] >= 5.0
+    assert len(attempts) <= 4
+    assert tracker.timeout_for("route") >= 5.0
+    assert tracker.get_stats()["route"]["timeouts"] == len(attempts) - 1
+
+
+def test_chat_completion_reuses_session_context(ollama_stub, tmp_path):
+    from models.unified_models import LLMContextState
+    from services.unified_session_manager import UnifiedSessionManager
+
+    manager = UnifiedSessionManager(sessions_dir=str(tmp_path))
+    session_id = manager.create_session().session_id
+    client = LLMClient(
+        host=ollama_stub.host, port=ollama_stub.port, cache=LLMResponseCache()
+    )
+    system = {"role": "system", "content": "你是企劃助手"}
+    history = []
+
+    async def turn(content, system_message=system):
+        state = manager.get_llm_context(session_id)
+        history.append({"role": "user", "content": content})
+        reply = await client.chat_completion(
+            [system_message, *history], context_state=state
+        )
+        history.append({"role": "assistant", "content": reply})
+        manager.save_llm_context(session_id, state)
+        return reply
+
+    async def run():
+        try:
+            await turn("第一輪")
+            await turn("第二輪")
+            await turn("換了系統提示", {"role": "system", "content": "新的系統提示"})
+        finally:
+            await client.close()
+
+    asyncio.run(run())
+
+    first, second, third = ollama_stub.requests
+    assert "context" not in first
+    assert second["context"] == [len(first["prompt"]), len("stub reply")]
+    assert second["prompt"] == "用戶: 第二輪\n\n"
+    assert "context" not in third
+    assert client.get_context_stats()["invalidated"] == 1
+
+    reloaded = UnifiedSessionManager(sessions_dir=str(tmp_path))
+    state = reloaded.get_llm_context(session_id)
+    assert isinstance(state, LLMContextState)
+    assert state.turns == 1
+    assert state.context == [len(third["prompt"]), len("stub reply")]
+
+
+def test_chat_completion_drops_context_missing_other_assistant_turns(ollama_stub):
+    from models.unified_models import LLMContextState
+
+    client = LLMClient(
+        host=ollama_stub.host, port=ollama_stub.port, cache=LLMResponseCache()
+    )
+    state = LLMContextState()
+    system = {"role": "system", "content": "你是企劃助手"}
+
+    async def run():
+        try:
+            history = [{"role": "user", "content": "第一輪"}]
+            reply = await client.chat_completion([system, *history], context_state=state)
+            # the caller pads a short reply; the context still covers it
+            history.append({"role": "assistant", "content": reply + "（補充建議）"})
+            history.append({"role": "user", "content": "第二輪"})
+            await client.chat_completion([system, *history], context_state=state)
+            # a reply from another path (e.g. the rule-based /api/chat) lands in between
+            history.append({"role": "assistant", "content": "stub reply"})
+            history.append({"role": "assistant", "content": "已記錄預算 300 萬"})
+            history.append({"role": "user", "content": "第三輪"})
+            await client.chat_completion([system, *history], context_state=state)
+        finally:
+            await client.close()
+
+    asyncio.run(run())
+
+    _, second, third = ollama_stub.requests
+    assert second["prompt"] == "用戶: 第二輪\n\n"
+    assert "context" not in third
+    assert "已記錄預算 300 萬" in third["prompt"]
+    assert client.get_context_stats()["invalidated"] == 1
+
+
+def test_generate_structured_sends_schema_and_validates(ollama_stub):
+    from models.unified_models import QuickReplyOptions
+
+    client = LLMClient(
+        host=ollama_stub.host, port=ollama_stub.port, cache=LLMResponseCache()
+    )
+
+    async def run():
+        try:
+            ollama_stub.reply = "not json at all"
+            broken = await client.generate_structured("選項", QuickReplyOptions)
+            ollama_stub.reply = '{"options": [{"text": "社群", "value": "社群"}]}'
+            parsed = await client.generate_structured("選項", QuickReplyOptions)
+            cached = await client.generate_structured("選項", QuickReplyOptions)
+        finally:
+            await client.close()
+        return broken, parsed, cached
+
+    broken, parsed, cached = asyncio.run(run())
+
+    assert broken is None
+    assert parsed.options[0].text == "社群"
+    assert cached == parsed
+    # the invalid reply was not cached, the valid one was
+    assert len(ollama_stub.requests) == 2
+    assert ollama_stub.requests[0]["format"]["properties"]["options"]["type"] == "array"
+    stats = client.get_structured_stats()["QuickReplyOptions"]
+    assert stats == {"requests": 3, "parsed": 2, "parse_failures": 1, "errors": 0}
+
+
+def test_constructor_does_no_network_io_and_probing_updates_health(ollama_stub):
+    import time
+
+    started = time.perf_counter()
+    unreachable = LLMClient(backends=["http://10.255.255.1:11434"])
+    assert time.perf_counter() - started < 0.5
+    assert unreachable.healthy is False
+
+    client = LLMClient(
+        host=ollama_stub.host, port=ollama_stub.port, cache=LLMResponseCache()
+    )
+    assert client.healthy is False
+
+    async def run():
+        try:
+            ok = await client.check_service_availability()
+            models = await client.get_available_models()
+        finally:
+            await client.close()
+        return ok, models
+
+    ok, models = asyncio.run(run())
+
+    assert ok is True
+    assert client.healthy is True
+    assert [m["name"] for m in models] == ["gemma3:27b"]
+    assert ollama_stub.requests == []
+
+
+def test_status_snapshot_and_rate_limited_deep_check(ollama_stub):
+    client = LLMClient(
+        host=ollama_stub.host, port=ollama_stub.port, cache=LLMResponseCache()
+    )
+    assert client.status_snapshot()["ready"] is False
+
+    async def run():
+        try:
+            await client.pool.probe_all(await client._get_http_session())
+            snapshot = client.status_snapshot()
+            first = await client.deep_health_check()
+            second = await client.deep_health_check()
+        finally:
+            await client.close()
+        return snapshot, first, second
+
+    snapshot, first, second = asyncio.run(run())
+
+    assert snapshot["ready"] is True
+    assert snapshot["healthy_backends"] == 1
+    assert first["generation_status"] == "healthy"
+    assert first["cached"] is False
+    assert second["cached"] is True
+    # only the first deep check generated
+    assert len(ollama_stub.requests) == 1
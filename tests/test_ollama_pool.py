@@ -0,0 +1,117 @@
+import asyncio
+import socket
+
+from services.llm_cache import LLMResponseCache
+from services.llm_client import LLMClient
+
+
+def _client(urls):
+    return LLMClient(backends=urls, cache=LLMResponseCache())
+
+
+def _unused_url():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return f"http://127.0.0.1:{sock.getsockname()[1]}"
+
+
+def test_routes_to_backend_with_model_resident(ollama_stubs):
+    cold, warm = ollama_stubs(2)
+    warm.loaded = ["gemma3:27b"]
+    client = _client([cold.url, warm.url])
+
+    async def run():
+        try:
+            await client.pool.probe_all(await client._get_http_session())
+            return await client.generate_response("hi", use_cache=False)
+        finally:
+            await client.close()
+
+    assert asyncio.run(run()) == "stub reply"
+    assert len(warm.requests) == 1
+    assert cold.requests == []
+
+
+def test_skips_backend_without_requested_model(ollama_stubs):
+    other, right = ollama_stubs(2)
+    other.models = [{"name": "llama3:8b"}]
+    client = _client([other.url, right.url])
+
+    async def run():
+        try:
+            await client.pool.probe_all(await client._get_http_session())
+            await client.generate_response("hi", use_cache=False)
+        finally:
+            await client.close()
+
+    asyncio.run(run())
+    assert len(right.requests) == 1
+    assert other.requests == []
+
+
+def test_unhealthy_backend_leaves_and_rejoins_rotation(ollama_stubs):
+    flaky, steady = ollama_stubs(2)
+    client = _client([flaky.url, steady.url])
+
+    async def run():
+        session = await client._get_http_session()
+        try:
+            flaky.healthy = False
+            await client.pool.probe_all(session)
+            out_of_rotation = [b.healthy for b in client.pool.backends]
+            await client.generate_response("one", use_cache=False)
+
+            flaky.healthy = True
+            await client.pool.probe_all(session)
+            back_in_rotation = [b.healthy for b in client.pool.backends]
+            await client.generate_response("two", use_cache=False)
+        finally:
+            await client.close()
+        return out_of_rotation, back_in_rotation
+
+    out_of_rotation, back_in_rotation = asyncio.run(run())
+
+    assert out_of_rotation == [False, True]
+    assert back_in_rotation == [True, True]
+    assert [r["prompt"] for r in steady.requests] == ["one"]
+    assert [r["prompt"] for r in flaky.requests] == ["two"]
+
+
+def test_connection_failure_fails_over_to_next_backend(ollama_stubs):
+    (alive,) = ollama_stubs(1)
+    client = _client([_unused_url(), alive.url])
+
+    async def run():
+        try:
+            return await client.generate_response("hi", use_cache=False)
+        finally:
+            await client.close()
+
+    assert asyncio.run(run()) == "stub reply"
+    dead = client.get_backend_stats()["backends"][0]
+    assert dead["total_failures"] == 1
+    assert len(alive.requests) == 1
+
+
+def test_slow_request_hedged_to_second_backend(ollama_stubs):
+    slow, fast = ollama_stubs(2)
+    slow.delay = 0.5
+    slow.reply = "slow reply"
+    client = _client([slow.url, fast.url])
+    client.hedging = True
+    client.hedge_max_ratio = 1.0
+    client.latency.min_samples = 1
+    client.latency.record("generate", 0.05)
+
+    async def run():
+        try:
+            return await client.generate_response("hi", use_cache=False)
+        finally:
+            await client.close()
+
+    assert asyncio.run(run()) == "stub reply"
+    assert len(slow.requests) == 1
+    assert len(fast.requests) == 1
+    stats = client.get_latency_stats()
+    assert stats["hedged"] == 1
+    assert stats["hedge_wins"] == 1
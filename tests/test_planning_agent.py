@@ -0,0 +1,288 @@
+import asyncio
+import json
+
+from agents.unified_planning_agent import UnifiedPlanningAgent
+from models.unified_models import ProjectData
+from services.intent_classifier import IntentClassifier, RoutingLog
+from services.llm_cache import LLMResponseCache
+from services.llm_client import LLMClient
+from services.speculative_executor import SpeculativeExecutor
+from services.unified_session_manager import UnifiedSessionManager
+from tools.unified_tools import ToolExecutor
+
+
+def test_quick_replies_run_concurrently_with_non_mutating_action(ollama_stub):
+    ollama_stub.delay = 0.3
+    client = LLMClient(
+        host=ollama_stub.host, port=ollama_stub.port, cache=LLMResponseCache()
+    )
+    agent = UnifiedPlanningAgent(
+        client,
+        ToolExecutor(client),
+        intent_classifier=IntentClassifier(),
+        routing_log=RoutingLog(None),
+    )
+    project = ProjectData()
+    project.project_attributes.industry = "家電"
+
+    async def run():
+        try:
+            return await agent.process_chat_turn("聊聊品牌故事", "s1", project)
+        finally:
+            await client.close()
+
+    response = asyncio.run(run())
+
+    metadata = response.metadata
+    assert metadata["action"] == "general_conversation"
+    timings = metadata["timings_ms"]
+    assert set(timings) == {"route", "action", "quick_replies"}
+    # route, then action and quick replies side by side: well under three serial calls
+    serial_ms = timings["route"] + timings["action"] + timings["quick_replies"]
+    assert metadata["total_ms"] < serial_ms - 200
+    assert len(ollama_stub.requests) == 3
+
+
+def _run_turn(client, agent, message, project):
+    async def run():
+        try:
+            return await agent.process_chat_turn(message, "s1", project)
+        finally:
+            await client.close()
+
+    return asyncio.run(run())
+
+
+def test_fused_planner_answers_turn_with_one_generation(ollama_stub):
+    ollama_stub.reply = json.dumps(
+        {
+            "next_action": "general_conversation",
+            "extracted_fields": {"project_attributes": {"industry": "家電"}},
+            "reply_text": "了解，您要推廣家電新品。請問目標受眾與預算範圍大約是多少？",
+            "quick_replies": [
+                {"text": "家庭親子", "value": "家庭親子"},
+                {"text": "年輕族群", "value": "年輕族群"},
+            ],
+        },
+        ensure_ascii=False,
+    )
+    client = LLMClient(
+        host=ollama_stub.host, port=ollama_stub.port, cache=LLMResponseCache()
+    )
+    agent = UnifiedPlanningAgent(client, ToolExecutor(client), planner_mode="fused")
+    project = ProjectData()
+
+    response = _run_turn(client, agent, "我們要推廣家電新品", project)
+
+    assert len(ollama_stub.requests) == 1
+    assert "format" in ollama_stub.requests[0]
+    assert response.metadata["planner"] == "fused"
+    assert project.project_attributes.industry == "家電"
+    assert [r.text for r in response.quick_replies] == ["家庭親子", "年輕族群"]
+    assert [r.priority for r in response.quick_replies] == [1, 2]
+
+
+def test_fused_planner_falls_back_to_multi_call_on_invalid_output(ollama_stub):
+    client = LLMClient(
+        host=ollama_stub.host, port=ollama_stub.port, cache=LLMResponseCache()
+    )
+    agent = UnifiedPlanningAgent(client, ToolExecutor(client), planner_mode="fused")
+
+    response = _run_turn(client, agent, "我們要推廣家電新品", ProjectData())
+
+    assert response.metadata["planner"] == "fused_fallback"
+    assert response.metadata["action"] == "extract_data"
+    # failed plan, then extraction and quick replies
+    assert len(ollama_stub.requests) == 3
+    assert response.quick_replies
+
+
+def _complete_project():
+    project = ProjectData()
+    project.project_attributes.industry = "3C家電"
+    project.project_attributes.campaign = "新品上市"
+    project.time_budget.planning_due_date = "2024-10-15"
+    project.time_budget.campaign_start_date = "2024-11-01"
+    project.time_budget.campaign_end_date = "2025-03-31"
+    project.time_budget.budget = "2000000"
+    project.content_strategy.planning_types = ["策略提案"]
+    project.content_strategy.media_formats = ["Meta廣告"]
+    project.content_strategy.audience_lock = "年輕族群"
+    return project
+
+
+def test_speculated_insights_and_quick_replies_are_served_next_turn(ollama_stub):
+    ollama_stub.reply = json.dumps(
+        {
+            "target_demographics": {"age": "25-34"},
+            "options": [{"text": "提供內容策略", "value": "提供內容策略"}],
+        },
+        ensure_ascii=False,
+    )
+    client = LLMClient(
+        host=ollama_stub.host, port=ollama_stub.port, cache=LLMResponseCache()
+    )
+    agent = UnifiedPlanningAgent(client, ToolExecutor(client))
+    project = _complete_project()
+    project.completeness_score = 100.0
+
+    async def run():
+        try:
+            agent._schedule_speculation("general_conversation", project)
+            await agent.speculator.drain()
+            speculated = len(ollama_stub.requests)
+
+            reply = await agent._handle_insight_generation("分析受眾", project)
+            # a different message than the canned one still hits for the same action
+            quick_replies = await agent._generate_quick_replies(
+                "分析受眾", project, "generate_insights"
+            )
+            return speculated, reply, quick_replies
+        finally:
+            await client.close()
+
+    speculated, reply, quick_replies = asyncio.run(run())
+
+    # insights, then quick replies for the state after applying them
+    assert speculated == 2
+    assert ollama_stub.requests[0]["prompt"] != ollama_stub.requests[1]["prompt"]
+    assert len(ollama_stub.requests) == speculated
+    assert reply.startswith("已為您生成受眾洞察")
+    assert project.audience_insights.target_demographics == {"age": "25-34"}
+    assert [r.text for r in quick_replies] == ["提供內容策略"]
+    assert agent.speculator.get_stats()["hits"] == 2
+
+
+def test_speculated_quick_replies_miss_for_a_different_action(ollama_stub):
+    ollama_stub.reply = json.dumps(
+        {
+            "target_demographics": {"age": "25-34"},
+            "options": [{"text": "提供內容策略", "value": "提供內容策略"}],
+        },
+        ensure_ascii=False,
+    )
+    client = LLMClient(
+        host=ollama_stub.host, port=ollama_stub.port, cache=LLMResponseCache()
+    )
+    agent = UnifiedPlanningAgent(client, ToolExecutor(client))
+    project = _complete_project()
+    project.completeness_score = 100.0
+
+    async def run():
+        try:
+            agent._schedule_speculation("general_conversation", project)
+            await agent.speculator.drain()
+            await agent._handle_insight_generation("分析受眾", project)
+            speculated = len(ollama_stub.requests)
+            await agent._generate_quick_replies(
+                "預算改成三百萬", project, "general_conversation"
+            )
+            return speculated
+        finally:
+            await client.close()
+
+    speculated = asyncio.run(run())
+
+    # the quick replies speculated for the insights action are not reused
+    assert len(ollama_stub.requests) == speculated + 1
+    assert "預算改成三百萬" in ollama_stub.requests[-1]["prompt"]
+    stats = agent.speculator.get_stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+
+
+def test_speculation_yields_to_queued_interactive_work(ollama_stub):
+    client = LLMClient(
+        host=ollama_stub.host, port=ollama_stub.port, cache=LLMResponseCache()
+    )
+    agent = UnifiedPlanningAgent(client, ToolExecutor(client))
+    project = _complete_project()
+    project.completeness_score = 100.0
+    client.scheduler.in_flight = client.scheduler.max_concurrent
+
+    async def run():
+        try:
+            agent._schedule_speculation("general_conversation", project)
+        finally:
+            client.scheduler.in_flight = 0
+            await client.close()
+
+    asyncio.run(run())
+
+    stats = agent.speculator.get_stats()
+    assert stats["scheduled"] == 0
+    assert stats["skipped_busy"] == 1
+    assert ollama_stub.requests == []
+
+
+def test_slow_step_falls_back_within_budget_and_lands_in_session_later(
+    ollama_stub, tmp_path
+):
+    ollama_stub.reply = json.dumps(
+        {
+            "next_action": "generate_insights",
+            "reply_text": "好的，我來為您分析目標受眾。",
+            "quick_replies": [{"text": "提供內容策略", "value": "提供內容策略"}],
+            "target_demographics": {"age": "25-34"},
+        },
+        ensure_ascii=False,
+    )
+    ollama_stub.delay = 0.3
+    client = LLMClient(
+        host=ollama_stub.host, port=ollama_stub.port, cache=LLMResponseCache()
+    )
+    manager = UnifiedSessionManager(sessions_dir=str(tmp_path))
+    session = manager.create_session()
+    session.project_data = _complete_project()
+    tools = ToolExecutor(client)
+    # plan (0.3s) fits the budget, the insights call after it does not
+    agent = UnifiedPlanningAgent(
+        client,
+        tools,
+        session_manager=manager,
+        planner_mode="fused",
+        intent_classifier=IntentClassifier(),
+        routing_log=RoutingLog(None),
+        speculator=SpeculativeExecutor(tools, enabled=False),
+        turn_budget=0.45,
+    )
+
+    async def run():
+        try:
+            response = await agent.process_chat_turn(
+                "請幫我分析目標受眾", session.session_id, session.project_data
+            )
+            insights_at_reply = response.project_data.audience_insights.target_demographics
+            # a later turn changes the budget while the insights are still running
+            later = manager.get_project_data(session.session_id)
+            later.time_budget.budget = "3000000"
+            manager.update_project_data(session.session_id, later)
+            await agent.drain_late_results()
+            return response, insights_at_reply
+        finally:
+            await client.close()
+
+    response, insights_at_reply = asyncio.run(run())
+
+    assert response.message.startswith("受眾洞察仍在分析中")
+    assert response.metadata["budget_missed"] == ["action"]
+    assert response.metadata["total_ms"] < 500
+    assert not insights_at_reply
+    # the late step works on its own copy: the turn's reply data stays untouched
+    assert not response.project_data.audience_insights.target_demographics
+    pending = response.metadata["pending"]
+    assert [p["step"] for p in pending] == ["action"]
+
+    late = manager.get_late_results(session.session_id, consume=True)
+    assert [r.id for r in late] == [pending[0]["id"]]
+    assert late[0].status == "completed"
+    assert late[0].message.startswith("已為您生成受眾洞察")
+    merged = manager.get_project_data(session.session_id)
+    assert merged.audience_insights.target_demographics == {"age": "25-34"}
+    assert merged.time_budget.budget == "3000000"
+    assert manager.get_late_results(session.session_id) == []
+
+    stats = agent.get_budget_stats()
+    assert stats["misses"] == 1
+    assert stats["late_completed"] == 1
+    assert stats["pending"] == 0
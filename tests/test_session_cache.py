@@ -0,0 +1,74 @@
+from models.unified_models import MessageRole
+from services.session_cache import SessionCache
+from services.unified_session_manager import UnifiedSessionManager
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_cache_evicts_least_recently_used_by_count_bytes_and_idle_time():
+    clock = FakeClock()
+    cache = SessionCache(
+        max_entries=3, max_bytes=40, idle_seconds=60, sizeof=len, clock=clock
+    )
+    cache["a"] = "x" * 10
+    cache["b"] = "x" * 10
+    cache["c"] = "x" * 10
+    assert cache["a"]  # a 變為最近使用
+    cache["d"] = "x" * 5
+    assert list(cache) == ["c", "a", "d"]
+
+    cache["e"] = "x" * 30
+    assert list(cache) == ["d", "e"]
+    assert cache.total_bytes == 35
+
+    clock.now = 30
+    assert "e" in cache and cache["e"]
+    clock.now = 80
+    assert cache.get("d") is None
+    assert cache.evict_idle() == 0 and list(cache) == ["e"]
+
+    stats = cache.get_stats()
+    assert stats["evicted_entries"] == 2
+    assert stats["evicted_bytes"] == 1
+    assert stats["evicted_idle"] == 1
+    assert stats["hits"] == 2 and stats["misses"] == 1
+
+
+
+def test_refresh_updates_running_size_and_enforces_byte_limit():
+    cache = SessionCache(max_entries=0, max_bytes=30, idle_seconds=0, sizeof=len)
+    cache["a"] = ["x"] * 10
+    cache["b"] = ["x"] * 10
+    assert cache.total_bytes == 20
+
+    cache["b"].extend(["x"] * 15)  # 就地修改後變大
+    cache.refresh("b")
+
+    assert list(cache) == ["b"]
+    assert cache.total_bytes == 25
+    assert cache.get_stats()["evicted_bytes"] == 1
+    del cache["b"]
+    assert cache.total_bytes == 0
+
+def test_manager_flushes_pending_writes_before_evicting(tmp_path):
+    manager = UnifiedSessionManager(
+        sessions_dir=str(tmp_path), backend="json", write_behind=True, durability="batch"
+    )
+    manager.active_sessions.max_entries = 1
+    first = manager.create_session().session_id
+    manager.add_chat_message(first, MessageRole.USER, "尚未寫入")
+
+    second = manager.create_session().session_id
+
+    assert first not in manager.active_sessions
+    assert manager.get_write_stats()["dirty_sessions"] == 1
+    reloaded = manager.get_session(first)
+    assert [m.content for m in reloaded.chat_history] == ["尚未寫入"]
+    assert second not in manager.active_sessions
+    assert manager.get_cache_stats()["evicted_entries"] == 2
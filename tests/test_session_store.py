@@ -0,0 +1,348 @@
+import asyncio
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+
+from models.unified_models import MessageRole
+from services.session_store import JsonFileSessionStore, JsonlLogSessionStore
+from services.unified_session_manager import UnifiedSessionManager
+
+
+def _sqlite_manager(tmp_path):
+    return UnifiedSessionManager(sessions_dir=str(tmp_path), backend="sqlite")
+
+
+def test_sqlite_store_round_trips_session_state(tmp_path):
+    manager = _sqlite_manager(tmp_path)
+    session_id = manager.create_session(user_id="u1").session_id
+    for i in range(5):
+        manager.add_chat_message(session_id, MessageRole.USER, f"訊息{i}")
+    project = manager.get_project_data(session_id)
+    project.project_attributes.industry = "家電"
+    manager.update_project_data(session_id, project)
+    manager.compact_chat_history(session_id, "先前討論了家電新品", 2)
+
+    reloaded = _sqlite_manager(tmp_path).get_session(session_id)
+
+    assert [m.content for m in reloaded.chat_history] == ["訊息2", "訊息3", "訊息4"]
+    assert reloaded.conversation_summary == "先前討論了家電新品"
+    assert reloaded.summarized_messages == 2
+    assert reloaded.project_data.project_attributes.industry == "家電"
+    assert reloaded.user_id == "u1"
+
+    db = sqlite3.connect(str(tmp_path / "sessions.sqlite3"))
+    assert db.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert db.execute("SELECT COUNT(*) FROM messages").fetchone()[0] == 3
+
+
+def test_workers_sharing_a_database_see_each_others_writes(tmp_path):
+    worker_a = _sqlite_manager(tmp_path)
+    worker_b = _sqlite_manager(tmp_path)
+    session_id = worker_a.create_session().session_id
+    assert worker_a.get_session(session_id).chat_history == []
+
+    worker_b.add_chat_messages(
+        session_id, [(MessageRole.USER, "你好"), (MessageRole.ASSISTANT, "您好")]
+    )
+
+    # 版本確認間隔內沿用記憶體中的會話，間隔到期後才發現其他行程的更新
+    assert worker_a.get_chat_history(session_id) == []
+    worker_a.version_check_interval = 0
+    assert [m.content for m in worker_a.get_chat_history(session_id)] == ["你好", "您好"]
+    worker_b.delete_session(session_id)
+    assert worker_a.get_session(session_id) is None
+
+
+def test_get_session_skips_version_check_while_flushing(tmp_path):
+    manager = UnifiedSessionManager(
+        sessions_dir=str(tmp_path), backend="sqlite", write_behind=True, durability="batch"
+    )
+    manager.version_check_interval = 0
+    session_id = manager.create_session().session_id
+    manager.add_chat_message(session_id, MessageRole.USER, "你好")
+
+    checks = []
+    version = manager.store.version
+    manager.store.version = lambda sid: checks.append(sid) or version(sid)
+    write_batch = manager._write_batch
+
+    def slow_write(batch):
+        # 寫入進行中（背景執行緒）讀取會話：不查詢版本、不重新載入
+        seen = manager.get_session(session_id)
+        assert [m.content for m in seen.chat_history] == ["你好"]
+        return write_batch(batch)
+
+    manager._write_batch = slow_write
+    assert asyncio.run(manager.flush_async()) == 1
+    assert checks == []
+    assert not manager._flushing
+
+    assert [m.content for m in manager.get_chat_history(session_id)] == ["你好"]
+    assert checks == [session_id]
+
+
+def test_list_and_cleanup_use_session_index(tmp_path):
+    manager = _sqlite_manager(tmp_path)
+    old = manager.create_session(user_id="u1")
+    recent = manager.create_session(user_id="u2")
+    manager.add_chat_message(recent.session_id, MessageRole.USER, "預算200萬")
+    old.updated_at = datetime.now() - timedelta(days=10)
+    manager.store.save(old)
+
+    listed = manager.list_sessions()
+    assert [s["session_id"] for s in listed] == [recent.session_id, old.session_id]
+    assert listed[0]["message_count"] == 1
+    assert [s["session_id"] for s in manager.list_sessions("u1")] == [old.session_id]
+
+    assert manager.cleanup_old_sessions(days=7) == 1
+    assert manager.get_session(old.session_id) is None
+    assert manager.get_session_statistics()["total_sessions"] == 1
+
+
+def _jsonl_manager(tmp_path, **kwargs):
+    kwargs.setdefault("compact_interval", 0)
+    store = JsonlLogSessionStore(str(tmp_path), **kwargs)
+    return UnifiedSessionManager(sessions_dir=str(tmp_path), store=store)
+
+
+def test_jsonl_store_appends_deltas_and_replays_on_load(tmp_path):
+    manager = _jsonl_manager(tmp_path)
+    session_id = manager.create_session(user_id="u1").session_id
+    snapshot = tmp_path / "log" / f"{session_id}.snapshot.json"
+    snapshot_before = snapshot.read_text(encoding="utf-8")
+
+    for i in range(3):
+        manager.add_chat_message(session_id, MessageRole.USER, f"訊息{i}")
+    project = manager.get_project_data(session_id)
+    project.project_attributes.industry = "家電"
+    manager.update_project_data(session_id, project)
+    manager.compact_chat_history(session_id, "先前討論了家電新品", 1)
+
+    assert snapshot.read_text(encoding="utf-8") == snapshot_before
+    log = (tmp_path / "log" / f"{session_id}.log.jsonl").read_text(encoding="utf-8")
+    assert '"op":"project","delta":{"project_attributes":{"industry":"家電"}}' in log
+
+    reloaded = _jsonl_manager(tmp_path).get_session(session_id)
+    assert [m.content for m in reloaded.chat_history] == ["訊息1", "訊息2"]
+    assert reloaded.conversation_summary == "先前討論了家電新品"
+    assert reloaded.project_data.project_attributes.industry == "家電"
+    assert reloaded.user_id == "u1"
+
+
+def test_jsonl_store_replaces_free_form_dicts_on_replay(tmp_path):
+    manager = _jsonl_manager(tmp_path)
+    session_id = manager.create_session().session_id
+    for demographics in ({"age": "25-34"}, {"gender": "F"}):
+        project = manager.get_project_data(session_id)
+        project.audience_insights.target_demographics = demographics
+        manager.update_project_data(session_id, project)
+
+    reloaded = _jsonl_manager(tmp_path)
+    project = reloaded.get_project_data(session_id)
+    assert project.audience_insights.target_demographics == {"gender": "F"}
+
+    reloaded.store.compact(session_id)
+    project = _jsonl_manager(tmp_path).get_project_data(session_id)
+    assert project.audience_insights.target_demographics == {"gender": "F"}
+
+
+def test_jsonl_store_truncates_torn_line_before_appending(tmp_path):
+    manager = _jsonl_manager(tmp_path)
+    session_id = manager.create_session().session_id
+    manager.add_chat_message(session_id, MessageRole.USER, "訊息0")
+    log = tmp_path / "log" / f"{session_id}.log.jsonl"
+    with open(log, "a", encoding="utf-8") as f:
+        f.write('{"seq":99,"op":"app')
+
+    restarted = _jsonl_manager(tmp_path)
+    restarted.add_chat_message(session_id, MessageRole.USER, "訊息1")
+
+    assert log.read_text(encoding="utf-8").endswith("\n")
+    reloaded = _jsonl_manager(tmp_path).get_session(session_id)
+    assert [m.content for m in reloaded.chat_history] == ["訊息0", "訊息1"]
+
+
+def test_jsonl_store_compacts_log_into_snapshot(tmp_path):
+    # 每則訊息寫入兩筆紀錄（訊息 + updated_at 狀態差異）
+    manager = _jsonl_manager(tmp_path, compact_records=10)
+    session_id = manager.create_session().session_id
+    for i in range(7):
+        manager.add_chat_message(session_id, MessageRole.USER, f"訊息{i}")
+
+    log = tmp_path / "log" / f"{session_id}.log.jsonl"
+    assert manager.store.stats["compactions"] == 1
+    assert len(log.read_text(encoding="utf-8").splitlines()) == 4
+
+    reloaded = _jsonl_manager(tmp_path).get_session(session_id)
+    assert [m.content for m in reloaded.chat_history] == [f"訊息{i}" for i in range(7)]
+
+
+def test_jsonl_store_migrates_legacy_json_sessions(tmp_path):
+    legacy = UnifiedSessionManager(sessions_dir=str(tmp_path), backend="json")
+    session_id = legacy.create_session(user_id="u1").session_id
+    legacy.add_chat_message(session_id, MessageRole.USER, "舊訊息")
+    assert isinstance(legacy.store, JsonFileSessionStore)
+
+    manager = _jsonl_manager(tmp_path)
+
+    assert not (tmp_path / f"{session_id}.json").exists()
+    assert (tmp_path / f"{session_id}.json.migrated").exists()
+    assert manager.store.stats["migrated"] == 1
+    session_data = manager.get_session(session_id)
+    assert [m.content for m in session_data.chat_history] == ["舊訊息"]
+    assert manager.list_sessions(user_id="u1")[0]["session_id"] == session_id
+
+
+def test_write_behind_coalesces_mutations_into_one_write(tmp_path):
+    manager = UnifiedSessionManager(
+        sessions_dir=str(tmp_path), backend="sqlite", write_behind=True, durability="batch"
+    )
+    session_id = manager.create_session().session_id
+    manager.flush()
+    for i in range(3):
+        manager.add_chat_message(session_id, MessageRole.USER, f"訊息{i}")
+    project = manager.get_project_data(session_id)
+    project.project_attributes.industry = "家電"
+    manager.update_project_data(session_id, project)
+
+    other = _sqlite_manager(tmp_path)
+    assert other.get_session(session_id).chat_history == []
+    assert manager.get_write_stats()["dirty_sessions"] == 1
+
+    assert manager.flush() == 1
+    reloaded = _sqlite_manager(tmp_path).get_session(session_id)
+    assert [m.content for m in reloaded.chat_history] == ["訊息0", "訊息1", "訊息2"]
+    assert reloaded.project_data.project_attributes.industry == "家電"
+    assert manager.write_stats["writes"] == 2
+    count = manager.store._db.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+    assert count == 3
+    synchronous = manager.store._db.execute("PRAGMA synchronous").fetchone()[0]
+    assert synchronous == 2  # FULL
+
+
+def test_write_behind_flushes_at_end_of_turn_and_on_shutdown(tmp_path):
+    manager = UnifiedSessionManager(
+        sessions_dir=str(tmp_path), backend="json", write_behind=True, durability="turn"
+    )
+    session_id = manager.create_session().session_id
+
+    async def run():
+        manager.begin_request()
+        manager.add_chat_message(session_id, MessageRole.USER, "你好")
+        await manager.end_request()
+        after_turn = UnifiedSessionManager(sessions_dir=str(tmp_path), backend="json")
+        after_turn = after_turn.get_session(session_id)
+        manager.compact_chat_history(session_id, "打過招呼", 1)
+        await manager.shutdown()
+        return after_turn
+
+    after_turn = asyncio.run(run())
+
+    assert [m.content for m in after_turn.chat_history] == ["你好"]
+    final = UnifiedSessionManager(sessions_dir=str(tmp_path), backend="json")
+    assert final.get_session(session_id).conversation_summary == "打過招呼"
+    assert manager.get_write_stats()["dirty_sessions"] == 0
+
+
+def test_end_request_flushes_only_sessions_touched_by_the_request(tmp_path):
+    manager = UnifiedSessionManager(
+        sessions_dir=str(tmp_path), backend="json", write_behind=True, durability="turn"
+    )
+    mine = manager.create_session().session_id
+    other = manager.create_session().session_id
+    manager.flush()
+
+    async def other_request():
+        manager.begin_request()
+        manager.add_chat_message(other, MessageRole.USER, "別的請求")
+
+    async def run():
+        # 另一個請求的變更在自己的 context 中，不應被本請求寫入
+        await asyncio.create_task(other_request())
+        manager.begin_request()
+        manager.add_chat_message(mine, MessageRole.USER, "你好")
+        await manager.end_request()
+
+    asyncio.run(run())
+
+    reloaded = UnifiedSessionManager(sessions_dir=str(tmp_path), backend="json")
+    assert [m.content for m in reloaded.get_session(mine).chat_history] == ["你好"]
+    assert reloaded.get_session(other).chat_history == []
+    assert manager.get_write_stats()["dirty_sessions"] == 1
+
+
+def test_file_index_follows_writes_from_other_workers(tmp_path):
+    first = UnifiedSessionManager(sessions_dir=str(tmp_path), backend="json")
+    second = UnifiedSessionManager(sessions_dir=str(tmp_path), backend="json")
+
+    created = first.create_session(user_id="u1").session_id
+    page, _ = second.list_sessions_page(user_id="u1")
+    assert [s["session_id"] for s in page] == [created]
+
+    # the other worker rewrites the index file (compaction) and deletes a session
+    second.store.index._rewrite()
+    second.delete_session(created)
+    assert first.list_sessions_page(user_id="u1")[0] == []
+
+
+@pytest.mark.parametrize("backend", ["json", "jsonl", "sqlite"])
+def test_list_sessions_page_uses_cursor_and_filters(tmp_path, backend, monkeypatch):
+    monkeypatch.setattr("config.SESSION_LOG_COMPACT_INTERVAL", 0)
+    manager = UnifiedSessionManager(sessions_dir=str(tmp_path), backend=backend)
+    base = datetime(2026, 1, 1)
+    ids = []
+    for i in range(5):
+        session = manager.create_session(user_id="u1" if i % 2 == 0 else "u2")
+        session.updated_at = base + timedelta(hours=i)
+        session.status = "closed" if i == 4 else "active"
+        manager._persist(session)
+        ids.append(session.session_id)
+    manager.store.close()
+
+    reopened = UnifiedSessionManager(sessions_dir=str(tmp_path), backend=backend)
+    first, cursor = reopened.list_sessions_page(limit=2)
+    second, cursor2 = reopened.list_sessions_page(cursor=cursor, limit=2)
+    third, cursor3 = reopened.list_sessions_page(cursor=cursor2, limit=2)
+    assert [s["session_id"] for s in first + second + third] == ids[::-1]
+    assert cursor3 is None
+
+    u1, _ = reopened.list_sessions_page(user_id="u1", status="active")
+    assert [s["session_id"] for s in u1] == [ids[2], ids[0]]
+    window, _ = reopened.list_sessions_page(
+        updated_after=base + timedelta(hours=1), updated_before=base + timedelta(hours=3)
+    )
+    assert [s["session_id"] for s in window] == [ids[2], ids[1]]
+    assert window[0]["message_count"] == 0
+
+    with pytest.raises(ValueError):
+        reopened.list_sessions_page(cursor="not-a-cursor")
+    reopened.store.close()
+
+
+def test_file_index_serves_listing_without_parsing_sessions(tmp_path, monkeypatch):
+    manager = UnifiedSessionManager(sessions_dir=str(tmp_path), backend="json")
+    session_id = manager.create_session(user_id="u1").session_id
+    manager.add_chat_message(session_id, MessageRole.USER, "你好")
+    gone = manager.create_session().session_id
+    manager.delete_session(gone)
+
+    def fail(self, session_id):
+        raise AssertionError("列表不應解析會話檔")
+
+    monkeypatch.setattr(JsonFileSessionStore, "load", fail)
+    listed = UnifiedSessionManager(sessions_dir=str(tmp_path), backend="json").list_sessions()
+    assert [(s["session_id"], s["message_count"]) for s in listed] == [(session_id, 1)]
+
+
+def test_unknown_session_ids_are_negatively_cached(tmp_path):
+    manager = UnifiedSessionManager(sessions_dir=str(tmp_path), backend="sqlite")
+    loads = []
+    original = manager.store.load
+    manager.store.load = lambda session_id: loads.append(session_id) or original(session_id)
+
+    for _ in range(3):
+        assert manager.get_session("missing") is None
+
+    assert loads == ["missing"]
+    assert manager.get_cache_stats()["negative_hits"] == 2
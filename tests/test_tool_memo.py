@@ -0,0 +1,63 @@
+import asyncio
+import json
+
+from models.unified_models import AudienceInsights, ProjectData
+from services.llm_cache import LLMResponseCache
+from services.llm_client import LLMClient
+from services.tool_memo import ToolResultMemo
+from tools.unified_tools import ToolExecutor
+
+
+def _project(industry, media, budget="100萬"):
+    project = ProjectData()
+    project.project_attributes.industry = industry
+    project.project_attributes.campaign = "新品上市"
+    project.time_budget.budget = budget
+    project.content_strategy.media_formats = media
+    return project
+
+
+def test_insights_are_shared_across_projects_with_same_inputs(ollama_stub):
+    ollama_stub.reply = json.dumps({"target_demographics": {"age": "25-34"}})
+    client = LLMClient(
+        host=ollama_stub.host, port=ollama_stub.port, cache=LLMResponseCache()
+    )
+    memo = ToolResultMemo()
+    tools = ToolExecutor(client, memo=memo)
+
+    first = _project("3C家電", ["社群", "影音"])
+    # same canonical inputs; audience_lock is not read by the insights prompt
+    second = _project(" 3c家電 ", ["影音", "社群", "影音"])
+    second.content_strategy.audience_lock = "年輕族群"
+    changed = _project("3C家電", ["社群", "影音"], budget="300萬")
+
+    async def run():
+        try:
+            a = await tools.generate_audience_insights(first)
+            b = await tools.generate_audience_insights(second)
+            c = await tools.generate_audience_insights(changed)
+            return a, b, c
+        finally:
+            await client.close()
+
+    a, b, c = asyncio.run(run())
+
+    assert len(ollama_stub.requests) == 2
+    assert isinstance(b.data, AudienceInsights)
+    assert b.data.target_demographics == {"age": "25-34"}
+    assert b.metadata["memoized"] is True
+    assert not c.metadata.get("memoized")
+    assert memo.get_stats()["hits"] == 1
+
+
+def test_prompt_version_bump_invalidates_entries():
+    inputs = {"project_attributes.industry": "3c家電"}
+    old = ToolResultMemo(version="1")
+    new = ToolResultMemo(version="2")
+
+    assert old.key("generate_content_strategy", inputs, "prompt") != new.key(
+        "generate_content_strategy", inputs, "prompt"
+    )
+    assert old.key("generate_content_strategy", inputs, "prompt") != old.key(
+        "generate_content_strategy", inputs, "prompt v2"
+    )
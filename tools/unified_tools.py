@@ -6,20 +6,53 @@
 
 import json
 import logging
-from typing import Any, Dict, List
-
-from models.unified_models import ProjectData, QuickReply, ToolResult, AudienceInsights
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from models.unified_models import (
+    ProjectData,
+    QuickReply,
+    ToolResult,
+    AudienceInsights,
+    ProjectDataExtraction,
+    CompletenessEvaluation,
+    ContentStrategySuggestion,
+    QuickReplyOptions,
+)
+from config import TOOL_MEMO_ENABLED
 from prompts.unified_prompts import UnifiedPrompts
+from services.llm_client import LLMPriority
+from services.tool_memo import ToolResultMemo, canonical_inputs
 
 logger = logging.getLogger(__name__)
 
+# 各工具提示詞實際讀取的專案欄位（記憶化指紋只依這些欄位；調整提示詞內容時需同步更新）
+MEMOIZED_TOOL_INPUTS = {
+    "generate_audience_insights": (
+        "project_attributes.industry",
+        "project_attributes.campaign",
+        "time_budget.budget",
+        "content_strategy.media_formats",
+    ),
+    "generate_content_strategy": (
+        "project_attributes.industry",
+        "project_attributes.campaign",
+        "time_budget.budget",
+    ),
+}
+
 
 class ToolExecutor:
     """統一的工具執行器"""
 
-    def __init__(self, llm_client):
-        """初始化工具執行器"""
+    def __init__(self, llm_client, memo: Optional[ToolResultMemo] = None):
+        """初始化工具執行器
+
+        memo: 工具結果記憶化快取；未提供時依 TOOL_MEMO_ENABLED 建立。
+        """
         self.llm_client = llm_client
+        if memo is None and TOOL_MEMO_ENABLED:
+            memo = ToolResultMemo()
+        self.memo = memo
 
     async def execute_tool(self, tool_name: str, **kwargs) -> ToolResult:
         """執行指定的工具"""
@@ -34,6 +67,8 @@ class ToolExecutor:
                 return await self.generate_content_strategy(**kwargs)
             elif tool_name == "extract_project_data":
                 return await self.extract_project_data(**kwargs)
+            elif tool_name == "render_proposal":
+                return await self.render_proposal(**kwargs)
             else:
                 return ToolResult(
                     success=False,
@@ -56,6 +91,12 @@ class ToolExecutor:
             # 構建受眾分析提示詞
             prompt = UnifiedPrompts.get_system_prompt("audience")
 
+            # 相同輸入欄位已生成過（可能來自其他會話）時直接沿用
+            memo_key = self._memo_key("generate_audience_insights", project_data, prompt)
+            cached = await self._memo_get(memo_key, AudienceInsights)
+            if cached is not None:
+                return cached
+
             # 添加專案上下文
             context = f"""
 專案資訊：
@@ -69,18 +110,29 @@ class ToolExecutor:
 
             full_prompt = prompt + context
 
-            # 調用LLM生成洞察
-            response = await self.llm_client.generate_response(full_prompt)
-
-            # 解析回應並構建受眾洞察對象
-            insights = self._parse_audience_insights(response)
+            # 調用LLM生成洞察（以 AudienceInsights 的 JSON Schema 約束輸出）
+            insights = await self.llm_client.generate_structured(
+                full_prompt,
+                AudienceInsights,
+                priority=LLMPriority.BACKGROUND,
+                call_type="insights",
+            )
+            if insights is None:
+                return ToolResult(
+                    success=True,
+                    data=self._default_audience_insights(),
+                    message="受眾洞察生成成功",
+                    metadata={"tool": "generate_audience_insights", "fallback": True},
+                )
 
-            return ToolResult(
+            result = ToolResult(
                 success=True,
                 data=insights,
                 message="受眾洞察生成成功",
                 metadata={"tool": "generate_audience_insights"},
             )
+            await self._memo_set(memo_key, result)
+            return result
 
         except Exception as e:
             logger.error(f"生成受眾洞察失敗: {e}")
@@ -92,36 +144,19 @@ class ToolExecutor:
             )
 
     async def generate_quick_replies(
-        self, user_message: str, project_data: ProjectData, context: str = "general"
+        self,
+        user_message: str,
+        project_data: ProjectData,
+        context: str = "general",
+        priority: LLMPriority = LLMPriority.NORMAL,
     ) -> ToolResult:
-        """生成快速回覆選項"""
+        """生成快速回覆選項（預先計算時以 BACKGROUND 優先級執行）"""
         try:
             # 構建快速回覆生成提示詞（依缺失欄位與上下文動態產生）
             prompt = UnifiedPrompts.get_system_prompt("quick_reply")
 
             # 找出缺口
-            missing = []
-            if not project_data.project_attributes.industry:
-                missing.append("industry")
-            if not project_data.project_attributes.campaign:
-                missing.append("campaign_theme")
-            if not project_data.time_budget.planning_due_date:
-                missing.append("proposal_due_date")
-            if (
-                not project_data.time_budget.campaign_start_date
-                or not project_data.time_budget.campaign_end_date
-            ):
-                missing.append("campaign_period")
-            if not project_data.time_budget.budget:
-                missing.append("total_budget")
-            if not project_data.content_strategy.media_formats:
-                missing.append("media_formats")
-            if not project_data.content_strategy.planning_types:
-                missing.append("plan_type")
-            if not project_data.content_strategy.audience_lock:
-                missing.append("audience_targeting")
-            if not project_data.content_strategy.audience_behavior:
-                missing.append("audience_behavior")
+            missing = self._missing_quick_reply_fields(project_data)
 
             # 添加對話上下文
             context_info = f"""
@@ -132,40 +167,26 @@ class ToolExecutor:
 
 請根據缺失欄位動態生成3-5個快速回覆，每個選項要能直接填入關鍵欄位或推進下一步，
 例如提供『受眾鎖定』、『媒體形式』、『預算範圍』、『活動期間』等具體可選文字。
-輸出 JSON 陣列，每個元素含 text、value 欄位。
+輸出 JSON 物件，options 陣列中每個元素含 text、value 欄位。
 """
 
             full_prompt = prompt + context_info
 
-            # 調用LLM生成選項
-            response = await self.llm_client.generate_response(full_prompt)
+            # 調用LLM生成選項（以 QuickReplyOptions 的 JSON Schema 約束輸出）
+            options = await self.llm_client.generate_structured(
+                full_prompt,
+                QuickReplyOptions,
+                priority=priority,
+                call_type="quick_replies",
+            )
 
-            # 解析回應並構建快速回覆選項；若 LLM 無法給出 JSON，就用缺失欄位生成預設泡泡
-            quick_replies = self._parse_quick_replies(response)
+            # 依序重新編排優先級；若 LLM 無法給出有效選項，就用缺失欄位生成預設泡泡
+            quick_replies = [
+                reply.copy(update={"priority": i + 1})
+                for i, reply in enumerate(options.options if options else [])
+            ]
             if not quick_replies:
-                fallback = []
-                if "audience_targeting" in missing:
-                    for lbl in ["家庭親子", "年輕族群", "企業決策者", "教育單位"]:
-                        fallback.append(
-                            QuickReply(text=lbl, value=lbl, priority=len(fallback) + 1)
-                        )
-                if "media_formats" in missing:
-                    for lbl in ["社群", "搜尋", "影音", "OOH"]:
-                        fallback.append(
-                            QuickReply(text=lbl, value=lbl, priority=len(fallback) + 1)
-                        )
-                if "total_budget" in missing:
-                    for lbl in ["50萬", "100萬", "300萬", "500萬"]:
-                        fallback.append(
-                            QuickReply(text=lbl, value=lbl, priority=len(fallback) + 1)
-                        )
-                if not fallback:
-                    fallback = [
-                        QuickReply(
-                            text="提供更多資訊", value="提供更多資訊", priority=1
-                        ),
-                        QuickReply(text="下一步建議", value="下一步建議", priority=2),
-                    ]
+                fallback = self.fallback_quick_replies(project_data)
                 return ToolResult(
                     success=True,
                     data=fallback,
@@ -205,11 +226,16 @@ class ToolExecutor:
 
             full_prompt = prompt + context
 
-            # 調用LLM評估完整度
-            response = await self.llm_client.generate_response(full_prompt)
-
-            # 解析回應
-            evaluation = self._parse_completeness_evaluation(response)
+            # 調用LLM評估完整度（以 CompletenessEvaluation 的 JSON Schema 約束輸出）
+            parsed = await self.llm_client.generate_structured(
+                full_prompt,
+                CompletenessEvaluation,
+                priority=LLMPriority.NORMAL,
+                call_type="completeness",
+            )
+            evaluation = (
+                parsed.dict() if parsed else self._default_completeness_evaluation()
+            )
 
             return ToolResult(
                 success=True,
@@ -233,6 +259,11 @@ class ToolExecutor:
             # 構建內容策略生成提示詞
             prompt = UnifiedPrompts.get_system_prompt("strategy")
 
+            memo_key = self._memo_key("generate_content_strategy", project_data, prompt)
+            cached = await self._memo_get(memo_key)
+            if cached is not None:
+                return cached
+
             # 添加專案和受眾資訊
             context = f"""
 專案資訊:
@@ -243,18 +274,29 @@ class ToolExecutor:
 
             full_prompt = prompt + context
 
-            # 調用LLM生成策略
-            response = await self.llm_client.generate_response(full_prompt)
-
-            # 解析回應
-            strategy = self._parse_content_strategy(response)
+            # 調用LLM生成策略（以 ContentStrategySuggestion 的 JSON Schema 約束輸出）
+            parsed = await self.llm_client.generate_structured(
+                full_prompt,
+                ContentStrategySuggestion,
+                priority=LLMPriority.BACKGROUND,
+                call_type="strategy",
+            )
+            if parsed is None:
+                return ToolResult(
+                    success=True,
+                    data=self._default_content_strategy(),
+                    message="內容策略生成成功",
+                    metadata={"tool": "generate_content_strategy", "fallback": True},
+                )
 
-            return ToolResult(
+            result = ToolResult(
                 success=True,
-                data=strategy,
+                data=parsed.dict(),
                 message="內容策略生成成功",
                 metadata={"tool": "generate_content_strategy"},
             )
+            await self._memo_set(memo_key, result)
+            return result
 
         except Exception as e:
             logger.error(f"生成內容策略失敗: {e}")
@@ -265,7 +307,50 @@ class ToolExecutor:
                 metadata={"tool": "generate_content_strategy", "error": str(e)},
             )
 
-    async def extract_project_data(self, user_message: str) -> ToolResult:
+    async def render_proposal(self, project_data: ProjectData) -> ToolResult:
+        """生成完整提案文本（Markdown，輸出較長，通常以背景工作執行）"""
+        try:
+            prompt = UnifiedPrompts.get_system_prompt("proposal")
+            project_json = json.dumps(
+                project_data.dict(exclude={"created_at", "updated_at"}),
+                ensure_ascii=False,
+                indent=2,
+                default=str,
+            )
+            context = f"""
+
+企劃專案資料：
+{project_json}
+"""
+            text = await self.llm_client.generate_response(
+                prompt + context,
+                max_tokens=4000,
+                priority=LLMPriority.BACKGROUND,
+                call_type="proposal",
+                raise_on_error=True,
+            )
+
+            return ToolResult(
+                success=bool(text and text.strip()),
+                data=text,
+                message="提案文本生成成功" if text else "提案文本為空",
+                metadata={"tool": "render_proposal"},
+            )
+
+        except Exception as e:
+            logger.error(f"生成提案文本失敗: {e}")
+            return ToolResult(
+                success=False,
+                data=None,
+                message=f"生成提案文本失敗: {str(e)}",
+                metadata={"tool": "render_proposal", "error": str(e)},
+            )
+
+    async def extract_project_data(
+        self,
+        user_message: str,
+        on_token: Optional[Callable[[str], Awaitable[None]]] = None,
+    ) -> ToolResult:
         """從用戶訊息中提取專案數據"""
         try:
             # 構建數據提取提示詞
@@ -274,11 +359,15 @@ class ToolExecutor:
             # 添加用戶訊息
             full_prompt = f"{prompt}\n\n用戶訊息: {user_message}"
 
-            # 調用LLM提取數據
-            response = await self.llm_client.generate_response(full_prompt)
-
-            # 解析回應
-            extracted_data = self._parse_extracted_data(response)
+            # 調用LLM提取數據（以 ProjectDataExtraction 的 JSON Schema 約束輸出）
+            parsed = await self.llm_client.generate_structured(
+                full_prompt,
+                ProjectDataExtraction,
+                on_token=on_token,
+                priority=LLMPriority.INTERACTIVE,
+                call_type="extract",
+            )
+            extracted_data = parsed.dict(exclude_none=True) if parsed else {}
 
             return ToolResult(
                 success=True,
@@ -296,141 +385,106 @@ class ToolExecutor:
                 metadata={"tool": "extract_project_data", "error": str(e)},
             )
 
-    def _parse_audience_insights(self, response: str) -> AudienceInsights:
-        """解析受眾洞察回應"""
-        try:
-            # 嘗試解析JSON回應
-            if "{" in response and "}" in response:
-                start = response.find("{")
-                end = response.rfind("}") + 1
-                json_str = response[start:end]
-                data = json.loads(json_str)
-
-                return AudienceInsights(**data)
-            else:
-                # 如果無法解析JSON，創建基本洞察對象
-                return AudienceInsights(
-                    target_demographics={"note": "需要進一步分析"},
-                    psychographic_profile={"note": "需要進一步分析"},
-                    behavior_patterns=["需要進一步分析"],
-                    pain_points=["需要進一步分析"],
-                    motivations=["需要進一步分析"],
-                    media_preferences=["需要進一步分析"],
+    def _memo_key(
+        self, tool_name: str, project_data: ProjectData, prompt: str
+    ) -> Optional[str]:
+        if self.memo is None:
+            return None
+        inputs = canonical_inputs(project_data, MEMOIZED_TOOL_INPUTS[tool_name])
+        model = getattr(self.llm_client, "model", "") or ""
+        return self.memo.key(tool_name, inputs, prompt, model)
+
+    async def _memo_get(
+        self, memo_key: Optional[str], data_model=None
+    ) -> Optional[ToolResult]:
+        if memo_key is None:
+            return None
+        return await self.memo.get_async(memo_key, data_model)
+
+    async def _memo_set(self, memo_key: Optional[str], result: ToolResult) -> None:
+        if memo_key is not None:
+            await self.memo.set_async(memo_key, result)
+
+    def _default_audience_insights(self) -> AudienceInsights:
+        """無法取得有效受眾洞察時的預設值"""
+        return AudienceInsights(
+            target_demographics={"note": "需要進一步分析"},
+            psychographic_profile={"note": "需要進一步分析"},
+            behavior_patterns=["需要進一步分析"],
+            pain_points=["需要進一步分析"],
+            motivations=["需要進一步分析"],
+            media_preferences=["需要進一步分析"],
+        )
+
+    def _default_completeness_evaluation(self) -> Dict[str, Any]:
+        """無法取得有效完整度評估時的預設值"""
+        return {
+            "completeness_score": 50.0,
+            "missing_fields": ["需要進一步分析"],
+            "next_action": "繼續收集資訊",
+            "is_ready": False,
+        }
+
+    def _default_content_strategy(self) -> Dict[str, Any]:
+        """無法取得有效內容策略時的預設值"""
+        return {
+            "planning_types": ["需要進一步分析"],
+            "media_formats": ["需要進一步分析"],
+            "content_themes": ["需要進一步分析"],
+            "timing_suggestions": ["需要進一步分析"],
+            "evaluation_metrics": ["需要進一步分析"],
+        }
+
+    def fallback_quick_replies(self, project_data: ProjectData) -> List[QuickReply]:
+        """依缺失欄位產生的預設快速回覆（不呼叫 LLM）"""
+        missing = self._missing_quick_reply_fields(project_data)
+        fallback = []
+        if "audience_targeting" in missing:
+            for lbl in ["家庭親子", "年輕族群", "企業決策者", "教育單位"]:
+                fallback.append(
+                    QuickReply(text=lbl, value=lbl, priority=len(fallback) + 1)
                 )
-        except Exception as e:
-            logger.warning(f"解析受眾洞察失敗，使用預設值: {e}")
-            return AudienceInsights()
-
-    def _parse_quick_replies(self, response: str) -> List[QuickReply]:
-        """解析快速回覆選項"""
-        try:
-            # 嘗試解析JSON回應
-            if "[" in response and "]" in response:
-                start = response.find("[")
-                end = response.rfind("]") + 1
-                json_str = response[start:end]
-                data = json.loads(json_str)
-
-                quick_replies = []
-                for i, item in enumerate(data):
-                    if isinstance(item, dict):
-                        quick_replies.append(
-                            QuickReply(
-                                text=item.get("text", f"選項{i+1}"),
-                                value=item.get("value", item.get("text", f"選項{i+1}")),
-                                priority=i + 1,
-                            )
-                        )
-                    else:
-                        quick_replies.append(
-                            QuickReply(text=str(item), value=str(item), priority=i + 1)
-                        )
-
-                return quick_replies
-            else:
-                # 如果無法解析JSON，生成基本選項
-                return [
-                    QuickReply(text="繼續", value="continue", priority=1),
-                    QuickReply(text="需要更多資訊", value="more_info", priority=2),
-                    QuickReply(text="完成", value="complete", priority=3),
-                ]
-        except Exception as e:
-            logger.warning(f"解析快速回覆選項失敗，使用預設值: {e}")
-            return [
-                QuickReply(text="繼續", value="continue", priority=1),
-                QuickReply(text="需要更多資訊", value="more_info", priority=2),
-                QuickReply(text="完成", value="complete", priority=3),
+        if "media_formats" in missing:
+            for lbl in ["社群", "搜尋", "影音", "OOH"]:
+                fallback.append(
+                    QuickReply(text=lbl, value=lbl, priority=len(fallback) + 1)
+                )
+        if "total_budget" in missing:
+            for lbl in ["50萬", "100萬", "300萬", "500萬"]:
+                fallback.append(
+                    QuickReply(text=lbl, value=lbl, priority=len(fallback) + 1)
+                )
+        if not fallback:
+            fallback = [
+                QuickReply(text="提供更多資訊", value="提供更多資訊", priority=1),
+                QuickReply(text="下一步建議", value="下一步建議", priority=2),
             ]
-
-    def _parse_completeness_evaluation(self, response: str) -> Dict[str, Any]:
-        """解析完整度評估"""
-        try:
-            # 嘗試解析JSON回應
-            if "{" in response and "}" in response:
-                start = response.find("{")
-                end = response.rfind("}") + 1
-                json_str = response[start:end]
-                return json.loads(json_str)
-            else:
-                # 如果無法解析JSON，返回基本評估
-                return {
-                    "completeness_score": 50.0,
-                    "missing_fields": ["需要進一步分析"],
-                    "next_action": "繼續收集資訊",
-                    "is_ready": False,
-                }
-        except Exception as e:
-            logger.warning(f"解析完整度評估失敗，使用預設值: {e}")
-            return {
-                "completeness_score": 50.0,
-                "missing_fields": ["需要進一步分析"],
-                "next_action": "繼續收集資訊",
-                "is_ready": False,
-            }
-
-    def _parse_content_strategy(self, response: str) -> Dict[str, Any]:
-        """解析內容策略"""
-        try:
-            # 嘗試解析JSON回應
-            if "{" in response and "}" in response:
-                start = response.find("{")
-                end = response.rfind("}") + 1
-                json_str = response[start:end]
-                return json.loads(json_str)
-            else:
-                # 如果無法解析JSON，返回基本策略
-                return {
-                    "planning_types": ["需要進一步分析"],
-                    "media_formats": ["需要進一步分析"],
-                    "content_themes": ["需要進一步分析"],
-                    "timing_suggestions": ["需要進一步分析"],
-                    "evaluation_metrics": ["需要進一步分析"],
-                }
-        except Exception as e:
-            logger.warning(f"解析內容策略失敗，使用預設值: {e}")
-            return {
-                "planning_types": ["需要進一步分析"],
-                "media_formats": ["需要進一步分析"],
-                "content_themes": ["需要進一步分析"],
-                "timing_suggestions": ["需要進一步分析"],
-                "evaluation_metrics": ["需要進一步分析"],
-            }
-
-    def _parse_extracted_data(self, response: str) -> Dict[str, Any]:
-        """解析提取的專案數據"""
-        try:
-            # 嘗試解析JSON回應
-            if "{" in response and "}" in response:
-                start = response.find("{")
-                end = response.rfind("}") + 1
-                json_str = response[start:end]
-                return json.loads(json_str)
-            else:
-                # 如果無法解析JSON，返回空數據
-                return {}
-        except Exception as e:
-            logger.warning(f"解析提取數據失敗: {e}")
-            return {}
+        return fallback
+
+    def _missing_quick_reply_fields(self, project_data: ProjectData) -> List[str]:
+        missing = []
+        if not project_data.project_attributes.industry:
+            missing.append("industry")
+        if not project_data.project_attributes.campaign:
+            missing.append("campaign_theme")
+        if not project_data.time_budget.planning_due_date:
+            missing.append("proposal_due_date")
+        if (
+            not project_data.time_budget.campaign_start_date
+            or not project_data.time_budget.campaign_end_date
+        ):
+            missing.append("campaign_period")
+        if not project_data.time_budget.budget:
+            missing.append("total_budget")
+        if not project_data.content_strategy.media_formats:
+            missing.append("media_formats")
+        if not project_data.content_strategy.planning_types:
+            missing.append("plan_type")
+        if not project_data.content_strategy.audience_lock:
+            missing.append("audience_targeting")
+        if not project_data.content_strategy.audience_behavior:
+            missing.append("audience_behavior")
+        return missing
 
     def _get_project_summary(self, project_data: ProjectData) -> str:
         """獲取專案摘要"""